@@ -1,25 +1,29 @@
 from datetime import datetime
-from decimal import Decimal
 from http import HTTPStatus
 import json
 from uuid import uuid4
 
-import boto3
-from boto3.dynamodb.conditions import Attr, Key
-
-from common.const import LAMBDA_STAGE, SendReason
+from common import episode_service, feed, search
+from common.const import FEED_CACHE_TTL, SendReason
+from common.counter import increment_like_points
 from common.decorator import handler
 from common.exception import ApplicationException
 from common.resource import Table
+from common.paginator import get_page_params, paginate_list, query_all
+from common.rate_limit import check_rate_limit
 from common.response import (
+    is_not_modified,
+    make_etag,
+    NotModifiedResponse,
     PostResponse,
     Response,
 )
-from common.util import add_point_history, is_empty
+from common.util import is_empty
 
 
 table_adage = Table.ADAGE
-table_user = Table.USER
+
+FEED_CACHE_CONTROL = f'public, max-age={FEED_CACHE_TTL}'
 
 
 @handler
@@ -29,44 +33,34 @@ def get(event, context):
     Returns:
         Response: レスポンス
     """
-    # 今月の格言取得
-    adage_list = get_adage_by_registration_month(datetime.now().month)
-
-    # 今月の格言リストを作成
-    _adage_list = []
-
-    for adage in adage_list: 
-        body = {
-            'adageId': adage['adageId'],
-            'title': adage['title'],
-            'registrationMonth': int(adage['registrationMonth']),
-            'likePoints': int(adage['likePoints']),
-            'episode': [],
-        }
-
-        # 格言IDのエピソードを取得
-        adage_episode = table_adage.query(
-            KeyConditionExpression=Key('adageId').eq(adage['adageId']) &
-                Key('key').begins_with('episode'),
-            FilterExpression=Attr('byGuest').not_exists(),
+    month = datetime.now().month
+    limit, cursor = get_page_params(event)
+
+    # 今月の格言リストを取得
+    etag, _adage_list = feed.get_feed(month)
+
+    # ページング指定の場合、ページ単位に切り出す
+    next_cursor = None
+    if limit is not None or cursor is not None:
+        _adage_list, next_cursor = paginate_list(
+            _adage_list,
+            f'feed#{month}',
+            limit,
+            cursor,
         )
-        if not is_empty(adage_episode.get('Items')):
-
-            for episode in adage_episode['Items']:
-                episode['likePoints'] = int(episode.get('likePoints', 0))
-
-            body['episode'] = adage_episode['Items']
+        etag = make_etag([etag, limit, cursor])
 
-        _adage_list.append(body)
+    # 変更がない場合
+    if is_not_modified(event, etag):
+        return NotModifiedResponse(etag, FEED_CACHE_CONTROL)
 
-    # いいねポイントで降順にソート
-    _adage_list.sort(
-        key=lambda x: x['likePoints'],
-        reverse=True,
+    return Response(
+        _adage_list,
+        etag=etag,
+        cache_control=FEED_CACHE_CONTROL,
+        next_cursor=next_cursor,
     )
 
-    return Response(_adage_list)
-
 
 @handler
 def post(event, context):
@@ -89,10 +83,14 @@ def post_by_guest(event, context):
 
     Raise:
         ApplicationException: 必須項目が空の場合
+        RateLimitException: リクエスト数の上限を超えた場合
 
     Returns:
         PostResponse: レスポンス
     """
+    # 認証なしのため送信元IPごとに制限
+    check_rate_limit(event, 'adage.post_by_guest')
+
     return post_core_process(event, 'guest')
 
 
@@ -135,18 +133,29 @@ def post_core_process(event: dict, sub: str) -> PostResponse:
     if sub == 'guest':
         body['byGuest'] = True
 
-    # ユーザにポイント付与
+    # エピソードも含まれる場合、格言とエピソードをまとめて登録
+    documents = [body]
+    if not is_empty(episode):
+        documents.append(
+            episode_service.create_adage_with_episode(body, sub, episode),
+        )
+
     else:
-        send_reason = SendReason.REGISTRATION_ADAGE
-        patch_user(sub, send_reason.point)
-        add_point_history(sub, send_reason)
+        # 格言登録
+        table_adage.put_item(Item=body)
 
-    # 格言登録
-    table_adage.put_item(Item=body)
+        if sub != 'guest':
+            # 月間ランキングへ追加
+            feed.add_adage(body)
 
-    # エピソードも含まれる場合
-    if not is_empty(episode):
-        invoke_lambda_post_episode(adage_id, sub, episode)
+            # ユーザにポイント付与
+            episode_service.award_points(
+                sub,
+                [SendReason.REGISTRATION_ADAGE],
+            )
+
+    # 検索インデックスへ格言、エピソード追加
+    search.add_documents(documents)
 
     body['episode'] = episode
 
@@ -166,99 +175,126 @@ def patch(event, context):
     """
     adage_id = event['pathParameters']['adageId']
 
-    patch_adage(adage_id)
+    adage = patch_adage(adage_id)
+
+    # 月間ランキングのいいねポイント更新(分割した場合は集約時に反映)
+    if adage is not None:
+        feed.apply_like_points(adage)
 
     return Response(
         {'adageId': adage_id},
     )
 
 
-def get_adage_by_registration_month(month: int) -> list:
-    """今月の格言リストを取得
+@handler
+def backfill_feed(event, context):
+    """既存エピソードへ格言の登録月を付与する(一括取得用の移行処理)
+
+    Returns:
+        Response: レスポンス
+    """
+    from boto3.dynamodb.conditions import Attr
+
+    scan_kwargs = {
+        'FilterExpression': Attr('key').begins_with('episode') &
+            Attr('registrationMonth').not_exists(),
+        'ProjectionExpression': 'adageId,#key',
+        'ExpressionAttributeNames': {'#key': 'key'},
+    }
+    updated = 0
+
+    while True:
+        items = table_adage.scan(**scan_kwargs)
+
+        for episode in items.get('Items', []):
+            adage = table_adage.get_item(
+                Key={
+                    'adageId': episode['adageId'],
+                    'key': 'title',
+                },
+                ProjectionExpression='registrationMonth',
+            ).get('Item', {})
+
+            # 格言が存在しない場合
+            if is_empty(adage.get('registrationMonth')):
+                continue
+
+            table_adage.update_item(
+                Key={
+                    'adageId': episode['adageId'],
+                    'key': episode['key'],
+                },
+                UpdateExpression='set registrationMonth=:registrationMonth',
+                ExpressionAttributeValues={
+                    ':registrationMonth': adage['registrationMonth'],
+                },
+            )
+            updated += 1
+
+        if 'LastEvaluatedKey' not in items:
+            break
+        scan_kwargs['ExclusiveStartKey'] = items['LastEvaluatedKey']
+
+    return Response({'updated': updated})
+
+
+@handler
+def rebuild_ranking(event, context):
+    """月間ランキングを格言テーブルから再作成する
 
     Args:
-        month (int): 今月の値
+        event (dict): イベント({'month': 月}、省略時は今月)
+        context (dict): コンテキスト
 
     Returns:
-        list: 今月の格言リスト
+        Response: レスポンス
     """
-    item = table_adage.query(
-        IndexName='registrationMonth-Index',
-        KeyConditionExpression=Key('registrationMonth').eq(month),
-        FilterExpression=Attr('byGuest').not_exists(),
+    month = (event or {}).get('month') or datetime.now().month
+
+    adage_list = feed.rebuild_monthly_ranking(int(month))
+
+    return Response(
+        {
+            'month': int(month),
+            'adages': len(adage_list),
+        },
     )
-    return [] if is_empty(item.get('Items')) else item['Items']
 
 
-def invoke_lambda_post_episode(
-        adage_id: str, sub: str, episode: str) -> dict:
-    """エピソード登録関数呼び出し
+def get_adage_by_registration_month(month: int) -> list:
+    """今月の格言リストを取得
 
     Args:
-        adage_id (str): 格言ID
-        sub (str): ユーザID
-        episode (str): エピソード
+        month (int): 今月の値
 
     Returns:
-        dict: 結果
+        list: 今月の格言リスト
     """
-    client = boto3.client('lambda')
-
-    return client.invoke(
-        FunctionName=f'share-adage-service-{LAMBDA_STAGE}-episodePost',
-        Payload=json.dumps(
-            {
-                'body': json.dumps(
-                    {
-                        'adageId': adage_id,
-                        'episode': episode,
-                        'userId': sub,
-                    },
-                ),
-            },
-        ),
+    from boto3.dynamodb.conditions import Attr, Key
+
+    return query_all(
+        table_adage.query,
+        IndexName='registrationMonth-Index',
+        KeyConditionExpression=Key('registrationMonth').eq(month),
+        FilterExpression=Attr('byGuest').not_exists() &
+            Attr('key').eq('title'),
     )
 
 
-def patch_adage(adage_id: str):
+def patch_adage(adage_id: str) -> dict:
     """格言のいいねポイントを増やす
 
     Args:
         adage_id (str): 格言ID
+
+    Returns:
+        dict: 更新後の格言、分割アイテムへ加算した場合None
     """
-    return table_adage.update_item(
-        Key= {
+    return increment_like_points(
+        table_adage,
+        {
             'adageId': adage_id,
             'key': 'title',
         },
-        UpdateExpression="ADD #likePoints :increment",
-        ExpressionAttributeNames={
-            '#likePoints':'likePoints'
-        },
-        ExpressionAttributeValues={
-            ":increment": Decimal(1)
-        },
-        ReturnValues="UPDATED_NEW"
     )
 
-
-def patch_user(user_id: str, point: int):
-    """ユーザのいいねポイントを増やす
-
-    Args:
-        user_id (str): ユーザID
-        point (int): ポイント
-    """
-    return table_user.update_item(
-        Key= {
-            'userId': user_id,
-            'key': 'userId',
-        },
-        UpdateExpression="ADD #likePoints :increment",
-        ExpressionAttributeNames={
-            '#likePoints':'likePoints',
-        },
-        ExpressionAttributeValues={
-            ":increment": Decimal(point),
-        },
-    )
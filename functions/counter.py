@@ -0,0 +1,99 @@
+import json
+import logging
+
+from common import counter, event_queue, likes
+from common.decorator import handler
+from common.event_queue import get_queue
+from common.response import Response
+
+
+logger = logging.getLogger('share-adage-service')
+
+
+@handler
+def fold(event, context):
+    """分割されたいいねポイントを本体アイテムへ集約し、ランキングへ反映する
+
+    Args:
+        event (dict): イベント
+        context (dict): コンテキスト
+
+    Returns:
+        Response: レスポンス
+    """
+    folded = {}
+
+    for name, table in likes.TABLES.items():
+        if counter.get_shard_count(table) <= 1:
+            continue
+
+        points = counter.fold_like_points(table)
+        likes.apply_folded(name, points)
+        folded[table.name] = len(points)
+
+    return Response(folded)
+
+
+def aggregate(event, context):
+    """キューに溜まったいいね・ハートのイベントを集約して書き込む
+
+    SQSトリガーの場合はRecordsのイベントを、それ以外は設定されたキューから
+    取り出したイベントを処理する。
+    SQSの再配信で同じメッセージを重複して加算しないよう、メッセージIDを
+    記録してから処理し、失敗時は記録を削除してbatchItemFailuresで再試行させる
+
+    Args:
+        event (dict): イベント
+        context (dict): コンテキスト
+
+    Returns:
+        dict: 書き込み件数、SQSトリガーの場合は失敗したメッセージ
+    """
+    # SQSトリガーの場合
+    if 'Records' in (event or {}):
+        return aggregate_records(event['Records'])
+
+    queue = get_queue()
+    result = likes.apply_events(queue.drain())
+
+    if hasattr(queue, 'ack'):
+        queue.ack()
+
+    logger.info(result)
+
+    return result
+
+
+def aggregate_records(records: list) -> dict:
+    """SQSのレコードのイベントを集約して書き込む
+
+    Args:
+        records (list): SQSトリガーのRecords
+
+    Returns:
+        dict: 失敗したメッセージ(batchItemFailures)
+    """
+    records = event_queue.claim_messages(records)
+
+    try:
+        result = likes.apply_events(
+            [json.loads(record['body']) for record in records],
+        )
+
+    except Exception as e:
+        logger.error(
+            'Aggregation failed. ' + str(type(e)) + ':' + str(e),
+        )
+        event_queue.release_messages(records)
+
+        return {
+            'batchItemFailures': [
+                {'itemIdentifier': record['messageId']}
+                for record in records
+            ],
+        }
+
+    event_queue.complete_messages(records)
+    logger.info(result)
+
+    return {'batchItemFailures': []}
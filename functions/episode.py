@@ -1,19 +1,19 @@
-from decimal import Decimal
 from http import HTTPStatus
 import json
-from uuid import uuid4
 
+from common import episode_service, likes
 from common.decorator import handler
-from common.exception import ApplicationException
+from common.exception import ApplicationException, ConditionalCheckException
+from common.rate_limit import check_rate_limit
 from common.response import PostResponse
 from common.response import Response
 from common.resource import Table
-from common.util import add_point_history, is_empty
+from common.user_repository import UserRepository
+from common.util import is_empty
 from common.const import SendReason
 
 
 table_adage = Table.ADAGE
-table_user = Table.USER
 
 
 @handler
@@ -28,10 +28,14 @@ def post(event, context):
         ApplicationException: 必須項目不足の場合
         ApplicationException: 既存格言が存在しない場合
         ApplicationException: 既存ユーザが存在しない場合
+        RateLimitException: リクエスト数の上限を超えた場合
 
     Returns:
         Response: レスポンス
     """
+    # 認証なしのため送信元IPごとに制限(ボディのuserIdによらない)
+    check_rate_limit(event, 'episode.post')
+
     body = json.loads(event['body'])
     adage_id = body.get('adageId')
     episode = body.get('episode')
@@ -45,7 +49,11 @@ def post(event, context):
         )
 
     # 既存格言チェック
-    exists_adage = get_adage(adage_id, 'title')
+    exists_adage = get_adage(
+        adage_id,
+        'title',
+        ['title', 'registrationMonth'],
+    )
     if is_empty(exists_adage):
         raise ApplicationException(
             HTTPStatus.BAD_REQUEST,
@@ -59,56 +67,12 @@ def post(event, context):
             'userId is required.',
         )
 
-    # ゲストユーザの場合
-    if user_id == 'guest':
-        user_id = '#'.join([user_id, str(uuid4())])
-        item = {
-            'adageId': adage_id,
-            'key': '#'.join(['episode', user_id]),
-            'userId': user_id,
-            'userName': 'ゲスト',
-            'title': exists_adage['title'],
-            'episode': episode,
-            'byGuest': True,
-            'likePoints': 0,
-        }
-        table_adage.put_item(Item=item)
-
-    else:
-        exists_user = get_user(user_id, ['userName'])
-        if is_empty(exists_user):
-            raise ApplicationException(
-                HTTPStatus.BAD_REQUEST,
-                f'User does not exists. userId: {user_id}',
-            )
-
-        # 格言IDにエピソード登録
-        item = {
-            'adageId': adage_id,
-            'key': '#'.join(['episode', user_id]),
-            'userId': user_id,
-            'userName': exists_user['userName'],
-            'title': exists_adage['title'],
-            'episode': episode,
-            'likePoints': 0,
-        }
-        table_adage.put_item(Item=item)
-
-        # ユーザIDにエピソード登録
-        table_user.put_item(
-            Item={
-                'userId': user_id,
-                'key': '#'.join(['episode', adage_id]),
-                'adageId': adage_id,
-                'title': exists_adage['title'],
-                'episode': episode,
-            },
-        )
-
-        # ユーザにポイント付与
-        send_reason = SendReason.REGISTRATION_EPISODE
-        patch_user(user_id, send_reason.point)
-        add_point_history(user_id, send_reason)
+    # エピソード登録
+    episode_service.create_episode(
+        {**exists_adage, 'adageId': adage_id},
+        user_id,
+        episode,
+    )
 
     return PostResponse(body)
 
@@ -134,45 +98,27 @@ def get_by_id(event, context):
 def patch_from_guest(event, context):
     """エピソード更新、ゲストより
 
+    Raises:
+        RateLimitException: リクエスト数の上限を超えた場合
+
     Returns:
         Response: レスポンス
     """
+    # 認証なしのため送信元IPごとに制限
+    check_rate_limit(event, 'episode.patch_from_guest')
+
     adage_id = event['pathParameters']['adageId']
     receiver_user_id = event['pathParameters']['userId']
 
-    # エピソードのポイント追加
-    table_adage.update_item(
-        Key= {
-            'adageId': adage_id,
-            'key': '#'.join(['episode', receiver_user_id]),
-        },
-        UpdateExpression="ADD #likePoints :increment",
-        ExpressionAttributeNames={
-            '#likePoints':'likePoints'
-        },
-        ExpressionAttributeValues={
-            ":increment": Decimal(1)
-        }
-    )
-
-    # ユーザのポイント追加
-    table_user.update_item(
-        Key= {
-            'userId': receiver_user_id,
-            'key': 'userId',
-        },
-        UpdateExpression="ADD #likePoints :increment",
-        ExpressionAttributeNames={
-            '#likePoints':'likePoints'
-        },
-        ExpressionAttributeValues={
-            ":increment": Decimal(1)
-        }
+    write_like_events(
+        adage_id,
+        receiver_user_id,
+        likes.history_event(
+            receiver_user_id,
+            SendReason.THANK_YOU_FROM_GUEST,
+        ),
     )
 
-    # ユーザのポイント履歴追加
-    add_point_history(receiver_user_id, SendReason.THANK_YOU_FROM_GUEST)
-
     return Response(
         {'episodeId': adage_id},
     )
@@ -182,75 +128,55 @@ def patch_from_guest(event, context):
 def patch_from_user(event, context):
     """エピソード更新、ユーザより
 
+    Raises:
+        RateLimitException: リクエスト数の上限を超えた場合
+
     Returns:
         Response: レスポンス
     """
+    # 認証なしのため送信元IPごとに制限
+    check_rate_limit(event, 'episode.patch_from_user')
+
     adage_id = event['pathParameters']['adageId']
     receiver_user_id = event['pathParameters']['userId']
     sender_user_id = event['pathParameters']['senderUserId']
 
-    # 格言の存在チェック
-    adage = get_adage(adage_id, 'title')
-    if is_empty(adage):
+    # 送信者の存在チェック(履歴に送信者名を使う)
+    sender = UserRepository().get(sender_user_id, ['userId', 'userName'])
+    if is_empty(sender):
         raise ApplicationException(
             HTTPStatus.NOT_FOUND,
-            f'Adage does not exists. adageId: {adage_id}',
+            f'User does not exists. userId: {sender_user_id}',
         )
 
-    # 受信者の存在チェック
-    receiver = get_user(receiver_user_id, ['userId'])
-    if is_empty(receiver):
-        raise ApplicationException(
-            HTTPStatus.NOT_FOUND,
-            f'User does not exists. userId: {receiver_user_id}',
+    # エピソード、受信者が存在する場合のみ書き込む
+    try:
+        write_like_events(
+            adage_id,
+            receiver_user_id,
+            likes.history_event(
+                receiver_user_id,
+                SendReason.THANK_YOU,
+                sender_user_id,
+                sender['userName'],
+            ),
+            must_exist=True,
         )
 
-    # 送信者の存在チェック
-    sender = get_user(sender_user_id, ['userId', 'userName'])
-    if is_empty(sender):
+    except ConditionalCheckException as e:
+        # 格言の存在ではなく、受信者のエピソードの存在を確認している
+        if e.table == 'adage':
+            raise ApplicationException(
+                HTTPStatus.NOT_FOUND,
+                'Episode does not exists. '
+                f'adageId: {adage_id}, userId: {receiver_user_id}',
+            )
+
         raise ApplicationException(
             HTTPStatus.NOT_FOUND,
-            f'User does not exists. userId: {sender_user_id}',
+            f'User does not exists. userId: {receiver_user_id}',
         )
 
-    # エピソードのポイント追加
-    table_adage.update_item(
-        Key= {
-            'adageId': adage_id,
-            'key': '#'.join(['episode', receiver_user_id]),
-        },
-        UpdateExpression="ADD #likePoints :increment",
-        ExpressionAttributeNames={
-            '#likePoints':'likePoints'
-        },
-        ExpressionAttributeValues={
-            ":increment": Decimal(1)
-        }
-    )
-
-    # ユーザのポイント追加
-    table_user.update_item(
-        Key= {
-            'userId': receiver_user_id,
-            'key': 'userId',
-        },
-        UpdateExpression="ADD #likePoints :increment",
-        ExpressionAttributeNames={
-            '#likePoints':'likePoints'
-        },
-        ExpressionAttributeValues={
-            ":increment": Decimal(1)
-        }
-    )
-
-    # ユーザのポイント履歴追加
-    add_point_history(
-        receiver_user_id,
-        SendReason.THANK_YOU,
-        sender_user_id,
-        sender['userName'],
-    )
-
     return Response(
         {'episodeId': adage_id},
     )
@@ -282,31 +208,20 @@ def delete(event, context):
             f'userId is required',
         )
 
-    # 格言IDのエピソード削除
-    table_adage.delete_item(
-        Key={
-            'adageId': adage_id,
-            'key': '#'.join(['episode', user_id]),
-        },
-    )
-
-    # ユーザIDのエピソード削除
-    table_user.delete_item(
-        Key={
-            'userId': user_id,
-            'key': '#'.join(['episode', adage_id]),
-        },
-    )
+    # エピソード削除
+    episode_service.delete_episode(adage_id, user_id)
 
     return Response({})
 
 
-def get_adage(adage_id: str, key: str) -> dict:
+def get_adage(
+        adage_id: str, key: str, projection_list: tuple=('title',)) -> dict:
     """格言取得
 
     Args:
         adage_id (str): 格言ID
         key (str): ソートキー
+        projection_list (tuple, optional): 取得属性リスト Defaults to ('title',).
 
     Returns:
         dict: 格言情報
@@ -316,55 +231,12 @@ def get_adage(adage_id: str, key: str) -> dict:
             'adageId': adage_id,
             'key': key,
         },
-        ProjectionExpression='title',
-    )
-
-    return {} if is_empty(item.get('Item')) else item['Item']
-
-
-def get_user(user_id: str, projection_list: list) -> dict:
-    """ユーザ取得
-
-    Args:
-        user_id (str): ユーザID
-        projection_list (list): 取得属性リスト
-
-    Returns:
-        dict: ユーザ情報
-    """
-    item = table_user.get_item(
-        Key={
-            'userId': user_id,
-            'key': 'userId',
-        },
         ProjectionExpression=','.join(projection_list),
     )
 
     return {} if is_empty(item.get('Item')) else item['Item']
 
 
-def get_user_name(user_id: str) -> str:
-    """ユーザ名を取得
-
-    Args:
-        user_id (str): ユーザID
-
-    Returns:
-        str: ユーザ名
-    """
-    item = table_user.get_item(
-        Key={
-            'userId': user_id,
-            'key': 'userId',
-        },
-        ProjectionExpression='userName',
-    )
-
-    user_info = {} if is_empty(item.get('Item')) else item['Item']
-
-    return {} if is_empty(user_info.get('userName')) else user_info['userName']
-
-
 def get_episode_by_id(adage_id: str, user_id: str):
     item = table_adage.get_item(
         Key={
@@ -379,25 +251,46 @@ def get_episode_by_id(adage_id: str, user_id: str):
     return {} if is_empty(item.get('Item')) else item['Item']
 
 
-def patch_user(user_id: str, point: int):
-    """ユーザのいいねポイントを増やす
+def write_like_events(
+        adage_id: str,
+        user_id: str,
+        history: dict,
+        must_exist: bool=False):
+    """エピソードへのいいねを書き込む
 
     Args:
-        user_id (str): ユーザID
-        point (int): ポイント
+        adage_id (str): 格言ID
+        user_id (str): エピソード投稿者のユーザID
+        history (dict): ポイント履歴登録イベント
+        must_exist (bool, optional): エピソード、ユーザが存在する場合のみ
+            書き込む Defaults to False.
+
+    Raises:
+        ConditionalCheckException: エピソード、ユーザが存在しない場合
     """
-    return table_user.update_item(
-        Key= {
-            'userId': user_id,
-            'key': 'userId',
-        },
-        UpdateExpression="ADD #likePoints :increment",
-        ExpressionAttributeNames={
-            '#likePoints':'likePoints',
-        },
-        ExpressionAttributeValues={
-            ":increment": Decimal(point),
-        },
+    # 両方存在しない場合はユーザの例外を優先するため、ユーザを先にする
+    likes.write(
+        [
+            # ユーザのポイント追加
+            likes.like_event(
+                'user',
+                {'userId': user_id, 'key': 'userId'},
+                must_exist=must_exist,
+            ),
+
+            # エピソードのポイント追加
+            likes.like_event(
+                'adage',
+                {
+                    'adageId': adage_id,
+                    'key': '#'.join(['episode', user_id]),
+                },
+                must_exist=must_exist,
+            ),
+
+            # ユーザのポイント履歴追加
+            history,
+        ],
     )
 
 
@@ -1,18 +1,15 @@
-from decimal import Decimal
 import json
 from http import HTTPStatus
 
+from common import likes, point_history
 from common.decorator import handler
-from common.exception import ApplicationException
-from common.resource import Table
+from common.exception import ApplicationException, ConditionalCheckException
 from common.response import Response
-from common.util import add_point_history, is_empty
+from common.user_repository import UserRepository
+from common.util import is_empty
 from common.const import SendReason
 
 
-table_user = Table.USER
-
-
 @handler
 def post_from_admin_to_me(event, context):
     """管理人からユーザへハートを送信
@@ -25,19 +22,27 @@ def post_from_admin_to_me(event, context):
     """
     sub = event['requestContext']['authorizer']['claims']['sub']
 
-    # ユーザの存在確認
-    user = get_user(sub, ['userId'])
-    if is_empty(user):
+    # ハートを付与(ユーザが存在する場合のみ)
+    send_reason = SendReason.THANK_YOU
+    try:
+        likes.write(
+            [
+                likes.like_event(
+                    'user',
+                    {'userId': sub, 'key': 'userId'},
+                    send_reason.point,
+                    must_exist=True,
+                ),
+                likes.history_event(sub, send_reason),
+            ],
+        )
+
+    except ConditionalCheckException:
         raise ApplicationException(
             HTTPStatus.NOT_FOUND,
             f'User does not exists. userId: {sub}',
         )
 
-    # ハートを付与
-    send_reason = SendReason.THANK_YOU
-    increment_user_heart(sub, send_reason.point)
-    add_point_history(sub, send_reason)
-
     return Response({})
 
 
@@ -55,33 +60,44 @@ def post_from_me_to_user(event, context):
     sender_user_id = event['requestContext']['authorizer']['claims']['sub']
     receiver_user_id = event['pathParameters']['userId']
 
-    # 送信者取得
-    sender_user = get_user(sender_user_id, ['userId', 'userName'])
+    # 送信者取得(履歴に送信者名を使う)
+    sender_user = UserRepository().get(
+        sender_user_id,
+        ['userId', 'userName'],
+    )
     if is_empty(sender_user):
         raise ApplicationException(
             HTTPStatus.NOT_FOUND,
             f'Does not exists. sender userId: {sender_user_id}',
         )
 
-    # 受信者
-    receiver_user = get_user(receiver_user_id, ['userId'])
-    if is_empty(receiver_user):
+    # 受信者が存在する場合のみ書き込む
+    try:
+        likes.write(
+            [
+                # ハート追加
+                likes.like_event(
+                    'user',
+                    {'userId': receiver_user_id, 'key': 'userId'},
+                    must_exist=True,
+                ),
+
+                # ハート履歴追加
+                likes.history_event(
+                    receiver_user_id,
+                    SendReason.THANK_YOU,
+                    sender_user['userId'],
+                    sender_user['userName'],
+                ),
+            ],
+        )
+
+    except ConditionalCheckException:
         raise ApplicationException(
             HTTPStatus.NOT_FOUND,
             f'Does not exists. receiver userId: {receiver_user_id}',
         )
 
-    # ハート追加
-    increment_user_heart(receiver_user_id, 1)
-
-    # ハート履歴追加
-    add_point_history(
-        receiver_user['userId'],
-        SendReason.THANK_YOU,
-        sender_user['userId'],
-        sender_user['userName'],
-    )
-
     return Response({})
 
 
@@ -107,83 +123,11 @@ def delete_history(event, context):
             'key is required.',
         )
 
-    # ハート履歴取得
-    heart = get_heart(user_id, key)
-    if is_empty(heart):
+    # ハート履歴削除(集計済みの場合は集計から差し引く)
+    if not point_history.delete_point(user_id, key):
         raise ApplicationException(
             HTTPStatus.NOT_FOUND,
             f'Does not exists heartHistory. key: {key}',
         )
 
-    # ハート履歴削除
-    table_user.delete_item(
-        Key={
-            'userId': user_id,
-            'key': key,
-        },
-    )
-
     return Response({})
-
-
-def get_heart(user_id: str, key: str) -> dict:
-    """ハート履歴取得
-
-    Args:
-        user_id (str): ユーザID
-        key (str): ソートキー
-
-    Returns:
-        dict: ハート履歴
-    """
-    item = table_user.get_item(
-        Key={
-            'userId': user_id,
-            'key': key,
-        },
-    )
-
-    return {} if is_empty(item.get('Item')) else item['Item']
-
-
-def get_user(user_id: str, projection_list: list) -> dict:
-    """ユーザ取得
-
-    Args:
-        user_id (str): ユーザID
-        projection_list (list): 取得属性リスト
-
-    Returns:
-        dict: ユーザ情報
-    """
-    item = table_user.get_item(
-        Key={
-            'userId': user_id,
-            'key': 'userId',
-        },
-        ProjectionExpression=','.join(projection_list),
-    )
-
-    return {} if is_empty(item.get('Item')) else item['Item']
-
-
-def increment_user_heart(user_id: str, point: int):
-    """ユーザのハート増加
-
-    Args:
-        user_id (str): ユーザID
-        point (int): 増加分ポイント
-    """
-    table_user.update_item(
-        Key= {
-            'userId': user_id,
-            'key': 'userId',
-        },
-        UpdateExpression="ADD #likePoints :increment",
-        ExpressionAttributeNames={
-            '#likePoints':'likePoints',
-        },
-        ExpressionAttributeValues={
-            ":increment": Decimal(point),
-        }
-    )
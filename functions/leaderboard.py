@@ -0,0 +1,91 @@
+from http import HTTPStatus
+
+from common import leaderboard
+from common.const import LEADERBOARD_CACHE_TTL
+from common.counter import get_like_points, get_shard_count
+from common.decorator import handler
+from common.exception import ApplicationException
+from common.paginator import get_page_params
+from common.resource import Table
+from common.response import Response
+from common.user_repository import UserRepository
+from common.util import is_empty
+
+
+table_user = Table.USER
+
+LEADERBOARD_CACHE_CONTROL = f'public, max-age={LEADERBOARD_CACHE_TTL}'
+
+
+@handler
+def get(event, context):
+    """ユーザランキング(上位)を参照する
+
+    Returns:
+        Response: レスポンス
+    """
+    limit, _ = get_page_params(event)
+
+    return Response(
+        {
+            'users': leaderboard.get_ranking(limit),
+        },
+        cache_control=LEADERBOARD_CACHE_CONTROL,
+    )
+
+
+@handler
+def get_me(event, context):
+    """自分の順位を参照する
+
+    Raises:
+        ApplicationException: ユーザが存在しない場合
+
+    Returns:
+        Response: レスポンス
+    """
+    user_id = event['requestContext']['authorizer']['claims']['sub']
+
+    user = UserRepository().get(user_id, ['userId', 'likePoints'])
+    if is_empty(user):
+        raise ApplicationException(
+            HTTPStatus.NOT_FOUND,
+            f'User does not exists. userId: {user_id}',
+        )
+
+    # 分割されたいいねポイントを合計
+    like_points = user.get('likePoints', 0)
+    if get_shard_count(table_user) > 1:
+        like_points = get_like_points(
+            table_user,
+            {
+                'userId': user_id,
+                'key': 'userId',
+            },
+        )
+
+    return Response(
+        {
+            'userId': user_id,
+            'likePoints': like_points,
+            **leaderboard.get_rank(user_id, like_points),
+        },
+    )
+
+
+@handler
+def rebuild(event, context):
+    """ユーザテーブルを並列スキャンしてユーザランキングを再作成する
+
+    Args:
+        event (dict): イベント({'segments': 並列スキャンの分割数(省略可)})
+        context (dict): コンテキスト
+
+    Returns:
+        Response: レスポンス
+    """
+    segments = (event or {}).get('segments')
+
+    return Response(
+        leaderboard.rebuild(int(segments) if segments else None),
+    )
@@ -0,0 +1,226 @@
+from http import HTTPStatus
+import importlib
+import json
+import logging
+import re
+import time
+
+from common.exception import ApplicationException
+from common.response import ErrorResponse
+
+
+logger = logging.getLogger('share-adage-service')
+logger.setLevel('INFO')
+
+# ルート定義(メソッド, リソースパス, ハンドラ)
+ROUTES = [
+    ('GET', '/adage', 'adage.get'),
+    ('POST', '/adage', 'adage.post'),
+    ('POST', '/adage/guest', 'adage.post_by_guest'),
+    ('PATCH', '/adage/{adageId}', 'adage.patch'),
+    ('POST', '/episode', 'episode.post'),
+    ('GET', '/adage/{adageId}/episode/{userId}', 'episode.get_by_id'),
+    ('PATCH', '/adage/{adageId}/episode/{userId}', 'episode.patch_from_guest'),
+    (
+        'PATCH',
+        '/adage/{adageId}/episode/{userId}/{senderUserId}',
+        'episode.patch_from_user',
+    ),
+    ('DELETE', '/episode/{adageId}', 'episode.delete'),
+    ('POST', '/heart', 'heart.post_from_admin_to_me'),
+    ('POST', '/heart/{userId}', 'heart.post_from_me_to_user'),
+    ('DELETE', '/heart', 'heart.delete_history'),
+    ('POST', '/user', 'user.post'),
+    ('GET', '/user', 'user.get'),
+    ('PUT', '/user', 'user.put'),
+    ('POST', '/user/confirm', 'user.confirm'),
+    ('POST', '/user/resendConfirmCode', 'user.resend_confirm_code'),
+    ('POST', '/user/login', 'user.login'),
+    ('POST', '/user/sendResetPasswordCode', 'user.send_reset_password_code'),
+    ('POST', '/user/resetPassword', 'user.reset_password'),
+    ('DELETE', '/user', 'user.delete'),
+    ('GET', '/user/deletion/{jobId}', 'user.get_deletion'),
+    ('GET', '/leaderboard', 'leaderboard.get'),
+    ('GET', '/leaderboard/me', 'leaderboard.get_me'),
+    ('GET', '/search', 'search.get'),
+]
+
+
+def compile_routes(routes: list) -> tuple:
+    """ルート定義から検索用のテーブルを作成
+
+    Args:
+        routes (list): ルート定義
+
+    Returns:
+        tuple: (
+            dict: {(メソッド, リソースパス): ハンドラ},
+            list: [(メソッド, パスの正規表現, リソースパス, ハンドラ)],
+        )
+    """
+    by_resource = {}
+    patterns = []
+
+    for method, resource, target in routes:
+        by_resource[(method, resource)] = target
+
+        pattern = re.sub(
+            r'\\\{(\w+)\\\}',
+            r'(?P<\1>[^/]+)',
+            re.escape(resource),
+        )
+        patterns.append(
+            (method, re.compile(f'^{pattern}/?$'), resource, target),
+        )
+
+    return by_resource, patterns
+
+
+# コンテナ起動時に1度だけ作成
+ROUTES_BY_RESOURCE, ROUTE_PATTERNS = compile_routes(ROUTES)
+
+# 読み込み済みのハンドラ
+_handlers = {}
+
+# ルートごとの処理時間の集計(コンテナ内)
+route_stats = {}
+
+
+def handle(event, context):
+    """APIリクエストを該当するハンドラへ振り分ける
+
+    各関数を個別にデプロイした場合と同じイベント、レスポンスを扱う
+
+    Args:
+        event (dict): イベント
+        context (dict): コンテキスト
+
+    Returns:
+        dict: レスポンス
+    """
+    start = time.perf_counter()
+    method = (event.get('httpMethod') or '').upper()
+
+    route = resolve(method, event.get('resource'), event.get('path'))
+    if route is None:
+        return ErrorResponse(
+            ApplicationException(
+                HTTPStatus.NOT_FOUND,
+                f'Route does not exists. {method} {event.get("path")}',
+            ),
+        ).format()
+
+    resource, target, path_parameters = route
+    if path_parameters:
+        event = {
+            **event,
+            'pathParameters': {
+                **(event.get('pathParameters') or {}),
+                **path_parameters,
+            },
+        }
+
+    cold = target not in _handlers
+    response = get_handler(target)(event, context)
+
+    record_timing(
+        f'{method} {resource}',
+        target,
+        (time.perf_counter() - start) * 1000,
+        cold,
+        response,
+    )
+
+    return response
+
+
+def resolve(method: str, resource: str, path: str) -> tuple:
+    """メソッドとパスからルートを検索
+
+    リソースパス(/adage/{adageId})で一致しない場合は、
+    実際のパス(/adage/xxx)をパターンで照合しパスパラメータを取り出す
+
+    Args:
+        method (str): メソッド
+        resource (str): リソースパス
+        path (str): パス
+
+    Returns:
+        tuple: (
+            str: リソースパス,
+            str: ハンドラ,
+            dict: パスパラメータ,
+        )、該当しない場合None
+    """
+    target = ROUTES_BY_RESOURCE.get((method, resource))
+    if target is not None:
+        return resource, target, {}
+
+    for route_method, pattern, route_resource, target in ROUTE_PATTERNS:
+        if route_method != method:
+            continue
+
+        match = pattern.match(path or '')
+        if match:
+            return route_resource, target, match.groupdict()
+
+    return None
+
+
+def get_handler(target: str):
+    """ハンドラを取得(モジュールは初回利用時に読み込む)
+
+    Args:
+        target (str): ハンドラ(module.function)
+
+    Returns:
+        function: ハンドラ
+    """
+    function = _handlers.get(target)
+    if function is None:
+        module_name, function_name = target.rsplit('.', 1)
+        function = getattr(importlib.import_module(module_name), function_name)
+        _handlers[target] = function
+
+    return function
+
+
+def record_timing(
+        route: str,
+        target: str,
+        duration: float,
+        cold: bool,
+        response: dict):
+    """ルートの処理時間を集計、ログ出力し、レスポンスヘッダへ付与
+
+    Args:
+        route (str): ルート(GET /adage)
+        target (str): ハンドラ
+        duration (float): 処理時間(ミリ秒)
+        cold (bool): ハンドラの初回呼び出しか否か
+        response (dict): レスポンス
+    """
+    stats = route_stats.setdefault(
+        route,
+        {'count': 0, 'totalMs': 0.0, 'maxMs': 0.0},
+    )
+    stats['count'] += 1
+    stats['totalMs'] += duration
+    stats['maxMs'] = max(stats['maxMs'], duration)
+
+    logger.info(
+        json.dumps(
+            {
+                'route': route,
+                'handler': target,
+                'statusCode': response.get('statusCode'),
+                'durationMs': round(duration, 1),
+                'cold': cold,
+                'count': stats['count'],
+                'avgMs': round(stats['totalMs'] / stats['count'], 1),
+            },
+        ),
+    )
+
+    headers = response.setdefault('headers', {})
+    headers['Server-Timing'] = f'route;desc="{target}";dur={duration:.1f}'
@@ -0,0 +1,58 @@
+from http import HTTPStatus
+
+from common import search
+from common.decorator import handler
+from common.exception import ApplicationException
+from common.paginator import get_page_params
+from common.response import Response
+
+
+@handler
+def get(event, context):
+    """格言タイトル、エピソードを全文検索する
+
+    Raises:
+        ApplicationException: 検索文字列が空の場合
+
+    Returns:
+        Response: レスポンス
+    """
+    query = (event.get('queryStringParameters') or {}).get('q')
+    if not search.get_terms(query):
+        raise ApplicationException(
+            HTTPStatus.BAD_REQUEST,
+            'q is required.',
+        )
+
+    limit, cursor = get_page_params(event)
+    results, next_cursor = search.search(query, limit, cursor)
+
+    return Response(results, next_cursor=next_cursor)
+
+
+@handler
+def merge(event, context):
+    """マージ前の登録、削除を検索インデックスへ反映する
+
+    Returns:
+        Response: レスポンス
+    """
+    return Response(search.merge_pending())
+
+
+@handler
+def build(event, context):
+    """格言テーブルを並列スキャンして検索インデックスを一括作成する
+
+    Args:
+        event (dict): イベント({'segments': 並列スキャンの分割数(省略可)})
+        context (dict): コンテキスト
+
+    Returns:
+        Response: レスポンス
+    """
+    segments = (event or {}).get('segments')
+
+    return Response(
+        search.build_index(int(segments) if segments else None),
+    )
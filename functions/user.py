@@ -1,16 +1,33 @@
-import boto3
-from boto3.dynamodb.conditions import Key
-from botocore.exceptions import ClientError
+from collections import defaultdict
 from datetime import datetime
 from http import HTTPStatus
 import json
 
-from common.const import JST, LAMBDA_STAGE
-from common.decorator import handler
+from common import (
+    account_deletion,
+    feed,
+    leaderboard,
+    point_history,
+    user_repository,
+    user_version,
+)
+from common.concurrency import call_with_retry, run_parallel
+from common.const import EPISODE_FANOUT_MODE, JST, LAMBDA_STAGE
+from common.counter import get_like_points, get_shard_count
+from common.decorator import handler, save_exception_log
 from common.const import SendReason
 from common.exception import ApplicationException
-from common.resource import Cognito
-from common.response import PostResponse, Response
+from common.paginator import get_page_params, query_all
+from common.profile import load_profile
+from common.resource import Cognito, get_client
+from common.response import (
+    is_not_modified,
+    make_etag,
+    NotModifiedResponse,
+    PostResponse,
+    Response,
+)
+from common.user_repository import UserRepository
 from common.resource import Table
 from common.util import is_empty, add_point_history
 
@@ -18,6 +35,14 @@ from common.util import is_empty, add_point_history
 table_user = Table.USER
 table_adage = Table.ADAGE
 
+# ユーザ名の投稿エピソードへの反映状態
+SYNC_PENDING = 'pending'
+SYNC_COMPLETED = 'completed'
+SYNC_FAILED = 'failed'
+
+# ユーザ参照は本人のみのため、共有キャッシュに保存させず毎回検証させる
+USER_CACHE_CONTROL = 'private, no-cache'
+
 
 @handler
 def post(event, context):
@@ -33,6 +58,8 @@ def post(event, context):
     Returns:
         PostResponse: レスポンス
     """
+    from boto3.dynamodb.conditions import Key
+
     body = json.loads(event['body'])
     login_id = body['loginId']
     password = body['password']
@@ -66,8 +93,19 @@ def post(event, context):
         'loginId': login_id,
         'userName': 'No name',
         'likePoints': send_reason.point,
+        'pointKeyVersion': point_history.POINT_KEY_VERSION,
     }
-    table_user.put_item(Item=item)
+    # 送信理由ごとの合計は登録時のポイント履歴を含めて作成する
+    table_user.put_item(
+        Item={
+            **item,
+            **point_history.make_summary(
+                [{'reason': send_reason.value, 'point': send_reason.point}],
+            ),
+        },
+    )
+    user_repository.invalidate(user_id)
+    leaderboard.add_user(item)
 
     # ポイント履歴追加
     add_point_history(user_id, send_reason)
@@ -79,42 +117,99 @@ def post(event, context):
 def get(event, context):
     """ユーザ参照
 
+    ユーザのパーティションの更新バージョンからETagを作成し、
+    If-None-Matchが一致する場合は更新バージョンの読み込みのみで304を返す
+
     Returns:
         Response: レスポンス
     """
     user_id = event['requestContext']['authorizer']['claims']['sub']
+    limit, cursor = get_page_params(event)
 
-    # ユーザID情報取得
-    user = get_user(
-        user_id,
-        ['userId', 'userName', 'loginId', 'likePoints'],
-    )
+    since, until = get_time_range(event)
 
-    # 投稿エピソード取得
-    episode_list = get_user_episode_list(
-        user_id,
-        ['adageId', 'title', 'episode'],
-    )
+    # 変更がない場合
+    version = user_version.get_version(user_id)
+    etag = make_etag([user_id, version, limit, cursor, since, until])
+    if is_not_modified(event, etag):
+        return NotModifiedResponse(etag, USER_CACHE_CONTROL)
 
-    # likePoints履歴取得
-    point_list = get_user_point_list(
+    # ユーザ、投稿エピソード、likePoints履歴1ページ、合計を並列に取得
+    # (更新バージョンより古い内容を返さないよう強い整合性で読み込む)
+    profile = load_profile(
         user_id,
-        ['key', 'senderId', 'senderName', 'reason', 'point', 'dateTime'],
+        {
+            'user': [
+                'userId',
+                'userName',
+                'loginId',
+                'likePoints',
+                'userNameSync',
+            ],
+            'episodes': ['adageId', 'title', 'episode'],
+            'points': [
+                'key',
+                'senderId',
+                'senderName',
+                'reason',
+                'point',
+                'dateTime',
+            ],
+        },
+        limit,
+        cursor,
+        since,
+        until,
+        consistent_read=True,
     )
-    for point in point_list:
-        point['reason'] = SendReason(point['reason']).message
-        point['point'] = int(point['point'])
-        point['dateTime'] = to_dt_str(float(point['dateTime']))
+    user = profile['user']
+
+    # 分割されたいいねポイントを合計
+    if get_shard_count(table_user) > 1:
+        user['likePoints'] = get_like_points(
+            table_user,
+            {
+                'userId': user_id,
+                'key': 'userId',
+            },
+        )
+
+    # likePoints履歴(新しい順)
+    point_list = [
+        {
+            **point,
+            'reason': SendReason(point['reason']).message,
+            'dateTime': to_dt_str(float(point['dateTime'])),
+        }
+        for point in profile['points']
+    ]
+
+    # 送信理由ごとのポイント合計(集計済みの履歴を含む)
+    point_summary = [
+        {
+            **summary,
+            'reason': SendReason(summary['reason']).message,
+        }
+        for summary in profile['summary']
+    ]
 
     return Response(
         {
             'userId': user['userId'],
             'userName': user['userName'],
             'loginId': user['loginId'],
-            'likePoints': int(user['likePoints']),
-            'episodeList': episode_list,
+            'likePoints': user['likePoints'],
+            # 投稿エピソードへのユーザ名の反映状態(変更していない場合は完了)
+            'userNameSync': to_sync_status(
+                user.get('userNameSync', {'status': SYNC_COMPLETED}),
+            ),
+            'episodeList': profile['episodes'],
             'pointList': point_list,
+            'pointSummary': point_summary,
         },
+        etag=etag,
+        cache_control=USER_CACHE_CONTROL,
+        next_cursor=profile['nextCursor'],
     )
 
 
@@ -161,34 +256,50 @@ def put(event, context):
                 'userId': user_id,
                 'key': 'userId',
             },
-            UpdateExpression='set userName=:userName',
+            UpdateExpression='set userName=:userName, userNameSync=:sync',
             ExpressionAttributeValues={
                 ':userName': new_user_name,
+                ':sync': {'status': SYNC_PENDING},
             },
         )
-
-        adages = get_adages_by_user_id(user_id)
-        print(adages)
-        for adage in adages:
-            table_adage.update_item(
-                Key={
-                    'adageId': adage['adageId'],
-                    'key': f'episode#{user_id}',
-                },
-                UpdateExpression='set userName=:userName',
-                ExpressionAttributeValues={
-                    ':userName': new_user_name,
-                },
-            )
+        user_repository.invalidate(user_id)
+        user_version.bump(user_id)
+        leaderboard.rename_user(user_id, new_user_name)
+
+    # 投稿エピソードのユーザ名更新
+    if EPISODE_FANOUT_MODE == 'event':
+        invoke_lambda_propagate_user_name(user_id)
+        sync = {'status': SYNC_PENDING}
+    else:
+        sync = propagate_user_name(user_id)
 
     return Response(
-        {'userName': new_user_name},
+        {
+            'userName': new_user_name,
+            'propagation': to_sync_status(sync),
+        },
     )
 
 
+def propagate_name(event, context):
+    """ユーザ名を投稿エピソードへ反映
+
+    失敗時は非同期呼び出しの再試行に任せるため、例外をそのまま送出する
+
+    Args:
+        event (dict): イベント({'userId': ユーザID})
+        context (dict): コンテキスト
+
+    Returns:
+        dict: 反映状態
+    """
+    return to_sync_status(propagate_user_name(event['userId']))
+
 
 @handler
 def confirm(event, context):
+    from botocore.exceptions import ClientError
+
     body = json.loads(event['body'])
     cognito = Cognito()
 
@@ -238,7 +349,7 @@ def resend_confirm_code(event, context):
         )
 
     # ユーザID取得
-    user_id = get_user_by_login_id(login_id, ['userId'])
+    user_id = UserRepository().get_by_login_id(login_id, ['userId'])
 
     # ユーザIDが存在しない場合
     if is_empty(user_id):
@@ -264,6 +375,8 @@ def login(event, context):
     Returns:
         PostResponse: IDトークン, アクセストークン
     """
+    from botocore.exceptions import ClientError
+
     body = json.loads(event['body'])
     login_id = body.get('loginId')
     password = body.get('password')
@@ -291,7 +404,7 @@ def login(event, context):
             e.response['Error']['Message'],
         )
 
-    user = get_user_by_login_id(
+    user = UserRepository().get_by_login_id(
         login_id,
         ['userId', 'userName'],
     )
@@ -309,6 +422,8 @@ def login(event, context):
 
 @handler
 def send_reset_password_code(event, context):
+    from boto3.dynamodb.conditions import Key
+
     body = json.loads(event['body'])
     login_id = body.get('loginId')
 
@@ -368,7 +483,8 @@ def delete(event, context):
     login_id = body.get('loginId')
 
     # ユーザID情報取得
-    user = get_user(
+    users = UserRepository()
+    user = users.get(
         user_id,
         ['userId', 'loginId'],
     )
@@ -387,180 +503,391 @@ def delete(event, context):
             f'Mail address is different. address: {login_id}'
         )
 
-    # 投稿エピソード取得
-    episode_list = get_user_episode_list(
-        user_id,
-        ['adageId'],
+    # Cognitoユーザ削除
+    cognito = Cognito()
+    cognito.delete_user(
+        AccessToken=body.get('accessToken'),
     )
 
-    # エピソード削除
-    for episode in episode_list:
-        invoke_lambda_episode_delete(episode['adageId'], user_id)
+    # ユーザデータ削除(時間内に終わらない場合は非同期で続きを実行)
+    users.invalidate(user_id)
+    job = account_deletion.start_job(user_id)
+    job = account_deletion.run_job(account_deletion.get_job_id(job), context)
+    if job['status'] != account_deletion.STATUS_COMPLETED:
+        account_deletion.continue_job(account_deletion.get_job_id(job))
 
-    # likePoints履歴取得
-    point_list = get_user_point_list(
-        user_id,
-        ['key'],
-    )
+    return Response(account_deletion.to_status(job))
 
-    # likePoints履歴削除
-    for point in point_list:
-        table_user.delete_item(
-            Key={
-                'userId': user['userId'],
-                'key': point['key'],
-            },
+
+def delete_worker(event, context):
+    """ユーザ削除ジョブの続きを実行
+
+    失敗時は非同期呼び出しの再試行に任せるため、例外をそのまま送出する
+
+    Args:
+        event (dict): イベント({'jobId': ジョブID})
+        context (dict): コンテキスト
+
+    Returns:
+        dict: 削除ジョブの状態
+    """
+    job = account_deletion.run_job(event['jobId'], context)
+    if is_empty(job):
+        return {}
+
+    if job['status'] != account_deletion.STATUS_COMPLETED:
+        account_deletion.continue_job(event['jobId'])
+
+    return account_deletion.to_status(job)
+
+
+@handler
+def get_deletion(event, context):
+    """ユーザ削除ジョブの状態参照
+
+    他のユーザのジョブは存在しないものとして扱う
+
+    Raises:
+        ApplicationException: ジョブが存在しない、他のユーザのジョブの場合
+
+    Returns:
+        Response: レスポンス
+    """
+    user_id = event['requestContext']['authorizer']['claims']['sub']
+    job_id = event['pathParameters']['jobId']
+    job = account_deletion.get_job(job_id)
+
+    # ジョブが存在しない、他のユーザのジョブの場合
+    if is_empty(job) or job['targetUserId'] != user_id:
+        raise ApplicationException(
+            HTTPStatus.NOT_FOUND,
+            f'Deletion job does not exists. jobId: {job_id}',
         )
 
-    # ユーザテーブル: ユーザ削除
-    table_user.delete_item(
-        Key={
-            'userId': user['userId'],
-            'key': 'userId',
-        },
-    )
+    return Response(account_deletion.to_status(job))
 
-    # Cognitoユーザ削除
-    cognito = Cognito()
-    cognito.delete_user(
-        AccessToken=body.get('accessToken'),
+
+def migrate_point_keys(event, context):
+    """ポイント履歴のソートキーを日時順の形式へ移行
+
+    時間内に終わらない場合は、続きのキーを渡して自身を非同期で呼び出す。
+    失敗時は非同期呼び出しの再試行に任せるため、例外をそのまま送出する
+
+    Args:
+        event (dict): イベント({
+            'lastEvaluatedKey': 続きのキー(省略可),
+            'writesPerSecond': 1秒あたりの最大書き込み件数(省略可),
+        })
+        context (dict): コンテキスト
+
+    Returns:
+        dict: 移行結果
+    """
+    event = event or {}
+    result = point_history.migrate_users(
+        event.get('lastEvaluatedKey'),
+        context,
+        event.get('writesPerSecond'),
     )
 
-    return Response({})
+    if result['lastEvaluatedKey'] is not None:
+        get_client('lambda').invoke(
+            FunctionName='share-adage-service-'
+                f'{LAMBDA_STAGE}-userMigratePointKeys',
+            InvocationType='Event',
+            Payload=json.dumps(
+                {
+                    **event,
+                    'lastEvaluatedKey': result['lastEvaluatedKey'],
+                },
+            ),
+        )
+
+    return result
 
 
-def get_user_by_login_id(login_id: str, projection_list: list) -> dict:
-    """ログインIDからユーザ取得
+def summarize_points(event, context):
+    """未集計ユーザの送信理由ごとのポイント合計をユーザ本体へ作成
+
+    時間内に終わらない場合は、続きのキーを渡して自身を非同期で呼び出す。
+    失敗時は非同期呼び出しの再試行に任せるため、例外をそのまま送出する
 
     Args:
-        login_id (str): ログインID
-        projection_list (list): 取得属性リスト
+        event (dict): イベント({
+            'lastEvaluatedKey': 続きのキー(省略可),
+        })
+        context (dict): コンテキスト
 
     Returns:
-        dict: ユーザ
+        dict: 作成結果
     """
-    item = table_user.query(
-        IndexName='loginId-Index',
-        KeyConditionExpression=Key('loginId').eq(login_id),
-        ProjectionExpression=','.join(projection_list),
+    event = event or {}
+    result = point_history.summarize_users(
+        event.get('lastEvaluatedKey'),
+        context,
     )
 
-    return {} if is_empty(item.get('Items')) else item['Items'][0]
+    if result['lastEvaluatedKey'] is not None:
+        get_client('lambda').invoke(
+            FunctionName='share-adage-service-'
+                f'{LAMBDA_STAGE}-userSummarizePoints',
+            InvocationType='Event',
+            Payload=json.dumps(
+                {
+                    **event,
+                    'lastEvaluatedKey': result['lastEvaluatedKey'],
+                },
+            ),
+        )
 
+    return result
 
-def get_user(user_id: str, projection_list: list) -> dict:
-    """ユーザ取得
+
+def compact_points(event, context):
+    """古いポイント履歴を月ごと、送信理由ごとの集計へまとめる
+
+    時間内に終わらない場合は、続きのキーを渡して自身を非同期で呼び出す。
+    失敗時は非同期呼び出しの再試行に任せるため、例外をそのまま送出する
 
     Args:
-        user_id (str): ユーザID
-        projection_list (list): 取得属性リスト
+        event (dict): イベント({
+            'lastEvaluatedKey': 続きのキー(省略可),
+            'ageDays': 集計対象にする履歴の経過日数(省略可),
+        })
+        context (dict): コンテキスト
 
     Returns:
-        dict: ユーザ
+        dict: 集計結果
     """
-    item = table_user.get_item(
-        Key={
-            'userId': user_id,
-            'key': 'userId',
-        },
-        ProjectionExpression=','.join(projection_list),
+    event = event or {}
+    result = point_history.compact_users(
+        event.get('lastEvaluatedKey'),
+        context,
+        event.get('ageDays'),
     )
 
-    return {} if is_empty(item.get('Item')) else item['Item']
+    if result['lastEvaluatedKey'] is not None:
+        get_client('lambda').invoke(
+            FunctionName='share-adage-service-'
+                f'{LAMBDA_STAGE}-userCompactPoints',
+            InvocationType='Event',
+            Payload=json.dumps(
+                {
+                    **event,
+                    'lastEvaluatedKey': result['lastEvaluatedKey'],
+                },
+            ),
+        )
+
+    return result
 
 
-def get_user_episode_list(user_id: str, projection_list: list) -> list:
-    """投稿エピソード取得
+def get_time_range(event: dict) -> tuple:
+    """イベントのクエリ文字列から日時の範囲を取得
 
     Args:
-        user_id (str): ユーザ情報
-        projection_list (list): 取得属性リスト
+        event (dict): イベント
+
+    Raises:
+        ApplicationException: 日時が不正な場合
 
     Returns:
-        dict: エピソード
+        tuple: (
+            float: 開始日時(since)、指定なしの場合None,
+            float: 終了日時(until)、指定なしの場合None,
+        )
     """
-    item = table_user.query(
-        KeyConditionExpression=Key('userId').eq(user_id) &
-            Key('key').begins_with('episode'),
-        ProjectionExpression=','.join(projection_list),
-    )
+    params = (event or {}).get('queryStringParameters') or {}
+    time_range = []
+
+    for name in ['since', 'until']:
+        value = params.get(name)
+        if is_empty(value):
+            time_range.append(None)
+            continue
+
+        try:
+            time_range.append(float(value))
+        except ValueError:
+            raise ApplicationException(
+                HTTPStatus.BAD_REQUEST,
+                f'{name} must be a unix timestamp.',
+            )
 
-    return [] if is_empty(item.get('Items')) else item['Items']
+    return tuple(time_range)
 
 
-def get_user_point_list(user_id: str, projection_list: list) -> list:
-    """likePoints履歴取得
+def get_adages_by_user_id(user_id: str) -> list:
+    """ユーザIDから格言・エピソードのキーリスト取得
 
     Args:
         user_id (str): ユーザID
-        projection_list (list): 取得属性リスト
 
     Returns:
-        list: likePoints履歴
+        list: 格言・エピソードのキーリスト
     """
-    projection = ','.join(
-        [
-            '#{0}'.format(item)
-            for item in projection_list
-        ]
-    )
-    expression = {
-        f'#{item}': item
-        for item in projection_list
-    }
+    from boto3.dynamodb.conditions import Key
 
-    item = table_user.query(
-        KeyConditionExpression=Key('userId').eq(user_id) &
-            Key('key').begins_with('point'),
-        ProjectionExpression=projection,
-        ExpressionAttributeNames=expression,
+    return query_all(
+        table_adage.query,
+        IndexName="userId-Index",
+        KeyConditionExpression=Key('userId').eq(user_id),
+        ProjectionExpression='adageId,#key',
+        ExpressionAttributeNames={
+            '#key': 'key',
+        },
     )
 
-    return [] if is_empty(item.get('Items')) else item['Items']
 
+def propagate_user_name(user_id: str) -> dict:
+    """ユーザ名を投稿エピソード、月間ランキングへ反映し、反映状態を保存
 
-def get_adages_by_user_id(user_id: str) -> list:
-    """ユーザIDから格言リスト取得
+    投稿エピソードはスレッドプールで並列に更新し、
+    スロットリングされた場合は再試行する
 
     Args:
         user_id (str): ユーザID
 
     Returns:
-        list: 格言リスト
+        dict: 反映状態
     """
-    items = table_adage.query(
-        IndexName="userId-Index",
-        KeyConditionExpression=Key('userId').eq(user_id),
-        ProjectionExpression='adageId',
+    from botocore.exceptions import ClientError
+
+    user = table_user.get_item(
+        Key={
+            'userId': user_id,
+            'key': 'userId',
+        },
+        ProjectionExpression='userName',
+        ConsistentRead=True,
+    ).get('Item', {})
+    user_name = user.get('userName')
+
+    episodes = [
+        item for item in get_adages_by_user_id(user_id)
+        if item['key'].startswith('episode')
+    ]
+    results = run_parallel(
+        lambda episode: update_episode_user_name(
+            episode['adageId'],
+            user_id,
+            user_name,
+        ),
+        episodes,
     )
 
-    return [] if is_empty(items.get('Items')) else items['Items']
+    # 月間ランキングは月ごとにまとめて更新
+    months = defaultdict(list)
+    failed = 0
+    for result in results:
+        if isinstance(result, Exception):
+            save_exception_log(result)
+            failed += 1
+
+        elif not result.get('byGuest') and 'registrationMonth' in result:
+            months[result['registrationMonth']].append(result['adageId'])
+
+    for month, adage_ids in months.items():
+        feed.update_user_episodes(
+            month,
+            adage_ids,
+            f'episode#{user_id}',
+            {'userName': user_name},
+        )
+
+    sync = {
+        'status': SYNC_FAILED if failed else SYNC_COMPLETED,
+        'total': len(episodes),
+        'updated': len(episodes) - failed,
+        'failed': failed,
+    }
+    # 反映中にユーザ名が再変更された場合は、後の反映で状態を保存する
+    if user_name is not None:
+        try:
+            table_user.update_item(
+                Key={
+                    'userId': user_id,
+                    'key': 'userId',
+                },
+                UpdateExpression='set userNameSync=:sync',
+                ConditionExpression='userName=:userName',
+                ExpressionAttributeValues={
+                    ':sync': sync,
+                    ':userName': user_name,
+                },
+            )
+            user_repository.invalidate(user_id)
+            user_version.bump(user_id)
+
+        except ClientError as e:
+            if e.response['Error']['Code'] \
+                    != 'ConditionalCheckFailedException':
+                raise e
+
+    return sync
 
 
-def invoke_lambda_episode_delete(adage_id: str, user_id: str):
-    """エピソード削除関数呼び出し
+def update_episode_user_name(
+        adage_id: str, user_id: str, user_name: str) -> dict:
+    """エピソードのユーザ名更新
 
     Args:
         adage_id (str): 格言ID
         user_id (str): ユーザID
+        user_name (str): ユーザ名
+
+    Returns:
+        dict: 更新後のエピソード、削除済みの場合は空のdict
     """
-    client = boto3.client('lambda')
+    from botocore.exceptions import ClientError
 
-    client.invoke(
-        FunctionName=f'share-adage-service-{LAMBDA_STAGE}-episodeDelete',
-        Payload=json.dumps(
-            {
-                'body': json.dumps(
-                    {
-                        'adageId': adage_id,
-                        'userId': user_id,
-                    },
-                ),
+    try:
+        return call_with_retry(
+            table_adage.update_item,
+            Key={
+                'adageId': adage_id,
+                'key': f'episode#{user_id}',
             },
-        ),
+            UpdateExpression='set userName=:userName',
+            ConditionExpression='attribute_exists(adageId)',
+            ExpressionAttributeValues={
+                ':userName': user_name,
+            },
+            ReturnValues='ALL_NEW',
+        )['Attributes']
+
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise e
+
+        return {}
+
+
+def invoke_lambda_propagate_user_name(user_id: str):
+    """ユーザ名反映関数を非同期で呼び出し
+
+    Args:
+        user_id (str): ユーザID
+    """
+    get_client('lambda').invoke(
+        FunctionName=f'share-adage-service-{LAMBDA_STAGE}-userPropagateName',
+        InvocationType='Event',
+        Payload=json.dumps({'userId': user_id}),
     )
 
 
+def to_sync_status(sync: dict) -> dict:
+    """反映状態をレスポンス用へ変換
+
+    Args:
+        sync (dict): 反映状態
+
+    Returns:
+        dict: 反映状態
+    """
+    return {k: v if k == 'status' else int(v) for k, v in sync.items()}
+
+
 def to_dt_str(time_stamp: float) -> str:
     """タイムスタンプを日時文字列へ
 
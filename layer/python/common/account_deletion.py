@@ -0,0 +1,298 @@
+from decimal import Decimal
+import json
+from uuid import uuid4
+
+from common import episode_service, leaderboard
+from common.concurrency import batch_write
+from common.const import LAMBDA_STAGE
+from common.counter import (
+    get_shard_count,
+    get_shard_key,
+    read_with_like_points,
+)
+from common.resource import Table, get_client
+from common.util import get_jst_timestamp, has_time, is_empty
+
+
+table_user = Table.USER
+
+# 削除ジョブのソートキー
+JOB_KEY = 'deletion'
+
+# 削除の処理順(エピソード -> ユーザのパーティション -> ユーザ本体)
+PHASE_EPISODE = 'episode'
+PHASE_PARTITION = 'partition'
+PHASE_USER = 'user'
+
+STATUS_RUNNING = 'running'
+STATUS_COMPLETED = 'completed'
+
+# 1回のクエリで読むアイテム数
+DELETION_PAGE_SIZE = 100
+
+# 残り時間がこれを下回ったら中断し、続きを非同期で実行する(ミリ秒)
+TIME_MARGIN_MS = 10000
+
+
+def start_job(user_id: str) -> dict:
+    """ユーザ削除ジョブを登録
+
+    Args:
+        user_id (str): 削除するユーザID
+
+    Returns:
+        dict: 削除ジョブ
+    """
+    jst_timestamp = Decimal(str(get_jst_timestamp()))
+    job = {
+        'userId': get_job_id_key(uuid4().hex),
+        'key': JOB_KEY,
+        'targetUserId': user_id,
+        'status': STATUS_RUNNING,
+        'phase': PHASE_EPISODE,
+        'deleted': 0,
+        'createdAt': jst_timestamp,
+        'updatedAt': jst_timestamp,
+    }
+    table_user.put_item(Item=job)
+
+    return job
+
+
+def get_job(job_id: str) -> dict:
+    """ユーザ削除ジョブを取得
+
+    Args:
+        job_id (str): ジョブID
+
+    Returns:
+        dict: 削除ジョブ、存在しない場合は空のdict
+    """
+    item = table_user.get_item(
+        Key={
+            'userId': get_job_id_key(job_id),
+            'key': JOB_KEY,
+        },
+        ConsistentRead=True,
+    )
+
+    return item.get('Item', {})
+
+
+def run_job(job_id: str, context=None) -> dict:
+    """ユーザ削除ジョブを実行
+
+    ユーザのパーティションをページ単位で読みながら削除し、
+    ページごとにチェックポイントを保存する。
+    Lambdaの残り時間が少なくなった場合は中断し、再実行時は
+    チェックポイントから再開する
+
+    Args:
+        job_id (str): ジョブID
+        context (dict, optional): コンテキスト Defaults to None.
+
+    Returns:
+        dict: 実行後の削除ジョブ
+    """
+    job = get_job(job_id)
+    if is_empty(job) or job['status'] == STATUS_COMPLETED:
+        return job
+
+    while job['status'] != STATUS_COMPLETED \
+            and has_time(context, TIME_MARGIN_MS):
+        if job['phase'] == PHASE_EPISODE:
+            delete_episode_page(job)
+
+        elif job['phase'] == PHASE_PARTITION:
+            delete_partition_page(job)
+
+        else:
+            delete_user(job)
+
+        save_checkpoint(job)
+
+    return job
+
+
+def delete_episode_page(job: dict):
+    """投稿エピソード1ページ分を格言テーブルと月間ランキングから削除
+
+    ユーザIDのエピソードは後続のパーティション削除でまとめて削除する
+
+    Args:
+        job (dict): 削除ジョブ
+    """
+    from boto3.dynamodb.conditions import Key
+
+    user_id = job['targetUserId']
+    kwargs = {
+        'KeyConditionExpression': Key('userId').eq(user_id) &
+            Key('key').begins_with('episode#'),
+        'ProjectionExpression': 'adageId',
+        'Limit': DELETION_PAGE_SIZE,
+    }
+    if not is_empty(job.get('checkpoint')):
+        kwargs['ExclusiveStartKey'] = job['checkpoint']
+
+    response = table_user.query(**kwargs)
+
+    for episode in response.get('Items', []):
+        episode_service.delete_adage_episode(episode['adageId'], user_id)
+        job['deleted'] += 1
+
+    move_checkpoint(job, response.get('LastEvaluatedKey'), PHASE_PARTITION)
+
+
+def delete_partition_page(job: dict):
+    """ユーザのパーティション1ページ分(ユーザ本体以外)を一括削除
+
+    Args:
+        job (dict): 削除ジョブ
+    """
+    from boto3.dynamodb.conditions import Key
+
+    user_id = job['targetUserId']
+    kwargs = {
+        'KeyConditionExpression': Key('userId').eq(user_id),
+        'ProjectionExpression': 'userId,#key',
+        'ExpressionAttributeNames': {
+            '#key': 'key',
+        },
+        'Limit': DELETION_PAGE_SIZE,
+    }
+    if not is_empty(job.get('checkpoint')):
+        kwargs['ExclusiveStartKey'] = job['checkpoint']
+
+    response = table_user.query(**kwargs)
+
+    job['deleted'] += batch_delete(
+        table_user,
+        [
+            item for item in response.get('Items', [])
+            if item['key'] != 'userId'
+        ],
+    )
+
+    move_checkpoint(job, response.get('LastEvaluatedKey'), PHASE_USER)
+
+
+def delete_user(job: dict):
+    """ユーザ本体と分割されたいいねポイントのアイテムを削除し、
+    ユーザランキングから取り除く
+
+    Args:
+        job (dict): 削除ジョブ
+    """
+    key = {
+        'userId': job['targetUserId'],
+        'key': 'userId',
+    }
+
+    # 再実行時(削除済み)は取り除かない
+    user = read_with_like_points(table_user, [key], ['likePoints'])[0]
+    if not is_empty(user):
+        leaderboard.remove_user(job['targetUserId'], user['likePoints'])
+    keys = [key]
+    if get_shard_count(table_user) > 1:
+        keys += [
+            get_shard_key(key, shard)
+            for shard in range(get_shard_count(table_user))
+        ]
+
+    job['deleted'] += batch_delete(table_user, keys)
+    job['status'] = STATUS_COMPLETED
+
+
+def move_checkpoint(job: dict, last_key: dict, next_phase: str):
+    """チェックポイントを次のページ、または次の処理へ進める
+
+    Args:
+        job (dict): 削除ジョブ
+        last_key (dict): LastEvaluatedKey
+        next_phase (str): 最後のページの場合の次の処理
+    """
+    if last_key is None:
+        job['phase'] = next_phase
+        job.pop('checkpoint', None)
+    else:
+        job['checkpoint'] = last_key
+
+
+def save_checkpoint(job: dict):
+    """削除ジョブの進捗を保存
+
+    Args:
+        job (dict): 削除ジョブ
+    """
+    job['updatedAt'] = Decimal(str(get_jst_timestamp()))
+    table_user.put_item(Item=job)
+
+
+def batch_delete(table, keys: list) -> int:
+    """BatchWriteItemでアイテムを一括削除
+
+    Args:
+        table (Table): テーブル
+        keys (list): 削除するアイテムのキーリスト
+
+    Returns:
+        int: 削除件数
+    """
+    return batch_write(
+        table,
+        [{'DeleteRequest': {'Key': key}} for key in keys],
+    )
+
+
+def continue_job(job_id: str):
+    """ユーザ削除ジョブの続きを非同期で実行
+
+    Args:
+        job_id (str): ジョブID
+    """
+    get_client('lambda').invoke(
+        FunctionName=f'share-adage-service-{LAMBDA_STAGE}-userDeleteWorker',
+        InvocationType='Event',
+        Payload=json.dumps({'jobId': job_id}),
+    )
+
+
+def get_job_id(job: dict) -> str:
+    """削除ジョブからジョブIDを取得
+
+    Args:
+        job (dict): 削除ジョブ
+
+    Returns:
+        str: ジョブID
+    """
+    return job['userId'].split('#', 1)[1]
+
+
+def get_job_id_key(job_id: str) -> str:
+    """削除ジョブのパーティションキーを取得
+
+    Args:
+        job_id (str): ジョブID
+
+    Returns:
+        str: パーティションキー
+    """
+    return '#'.join(['job', job_id])
+
+
+def to_status(job: dict) -> dict:
+    """削除ジョブをレスポンス用の状態へ変換
+
+    Args:
+        job (dict): 削除ジョブ
+
+    Returns:
+        dict: 削除ジョブの状態
+    """
+    return {
+        'jobId': get_job_id(job),
+        'status': job['status'],
+        'phase': job['phase'],
+        'deleted': int(job['deleted']),
+    }
@@ -0,0 +1,76 @@
+from collections import OrderedDict
+import time
+
+
+class TTLCache:
+    """有効期限と最大件数を持つキャッシュ
+
+    モジュールレベルで保持し、ウォームスタートしたLambdaコンテナ間で再利用する
+    """
+
+    def __init__(self, ttl: float, max_size: int):
+        """キャッシュ作成
+
+        Args:
+            ttl (float): 有効期限(秒)、0以下の場合はキャッシュしない
+            max_size (int): 最大件数、超えた場合は最も古く参照されたものを破棄
+        """
+        self._ttl = ttl
+        self._max_size = max_size
+        self._items = OrderedDict()
+
+    def get(self, key, default=None):
+        """キャッシュ取得
+
+        Args:
+            key (any): キー
+            default (any, optional): 存在しない場合の値 Defaults to None.
+
+        Returns:
+            any: 値
+        """
+        item = self._items.get(key)
+        if item is None:
+            return default
+
+        expires_at, value = item
+
+        # 有効期限切れの場合
+        if expires_at <= time.monotonic():
+            del self._items[key]
+            return default
+
+        self._items.move_to_end(key)
+        return value
+
+    def set(self, key, value):
+        """キャッシュ登録
+
+        Args:
+            key (any): キー
+            value (any): 値
+        """
+        if self._ttl <= 0 or self._max_size <= 0:
+            return
+
+        self._items[key] = (time.monotonic() + self._ttl, value)
+        self._items.move_to_end(key)
+
+        while len(self._items) > self._max_size:
+            self._items.popitem(last=False)
+
+    def delete(self, key):
+        """キャッシュ削除
+
+        Args:
+            key (any): キー
+        """
+        self._items.pop(key, None)
+
+    def clear(self):
+        """キャッシュ全削除
+        """
+        self._items.clear()
+
+    def __len__(self) -> int:
+        return len(self._items)
@@ -0,0 +1,291 @@
+import os
+import random
+import threading
+import time
+
+
+# 並列実行の最大スレッド数
+PARALLEL_MAX_WORKERS = int(os.environ.get('PARALLEL_MAX_WORKERS', 8))
+
+# 並列実行せず順番に実行する(デバッグ用)
+PARALLEL_SEQUENTIAL = \
+    os.environ.get('PARALLEL_SEQUENTIAL', 'false').lower() == 'true'
+
+# 並列実行のスレッドプール(スレッドごとのboto3リソースを再利用するため共有)
+_executor = None
+_executor_lock = threading.Lock()
+# 並列実行のスレッド内か否か
+_worker = threading.local()
+
+# スロットリング時の再試行回数と待ち時間(秒)
+THROTTLE_RETRY = int(os.environ.get('THROTTLE_RETRY', 5))
+BACKOFF_BASE = 0.05
+BACKOFF_MAX = 2.0
+
+# BatchWriteItemで1度に書き込める最大件数と未処理アイテムの再送回数
+BATCH_WRITE_MAX = 25
+BATCH_WRITE_RETRY = 8
+
+# 再試行するエラーコード
+THROTTLING_ERROR_CODES = {
+    'ProvisionedThroughputExceededException',
+    'RequestLimitExceeded',
+    'ThrottlingException',
+    'TransactionConflictException',
+}
+
+
+class Throttle:
+    """1秒あたりの処理件数を一定以下に抑える
+    """
+
+    def __init__(self, rate: float):
+        """
+        Args:
+            rate (float): 1秒あたりの最大件数(0以下の場合は制限なし)
+        """
+        self._interval = 1 / rate if rate > 0 else 0
+        self._next = time.monotonic()
+
+    def wait(self, count: int=1):
+        """count件の処理を始められるまで待つ
+
+        Args:
+            count (int, optional): 処理件数 Defaults to 1.
+        """
+        now = time.monotonic()
+        if self._next > now:
+            time.sleep(self._next - now)
+            now = self._next
+
+        self._next = now + count * self._interval
+
+
+def run_parallel(func, items: list, max_workers: int=None) -> list:
+    """アイテムごとに関数をスレッドプールで並列実行
+
+    例外は送出せず、結果リストの該当位置に格納する
+
+    Args:
+        func (function): 実行する関数(引数はアイテム)
+        items (list): アイテムリスト
+        max_workers (int, optional): 最大スレッド数
+            Defaults to None(PARALLEL_MAX_WORKERS).
+
+    Returns:
+        list: アイテム順の結果(失敗した場合は例外)リスト
+    """
+    items = list(items)
+    if not items:
+        return []
+
+    max_workers = 1 if PARALLEL_SEQUENTIAL \
+        else min(max_workers or PARALLEL_MAX_WORKERS, len(items))
+
+    def call(item):
+        try:
+            return func(item)
+        except Exception as e:
+            return e
+
+    # 並列実行のスレッド内から呼ばれた場合は、プールの枯渇を避けて順番に実行
+    if max_workers <= 1 or getattr(_worker, 'active', False):
+        return [call(item) for item in items]
+
+    # 共有プールのうち、同時に実行するのはmax_workers件まで
+    semaphore = threading.BoundedSemaphore(max_workers)
+
+    def bounded_call(item):
+        with semaphore:
+            return call(item)
+
+    return list(get_executor().map(bounded_call, items))
+
+
+def get_executor():
+    """並列実行のスレッドプールを取得(初回呼び出し時に作成)
+
+    スレッドを使い回し、スレッドごとに作成するboto3のリソースを再利用する
+
+    Returns:
+        ThreadPoolExecutor: スレッドプール
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    global _executor
+
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=PARALLEL_MAX_WORKERS,
+                    thread_name_prefix='parallel',
+                    initializer=mark_worker,
+                )
+
+    return _executor
+
+
+def mark_worker():
+    """並列実行のスレッドであることを記録
+    """
+    _worker.active = True
+
+
+def gather(
+        calls: dict,
+        max_workers: int=None,
+        timings: dict=None) -> dict:
+    """互いに依存しない呼び出しを並列実行し、名前ごとの結果を返す
+
+    全ての呼び出しの完了を待ってから、失敗した呼び出しのうち
+    定義順で最初のものの例外を送出する
+
+    Args:
+        calls (dict): {名前: 引数なしで呼び出せる関数}
+        max_workers (int, optional): 最大スレッド数
+            Defaults to None(PARALLEL_MAX_WORKERS).
+        timings (dict, optional): 名前ごとの処理時間(ミリ秒)の格納先
+            Defaults to None.
+
+    Raises:
+        Exception: いずれかの呼び出しが失敗した場合
+
+    Returns:
+        dict: {名前: 戻り値}
+    """
+    def call(name):
+        start = time.perf_counter()
+        try:
+            return calls[name]()
+        finally:
+            if timings is not None:
+                timings[name] = (time.perf_counter() - start) * 1000
+
+    names = list(calls)
+    results = run_parallel(call, names, max_workers)
+
+    for result in results:
+        if isinstance(result, Exception):
+            raise result
+
+    return dict(zip(names, results))
+
+
+def call_with_retry(func, *args, retries: int=None, **kwargs):
+    """スロットリングされた場合に指数バックオフで再試行して関数を実行
+
+    Args:
+        func (function): 実行する関数
+        retries (int, optional): 再試行回数
+            Defaults to None(THROTTLE_RETRY).
+
+    Raises:
+        ClientError: スロットリング以外のエラー、再試行回数を超えた場合
+
+    Returns:
+        any: 関数の戻り値
+    """
+    from botocore.exceptions import ClientError
+
+    retries = THROTTLE_RETRY if retries is None else retries
+
+    for attempt in range(retries + 1):
+        try:
+            return func(*args, **kwargs)
+
+        except ClientError as e:
+            if not is_throttled(e) or attempt >= retries:
+                raise e
+
+        time.sleep(get_backoff(attempt))
+
+
+def batch_write(table, requests: list) -> int:
+    """BatchWriteItemで一括書き込み
+
+    25件ずつ書き込み、未処理アイテムは指数バックオフで再送する
+
+    Args:
+        table (Table): テーブル
+        requests (list): PutRequest、DeleteRequestのリスト
+
+    Raises:
+        RuntimeError: 再送回数を超えても未処理アイテムが残った場合
+
+    Returns:
+        int: 書き込み件数
+    """
+    for i in range(0, len(requests), BATCH_WRITE_MAX):
+        request_items = {table.name: requests[i:i + BATCH_WRITE_MAX]}
+
+        for attempt in range(BATCH_WRITE_RETRY + 1):
+            response = call_with_retry(
+                table.meta.client.batch_write_item,
+                RequestItems=request_items,
+            )
+            request_items = response.get('UnprocessedItems')
+            if not request_items:
+                break
+
+            if attempt < BATCH_WRITE_RETRY:
+                time.sleep(get_backoff(attempt))
+
+        else:
+            raise RuntimeError(
+                'Unprocessed items remain. '
+                f'count: {len(request_items[table.name])}',
+            )
+
+    return len(requests)
+
+
+def is_throttled(error: Exception) -> bool:
+    """スロットリング(再試行で解消するエラー)か否か
+
+    Args:
+        error (ClientError): 例外
+
+    Returns:
+        bool: スロットリングか否か
+    """
+    return error.response.get('Error', {}).get('Code') \
+        in THROTTLING_ERROR_CODES
+
+
+def get_condition_failures(error: Exception) -> list:
+    """条件付き書き込みで条件を満たさなかった位置を取得
+
+    Args:
+        error (ClientError): 例外
+
+    Returns:
+        list: 条件を満たさなかった位置(単一の書き込みの場合は[0]、
+            トランザクションの場合は項目の位置)、条件以外のエラーの場合は空
+    """
+    code = error.response.get('Error', {}).get('Code')
+
+    if code == 'ConditionalCheckFailedException':
+        return [0]
+
+    if code == 'TransactionCanceledException':
+        return [
+            i for i, reason in enumerate(
+                error.response.get('CancellationReasons', []),
+            )
+            if reason.get('Code') == 'ConditionalCheckFailed'
+        ]
+
+    return []
+
+
+def get_backoff(attempt: int) -> float:
+    """再試行までの待ち時間(秒)を取得(ジッター付き指数バックオフ)
+
+    Args:
+        attempt (int): 試行回数(0始まり)
+
+    Returns:
+        float: 待ち時間(秒)
+    """
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
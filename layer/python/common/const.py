@@ -7,6 +7,42 @@ LAMBDA_STAGE = os.environ['LAMBDA_STAGE']
 
 JST = timezone(timedelta(hours=+9), 'JST')
 
+# AWSクライアントの接続設定
+AWS_MAX_POOL_CONNECTIONS = int(os.environ.get('AWS_MAX_POOL_CONNECTIONS', 16))
+AWS_CONNECT_TIMEOUT = float(os.environ.get('AWS_CONNECT_TIMEOUT', 2))
+AWS_READ_TIMEOUT = float(os.environ.get('AWS_READ_TIMEOUT', 10))
+AWS_TCP_KEEPALIVE = os.environ.get('AWS_TCP_KEEPALIVE', 'true') == 'true'
+AWS_RETRY_MODE = os.environ.get('AWS_RETRY_MODE', 'standard')
+AWS_MAX_ATTEMPTS = int(os.environ.get('AWS_MAX_ATTEMPTS', 3))
+
+# 格言フィードのキャッシュ設定
+FEED_CACHE_TTL = int(os.environ.get('FEED_CACHE_TTL', 60))
+FEED_CACHE_MAX_SIZE = int(os.environ.get('FEED_CACHE_MAX_SIZE', 12))
+
+# ユーザランキング(上位)のキャッシュ設定
+LEADERBOARD_CACHE_TTL = int(os.environ.get('LEADERBOARD_CACHE_TTL', 10))
+
+# ユーザのキャッシュ設定(TTLが0の場合はリクエスト内のみ再利用)
+USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 0))
+USER_CACHE_MAX_SIZE = int(os.environ.get('USER_CACHE_MAX_SIZE', 256))
+# 存在しないユーザIDのキャッシュ設定
+USER_NEGATIVE_CACHE_TTL = int(os.environ.get('USER_NEGATIVE_CACHE_TTL', 30))
+
+# いいねポイントの書き込み分割数(1の場合は分割しない)
+ADAGE_LIKE_SHARDS = int(os.environ.get('ADAGE_LIKE_SHARDS', 1))
+USER_LIKE_SHARDS = int(os.environ.get('USER_LIKE_SHARDS', 1))
+
+# いいね・ハートの書き込みモード(sync: 同期書き込み, async: キュー経由で集約)
+LIKE_WRITE_MODE = os.environ.get('LIKE_WRITE_MODE', 'sync')
+# 集約用キューの種類(memory, file, sqs)
+LIKE_QUEUE = os.environ.get('LIKE_QUEUE', 'memory')
+LIKE_QUEUE_PATH = os.environ.get('LIKE_QUEUE_PATH', '/tmp/like-events.jsonl')
+LIKE_QUEUE_URL = os.environ.get('LIKE_QUEUE_URL', '')
+
+# ユーザ名反映の実行方法
+# (event: 非同期呼び出し, inprocess: 同一関数内でレスポンス前に実行)
+EPISODE_FANOUT_MODE = os.environ.get('EPISODE_FANOUT_MODE', 'event')
+
 
 class SendReason(IntEnum):
 
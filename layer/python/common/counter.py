@@ -0,0 +1,438 @@
+from decimal import Decimal
+import random
+
+from common.concurrency import batch_write, get_condition_failures
+from common.const import ADAGE_LIKE_SHARDS, USER_LIKE_SHARDS
+from common.resource import Table
+
+
+table_adage = Table.ADAGE
+table_user = Table.USER
+
+# テーブルごとのいいねポイントの分割数(1の場合は分割しない)
+LIKE_SHARDS = {
+    table_adage.name: ADAGE_LIKE_SHARDS,
+    table_user.name: USER_LIKE_SHARDS,
+}
+
+# TransactGetItemsで1度に取得できる最大件数
+TRANSACT_GET_MAX = 100
+
+
+def increment_like_points(
+        table,
+        key: dict,
+        point: int=1,
+        must_exist: bool=False,
+        return_values: str='ALL_NEW') -> dict:
+    """いいねポイントを増やす
+
+    分割数が2以上の場合、ランダムに選んだ分割アイテムへ加算する。
+    加算ごとに本体と全分割アイテムを読むと読み込み容量が分割数に比例して
+    かかるため、合計値は読み込み時(get_like_points等)に計算し、
+    月間ランキング等へは集約時(fold_like_points)に反映する
+
+    Args:
+        table (Table): テーブル
+        key (dict): 本体アイテムのキー
+        point (int, optional): 増加分ポイント Defaults to 1.
+        must_exist (bool, optional): 本体アイテムが存在する場合のみ加算する
+            Defaults to False.
+        return_values (str, optional): 'ALL_OLD'の場合は更新前の本体アイテム
+            (加算で作成した場合は空)を返す Defaults to 'ALL_NEW'.
+
+    Raises:
+        ClientError: 本体アイテムが存在しない場合(must_existの場合)
+
+    Returns:
+        dict: 本体アイテム(既定は更新後)、分割アイテムへ加算した場合None
+    """
+    if get_shard_count(table) <= 1:
+        kwargs = {}
+        if must_exist:
+            kwargs['ConditionExpression'] = \
+                f'attribute_exists({get_partition_key_name(key)})'
+
+        return table.update_item(
+            Key=key,
+            UpdateExpression="ADD #likePoints :increment",
+            ExpressionAttributeNames={
+                '#likePoints': 'likePoints',
+            },
+            ExpressionAttributeValues={
+                ":increment": Decimal(point),
+            },
+            ReturnValues=return_values,
+            **kwargs,
+        ).get('Attributes', {})
+
+    requests = get_increment_requests(table, key, point, must_exist)
+
+    # 本体アイテムの存在確認と分割アイテムへの加算を同一トランザクションで行う
+    if len(requests) > 1:
+        table.meta.client.transact_write_items(TransactItems=requests)
+    else:
+        table.meta.client.update_item(**requests[0]['Update'])
+
+    return None
+
+
+def get_increment_requests(
+        table,
+        key: dict,
+        point: int=1,
+        must_exist: bool=False) -> list:
+    """いいねポイントの加算をTransactWriteItemsの項目として作成
+
+    分割数が2以上の場合は、ランダムに選んだ分割アイテムへの加算と
+    (must_existの場合)本体アイテムの存在確認になる
+
+    Args:
+        table (Table): テーブル
+        key (dict): 本体アイテムのキー
+        point (int, optional): 増加分ポイント Defaults to 1.
+        must_exist (bool, optional): 本体アイテムが存在する場合のみ加算する
+            Defaults to False.
+
+    Returns:
+        list: TransactWriteItemsの項目リスト
+    """
+    shards = get_shard_count(table)
+    partition_key = get_partition_key_name(key)
+    condition = f'attribute_exists({partition_key})'
+
+    update = {
+        'TableName': table.name,
+        'Key': key,
+        'UpdateExpression': "ADD #likePoints :increment",
+        'ExpressionAttributeNames': {
+            '#likePoints': 'likePoints',
+        },
+        'ExpressionAttributeValues': {
+            ":increment": Decimal(point),
+        },
+    }
+
+    if shards <= 1:
+        if must_exist:
+            update['ConditionExpression'] = condition
+
+        return [{'Update': update}]
+
+    update['Key'] = get_shard_key(key, random.randrange(shards))
+    update['UpdateExpression'] += " SET #shardOf = :shardOf"
+    update['ExpressionAttributeNames']['#shardOf'] = 'shardOf'
+    update['ExpressionAttributeValues'][':shardOf'] = key[partition_key]
+
+    if not must_exist:
+        return [{'Update': update}]
+
+    return [
+        {
+            'ConditionCheck': {
+                'TableName': table.name,
+                'Key': key,
+                'ConditionExpression': condition,
+            },
+        },
+        {'Update': update},
+    ]
+
+
+def merge_like_points(table, items: list) -> list:
+    """アイテムのいいねポイントを分割アイテムとの合計値へ置き換える
+
+    Args:
+        table (Table): テーブル
+        items (list): 本体アイテムリスト(キー属性を含むこと)
+
+    Returns:
+        list: アイテムリスト
+    """
+    if get_shard_count(table) <= 1 or not items:
+        return items
+
+    key_names = get_key_names(table)
+    totals = read_with_like_points(
+        table,
+        [{name: item[name] for name in key_names} for item in items],
+        ['likePoints'],
+    )
+
+    for item, total in zip(items, totals):
+        item['likePoints'] = total.get('likePoints', Decimal(0))
+
+    return items
+
+
+def read_with_like_points(
+        table, keys: list, projection_list: list=None) -> list:
+    """本体アイテムと分割アイテムを同時点で読み、合計値を付けて返す
+
+    Args:
+        table (Table): テーブル
+        keys (list): 本体アイテムのキーリスト
+        projection_list (list, optional): 本体の取得属性リスト
+            Defaults to None.
+
+    Returns:
+        list: 本体アイテムリスト(存在しない場合は空のdict)
+    """
+    shards = get_shard_count(table)
+    group_size = shards + 1
+    groups_per_call = max(TRANSACT_GET_MAX // group_size, 1)
+    results = []
+
+    for i in range(0, len(keys), groups_per_call):
+        request = []
+        for key in keys[i:i + groups_per_call]:
+            base = {
+                'Get': {
+                    'TableName': table.name,
+                    'Key': key,
+                },
+            }
+            if projection_list:
+                base['Get']['ProjectionExpression'] = ','.join(
+                    f'#p{n}' for n in range(len(projection_list))
+                )
+                base['Get']['ExpressionAttributeNames'] = {
+                    f'#p{n}': name
+                    for n, name in enumerate(projection_list)
+                }
+            request.append(base)
+
+            for shard in range(shards):
+                request.append(
+                    {
+                        'Get': {
+                            'TableName': table.name,
+                            'Key': get_shard_key(key, shard),
+                            'ProjectionExpression': 'likePoints',
+                        },
+                    },
+                )
+
+        responses = table.meta.client.transact_get_items(
+            TransactItems=request,
+        )['Responses']
+
+        for j in range(0, len(responses), group_size):
+            group = [
+                response.get('Item', {})
+                for response in responses[j:j + group_size]
+            ]
+            item = group[0]
+            total = sum(
+                (shard.get('likePoints', Decimal(0)) for shard in group),
+                Decimal(0),
+            )
+            if item or total:
+                item['likePoints'] = total
+            results.append(item)
+
+    return results
+
+
+def get_like_points(table, key: dict) -> Decimal:
+    """本体アイテムと分割アイテムの合計いいねポイントを取得
+
+    Args:
+        table (Table): テーブル
+        key (dict): 本体アイテムのキー
+
+    Returns:
+        Decimal: いいねポイント
+    """
+    item = read_with_like_points(table, [key], ['likePoints'])[0]
+
+    return item.get('likePoints', Decimal(0))
+
+
+def fold_like_points(table) -> dict:
+    """分割アイテムのいいねポイントを本体アイテムへ集約する
+
+    分割アイテムの減算と本体アイテムの加算を同一トランザクションで行うため、
+    集約中も合計値は変わらない。
+    本体アイテムが削除済みの場合は、本体を作り直さずに分割アイテムを削除する
+
+    Args:
+        table (Table): テーブル
+
+    Returns:
+        dict: {本体アイテムのキー(tuple): 集約したポイント}
+    """
+    from boto3.dynamodb.conditions import Attr
+    from botocore.exceptions import ClientError
+
+    scan_kwargs = {
+        'FilterExpression': Attr('shardOf').exists() &
+            Attr('likePoints').ne(0),
+    }
+    partition_key, sort_key = get_key_names(table)
+    folded = {}
+
+    while True:
+        items = table.scan(**scan_kwargs)
+
+        for shard in items.get('Items', []):
+            point = shard['likePoints']
+            shard_key = {
+                partition_key: shard[partition_key],
+                sort_key: shard[sort_key],
+            }
+            try:
+                fold_shard(table, shard, shard_key, point)
+
+            except ClientError as e:
+                failures = get_condition_failures(e)
+                if not failures:
+                    raise e
+
+                # 本体アイテムが削除済みの場合は分割アイテムを削除する
+                # (分割アイテムが更新された場合は次回の集約で反映する)
+                if 1 in failures:
+                    table.delete_item(Key=shard_key)
+                continue
+
+            base_key = (
+                (partition_key, shard['shardOf']),
+                (sort_key, shard[sort_key]),
+            )
+            folded[base_key] = folded.get(base_key, 0) + int(point)
+
+        if 'LastEvaluatedKey' not in items:
+            break
+        scan_kwargs['ExclusiveStartKey'] = items['LastEvaluatedKey']
+
+    return folded
+
+
+def fold_shard(table, shard: dict, shard_key: dict, point: Decimal):
+    """分割アイテム1件のいいねポイントを本体アイテムへ移す
+
+    Args:
+        table (Table): テーブル
+        shard (dict): 分割アイテム
+        shard_key (dict): 分割アイテムのキー
+        point (Decimal): 移すポイント
+
+    Raises:
+        ClientError: 分割アイテムが更新された、本体アイテムが存在しない場合
+    """
+    partition_key, sort_key = get_key_names(table)
+
+    table.meta.client.transact_write_items(
+        TransactItems=[
+            {
+                'Update': {
+                    'TableName': table.name,
+                    'Key': shard_key,
+                    'UpdateExpression': 'ADD likePoints :decrement',
+                    'ConditionExpression': 'likePoints >= :point',
+                    'ExpressionAttributeValues': {
+                        ':decrement': -point,
+                        ':point': point,
+                    },
+                },
+            },
+            {
+                'Update': {
+                    'TableName': table.name,
+                    'Key': {
+                        partition_key: shard['shardOf'],
+                        sort_key: shard[sort_key],
+                    },
+                    'UpdateExpression': 'ADD likePoints :increment',
+                    # 削除済みの本体アイテムをlikePointsのみで作り直さない
+                    'ConditionExpression': 'attribute_exists(#pk)',
+                    'ExpressionAttributeNames': {
+                        '#pk': partition_key,
+                    },
+                    'ExpressionAttributeValues': {
+                        ':increment': point,
+                    },
+                },
+            },
+        ],
+    )
+
+
+def delete_like_shards(table, key: dict):
+    """本体アイテムの分割アイテムを削除
+
+    Args:
+        table (Table): テーブル
+        key (dict): 本体アイテムのキー
+    """
+    shards = get_shard_count(table)
+    if shards <= 1:
+        return
+
+    batch_write(
+        table,
+        [
+            {'DeleteRequest': {'Key': get_shard_key(key, shard)}}
+            for shard in range(shards)
+        ],
+    )
+
+
+def get_shard_count(table) -> int:
+    """テーブルのいいねポイントの分割数を取得
+
+    Args:
+        table (Table): テーブル
+
+    Returns:
+        int: 分割数
+    """
+    return LIKE_SHARDS.get(table.name, 1)
+
+
+def get_shard_key(key: dict, shard: int) -> dict:
+    """分割アイテムのキーを取得
+
+    パーティションキーに分割番号を付け、書き込みを別パーティションへ分散する
+
+    Args:
+        key (dict): 本体アイテムのキー
+        shard (int): 分割番号
+
+    Returns:
+        dict: 分割アイテムのキー
+    """
+    partition_key = get_partition_key_name(key)
+    shard_key = dict(key)
+    shard_key[partition_key] = '#'.join(
+        [key[partition_key], 'shard', str(shard)],
+    )
+
+    return shard_key
+
+
+def get_partition_key_name(key: dict) -> str:
+    """キーからパーティションキー名を取得
+
+    Args:
+        key (dict): キー
+
+    Returns:
+        str: パーティションキー名
+    """
+    return next(name for name in key if name != 'key')
+
+
+def get_key_names(table) -> tuple:
+    """テーブルのキー名を取得
+
+    Args:
+        table (Table): テーブル
+
+    Returns:
+        tuple: (パーティションキー名, ソートキー名)
+    """
+    partition_key = 'adageId' if table.name == table_adage.name else 'userId'
+
+    return partition_key, 'key'
+
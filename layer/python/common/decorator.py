@@ -1,6 +1,8 @@
+from base64 import b64decode
 import logging
 
-from common.response import ErrorResponse
+from common import idempotency
+from common.response import ErrorResponse, compress
 from common.exception import ApplicationException
 
 
@@ -12,8 +14,16 @@ def handler(func):
     """Lambda関数ハンドラ
     """
     def wrapper(*args, **kwargs):
+        event = args[0] if args else None
+        decode_body(event)
+        control_id = None
 
         try:
+            # Idempotency-Keyが同じリクエストは最初のレスポンスを再送する
+            control_id, replay = idempotency.start(event)
+            if replay is not None:
+                return replay
+
             response = func(*args, **kwargs)
 
         # 任意の例外の場合
@@ -25,10 +35,30 @@ def handler(func):
             save_exception_log(e)
             response = ErrorResponse(e)
 
-        return response.format()
+        # ボディのJSON変換は1度だけにし、保存後に圧縮する
+        formatted = response.format()
+        if control_id is not None:
+            idempotency.finish(control_id, formatted)
+
+        return compress(formatted, event)
     return wrapper
 
 
+def decode_body(event: dict):
+    """base64でエンコードされたボディ(binaryMediaTypes設定時)を文字列へ戻す
+
+    Args:
+        event (dict): イベント
+    """
+    if not isinstance(event, dict) or not event.get('isBase64Encoded'):
+        return
+
+    if event.get('body') is not None:
+        event['body'] = b64decode(event['body']).decode('utf-8')
+
+    event['isBase64Encoded'] = False
+
+
 def save_exception_log(error: Exception):
     """例外のログを保存
 
@@ -0,0 +1,293 @@
+from http import HTTPStatus
+from uuid import uuid4
+
+from common import feed, likes, search, user_version
+from common.concurrency import gather
+from common.const import SendReason
+from common.counter import delete_like_shards
+from common.exception import ApplicationException
+from common.resource import Table
+from common.user_repository import UserRepository
+from common.util import get_jst_timestamp, is_empty
+
+
+table_adage = Table.ADAGE
+table_user = Table.USER
+
+
+def create_episode(adage: dict, user_id: str, episode: str) -> dict:
+    """既存の格言へエピソードを登録
+
+    Args:
+        adage (dict): 格言(adageId, title, registrationMonth)
+        user_id (str): ユーザID('guest'の場合はゲスト)
+        episode (str): エピソード
+
+    Raises:
+        ApplicationException: ユーザが存在しない場合
+
+    Returns:
+        dict: 格言IDに登録したエピソード
+    """
+    adage_item, user_item = make_episode_items(adage, user_id, episode)
+
+    # 格言IDにエピソード登録
+    table_adage.put_item(Item=adage_item)
+
+    # 検索インデックスへエピソード追加
+    search.add_documents([adage_item])
+
+    # ゲストユーザの場合
+    if user_item is None:
+        return adage_item
+
+    gather(
+        {
+            # 月間ランキングへエピソード追加
+            'feed': lambda: feed.put_episode(
+                adage['registrationMonth'],
+                adage_item,
+            ),
+
+            # ユーザIDにエピソード登録
+            'user': lambda: put_user_episode(user_item),
+
+            # ユーザにポイント付与
+            'points': lambda: award_points(
+                user_id,
+                [SendReason.REGISTRATION_EPISODE],
+            ),
+        },
+    )
+
+    return adage_item
+
+
+def create_adage_with_episode(
+        adage: dict, user_id: str, episode: str) -> dict:
+    """格言とエピソードを1つのトランザクションで登録
+
+    Args:
+        adage (dict): 格言アイテム
+        user_id (str): ユーザID('guest'の場合はゲスト)
+        episode (str): エピソード
+
+    Raises:
+        ApplicationException: ユーザが存在しない場合
+
+    Returns:
+        dict: 格言IDに登録したエピソード
+    """
+    adage_item, user_item = make_episode_items(adage, user_id, episode)
+
+    transact_items = [
+        {
+            'Put': {
+                'TableName': table_adage.name,
+                'Item': adage,
+                'ConditionExpression': 'attribute_not_exists(adageId)',
+            },
+        },
+        {
+            'Put': {
+                'TableName': table_adage.name,
+                'Item': adage_item,
+            },
+        },
+    ]
+    if user_item is not None:
+        transact_items += [
+            {
+                'Put': {
+                    'TableName': table_user.name,
+                    'Item': user_item,
+                },
+            },
+            {'Update': user_version.get_version_update(user_id)},
+        ]
+
+    # 格言、格言IDのエピソード、ユーザIDのエピソードを登録
+    table_adage.meta.client.transact_write_items(
+        TransactItems=transact_items,
+    )
+
+    # ゲストユーザの場合
+    if user_item is None:
+        return adage_item
+
+    # 月間ランキングへエピソードを含めて格言追加
+    feed.add_adage({**adage, 'episode': [adage_item]})
+
+    # ユーザにポイント付与
+    award_points(
+        user_id,
+        [SendReason.REGISTRATION_ADAGE, SendReason.REGISTRATION_EPISODE],
+    )
+
+    return adage_item
+
+
+def put_user_episode(user_item: dict):
+    """ユーザIDにエピソードを登録し、更新バージョンを進める
+
+    Args:
+        user_item (dict): ユーザIDのエピソード
+    """
+    table_user.put_item(Item=user_item)
+    user_version.bump(user_item['userId'])
+
+
+def make_episode_items(adage: dict, user_id: str, episode: str) -> tuple:
+    """エピソードのアイテムを作成
+
+    Args:
+        adage (dict): 格言(adageId, title, registrationMonth)
+        user_id (str): ユーザID('guest'の場合はゲスト)
+        episode (str): エピソード
+
+    Raises:
+        ApplicationException: ユーザが存在しない場合
+
+    Returns:
+        tuple: (
+            dict: 格言IDのエピソード,
+            dict: ユーザIDのエピソード、ゲストの場合None,
+        )
+    """
+    adage_id = adage['adageId']
+
+    # ゲストユーザの場合
+    if user_id == 'guest':
+        user_id = '#'.join([user_id, str(uuid4())])
+        adage_item = {
+            'adageId': adage_id,
+            'key': '#'.join(['episode', user_id]),
+            'userId': user_id,
+            'userName': 'ゲスト',
+            'title': adage['title'],
+            'episode': episode,
+            'registrationMonth': adage['registrationMonth'],
+            'byGuest': True,
+            'likePoints': 0,
+        }
+        return adage_item, None
+
+    exists_user = UserRepository().get(user_id, ['userName'])
+    if is_empty(exists_user):
+        raise ApplicationException(
+            HTTPStatus.BAD_REQUEST,
+            f'User does not exists. userId: {user_id}',
+        )
+
+    adage_item = {
+        'adageId': adage_id,
+        'key': '#'.join(['episode', user_id]),
+        'userId': user_id,
+        'userName': exists_user['userName'],
+        'title': adage['title'],
+        'episode': episode,
+        'registrationMonth': adage['registrationMonth'],
+        'likePoints': 0,
+    }
+    user_item = {
+        'userId': user_id,
+        'key': '#'.join(['episode', adage_id]),
+        'adageId': adage_id,
+        'title': adage['title'],
+        'episode': episode,
+    }
+
+    return adage_item, user_item
+
+
+def delete_episode(adage_id: str, user_id: str):
+    """格言IDに投稿したユーザのエピソード削除
+
+    Args:
+        adage_id (str): 格言ID
+        user_id (str): ユーザID
+    """
+    # 格言IDのエピソード削除
+    delete_adage_episode(adage_id, user_id)
+
+    # ユーザIDのエピソード削除
+    table_user.delete_item(
+        Key={
+            'userId': user_id,
+            'key': '#'.join(['episode', adage_id]),
+        },
+    )
+    user_version.bump(user_id)
+
+
+def delete_adage_episode(adage_id: str, user_id: str) -> dict:
+    """格言IDのエピソードを削除し、月間ランキングから取り除く
+
+    Args:
+        adage_id (str): 格言ID
+        user_id (str): ユーザID
+
+    Returns:
+        dict: 削除したエピソード、存在しない場合は空のdict
+    """
+    deleted = table_adage.delete_item(
+        Key={
+            'adageId': adage_id,
+            'key': '#'.join(['episode', user_id]),
+        },
+        ReturnValues='ALL_OLD',
+    ).get('Attributes', {})
+
+    if deleted:
+        # 分割されたいいねポイントも削除
+        delete_like_shards(
+            table_adage,
+            {
+                'adageId': adage_id,
+                'key': deleted['key'],
+            },
+        )
+
+        # 検索インデックスからエピソード削除
+        search.remove_document(adage_id, deleted['key'])
+
+    # 月間ランキングからエピソード削除
+    if not deleted.get('byGuest') and 'registrationMonth' in deleted:
+        feed.remove_episode(
+            deleted['registrationMonth'],
+            adage_id,
+            deleted['key'],
+        )
+
+    return deleted
+
+
+def award_points(user_id: str, reasons: list):
+    """ユーザにポイント付与
+
+    ポイントの加算は1回の更新にまとめ、履歴はまとめて登録する
+    (履歴のキーが重複しないよう日時をずらす)
+
+    Args:
+        user_id (str): ユーザID
+        reasons (list): 送信理由リスト
+    """
+    jst_timestamp = get_jst_timestamp()
+
+    likes.apply_events(
+        [
+            likes.like_event(
+                'user',
+                {'userId': user_id, 'key': 'userId'},
+                sum(reason.point for reason in reasons),
+            ),
+            *[
+                likes.history_event(
+                    user_id,
+                    reason,
+                    jst_timestamp=jst_timestamp + i * 0.001,
+                )
+                for i, reason in enumerate(reasons)
+            ],
+        ],
+    )
@@ -0,0 +1,280 @@
+from collections import deque
+import fcntl
+import json
+import os
+import time
+
+from common.concurrency import batch_write
+from common.const import LIKE_QUEUE, LIKE_QUEUE_PATH, LIKE_QUEUE_URL
+from common.resource import Table, get_client
+
+
+table_control = Table.CONTROL
+
+# SQSの1リクエストあたりの最大件数
+SQS_BATCH_MAX = 10
+
+# 処理済みのSQSメッセージIDの記録(再配信時の重複加算を防ぐ)
+SQS_MESSAGE_PREFIX = 'sqsmessage#'
+# 処理済みの記録を保持する秒数(キューの保持期間以上)
+SQS_MESSAGE_TTL = int(os.environ.get('SQS_MESSAGE_TTL', 4 * 24 * 60 * 60))
+# 処理中の記録が有効な秒数(超えた場合は処理が中断したとみなし再処理する)
+SQS_MESSAGE_LOCK_TTL = int(os.environ.get('SQS_MESSAGE_LOCK_TTL', 120))
+
+IN_PROGRESS = 'in_progress'
+COMPLETED = 'completed'
+
+
+class MemoryQueue:
+    """プロセス内キュー(ローカル実行、テスト用)
+    """
+
+    def __init__(self):
+        self._events = deque()
+
+    def put(self, events: list):
+        """イベント登録
+
+        Args:
+            events (list): イベントリスト
+        """
+        self._events.extend(events)
+
+    def drain(self, max_events: int=None) -> list:
+        """イベントを取り出す
+
+        Args:
+            max_events (int, optional): 最大件数 Defaults to None.
+
+        Returns:
+            list: イベントリスト
+        """
+        count = len(self._events) if max_events is None \
+            else min(max_events, len(self._events))
+
+        return [self._events.popleft() for _ in range(count)]
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+
+class FileQueue:
+    """ファイルキュー(JSON Lines、複数プロセスから利用可能)
+
+    取り出し時はファイルを処理中ファイルへ移動し、
+    処理中に異常終了した場合は次回の取り出しで再処理する
+    """
+
+    def __init__(self, path: str):
+        self._path = path
+        self._processing_path = path + '.processing'
+        self._lock_path = path + '.lock'
+
+    def put(self, events: list):
+        """イベント登録
+
+        Args:
+            events (list): イベントリスト
+        """
+        lines = ''.join(
+            json.dumps(event, ensure_ascii=False) + '\n'
+            for event in events
+        )
+
+        with self._lock():
+            with open(self._path, 'a', encoding='utf-8') as f:
+                f.write(lines)
+
+    def drain(self, max_events: int=None) -> list:
+        """イベントを取り出す
+
+        Args:
+            max_events (int, optional): 未使用(ファイル単位で取り出す)
+                Defaults to None.
+
+        Returns:
+            list: イベントリスト
+        """
+        with self._lock():
+            if not os.path.exists(self._processing_path):
+                if not os.path.exists(self._path):
+                    return []
+                os.replace(self._path, self._processing_path)
+
+            with open(self._processing_path, encoding='utf-8') as f:
+                return [json.loads(line) for line in f if line.strip()]
+
+    def ack(self):
+        """取り出したイベントの処理完了
+        """
+        with self._lock():
+            if os.path.exists(self._processing_path):
+                os.remove(self._processing_path)
+
+    def __len__(self) -> int:
+        with self._lock():
+            count = 0
+            for path in [self._path, self._processing_path]:
+                if os.path.exists(path):
+                    with open(path, encoding='utf-8') as f:
+                        count += sum(1 for line in f if line.strip())
+
+            return count
+
+    def _lock(self):
+        return _FileLock(self._lock_path)
+
+
+class SqsQueue:
+    """SQSキュー(取り出しはSQSトリガーのLambdaで行う)
+    """
+
+    def __init__(self, queue_url: str):
+        self._queue_url = queue_url
+        self._sqs = get_client('sqs')
+
+    def put(self, events: list):
+        """イベント登録
+
+        Args:
+            events (list): イベントリスト
+        """
+        for i in range(0, len(events), SQS_BATCH_MAX):
+            self._sqs.send_message_batch(
+                QueueUrl=self._queue_url,
+                Entries=[
+                    {
+                        'Id': str(n),
+                        'MessageBody': json.dumps(event, ensure_ascii=False),
+                    }
+                    for n, event in enumerate(events[i:i + SQS_BATCH_MAX])
+                ],
+            )
+
+
+def claim_messages(records: list) -> list:
+    """SQSのレコードを処理中として条件付きで記録し、未処理のものを返す
+
+    SQSは同じメッセージを複数回配信することがあるため、
+    処理済み、他で処理中のメッセージは除く
+
+    Args:
+        records (list): SQSトリガーのRecords
+
+    Returns:
+        list: 処理するレコードリスト
+    """
+    from botocore.exceptions import ClientError
+
+    now = int(time.time())
+    claimed = []
+
+    for record in records:
+        try:
+            table_control.put_item(
+                Item={
+                    'controlId': SQS_MESSAGE_PREFIX + record['messageId'],
+                    'status': IN_PROGRESS,
+                    'lockedUntil': now + SQS_MESSAGE_LOCK_TTL,
+                    'expiresAt': now + SQS_MESSAGE_TTL,
+                },
+                # 処理中のまま期限が過ぎた(中断した)記録は引き継ぐ
+                ConditionExpression='attribute_not_exists(controlId)'
+                    ' OR (#status = :inProgress AND lockedUntil < :now)',
+                ExpressionAttributeNames={
+                    '#status': 'status',
+                },
+                ExpressionAttributeValues={
+                    ':inProgress': IN_PROGRESS,
+                    ':now': now,
+                },
+            )
+
+        except ClientError as e:
+            if e.response['Error']['Code'] \
+                    != 'ConditionalCheckFailedException':
+                raise e
+
+            continue
+
+        claimed.append(record)
+
+    return claimed
+
+
+def complete_messages(records: list):
+    """SQSのレコードを処理済みとして記録
+
+    Args:
+        records (list): 処理したレコードリスト
+    """
+    for record in records:
+        table_control.update_item(
+            Key={'controlId': SQS_MESSAGE_PREFIX + record['messageId']},
+            UpdateExpression='SET #status = :status',
+            ExpressionAttributeNames={
+                '#status': 'status',
+            },
+            ExpressionAttributeValues={
+                ':status': COMPLETED,
+            },
+        )
+
+
+def release_messages(records: list):
+    """処理に失敗したSQSのレコードの記録を削除し、再配信で再処理させる
+
+    Args:
+        records (list): 処理に失敗したレコードリスト
+    """
+    batch_write(
+        table_control,
+        [
+            {
+                'DeleteRequest': {
+                    'Key': {
+                        'controlId': SQS_MESSAGE_PREFIX + record['messageId'],
+                    },
+                },
+            }
+            for record in records
+        ],
+    )
+
+
+class _FileLock:
+
+    def __init__(self, path: str):
+        self._path = path
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self._path, 'a')
+        fcntl.flock(self._file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *args):
+        fcntl.flock(self._file, fcntl.LOCK_UN)
+        self._file.close()
+
+
+_queue = None
+
+
+def get_queue():
+    """設定されたキューを取得(コンテナ内で共有)
+
+    Returns:
+        MemoryQueue | FileQueue | SqsQueue: キュー
+    """
+    global _queue
+
+    if _queue is None:
+        if LIKE_QUEUE == 'sqs':
+            _queue = SqsQueue(LIKE_QUEUE_URL)
+        elif LIKE_QUEUE == 'file':
+            _queue = FileQueue(LIKE_QUEUE_PATH)
+        else:
+            _queue = MemoryQueue()
+
+    return _queue
@@ -42,6 +42,40 @@ class ApplicationException(Exception):
         )
 
 
+class RateLimitException(ApplicationException):
+    """リクエスト数の上限を超えた場合の例外(429)
+    """
+
+    @property
+    def retry_after(self) -> int:
+        return self._retry_after
+
+    def __init__(self, retry_after: int, message: str=''):
+        """例外オブジェクト作成
+
+        Args:
+            retry_after (int): 再試行できるまでの秒数
+            message (str, optional): 例外メッセージ Defaults to ''.
+        """
+        super().__init__(HTTPStatus.TOO_MANY_REQUESTS, message)
+        self._retry_after = retry_after
+
+
+class ConditionalCheckException(Exception):
+    """条件付き書き込みで、対象アイテムが存在しなかった場合の例外
+    """
+
+    def __init__(self, table: str, key: dict):
+        """例外オブジェクト作成
+
+        Args:
+            table (str): テーブル('adage' または 'user')
+            key (dict): アイテムのキー
+        """
+        super().__init__(f'Item does not exists. {table}: {key}')
+        self.table = table
+        self.key = key
+
 
 class CognitoException(Exception):
     """Cognito例外クラス
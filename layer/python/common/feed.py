@@ -0,0 +1,582 @@
+import logging
+
+from common.cache import TTLCache
+from common.concurrency import batch_write
+from common.const import FEED_CACHE_MAX_SIZE, FEED_CACHE_TTL
+from common.counter import merge_like_points
+from common.paginator import query_all
+from common.resource import Table
+from common.response import make_etag
+
+
+logger = logging.getLogger('share-adage-service')
+
+table_adage = Table.ADAGE
+
+# 月間ランキング(格言リストをいいねポイント順に返す読み取りモデル)
+# パーティション ranking#<月> に格言、エピソードごとのエントリを保持し、
+# 変更のあったエントリのみを更新する
+RANKING_KEY = 'ranking'
+RANKING_META_KEY = 'meta'
+ADAGE_ENTRY_PREFIX = 'a#'
+EPISODE_ENTRY_PREFIX = 'e#'
+
+# 月ごとの格言リスト(ETag, 格言リスト)のキャッシュ
+feed_cache = TTLCache(FEED_CACHE_TTL, FEED_CACHE_MAX_SIZE)
+
+# 月間ランキング作成済みの月(作成済みの確認の読み込みを省く)
+built_cache = TTLCache(FEED_CACHE_TTL, FEED_CACHE_MAX_SIZE)
+
+
+def get_feed(month: int) -> tuple:
+    """今月の格言リストを取得
+
+    キャッシュ、月間ランキング、格言テーブルの順に参照する
+
+    Args:
+        month (int): 月
+
+    Returns:
+        tuple: (
+            str: ETag,
+            list: いいねポイント順の格言リスト,
+        )
+    """
+    cached = feed_cache.get(month)
+    if cached is not None:
+        return cached
+
+    adage_list = get_monthly_ranking(month)
+
+    # 月間ランキング未作成の場合、格言・エピソードを一括取得して作成
+    if adage_list is None:
+        adage_list = build_feed(get_feed_by_registration_month(month))
+
+    cached = (make_etag(adage_list), adage_list)
+    feed_cache.set(month, cached)
+
+    return cached
+
+
+def get_feed_by_registration_month(month: int) -> list:
+    """今月の格言とエピソードを一括取得
+
+    エピソードにも格言の登録月(registrationMonth)を持たせているため、
+    registrationMonth-Indexへの1回のクエリで格言とエピソードを取得できる
+
+    Args:
+        month (int): 今月の値
+
+    Returns:
+        list: 今月の格言・エピソードのアイテムリスト
+    """
+    from boto3.dynamodb.conditions import Attr, Key
+
+    items = query_all(
+        table_adage.query,
+        IndexName='registrationMonth-Index',
+        KeyConditionExpression=Key('registrationMonth').eq(month),
+        FilterExpression=Attr('byGuest').not_exists(),
+    )
+
+    # 分割されたいいねポイントを合計
+    return merge_like_points(table_adage, items)
+
+
+def build_feed(feed_items: list) -> list:
+    """格言・エピソードのアイテムからレスポンス用の格言リストを作成
+
+    Args:
+        feed_items (list): 格言・エピソードのアイテムリスト
+
+    Returns:
+        list: いいねポイントの降順に並んだ格言リスト
+    """
+    adages = {}
+    episodes = []
+
+    for item in feed_items:
+        if item['key'] == 'title':
+            adages[item['adageId']] = to_feed_adage(item)
+
+        elif item['key'].startswith('episode'):
+            episodes.append(item)
+
+    return link_episodes(adages, episodes)
+
+
+def link_episodes(adages: dict, episodes: list) -> list:
+    """エピソードを格言へ紐付け、いいねポイントの降順に並べる
+
+    Args:
+        adages (dict): {格言ID: フィード用の格言}
+        episodes (list): エピソードのアイテムリスト
+
+    Returns:
+        list: いいねポイントの降順に並んだ格言リスト
+    """
+    # エピソードはソートキー順に格言へ紐付け
+    for episode in sorted(episodes, key=lambda x: x['key']):
+        adage = adages.get(episode['adageId'])
+        if adage is None:
+            continue
+
+        adage['episode'].append(to_feed_episode(episode))
+
+    # いいねポイントで降順にソート
+    _adage_list = list(adages.values())
+    sort_feed(_adage_list)
+
+    return _adage_list
+
+
+def to_feed_adage(item: dict) -> dict:
+    """格言アイテムをフィード用の格言へ変換
+
+    Args:
+        item (dict): 格言アイテム
+
+    Returns:
+        dict: フィード用の格言
+    """
+    return {
+        'adageId': item['adageId'],
+        'title': item['title'],
+        'registrationMonth': int(item['registrationMonth']),
+        'likePoints': int(item.get('likePoints', 0)),
+        'episode': [
+            to_feed_episode(episode)
+            for episode in item.get('episode', [])
+        ],
+    }
+
+
+def to_feed_episode(item: dict) -> dict:
+    """エピソードアイテムをフィード用のエピソードへ変換
+
+    Args:
+        item (dict): エピソードアイテム
+
+    Returns:
+        dict: フィード用のエピソード
+    """
+    episode = {
+        k: v for k, v in item.items()
+        if k != 'registrationMonth'
+    }
+    episode['likePoints'] = int(episode.get('likePoints', 0))
+
+    return episode
+
+
+def sort_feed(adage_list: list):
+    """格言リストをいいねポイントの降順にソート
+
+    Args:
+        adage_list (list): 格言リスト
+    """
+    adage_list.sort(
+        key=lambda x: x['likePoints'],
+        reverse=True,
+    )
+
+
+def get_monthly_ranking(month: int) -> list:
+    """月間ランキングを取得
+
+    Args:
+        month (int): 月
+
+    Returns:
+        list: いいねポイント順の格言リスト、未作成の場合None
+    """
+    from boto3.dynamodb.conditions import Key
+
+    items = query_all(
+        table_adage.query,
+        KeyConditionExpression=Key('adageId').eq(get_ranking_id(month)),
+    )
+
+    if not any(item['key'] == RANKING_META_KEY for item in items):
+        return None
+
+    adages = {}
+    episodes = []
+    for item in items:
+        if item['key'].startswith(ADAGE_ENTRY_PREFIX):
+            adage = to_feed_adage(item['entry'])
+            adages[adage['adageId']] = adage
+
+        elif item['key'].startswith(EPISODE_ENTRY_PREFIX):
+            episodes.append(item['entry'])
+
+    return link_episodes(adages, episodes)
+
+
+def rebuild_monthly_ranking(month: int) -> list:
+    """格言テーブルから月間ランキングを再作成
+
+    再作成中に加算されたいいねポイントを古い値で戻さないよう、
+    エントリはいいねポイントが増える場合のみ書き込む
+
+    Args:
+        month (int): 月
+
+    Returns:
+        list: いいねポイント順の格言リスト
+    """
+    from boto3.dynamodb.conditions import Key
+
+    adage_list = build_feed(get_feed_by_registration_month(month))
+    ranking_id = get_ranking_id(month)
+
+    entries = {}
+    for adage in adage_list:
+        entries[get_adage_entry_key(adage['adageId'])] = {
+            **adage,
+            'episode': [],
+        }
+        for episode in adage['episode']:
+            entries[get_episode_entry_key(adage['adageId'], episode['key'])] \
+                = episode
+
+    for key, entry in entries.items():
+        put_entry(ranking_id, key, entry, only_increase=True)
+
+    # 格言テーブルから削除されたエントリを削除
+    existing = query_all(
+        table_adage.query,
+        KeyConditionExpression=Key('adageId').eq(ranking_id),
+        ProjectionExpression='adageId,#key',
+        ExpressionAttributeNames={
+            '#key': 'key',
+        },
+    )
+    batch_write(
+        table_adage,
+        [
+            {'DeleteRequest': {'Key': item}}
+            for item in existing
+            if item['key'] not in entries and item['key'] != RANKING_META_KEY
+        ],
+    )
+
+    table_adage.put_item(
+        Item={
+            'adageId': ranking_id,
+            'key': RANKING_META_KEY,
+        },
+    )
+    built_cache.set(int(month), True)
+    feed_cache.delete(int(month))
+
+    return adage_list
+
+
+def add_adage(adage: dict):
+    """月間ランキングへ格言(含まれる場合はエピソードも)を追加
+
+    Args:
+        adage (dict): 格言アイテム
+    """
+    entry = to_feed_adage(adage)
+
+    def write(ranking_id: str):
+        put_entry(
+            ranking_id,
+            get_adage_entry_key(entry['adageId']),
+            {**entry, 'episode': []},
+            only_increase=True,
+        )
+        for episode in entry['episode']:
+            put_entry(
+                ranking_id,
+                get_episode_entry_key(entry['adageId'], episode['key']),
+                episode,
+            )
+
+    update_monthly_ranking(entry['registrationMonth'], write)
+
+
+def update_adage_like_points(month: int, adage_id: str, like_points: int):
+    """月間ランキングの格言のいいねポイントを更新
+
+    Args:
+        month (int): 月
+        adage_id (str): 格言ID
+        like_points (int): 更新後のいいねポイント
+    """
+    update_monthly_ranking(
+        month,
+        lambda ranking_id: update_entry(
+            ranking_id,
+            get_adage_entry_key(adage_id),
+            {'likePoints': int(like_points)},
+        ),
+    )
+
+
+def apply_like_points(item: dict):
+    """いいねポイント更新後の格言、エピソードを月間ランキングへ反映
+
+    Args:
+        item (dict): 更新後の格言またはエピソード
+    """
+    # ゲスト投稿、登録月がない場合はランキング対象外
+    if item.get('byGuest') or 'registrationMonth' not in item:
+        return
+
+    if item['key'] == 'title':
+        update_adage_like_points(
+            item['registrationMonth'],
+            item['adageId'],
+            item['likePoints'],
+        )
+
+    elif item['key'].startswith('episode'):
+        update_episode(
+            item['registrationMonth'],
+            item['adageId'],
+            item['key'],
+            {'likePoints': item['likePoints']},
+        )
+
+
+def put_episode(month: int, episode: dict):
+    """月間ランキングの格言へエピソードを追加、更新
+
+    Args:
+        month (int): 月
+        episode (dict): エピソードアイテム
+    """
+    entry = to_feed_episode(episode)
+
+    update_monthly_ranking(
+        month,
+        lambda ranking_id: put_entry(
+            ranking_id,
+            get_episode_entry_key(entry['adageId'], entry['key']),
+            entry,
+        ),
+    )
+
+
+def update_episode(month: int, adage_id: str, key: str, attributes: dict):
+    """月間ランキングのエピソードの属性を更新
+
+    いいねポイントは減ることがないため、大きくなる場合のみ更新する
+
+    Args:
+        month (int): 月
+        adage_id (str): 格言ID
+        key (str): エピソードのソートキー
+        attributes (dict): 更新する属性
+    """
+    update_monthly_ranking(
+        month,
+        lambda ranking_id: update_entry(
+            ranking_id,
+            get_episode_entry_key(adage_id, key),
+            attributes,
+        ),
+    )
+
+
+def update_user_episodes(
+        month: int, adage_ids: list, key: str, attributes: dict):
+    """月間ランキングの複数の格言にある同一ユーザのエピソードの属性を更新
+
+    Args:
+        month (int): 月
+        adage_ids (list): 格言IDリスト
+        key (str): エピソードのソートキー
+        attributes (dict): 更新する属性
+    """
+    def write(ranking_id: str):
+        for adage_id in dict.fromkeys(adage_ids):
+            update_entry(
+                ranking_id,
+                get_episode_entry_key(adage_id, key),
+                attributes,
+            )
+
+    update_monthly_ranking(month, write)
+
+
+def remove_episode(month: int, adage_id: str, key: str):
+    """月間ランキングからエピソードを削除
+
+    Args:
+        month (int): 月
+        adage_id (str): 格言ID
+        key (str): エピソードのソートキー
+    """
+    update_monthly_ranking(
+        month,
+        lambda ranking_id: table_adage.delete_item(
+            Key={
+                'adageId': ranking_id,
+                'key': get_episode_entry_key(adage_id, key),
+            },
+        ),
+    )
+
+
+def update_monthly_ranking(month: int, write):
+    """月間ランキングの変更したエントリのみを書き込む
+
+    ランキングが未作成の場合は格言テーブルから作成する。
+    (格言テーブルへの書き込み後に呼ばれるため、作成結果に変更が含まれる)
+    書き込みに失敗した場合は作成済みの印を削除し、次回の書き込み時に再作成させる
+
+    Args:
+        month (int): 月
+        write (function): 月間ランキングのパーティションキーを受け取り、
+            エントリを書き込む関数
+    """
+    feed_cache.delete(int(month))
+
+    try:
+        if ensure_monthly_ranking(month):
+            write(get_ranking_id(month))
+
+    except Exception as e:
+        logger.warning(
+            'Ranking is discarded. ' + str(type(e)) + ':' + str(e),
+        )
+        built_cache.delete(int(month))
+        table_adage.delete_item(
+            Key={
+                'adageId': get_ranking_id(month),
+                'key': RANKING_META_KEY,
+            },
+        )
+
+
+def ensure_monthly_ranking(month: int) -> bool:
+    """月間ランキングが作成済みか確認し、未作成の場合は作成
+
+    Args:
+        month (int): 月
+
+    Returns:
+        bool: 作成済みの場合True、今回作成した場合False
+    """
+    if built_cache.get(int(month)):
+        return True
+
+    item = table_adage.get_item(
+        Key={
+            'adageId': get_ranking_id(month),
+            'key': RANKING_META_KEY,
+        },
+        ConsistentRead=True,
+    ).get('Item')
+
+    if item is None:
+        rebuild_monthly_ranking(month)
+        return False
+
+    built_cache.set(int(month), True)
+    return True
+
+
+def put_entry(
+        ranking_id: str, key: str, entry: dict, only_increase: bool=False):
+    """月間ランキングのエントリを書き込む
+
+    Args:
+        ranking_id (str): 月間ランキングのパーティションキー
+        key (str): エントリのソートキー
+        entry (dict): フィード用の格言、エピソード
+        only_increase (bool, optional): 既存のエントリよりいいねポイントが
+            小さい場合は書き込まない Defaults to False.
+    """
+    from botocore.exceptions import ClientError
+
+    condition = {}
+    if only_increase:
+        condition = {
+            'ConditionExpression': 'attribute_not_exists(#entry)'
+                ' OR #entry.likePoints <= :likePoints',
+            'ExpressionAttributeNames': {'#entry': 'entry'},
+            'ExpressionAttributeValues': {
+                ':likePoints': int(entry.get('likePoints', 0)),
+            },
+        }
+
+    try:
+        table_adage.put_item(
+            Item={
+                'adageId': ranking_id,
+                'key': key,
+                'entry': entry,
+            },
+            **condition,
+        )
+
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise e
+
+
+def update_entry(ranking_id: str, key: str, attributes: dict):
+    """月間ランキングのエントリの属性を更新
+
+    エントリが存在しない場合、いいねポイントが大きくならない場合は更新しない
+
+    Args:
+        ranking_id (str): 月間ランキングのパーティションキー
+        key (str): エントリのソートキー
+        attributes (dict): 更新する属性
+    """
+    from botocore.exceptions import ClientError
+
+    names = {'#entry': 'entry'}
+    values = {}
+    updates = []
+    for i, (name, value) in enumerate(attributes.items()):
+        names[f'#a{i}'] = name
+        values[f':v{i}'] = value
+        updates.append(f'#entry.#a{i} = :v{i}')
+
+    condition = 'attribute_exists(#entry)'
+    if 'likePoints' in attributes:
+        values[':likePoints'] = int(attributes['likePoints'])
+        condition += ' AND #entry.likePoints < :likePoints'
+
+    try:
+        table_adage.update_item(
+            Key={
+                'adageId': ranking_id,
+                'key': key,
+            },
+            UpdateExpression='SET ' + ', '.join(updates),
+            ConditionExpression=condition,
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values,
+        )
+
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise e
+
+
+def get_adage_entry_key(adage_id: str) -> str:
+    return ADAGE_ENTRY_PREFIX + adage_id
+
+
+def get_episode_entry_key(adage_id: str, key: str) -> str:
+    return EPISODE_ENTRY_PREFIX + '#'.join([adage_id, key])
+
+
+def get_ranking_id(month: int) -> str:
+    """月間ランキングのパーティションキーを取得
+
+    Args:
+        month (int): 月
+
+    Returns:
+        str: パーティションキー
+    """
+    return '#'.join([RANKING_KEY, str(int(month))])
@@ -0,0 +1,257 @@
+import gzip
+from hashlib import sha256
+from http import HTTPStatus
+import logging
+import os
+import time
+
+from common.exception import ApplicationException
+from common.rate_limit import get_source_ip
+from common.resource import Table
+from common.response import GZIP_LEVEL, compress
+from common.util import get_header, is_empty
+
+
+logger = logging.getLogger('share-adage-service')
+
+table_control = Table.CONTROL
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+IDEMPOTENCY_PREFIX = 'idempotency#'
+
+# 対象のHTTPメソッド
+IDEMPOTENT_METHODS = ('POST', 'PUT', 'PATCH', 'DELETE')
+
+# 最初のレスポンスを保持する秒数
+IDEMPOTENCY_TTL = int(os.environ.get('IDEMPOTENCY_TTL', 24 * 60 * 60))
+# 処理中の記録が有効な秒数(超えた場合は処理が中断したとみなし再実行する)
+IDEMPOTENCY_LOCK_TTL = int(os.environ.get('IDEMPOTENCY_LOCK_TTL', 60))
+# Idempotency-Keyの最大長
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+
+IN_PROGRESS = 'in_progress'
+COMPLETED = 'completed'
+
+
+def start(event: dict) -> tuple:
+    """Idempotency-Keyの処理を開始
+
+    初回は処理中として条件付きで記録する。同じキーの完了済みのリクエストは
+    保存したレスポンスを返し、処理中の場合は409とする
+
+    Args:
+        event (dict): イベント
+
+    Raises:
+        ApplicationException: 同じキーのリクエストが処理中の場合(409)
+        ApplicationException: 同じキーで異なるリクエストの場合(422)
+
+    Returns:
+        tuple: (
+            str: 記録のキー、対象外の場合None,
+            dict: 再送するレスポンス、初回の場合None,
+        )
+    """
+    control_id = get_control_id(event)
+    if control_id is None:
+        return None, None
+
+    request_hash = get_request_hash(event)
+    now = int(time.time())
+
+    try:
+        if lock(control_id, request_hash, now):
+            return control_id, None
+
+        item = table_control.get_item(
+            Key={'controlId': control_id},
+            ConsistentRead=True,
+        ).get('Item')
+
+    except Exception as e:
+        logger.warning(
+            'Idempotency check failed. ' + str(type(e)) + ':' + str(e),
+        )
+        return None, None
+
+    # 記録の確認までに期限切れで削除された場合は、処理中として扱う
+    if item is None or item['status'] == IN_PROGRESS:
+        raise ApplicationException(
+            HTTPStatus.CONFLICT,
+            'A request with the same Idempotency-Key is in progress.',
+        )
+
+    if item['requestHash'] != request_hash:
+        raise ApplicationException(
+            HTTPStatus.UNPROCESSABLE_ENTITY,
+            'Idempotency-Key was used for a different request.',
+        )
+
+    response = item['response']
+    body = response['body']
+    # ボディはgzipで圧縮して保存している(文字列の場合は圧縮前の形式の記録)
+    if not isinstance(body, str):
+        body = gzip.decompress(body.value).decode('utf-8')
+
+    headers = {
+        **response['headers'],
+        'Idempotent-Replayed': 'true',
+    }
+    headers['Access-Control-Expose-Headers'] = ', '.join(
+        [headers.get('Access-Control-Expose-Headers'), 'Idempotent-Replayed'],
+    )
+
+    return None, compress(
+        {
+            'statusCode': int(response['statusCode']),
+            'headers': headers,
+            'body': body,
+        },
+        event,
+    )
+
+
+def finish(control_id: str, response: dict):
+    """最初のレスポンスを保存(ボディはgzipで圧縮する)
+
+    エラー(429等の一時的なものを含む)の場合は記録を削除し、
+    再試行で再実行させる
+
+    Args:
+        control_id (str): 記録のキー
+        response (dict): 圧縮前のレスポンス(変更しない)
+    """
+    try:
+        if response['statusCode'] >= HTTPStatus.BAD_REQUEST:
+            table_control.delete_item(Key={'controlId': control_id})
+            return
+
+        table_control.update_item(
+            Key={'controlId': control_id},
+            UpdateExpression='SET #status = :status, #response = :response,'
+                ' expiresAt = :expiresAt',
+            ExpressionAttributeNames={
+                '#status': 'status',
+                '#response': 'response',
+            },
+            ExpressionAttributeValues={
+                ':status': COMPLETED,
+                ':response': {
+                    'statusCode': response['statusCode'],
+                    'headers': response['headers'],
+                    'body': gzip.compress(
+                        response['body'].encode('utf-8'),
+                        compresslevel=GZIP_LEVEL,
+                        mtime=0,
+                    ),
+                },
+                ':expiresAt': int(time.time()) + IDEMPOTENCY_TTL,
+            },
+        )
+
+    except Exception as e:
+        logger.warning(
+            'Idempotency record failed. ' + str(type(e)) + ':' + str(e),
+        )
+
+
+def lock(control_id: str, request_hash: str, now: int) -> bool:
+    """処理中として条件付きで記録
+
+    Args:
+        control_id (str): 記録のキー
+        request_hash (str): リクエストのハッシュ
+        now (int): 現在時刻
+
+    Returns:
+        bool: 記録できた場合True、既に記録がある場合False
+    """
+    from botocore.exceptions import ClientError
+
+    try:
+        table_control.put_item(
+            Item={
+                'controlId': control_id,
+                'status': IN_PROGRESS,
+                'requestHash': request_hash,
+                'lockedUntil': now + IDEMPOTENCY_LOCK_TTL,
+                'expiresAt': now + IDEMPOTENCY_TTL,
+            },
+            # 処理中のまま期限が過ぎた(中断した)記録は引き継ぐ
+            ConditionExpression='attribute_not_exists(controlId)'
+                ' OR (#status = :inProgress AND lockedUntil < :now)',
+            ExpressionAttributeNames={
+                '#status': 'status',
+            },
+            ExpressionAttributeValues={
+                ':inProgress': IN_PROGRESS,
+                ':now': now,
+            },
+        )
+
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise e
+
+        return False
+
+    return True
+
+
+def get_control_id(event: dict) -> str:
+    """Idempotency-Keyの記録のキーを作成(ルート、ユーザごと)
+
+    認証なしのリクエスト(ゲスト)は送信元IPごとにする
+
+    Args:
+        event (dict): イベント
+
+    Raises:
+        ApplicationException: Idempotency-Keyが長すぎる場合
+
+    Returns:
+        str: 記録のキー、ヘッダがない、対象外のメソッドの場合None
+    """
+    if not isinstance(event, dict) \
+            or event.get('httpMethod') not in IDEMPOTENT_METHODS:
+        return None
+
+    key = get_header(event, IDEMPOTENCY_HEADER)
+    if is_empty(key):
+        return None
+
+    if len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+        raise ApplicationException(
+            HTTPStatus.BAD_REQUEST,
+            'Idempotency-Key is too long.',
+        )
+
+    claims = ((event.get('requestContext') or {}).get('authorizer') or {}) \
+        .get('claims') or {}
+
+    return IDEMPOTENCY_PREFIX + '#'.join(
+        [
+            event['httpMethod'],
+            event.get('resource') or event.get('path') or '',
+            claims.get('sub') or 'guest@' + get_source_ip(event),
+            key,
+        ],
+    )
+
+
+def get_request_hash(event: dict) -> str:
+    """同じキーで異なるリクエストを判定するためのハッシュ
+
+    Args:
+        event (dict): イベント
+
+    Returns:
+        str: パスパラメータ、ボディのハッシュ
+    """
+    digest = sha256()
+    digest.update(repr(sorted(
+        (event.get('pathParameters') or {}).items(),
+    )).encode('utf-8'))
+    digest.update((event.get('body') or '').encode('utf-8'))
+
+    return digest.hexdigest()
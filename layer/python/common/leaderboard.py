@@ -0,0 +1,807 @@
+from collections import Counter, defaultdict
+import heapq
+import logging
+import os
+
+from common.cache import TTLCache
+from common.concurrency import batch_write, run_parallel
+from common.const import LEADERBOARD_CACHE_TTL
+from common.paginator import query_all
+from common.resource import Table, get_resource
+from common.util import is_empty
+
+
+logger = logging.getLogger('share-adage-service')
+
+table_user = Table.USER
+
+# ユーザのいいねポイントのランキング(ユーザテーブルの1パーティションに保持する)
+#   top#<ユーザID>: 上位ユーザ(ユーザ名、いいねポイント)
+#   bucket#<番号>: いいねポイントの範囲ごとのユーザ数(ヒストグラム)
+# 上位ユーザは1件ずつのアイテムとし、加算ごとに全体を書き換えない
+LEADERBOARD_ID = 'leaderboard'
+TOP_KEY_PREFIX = 'top#'
+BUCKET_KEY_PREFIX = 'bucket#'
+# 旧形式(上位ユーザのリストを1アイテムに保持)のソートキー、再作成時に削除する
+LEGACY_TOP_KEY = 'top'
+
+# 上位ランキングの件数
+LEADERBOARD_TOP_SIZE = int(os.environ.get('LEADERBOARD_TOP_SIZE', 100))
+# 削除されたユーザの補充用に、上位ランキングより多めに保持する件数
+LEADERBOARD_TOP_MARGIN = int(os.environ.get('LEADERBOARD_TOP_MARGIN', 20))
+
+# ヒストグラムの範囲の分割数(2のべき乗ごとの範囲をさらに64分割する)
+# 128未満は1ポイントごと、以降は範囲の幅が下限の1/64以下になる
+# (登録時のポイント付近に集中する同点のユーザの順位を正確にするため)
+# 変更した場合はランキングを再作成する
+SUB_BUCKET_BITS = 6
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+
+# 再作成時の並列スキャンの分割数
+LEADERBOARD_SCAN_SEGMENTS = int(
+    os.environ.get('LEADERBOARD_SCAN_SEGMENTS', 8),
+)
+
+# BatchGetItemで1度に取得できる最大件数
+BATCH_GET_MAX = 100
+
+# 上位ランキング、ヒストグラムのキャッシュ(更新要否の判定、参照に使用)
+leaderboard_cache = TTLCache(LEADERBOARD_CACHE_TTL, 2)
+
+
+def get_ranking(limit: int=None) -> list:
+    """上位ランキングを取得
+
+    Args:
+        limit (int, optional): 件数 Defaults to None(LEADERBOARD_TOP_SIZE).
+
+    Returns:
+        list: [{'rank': 順位, 'userId', 'userName', 'likePoints'}]
+    """
+    limit = min(limit or LEADERBOARD_TOP_SIZE, LEADERBOARD_TOP_SIZE)
+
+    return rank_users(get_top())[:limit]
+
+
+def get_rank(user_id: str, like_points: int) -> dict:
+    """ユーザの順位を取得
+
+    上位ランキングに含まれる場合は正確な順位を、含まれない場合は
+    ヒストグラムから推定した順位を返す
+
+    Args:
+        user_id (str): ユーザID
+        like_points (int): ユーザのいいねポイント
+
+    Returns:
+        dict: {
+            'rank': 順位(いいねポイントが上のユーザ数 + 1),
+            'total': ユーザ数,
+            'exact': 正確な順位か否か,
+        }
+    """
+    buckets = get_buckets()
+    total = sum(buckets.values())
+
+    for user in rank_users(get_top()):
+        if user['userId'] == user_id:
+            return {
+                'rank': user['rank'],
+                'total': total,
+                'exact': True,
+            }
+
+    rank, exact = estimate_rank(buckets, like_points)
+
+    return {
+        'rank': rank,
+        'total': max(total, rank),
+        'exact': exact,
+    }
+
+
+def apply_like_points(item: dict, point: int, existed: bool=True):
+    """いいねポイント加算後のユーザをランキングへ反映
+
+    ランキングの更新に失敗しても、いいねポイントの加算は取り消さない
+    (ランキングは再作成で修復する)
+
+    Args:
+        item (dict): 加算後のユーザ(likePointsは合計値)
+        point (int): 加算したポイント
+        existed (bool, optional): 加算前にユーザが存在したか
+            (加算で作成した場合はヒストグラムへ追加する) Defaults to True.
+    """
+    like_points = int(item.get('likePoints', 0))
+    old_points = like_points - int(point) if existed else None
+
+    try:
+        move_bucket(old_points, like_points)
+        put_top_user(item)
+
+    except Exception as e:
+        log_failure(e)
+
+
+def add_user(item: dict):
+    """登録したユーザをランキングへ追加
+
+    Args:
+        item (dict): ユーザ
+    """
+    try:
+        move_bucket(None, int(item.get('likePoints', 0)))
+        put_top_user(item)
+
+    except Exception as e:
+        log_failure(e)
+
+
+def remove_user(user_id: str, like_points: int):
+    """削除したユーザをランキングから取り除く
+
+    Args:
+        user_id (str): ユーザID
+        like_points (int): ユーザのいいねポイント
+    """
+    try:
+        move_bucket(int(like_points), None)
+        table_user.delete_item(Key=get_top_key(user_id))
+        leaderboard_cache.delete(TOP_KEY_PREFIX)
+
+    except Exception as e:
+        log_failure(e)
+
+
+def rename_user(user_id: str, user_name: str):
+    """上位ランキングのユーザ名を更新
+
+    Args:
+        user_id (str): ユーザID
+        user_name (str): ユーザ名
+    """
+    from botocore.exceptions import ClientError
+
+    try:
+        user = find_user(get_top(), user_id)
+        if user is None or user['userName'] == user_name:
+            return
+
+        table_user.update_item(
+            Key=get_top_key(user_id),
+            UpdateExpression='SET userName = :userName',
+            ConditionExpression='attribute_exists(userId)',
+            ExpressionAttributeValues={
+                ':userName': user_name,
+            },
+        )
+        leaderboard_cache.delete(TOP_KEY_PREFIX)
+
+    except ClientError as e:
+        # 上位ランキングから外れた場合
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            log_failure(e)
+
+    except Exception as e:
+        log_failure(e)
+
+
+def log_failure(error: Exception):
+    """ランキングの更新失敗をログに出力(ランキングは再作成で修復する)
+
+    Args:
+        error (Exception): 例外
+    """
+    logger.warning(
+        'Leaderboard update failed. ' + str(type(error)) + ':' + str(error),
+    )
+
+
+def put_top_user(item: dict):
+    """上位ランキングへユーザを追加、更新
+
+    対象のユーザのアイテムのみを書き込む。キャッシュした上位ランキングで
+    対象外、または変更がないと分かる場合は書き込まない。
+    保持件数を超えた場合は最下位のユーザを削除する
+
+    Args:
+        item (dict): ユーザ(userId, userName, likePoints)
+    """
+    from botocore.exceptions import ClientError
+
+    entry = to_top_user(item)
+    capacity = LEADERBOARD_TOP_SIZE + LEADERBOARD_TOP_MARGIN
+
+    users = get_top()
+    current = find_user(users, entry['userId'])
+    if current == entry:
+        return
+
+    full = current is None and len(users) >= capacity
+    if full and entry['likePoints'] <= users[-1]['likePoints']:
+        return
+
+    try:
+        table_user.put_item(
+            Item={
+                **get_top_key(entry['userId']),
+                'userName': entry['userName'],
+                'likePoints': entry['likePoints'],
+            },
+            # 並行した加算の書き込みの前後で、いいねポイントを戻さない
+            ConditionExpression='attribute_not_exists(userId)'
+                ' OR likePoints <= :likePoints',
+            ExpressionAttributeValues={
+                ':likePoints': entry['likePoints'],
+            },
+        )
+
+        if full:
+            remove_lowest(users[-1], entry['likePoints'])
+
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise e
+
+        # 他の加算で更新済みの場合
+        leaderboard_cache.delete(TOP_KEY_PREFIX)
+        return
+
+    merge_top(users, entry, capacity)
+    leaderboard_cache.set(TOP_KEY_PREFIX, users)
+
+
+def remove_lowest(lowest: dict, like_points: int):
+    """保持件数を超えた上位ランキングから最下位のユーザを削除
+
+    削除までに追加したユーザ以上に加算された場合は削除しない
+
+    Args:
+        lowest (dict): キャッシュした上位ランキングの最下位のユーザ
+        like_points (int): 追加したユーザのいいねポイント
+    """
+    from botocore.exceptions import ClientError
+
+    try:
+        table_user.delete_item(
+            Key=get_top_key(lowest['userId']),
+            ConditionExpression='likePoints < :likePoints',
+            ExpressionAttributeValues={
+                ':likePoints': like_points,
+            },
+        )
+
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise e
+
+
+def merge_top(users: list, entry: dict, capacity: int) -> bool:
+    """上位ランキングへユーザを追加、更新し、保持件数に切り詰める
+
+    Args:
+        users (list): いいねポイントの降順のユーザリスト(変更する)
+        entry (dict): 追加、更新するユーザ
+        capacity (int): 保持件数
+
+    Returns:
+        bool: 変更したか否か
+    """
+    current = find_user(users, entry['userId'])
+    if current == entry:
+        return False
+
+    if current is not None:
+        users.remove(current)
+
+    elif len(users) >= capacity \
+            and entry['likePoints'] <= users[-1]['likePoints']:
+        return False
+
+    users.append(entry)
+    sort_users(users)
+    del users[capacity:]
+
+    return True
+
+
+def move_bucket(old_points: int, new_points: int):
+    """ユーザをヒストグラムの範囲間で移動
+
+    範囲が変わらない場合は書き込まない
+
+    Args:
+        old_points (int): 変更前のいいねポイント(追加の場合None)
+        new_points (int): 変更後のいいねポイント(削除の場合None)
+    """
+    old_bucket = None if old_points is None else get_bucket(old_points)
+    new_bucket = None if new_points is None else get_bucket(new_points)
+    if old_bucket == new_bucket:
+        return
+
+    updates = []
+    for bucket, count in [(old_bucket, -1), (new_bucket, 1)]:
+        if bucket is None:
+            continue
+
+        low, high = get_bucket_range(bucket)
+        updates.append(
+            {
+                'Update': {
+                    'TableName': table_user.name,
+                    'Key': {
+                        'userId': LEADERBOARD_ID,
+                        'key': get_bucket_key(bucket),
+                    },
+                    'UpdateExpression':
+                        'ADD #count :count SET #low = :low, #high = :high',
+                    'ExpressionAttributeNames': {
+                        '#count': 'count',
+                        '#low': 'low',
+                        '#high': 'high',
+                    },
+                    'ExpressionAttributeValues': {
+                        ':count': count,
+                        ':low': low,
+                        ':high': high,
+                    },
+                },
+            },
+        )
+
+    # 移動元と移動先を同時に更新し、合計人数をずらさない
+    if len(updates) == 1:
+        table_user.meta.client.update_item(**updates[0]['Update'])
+    else:
+        table_user.meta.client.transact_write_items(TransactItems=updates)
+
+    leaderboard_cache.delete(BUCKET_KEY_PREFIX)
+
+
+def get_top() -> list:
+    """上位ランキングを取得(キャッシュがある場合はキャッシュから)
+
+    Returns:
+        list: いいねポイントの降順のユーザリスト(保持件数まで)
+    """
+    from boto3.dynamodb.conditions import Key
+
+    users = leaderboard_cache.get(TOP_KEY_PREFIX)
+    if users is not None:
+        return [dict(user) for user in users]
+
+    items = query_all(
+        table_user.query,
+        KeyConditionExpression=Key('userId').eq(LEADERBOARD_ID) &
+            Key('key').begins_with(TOP_KEY_PREFIX),
+        ProjectionExpression='#key,userName,likePoints',
+        ExpressionAttributeNames={
+            '#key': 'key',
+        },
+    )
+
+    users = [
+        to_top_user(
+            {**item, 'userId': item['key'][len(TOP_KEY_PREFIX):]},
+        )
+        for item in items
+    ]
+    sort_users(users)
+    del users[LEADERBOARD_TOP_SIZE + LEADERBOARD_TOP_MARGIN:]
+    leaderboard_cache.set(TOP_KEY_PREFIX, users)
+
+    return [dict(user) for user in users]
+
+
+def get_buckets() -> dict:
+    """ヒストグラムを取得(キャッシュがある場合はキャッシュから)
+
+    Returns:
+        dict: {範囲の番号: ユーザ数}
+    """
+    from boto3.dynamodb.conditions import Key
+
+    buckets = leaderboard_cache.get(BUCKET_KEY_PREFIX)
+    if buckets is not None:
+        return dict(buckets)
+
+    items = query_all(
+        table_user.query,
+        KeyConditionExpression=Key('userId').eq(LEADERBOARD_ID) &
+            Key('key').begins_with(BUCKET_KEY_PREFIX),
+        ProjectionExpression='#key,#count',
+        ExpressionAttributeNames={
+            '#key': 'key',
+            '#count': 'count',
+        },
+    )
+
+    buckets = {
+        int(item['key'][len(BUCKET_KEY_PREFIX):]): int(item['count'])
+        for item in items
+        if int(item['count']) > 0
+    }
+    leaderboard_cache.set(BUCKET_KEY_PREFIX, buckets)
+
+    return dict(buckets)
+
+
+def estimate_rank(buckets: dict, like_points: int) -> tuple:
+    """ヒストグラムから順位を推定
+
+    上の範囲のユーザ数に、同じ範囲内でいいねポイントが上のユーザ数を
+    範囲内で均等に分布しているとして加える
+
+    Args:
+        buckets (dict): {範囲の番号: ユーザ数}
+        like_points (int): いいねポイント
+
+    Returns:
+        tuple: (
+            int: 順位,
+            bool: 正確な順位か否か(範囲の幅が1の場合),
+        )
+    """
+    bucket = get_bucket(like_points)
+    low, high = get_bucket_range(bucket)
+    above = sum(
+        count for index, count in buckets.items()
+        if index > bucket
+    )
+    within = buckets.get(bucket, 0) * (high - 1 - like_points) \
+        // (high - low)
+
+    return above + within + 1, high - low == 1
+
+
+def get_bucket(like_points: int) -> int:
+    """いいねポイントからヒストグラムの範囲の番号を取得
+
+    Args:
+        like_points (int): いいねポイント
+
+    Returns:
+        int: 範囲の番号(いいねポイントの昇順)
+    """
+    like_points = max(int(like_points), 0)
+    if like_points < SUB_BUCKETS:
+        return like_points
+
+    shift = like_points.bit_length() - SUB_BUCKET_BITS - 1
+
+    return (shift + 1) * SUB_BUCKETS + (like_points >> shift) - SUB_BUCKETS
+
+
+def get_bucket_range(bucket: int) -> tuple:
+    """ヒストグラムの範囲を取得
+
+    Args:
+        bucket (int): 範囲の番号
+
+    Returns:
+        tuple: (下限(以上), 上限(未満))
+    """
+    if bucket < SUB_BUCKETS:
+        return bucket, bucket + 1
+
+    shift = bucket // SUB_BUCKETS - 1
+    mantissa = bucket % SUB_BUCKETS + SUB_BUCKETS
+
+    return mantissa << shift, (mantissa + 1) << shift
+
+
+def get_bucket_key(bucket: int) -> str:
+    """ヒストグラムの範囲のソートキーを取得
+
+    Args:
+        bucket (int): 範囲の番号
+
+    Returns:
+        str: ソートキー
+    """
+    return BUCKET_KEY_PREFIX + str(bucket).zfill(4)
+
+
+def rebuild(segments: int=None) -> dict:
+    """ユーザテーブルを並列スキャンしてランキングを再作成
+
+    分割されたいいねポイントも合計する。
+    再作成中の加算は反映されない場合があるため、書き込みの少ない時間に実行する
+
+    Args:
+        segments (int, optional): 並列スキャンの分割数
+            Defaults to None(LEADERBOARD_SCAN_SEGMENTS).
+
+    Returns:
+        dict: {'users': ユーザ数, 'buckets': 範囲の数, 'top': 上位の件数}
+    """
+    segments = segments or LEADERBOARD_SCAN_SEGMENTS
+    totals = defaultdict(int)
+    users = set()
+
+    results = run_parallel(
+        lambda segment: scan_segment(segment, segments),
+        range(segments),
+    )
+    for result in results:
+        if isinstance(result, Exception):
+            raise result
+
+        segment_totals, segment_users = result
+        for user_id, like_points in segment_totals.items():
+            totals[user_id] += like_points
+        users |= segment_users
+
+    # 削除済みユーザの分割アイテムは除く
+    scores = {user_id: totals[user_id] for user_id in users}
+    buckets = Counter(get_bucket(score) for score in scores.values())
+
+    top = heapq.nlargest(
+        LEADERBOARD_TOP_SIZE + LEADERBOARD_TOP_MARGIN,
+        scores.items(),
+        key=lambda x: (x[1], x[0]),
+    )
+    names = get_user_names([user_id for user_id, _ in top])
+    top_users = [
+        {
+            'userId': user_id,
+            'userName': names.get(user_id, ''),
+            'likePoints': score,
+        }
+        for user_id, score in top
+    ]
+    sort_users(top_users)
+
+    write_buckets(buckets)
+    write_top(top_users)
+    leaderboard_cache.clear()
+
+    return {
+        'users': len(scores),
+        'buckets': len(buckets),
+        'top': len(top_users),
+    }
+
+
+def scan_segment(segment: int, total_segments: int) -> tuple:
+    """ユーザテーブルの1区分をスキャンし、ユーザごとのいいねポイントを合計
+
+    Args:
+        segment (int): 区分
+        total_segments (int): 分割数
+
+    Returns:
+        tuple: (
+            dict: {ユーザID: いいねポイント(区分内の合計)},
+            set: 区分内のユーザIDの集合(分割アイテムを除く),
+        )
+    """
+    from boto3.dynamodb.conditions import Attr
+
+    totals = defaultdict(int)
+    users = set()
+
+    items = query_all(
+        table_user.scan,
+        Segment=segment,
+        TotalSegments=total_segments,
+        FilterExpression=Attr('key').eq('userId'),
+        ProjectionExpression='userId,likePoints,shardOf',
+    )
+    for item in items:
+        user_id = item.get('shardOf') or item['userId']
+        totals[user_id] += int(item.get('likePoints', 0))
+
+        if 'shardOf' not in item:
+            users.add(user_id)
+
+    return totals, users
+
+
+def write_buckets(buckets: dict):
+    """ヒストグラムを書き込み、使われなくなった範囲を削除
+
+    Args:
+        buckets (dict): {範囲の番号: ユーザ数}
+    """
+    keys = {get_bucket_key(bucket) for bucket in buckets}
+    requests = get_stale_requests(BUCKET_KEY_PREFIX, keys)
+    for bucket, count in sorted(buckets.items()):
+        low, high = get_bucket_range(bucket)
+        requests.append(
+            {
+                'PutRequest': {
+                    'Item': {
+                        'userId': LEADERBOARD_ID,
+                        'key': get_bucket_key(bucket),
+                        'count': count,
+                        'low': low,
+                        'high': high,
+                    },
+                },
+            },
+        )
+
+    batch_write(table_user, requests)
+
+
+def write_top(users: list):
+    """上位ランキングを書き込み、含まれなくなったユーザを削除
+
+    Args:
+        users (list): 上位ランキングのユーザリスト
+    """
+    keys = {get_top_key(user['userId'])['key'] for user in users}
+    requests = get_stale_requests(TOP_KEY_PREFIX, keys)
+
+    # 旧形式のアイテム
+    requests.append(
+        {
+            'DeleteRequest': {
+                'Key': {
+                    'userId': LEADERBOARD_ID,
+                    'key': LEGACY_TOP_KEY,
+                },
+            },
+        },
+    )
+    for user in users:
+        requests.append(
+            {
+                'PutRequest': {
+                    'Item': {
+                        **get_top_key(user['userId']),
+                        'userName': user['userName'],
+                        'likePoints': user['likePoints'],
+                    },
+                },
+            },
+        )
+
+    batch_write(table_user, requests)
+
+
+def get_stale_requests(prefix: str, keys: set) -> list:
+    """ランキングのアイテムのうち、書き込み対象外のものの削除リクエスト
+
+    Args:
+        prefix (str): ソートキーの接頭辞
+        keys (set): 書き込むソートキーの集合
+
+    Returns:
+        list: BatchWriteItemの削除リクエストリスト
+    """
+    from boto3.dynamodb.conditions import Key
+
+    return [
+        {
+            'DeleteRequest': {
+                'Key': {
+                    'userId': LEADERBOARD_ID,
+                    'key': item['key'],
+                },
+            },
+        }
+        for item in query_all(
+            table_user.query,
+            KeyConditionExpression=Key('userId').eq(LEADERBOARD_ID) &
+                Key('key').begins_with(prefix),
+            ProjectionExpression='#key',
+            ExpressionAttributeNames={
+                '#key': 'key',
+            },
+        )
+        if item['key'] not in keys
+    ]
+
+
+def get_user_names(user_ids: list) -> dict:
+    """ユーザ名をまとめて取得
+
+    Args:
+        user_ids (list): ユーザIDリスト
+
+    Returns:
+        dict: {ユーザID: ユーザ名}
+    """
+    names = {}
+
+    for i in range(0, len(user_ids), BATCH_GET_MAX):
+        request_items = {
+            table_user.name: {
+                'Keys': [
+                    {'userId': user_id, 'key': 'userId'}
+                    for user_id in user_ids[i:i + BATCH_GET_MAX]
+                ],
+                'ProjectionExpression': 'userId,userName',
+            },
+        }
+        while request_items:
+            response = get_resource('dynamodb').batch_get_item(
+                RequestItems=request_items,
+            )
+            for item in response.get('Responses', {}).get(
+                    table_user.name, []):
+                names[item['userId']] = item.get('userName', '')
+
+            request_items = response.get('UnprocessedKeys')
+
+    return names
+
+
+def get_top_key(user_id: str) -> dict:
+    """上位ランキングのユーザのアイテムのキーを取得
+
+    Args:
+        user_id (str): ユーザID
+
+    Returns:
+        dict: キー
+    """
+    return {
+        'userId': LEADERBOARD_ID,
+        'key': TOP_KEY_PREFIX + user_id,
+    }
+
+
+def rank_users(users: list) -> list:
+    """いいねポイントの降順のユーザリストに順位を付ける(同点は同順位)
+
+    Args:
+        users (list): いいねポイントの降順のユーザリスト
+
+    Returns:
+        list: 順位付きのユーザリスト
+    """
+    ranked = []
+    for i, user in enumerate(users):
+        if i > 0 and user['likePoints'] == users[i - 1]['likePoints']:
+            rank = ranked[-1]['rank']
+        else:
+            rank = i + 1
+
+        ranked.append({'rank': rank, **user})
+
+    return ranked
+
+
+def sort_users(users: list):
+    """ユーザリストをいいねポイントの降順(同点はユーザID順)にソート
+
+    Args:
+        users (list): ユーザリスト
+    """
+    users.sort(key=lambda x: (-x['likePoints'], x['userId']))
+
+
+def find_user(users: list, user_id: str) -> dict:
+    """ユーザリストからユーザを検索
+
+    Args:
+        users (list): ユーザリスト
+        user_id (str): ユーザID
+
+    Returns:
+        dict: ユーザ、存在しない場合None
+    """
+    for user in users:
+        if user['userId'] == user_id:
+            return user
+
+    return None
+
+
+def to_top_user(item: dict) -> dict:
+    """ユーザを上位ランキング用へ変換
+
+    Args:
+        item (dict): ユーザ
+
+    Returns:
+        dict: {'userId', 'userName', 'likePoints'}
+    """
+    return {
+        'userId': item['userId'],
+        'userName': item.get('userName', ''),
+        'likePoints': int(item.get('likePoints', 0)),
+    }
@@ -0,0 +1,454 @@
+from collections import OrderedDict
+from functools import partial
+
+from common import feed, leaderboard, point_history, user_version
+from common.concurrency import gather, get_condition_failures
+from common.const import LIKE_WRITE_MODE, SendReason
+from common.counter import (
+    get_increment_requests,
+    get_shard_count,
+    increment_like_points,
+)
+from common.event_queue import get_queue
+from common.exception import ConditionalCheckException
+from common.resource import Table, get_resource
+from common.util import get_jst_timestamp, make_point_history
+
+
+table_adage = Table.ADAGE
+table_user = Table.USER
+
+TABLES = {
+    'adage': table_adage,
+    'user': table_user,
+}
+
+# TransactWriteItemsで1度に書き込める最大件数
+TRANSACT_WRITE_MAX = 100
+
+
+def like_event(
+        table: str,
+        key: dict,
+        point: int=1,
+        must_exist: bool=False) -> dict:
+    """いいねポイント加算イベント作成
+
+    Args:
+        table (str): テーブル('adage' または 'user')
+        key (dict): アイテムのキー
+        point (int, optional): 増加分ポイント Defaults to 1.
+        must_exist (bool, optional): アイテムが存在しない場合は
+            同じイベントリストを書き込まない Defaults to False.
+
+    Returns:
+        dict: イベント
+    """
+    return {
+        'type': 'like',
+        'table': table,
+        'key': key,
+        'point': point,
+        'mustExist': must_exist,
+    }
+
+
+def history_event(
+        user_id: str,
+        reason: SendReason,
+        sender_id: str='admin',
+        sender_name: str='管理人',
+        jst_timestamp: float=None) -> dict:
+    """ポイント履歴登録イベント作成
+
+    日時は省略時、イベント作成時点のものを使用する
+
+    Args:
+        user_id (str): ユーザID
+        reason (SendReason): 送信理由
+        sender_id (str): 送信者ID
+        sender_name (str): 送信者名
+        jst_timestamp (float, optional): 日時 Defaults to None.
+
+    Returns:
+        dict: イベント
+    """
+    return {
+        'type': 'history',
+        'userId': user_id,
+        'reason': reason.value,
+        'senderId': sender_id,
+        'senderName': sender_name,
+        'dateTime': get_jst_timestamp() \
+            if jst_timestamp is None \
+            else jst_timestamp,
+    }
+
+
+def write(events: list):
+    """いいね・ハートのイベントを書き込む
+
+    asyncモードの場合はキューへ登録して即時に返り、集約関数で書き込む
+    (存在が必要なアイテムは登録前にまとめて確認する)
+
+    Args:
+        events (list): イベントリスト
+
+    Raises:
+        ConditionalCheckException: 存在が必要なアイテムが存在しない場合
+    """
+    if LIKE_WRITE_MODE == 'async':
+        check_exists(
+            [
+                (event['table'], event['key'])
+                for event in events
+                if event.get('mustExist')
+            ],
+        )
+        get_queue().put(
+            [
+                {**event, 'mustExist': False}
+                if event.get('mustExist') else event
+                for event in events
+            ],
+        )
+
+    else:
+        apply_events(events)
+
+
+def apply_events(events: list) -> dict:
+    """イベントを集約して書き込む
+
+    同じアイテムへの加算は合計して1回の更新にまとめ、
+    ポイント履歴はBatchWriteItemでまとめて登録する。
+    アイテムごとの更新と履歴の登録は互いに依存しないため並列で実行する。
+    書き込んだユーザの更新バージョンはユーザごとに1回だけ進める。
+    存在が必要なアイテムがある場合は、全ての加算と履歴の登録を
+    存在確認付きの1つのトランザクションにし、存在しない場合は何も書き込まない
+
+    Args:
+        events (list): イベントリスト
+
+    Raises:
+        ConditionalCheckException: 存在が必要なアイテムが存在しない場合
+
+    Returns:
+        dict: 書き込み件数
+    """
+    totals = OrderedDict()
+    required = set()
+    histories = []
+
+    for event in events:
+        if event['type'] == 'like':
+            key = (
+                event['table'],
+                tuple(sorted(event['key'].items())),
+            )
+            totals[key] = totals.get(key, 0) + int(event['point'])
+            if event.get('mustExist'):
+                required.add(key)
+
+        elif event['type'] == 'history':
+            histories.append(
+                make_point_history(
+                    event['userId'],
+                    SendReason(event['reason']),
+                    event['senderId'],
+                    event['senderName'],
+                    event['dateTime'],
+                ),
+            )
+
+    written = bool(required) \
+        and write_if_exists(totals, required, histories)
+
+    if not written:
+        # トランザクションの上限を超える場合は、先に存在を確認してから書き込む
+        check_exists(
+            [
+                (table, dict(key))
+                for table, key in totals
+                if (table, key) in required
+            ],
+        )
+
+        calls = {
+            (table, key): partial(
+                apply_like_points,
+                table,
+                dict(key),
+                point,
+                (table, key) in required,
+            )
+            for (table, key), point in totals.items()
+        }
+        if histories:
+            calls['histories'] = partial(put_histories, histories)
+
+        gather(calls)
+
+    # ユーザ本体の送信理由ごとの合計へ反映
+    if histories:
+        point_history.add_to_summaries(histories)
+
+    user_version.bump_all(
+        [dict(key)['userId'] for table, key in totals if table == 'user']
+        + [history['userId'] for history in histories],
+    )
+
+    return {
+        'events': len(events),
+        'updates': len(totals),
+        'histories': len(histories),
+    }
+
+
+def apply_like_points(
+        table: str,
+        key: dict,
+        point: int,
+        must_exist: bool=False):
+    """いいねポイントを加算し、格言の場合は月間ランキング、
+    ユーザの場合はユーザランキングへ反映
+
+    分割アイテムへ加算した場合は合計値を読まず、集約時に反映する
+
+    Args:
+        table (str): テーブル('adage' または 'user')
+        key (dict): アイテムのキー
+        point (int): 増加分ポイント
+        must_exist (bool, optional): アイテムが存在する場合のみ加算する
+            Defaults to False.
+
+    Raises:
+        ConditionalCheckException: アイテムが存在しない場合
+    """
+    from botocore.exceptions import ClientError
+
+    try:
+        old = increment_like_points(
+            TABLES[table],
+            key,
+            point,
+            must_exist,
+            return_values='ALL_OLD',
+        )
+
+    except ClientError as e:
+        if must_exist and get_condition_failures(e):
+            raise ConditionalCheckException(table, key)
+        raise e
+
+    if old is not None:
+        # 更新前の値から加算後のアイテムを作る(空の場合は加算で作成した)
+        item = {
+            **key,
+            **old,
+            'likePoints': old.get('likePoints', 0) + point,
+        }
+        apply_rankings(table, item, point, bool(old))
+
+
+def apply_folded(table: str, folded: dict):
+    """分割アイテムを集約した本体アイテムを月間ランキング、
+    ユーザランキングへ反映
+
+    Args:
+        table (str): テーブル('adage' または 'user')
+        folded (dict): {本体アイテムのキー(tuple): 集約したポイント}
+    """
+    for key, point in folded.items():
+        item = TABLES[table].get_item(Key=dict(key)).get('Item')
+
+        # 集約後に削除された場合
+        if item is None:
+            continue
+
+        apply_rankings(table, item, point)
+
+
+def apply_rankings(
+        table: str,
+        item: dict,
+        point: int,
+        existed: bool=True):
+    """加算後のアイテムを月間ランキング、ユーザランキングへ反映
+
+    Args:
+        table (str): テーブル('adage' または 'user')
+        item (dict): 加算後のアイテム
+        point (int): 加算したポイント
+        existed (bool, optional): 加算前にアイテムが存在したか
+            Defaults to True.
+    """
+    # 月間ランキングのいいねポイント更新
+    if table == 'adage':
+        feed.apply_like_points(item)
+
+    # ユーザランキングの更新
+    elif table == 'user':
+        leaderboard.apply_like_points(item, point, existed)
+
+
+def write_if_exists(
+        totals: OrderedDict, required: set, histories: list) -> bool:
+    """存在確認、加算、履歴の登録を1つのトランザクションで書き込み、
+    ランキングへ反映
+
+    Args:
+        totals (OrderedDict): {(テーブル, キー): 増加分ポイント}
+        required (set): 存在が必要な(テーブル, キー)
+        histories (list): ポイント履歴リスト
+
+    Raises:
+        ConditionalCheckException: 存在が必要なアイテムが存在しない場合
+
+    Returns:
+        bool: 書き込んだ場合True、トランザクションの上限を超える場合False
+    """
+    from botocore.exceptions import ClientError
+
+    # トランザクションの項目と、条件を満たさなかった場合の対象
+    transact_items = []
+    targets = []
+    for (table, key), point in totals.items():
+        requests = get_increment_requests(
+            TABLES[table],
+            dict(key),
+            point,
+            (table, key) in required,
+        )
+        transact_items += requests
+        targets += [(table, dict(key))] * len(requests)
+
+    transact_items += [
+        {
+            'Put': {
+                'TableName': table_user.name,
+                'Item': history,
+            },
+        }
+        for history in histories
+    ]
+
+    if len(transact_items) > TRANSACT_WRITE_MAX:
+        return False
+
+    # トランザクションは更新前の値を返さないため、存在確認のないユーザは
+    # 加算前に存在を読んでおく(加算で作成した場合はランキングへ追加になる)
+    existed = gather(
+        {
+            (table, key): partial(exists, table, dict(key))
+            for table, key in totals
+            if table == 'user'
+            and (table, key) not in required
+            and get_shard_count(TABLES[table]) <= 1
+        },
+    )
+
+    try:
+        table_user.meta.client.transact_write_items(
+            TransactItems=transact_items,
+        )
+
+    except ClientError as e:
+        failures = get_condition_failures(e)
+        if not failures:
+            raise e
+
+        raise ConditionalCheckException(*targets[failures[0]])
+
+    # トランザクションは更新後の値を返さないため読み直す(分割した場合は集約時)
+    for (table, key), point in totals.items():
+        if get_shard_count(TABLES[table]) > 1:
+            continue
+
+        item = TABLES[table].get_item(
+            Key=dict(key),
+            ConsistentRead=True,
+        ).get('Item')
+        if item is not None:
+            apply_rankings(
+                table,
+                item,
+                point,
+                existed.get((table, key), True),
+            )
+
+    return True
+
+
+def exists(table: str, key: dict) -> bool:
+    """アイテムが存在するか
+
+    Args:
+        table (str): テーブル('adage' または 'user')
+        key (dict): アイテムのキー
+
+    Returns:
+        bool: 存在する場合True
+    """
+    return 'Item' in TABLES[table].get_item(
+        Key=key,
+        ConsistentRead=True,
+        ProjectionExpression=','.join(f'#{name}' for name in key),
+        ExpressionAttributeNames={f'#{name}': name for name in key},
+    )
+
+
+def put_histories(histories: list):
+    """ポイント履歴を登録
+
+    Args:
+        histories (list): ポイント履歴リスト
+    """
+    if len(histories) == 1:
+        table_user.put_item(Item=histories[0])
+        return
+
+    with table_user.batch_writer(
+            overwrite_by_pkeys=['userId', 'key']) as batch:
+        for history in histories:
+            batch.put_item(Item=history)
+
+
+def check_exists(targets: list):
+    """アイテムの存在をまとめて確認
+
+    Args:
+        targets (list): 存在が必要なアイテム [(テーブル, キー)]
+
+    Raises:
+        ConditionalCheckException: アイテムが存在しない場合
+    """
+    if not targets:
+        return
+
+    request_items = {}
+    for table, key in targets:
+        request = request_items.setdefault(
+            TABLES[table].name,
+            {
+                'Keys': [],
+                'ProjectionExpression': ','.join(f'#{name}' for name in key),
+                'ExpressionAttributeNames': {f'#{name}': name for name in key},
+            },
+        )
+        if key not in request['Keys']:
+            request['Keys'].append(key)
+
+    found = []
+    while request_items:
+        response = get_resource('dynamodb').batch_get_item(
+            RequestItems=request_items,
+        )
+        for name, items in response.get('Responses', {}).items():
+            found += [(name, item) for item in items]
+
+        request_items = response.get('UnprocessedKeys')
+
+    for table, key in targets:
+        if (TABLES[table].name, key) not in found:
+            raise ConditionalCheckException(table, key)
@@ -0,0 +1,276 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+import hashlib
+import hmac
+from http import HTTPStatus
+import json
+import os
+import secrets
+
+from common.const import LAMBDA_STAGE
+from common.exception import ApplicationException
+from common.util import is_empty
+
+
+# カーソル改ざん検知用の署名キー(カーソルの作成、検証時に確認する)
+CURSOR_SECRET = os.environ.get('CURSOR_SECRET')
+# 署名キーの設定を省略できるステージ(プロセスごとのランダムなキーを使う)
+CURSOR_SECRET_OPTIONAL_STAGES = ('test',)
+
+# 1ページの最大件数
+MAX_PAGE_LIMIT = 1000
+
+
+def iterate_pages(method, **kwargs):
+    """LastEvaluatedKeyをたどりながらページ単位でアイテムを返す
+
+    Args:
+        method (function): Table.query または Table.scan
+
+    Yields:
+        list: 1ページ分のアイテムリスト
+    """
+    while True:
+        response = method(**kwargs)
+        yield response.get('Items', [])
+
+        if 'LastEvaluatedKey' not in response:
+            return
+
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def query_all(method, **kwargs) -> list:
+    """全ページのアイテムを取得
+
+    Args:
+        method (function): Table.query または Table.scan
+
+    Returns:
+        list: アイテムリスト
+    """
+    items = []
+    for page in iterate_pages(method, **kwargs):
+        items.extend(page)
+
+    return items
+
+
+def query_page(
+        method,
+        scope: str,
+        limit: int=None,
+        cursor: str=None,
+        **kwargs) -> tuple:
+    """カーソル位置から最大limit件のアイテムを取得
+
+    FilterExpressionで件数が減った場合も、limit件に達するか
+    最後のページまで読み進める
+
+    Args:
+        method (function): Table.query または Table.scan
+        scope (str): カーソルの利用範囲(別の検索条件への流用を防ぐ)
+        limit (int, optional): 最大件数、省略時は全件 Defaults to None.
+        cursor (str, optional): 前ページのカーソル Defaults to None.
+
+    Returns:
+        tuple: (
+            list: アイテムリスト,
+            str: 次ページのカーソル、最後のページの場合None,
+        )
+    """
+    if not is_empty(cursor):
+        kwargs['ExclusiveStartKey'] = decode_cursor(cursor, scope)
+
+    if limit is None:
+        return query_all(method, **kwargs), None
+
+    items = []
+    while True:
+        kwargs['Limit'] = limit - len(items)
+        response = method(**kwargs)
+        items.extend(response.get('Items', []))
+
+        last_key = response.get('LastEvaluatedKey')
+        if last_key is None:
+            return items, None
+
+        if len(items) >= limit:
+            return items, encode_cursor(last_key, scope)
+
+        kwargs['ExclusiveStartKey'] = last_key
+
+
+def paginate_list(
+        items: list,
+        scope: str,
+        limit: int=None,
+        cursor: str=None) -> tuple:
+    """取得済みのリストをカーソル位置から最大limit件に切り出す
+
+    Args:
+        items (list): アイテムリスト
+        scope (str): カーソルの利用範囲
+        limit (int, optional): 最大件数、省略時は全件 Defaults to None.
+        cursor (str, optional): 前ページのカーソル Defaults to None.
+
+    Returns:
+        tuple: (
+            list: アイテムリスト,
+            str: 次ページのカーソル、最後のページの場合None,
+        )
+    """
+    offset = 0
+    if not is_empty(cursor):
+        offset = int(decode_cursor(cursor, scope)['offset'])
+
+    if limit is None:
+        return items[offset:], None
+
+    end = offset + limit
+    next_cursor = encode_cursor({'offset': end}, scope) \
+        if end < len(items) \
+        else None
+
+    return items[offset:end], next_cursor
+
+
+def get_page_params(event: dict) -> tuple:
+    """イベントのクエリ文字列からページング条件を取得
+
+    Args:
+        event (dict): イベント
+
+    Raises:
+        ApplicationException: limitが不正な場合
+
+    Returns:
+        tuple: (
+            int: 最大件数、指定なしの場合None,
+            str: カーソル、指定なしの場合None,
+        )
+    """
+    params = (event or {}).get('queryStringParameters') or {}
+    limit = params.get('limit')
+    cursor = params.get('cursor')
+
+    if not is_empty(limit):
+        try:
+            limit = int(limit)
+        except ValueError:
+            limit = 0
+
+        if not 0 < limit <= MAX_PAGE_LIMIT:
+            raise ApplicationException(
+                HTTPStatus.BAD_REQUEST,
+                f'limit must be between 1 and {MAX_PAGE_LIMIT}.',
+            )
+
+    else:
+        limit = None
+
+    return limit, None if is_empty(cursor) else cursor
+
+
+def encode_cursor(key: dict, scope: str) -> str:
+    """ページ位置を署名付きの不透明なカーソルへ変換
+
+    Args:
+        key (dict): LastEvaluatedKey 等のページ位置
+        scope (str): カーソルの利用範囲
+
+    Returns:
+        str: カーソル
+    """
+    from boto3.dynamodb.types import TypeSerializer
+
+    serializer = TypeSerializer()
+    payload = json.dumps(
+        {k: serializer.serialize(v) for k, v in key.items()},
+        sort_keys=True,
+        separators=(',', ':'),
+    ).encode('utf-8')
+
+    return '.'.join(
+        [
+            _b64encode(payload),
+            _b64encode(_sign(payload, scope)),
+        ],
+    )
+
+
+def decode_cursor(cursor: str, scope: str) -> dict:
+    """カーソルをページ位置へ変換
+
+    Args:
+        cursor (str): カーソル
+        scope (str): カーソルの利用範囲
+
+    Raises:
+        ApplicationException: カーソルが不正、改ざんされている場合
+
+    Returns:
+        dict: ページ位置
+    """
+    from boto3.dynamodb.types import TypeDeserializer
+
+    deserializer = TypeDeserializer()
+    try:
+        payload, signature = cursor.split('.')
+        payload = _b64decode(payload)
+        signature = _b64decode(signature)
+
+        if not hmac.compare_digest(signature, _sign(payload, scope)):
+            raise ValueError('signature mismatch')
+
+        return {
+            k: deserializer.deserialize(v)
+            for k, v in json.loads(payload).items()
+        }
+
+    except (TypeError, ValueError, AttributeError, KeyError):
+        raise ApplicationException(
+            HTTPStatus.BAD_REQUEST,
+            'Invalid cursor.',
+        )
+
+
+def get_cursor_secret() -> str:
+    """カーソルの署名キーを取得
+
+    空のキーではカーソルを偽造できるため、未設定の場合は失敗させる
+    (カーソルを使わないAPIには影響させない)
+
+    Raises:
+        ApplicationException: 署名キーが未設定の場合
+
+    Returns:
+        str: 署名キー
+    """
+    global CURSOR_SECRET
+
+    if is_empty(CURSOR_SECRET):
+        if LAMBDA_STAGE not in CURSOR_SECRET_OPTIONAL_STAGES:
+            raise ApplicationException(
+                HTTPStatus.INTERNAL_SERVER_ERROR,
+                'CURSOR_SECRET is not set.',
+            )
+
+        CURSOR_SECRET = secrets.token_hex(32)
+
+    return CURSOR_SECRET
+
+
+def _sign(payload: bytes, scope: str) -> bytes:
+    return hmac.new(
+        get_cursor_secret().encode('utf-8'),
+        scope.encode('utf-8') + b'\n' + payload,
+        hashlib.sha256,
+    ).digest()[:16]
+
+
+def _b64encode(value: bytes) -> str:
+    return urlsafe_b64encode(value).decode('ascii').rstrip('=')
+
+
+def _b64decode(value: str) -> bytes:
+    return urlsafe_b64decode(value + '=' * (-len(value) % 4))
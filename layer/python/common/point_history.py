@@ -0,0 +1,1004 @@
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal
+import os
+
+from common import user_version
+from common.concurrency import (
+    BATCH_WRITE_MAX,
+    Throttle,
+    batch_write,
+    get_condition_failures,
+)
+from common.const import JST
+from common.paginator import (
+    decode_cursor,
+    encode_cursor,
+    paginate_list,
+    query_all,
+    query_page,
+)
+from common.resource import Table
+from common.util import (
+    POINT_KEY_PREFIX,
+    format_point_time,
+    get_jst_timestamp,
+    has_time,
+    is_empty,
+    make_point_key,
+)
+
+
+table_user = Table.USER
+
+# 日時順のソートキーへ移行済みのユーザに付けるバージョン
+POINT_KEY_VERSION = 2
+
+# 月ごと、送信理由ごとの集計済み履歴のソートキーの接頭辞
+ROLLUP_KEY_PREFIX = 'point#r#'
+
+# 送信理由ごとのポイント合計、件数を保持するユーザ本体の属性
+# ({送信理由: 値}、存在しない場合は未集計のユーザとして履歴から合計する)
+SUMMARY_POINTS = 'reasonPoints'
+SUMMARY_COUNTS = 'reasonCounts'
+
+# 集計対象にする履歴の経過日数
+COMPACTION_AGE_DAYS = int(os.environ.get('POINT_COMPACTION_AGE_DAYS', 90))
+
+# 集計済みの履歴をTTLで削除するまでの日数
+COMPACTED_EXPIRE_DAYS = int(
+    os.environ.get('POINT_COMPACTED_EXPIRE_DAYS', 7),
+)
+
+# TransactWriteItemsで1度に書き込める最大件数
+TRANSACT_WRITE_MAX = 100
+
+# 移行で1回のスキャンで読むアイテム数
+MIGRATION_SCAN_LIMIT = 100
+
+# 残り時間がこれを下回ったら移行を中断する(ミリ秒)
+TIME_MARGIN_MS = 10000
+
+# 移行の1秒あたりの最大書き込み件数
+MIGRATION_WRITES_PER_SECOND = int(
+    os.environ.get('POINT_MIGRATION_WRITES_PER_SECOND', 50),
+)
+
+
+def query_points(
+        user_id: str,
+        projection_list: list,
+        limit: int=None,
+        cursor: str=None,
+        since: float=None,
+        until: float=None,
+        migrated: bool=True,
+        consistent_read: bool=False) -> tuple:
+    """ポイント履歴を新しい順に取得
+
+    Args:
+        user_id (str): ユーザID
+        projection_list (list): 取得属性リスト
+        limit (int, optional): 最大件数、省略時は全件 Defaults to None.
+        cursor (str, optional): 前ページのカーソル Defaults to None.
+        since (float, optional): 開始日時(以降) Defaults to None.
+        until (float, optional): 終了日時(以前) Defaults to None.
+        migrated (bool, optional): 日時順のソートキーへ移行済みか否か
+            Defaults to True.
+        consistent_read (bool, optional): 強い整合性で読み込むか否か
+            Defaults to False.
+
+    Returns:
+        tuple: (
+            list: ポイント履歴,
+            str: 次ページのカーソル、最後のページの場合None,
+        )
+    """
+    from boto3.dynamodb.conditions import Attr, Key
+
+    scope = get_scope(user_id, since, until)
+
+    # 未移行の場合は全件取得して日時で並べ替える
+    if not migrated:
+        return query_legacy_points(
+            user_id, projection_list, limit, cursor, since, until, scope,
+            consistent_read,
+        )
+
+    lower = POINT_KEY_PREFIX
+    upper = POINT_KEY_PREFIX + '\uffff'
+    if since is not None:
+        lower = POINT_KEY_PREFIX + format_point_time(since)
+    if until is not None:
+        upper = POINT_KEY_PREFIX + format_point_time(until) + '#\uffff'
+
+    return query_page(
+        table_user.query,
+        scope,
+        limit,
+        cursor,
+        KeyConditionExpression=Key('userId').eq(user_id) &
+            Key('key').between(lower, upper),
+        FilterExpression=Attr('compacted').not_exists(),
+        ScanIndexForward=False,
+        ConsistentRead=consistent_read,
+        **get_projection(projection_list),
+    )
+
+
+def query_legacy_points(
+        user_id: str,
+        projection_list: list,
+        limit: int,
+        cursor: str,
+        since: float,
+        until: float,
+        scope: str,
+        consistent_read: bool=False) -> tuple:
+    """未移行ユーザのポイント履歴を新しい順に取得
+
+    Args:
+        user_id (str): ユーザID
+        projection_list (list): 取得属性リスト
+        limit (int): 最大件数
+        cursor (str): 前ページのカーソル
+        since (float): 開始日時(以降)
+        until (float): 終了日時(以前)
+        scope (str): カーソルの利用範囲
+        consistent_read (bool, optional): 強い整合性で読み込むか否か
+            Defaults to False.
+
+    Returns:
+        tuple: (
+            list: ポイント履歴,
+            str: 次ページのカーソル、最後のページの場合None,
+        )
+    """
+    from boto3.dynamodb.conditions import Attr, Key
+
+    items = query_all(
+        table_user.query,
+        KeyConditionExpression=Key('userId').eq(user_id) &
+            Key('key').begins_with('point#'),
+        FilterExpression=Attr('compacted').not_exists() &
+            Attr('dateTime').exists(),
+        ConsistentRead=consistent_read,
+        **get_projection(list(projection_list) + ['dateTime']),
+    )
+
+    items, next_cursor = paginate_points(
+        user_id, items, limit, cursor, since, until, False,
+    )
+
+    if 'dateTime' not in projection_list:
+        for item in items:
+            del item['dateTime']
+
+    return items, next_cursor
+
+
+def paginate_points(
+        user_id: str,
+        items: list,
+        limit: int=None,
+        cursor: str=None,
+        since: float=None,
+        until: float=None,
+        migrated: bool=True) -> tuple:
+    """取得済みのポイント履歴を新しい順に、query_pointsと同じカーソルで切り出す
+
+    Args:
+        user_id (str): ユーザID
+        items (list): ポイント履歴(key、dateTimeを含むこと)
+        limit (int, optional): 最大件数、省略時は全件 Defaults to None.
+        cursor (str, optional): 前ページのカーソル Defaults to None.
+        since (float, optional): 開始日時(以降) Defaults to None.
+        until (float, optional): 終了日時(以前) Defaults to None.
+        migrated (bool, optional): 日時順のソートキーへ移行済みか否か
+            Defaults to True.
+
+    Returns:
+        tuple: (
+            list: ポイント履歴,
+            str: 次ページのカーソル、最後のページの場合None,
+        )
+    """
+    scope = get_scope(user_id, since, until)
+    items = [
+        item for item in items
+        if 'dateTime' in item and not item.get('compacted')
+        and (since is None or item['dateTime'] >= Decimal(str(since)))
+        and (until is None or item['dateTime'] <= Decimal(str(until)))
+    ]
+
+    # 未移行の場合は日時で並べ替え、位置をカーソルにする
+    if not migrated:
+        items.sort(key=lambda x: x['dateTime'], reverse=True)
+        return paginate_list(items, 'legacy#' + scope, limit, cursor)
+
+    items.sort(key=lambda x: x['key'], reverse=True)
+    if not is_empty(cursor):
+        last_key = decode_cursor(cursor, scope)['key']
+        items = [item for item in items if item['key'] < last_key]
+
+    if limit is None or len(items) <= limit:
+        return items, None
+
+    items = items[:limit]
+    next_cursor = encode_cursor(
+        {
+            'userId': user_id,
+            'key': items[-1]['key'],
+        },
+        scope,
+    )
+
+    return items, next_cursor
+
+
+def is_migrated(user: dict) -> bool:
+    """ユーザのポイント履歴が日時順のソートキーへ移行済みか否か
+
+    Args:
+        user (dict): ユーザ(pointKeyVersionを含むこと)
+
+    Returns:
+        bool: 移行済みか否か
+    """
+    return int(user.get('pointKeyVersion', 1)) >= POINT_KEY_VERSION
+
+
+def migrate_users(
+        start_key: dict=None,
+        context=None,
+        writes_per_second: int=None) -> dict:
+    """未移行ユーザのポイント履歴のソートキーを日時順の形式へ書き換える
+
+    書き込み件数を1秒あたりの上限に抑え、稼働中のテーブルへの影響を抑える。
+    Lambdaの残り時間が少なくなった場合は中断し、続きのキーを返す
+
+    Args:
+        start_key (dict, optional): 前回の続きのキー Defaults to None.
+        context (dict, optional): コンテキスト Defaults to None.
+        writes_per_second (int, optional): 1秒あたりの最大書き込み件数
+            Defaults to None(MIGRATION_WRITES_PER_SECOND).
+
+    Returns:
+        dict: {
+            'users': 移行したユーザ数,
+            'rewritten': 書き換えた履歴数,
+            'lastEvaluatedKey': 続きのキー、完了した場合None,
+        }
+    """
+    from boto3.dynamodb.conditions import Attr
+
+    throttle = Throttle(writes_per_second or MIGRATION_WRITES_PER_SECOND)
+    result = {
+        'users': 0,
+        'rewritten': 0,
+        'lastEvaluatedKey': start_key,
+    }
+    scan_kwargs = {
+        'FilterExpression': Attr('key').eq('userId') &
+            Attr('pointKeyVersion').not_exists(),
+        'ProjectionExpression': 'userId',
+        'Limit': MIGRATION_SCAN_LIMIT,
+    }
+
+    while has_time(context, TIME_MARGIN_MS):
+        if not is_empty(result['lastEvaluatedKey']):
+            scan_kwargs['ExclusiveStartKey'] = result['lastEvaluatedKey']
+
+        response = table_user.scan(**scan_kwargs)
+
+        for user in response.get('Items', []):
+            result['rewritten'] += migrate_user(user['userId'], throttle)
+            result['users'] += 1
+
+        result['lastEvaluatedKey'] = response.get('LastEvaluatedKey')
+        if result['lastEvaluatedKey'] is None:
+            break
+
+    return result
+
+
+def migrate_user(user_id: str, throttle=None) -> int:
+    """ユーザのポイント履歴のソートキーを日時順の形式へ書き換える
+
+    新しいキーの履歴の登録と古いキーの削除を同じバッチで行う。
+    途中で失敗しても、再実行すると同じキーへ書き換えるため重複しない
+
+    Args:
+        user_id (str): ユーザID
+        throttle (Throttle, optional): 書き込み件数の制限
+            Defaults to None.
+
+    Returns:
+        int: 書き換えた履歴数
+    """
+    from boto3.dynamodb.conditions import Key
+
+    items = [
+        item for item in query_all(
+            table_user.query,
+            KeyConditionExpression=Key('userId').eq(user_id) &
+                Key('key').begins_with('point#'),
+        )
+        if not item['key'].startswith(POINT_KEY_PREFIX)
+    ]
+
+    # 登録と削除で2件になるため、1バッチあたり半分の件数ずつ書き換える
+    per_batch = BATCH_WRITE_MAX // 2
+    for i in range(0, len(items), per_batch):
+        requests = []
+        for item in items[i:i + per_batch]:
+            requests.append(
+                {'PutRequest': {'Item': to_time_ordered(item)}},
+            )
+            requests.append(
+                {
+                    'DeleteRequest': {
+                        'Key': {
+                            'userId': user_id,
+                            'key': item['key'],
+                        },
+                    },
+                },
+            )
+
+        if throttle is not None:
+            throttle.wait(len(requests))
+        batch_write(table_user, requests)
+
+    table_user.update_item(
+        Key={
+            'userId': user_id,
+            'key': 'userId',
+        },
+        UpdateExpression='set pointKeyVersion=:version',
+        ConditionExpression='attribute_exists(userId)',
+        ExpressionAttributeValues={
+            ':version': POINT_KEY_VERSION,
+        },
+    )
+    user_version.bump(user_id)
+
+    return len(items)
+
+
+def to_time_ordered(item: dict) -> dict:
+    """旧形式(point#<送信者ID>#<日時>)の履歴を日時順のキーへ変換
+
+    Args:
+        item (dict): 旧形式の履歴
+
+    Returns:
+        dict: 日時順のキーの履歴
+    """
+    sender_id = item.get('senderId')
+    if sender_id is None:
+        sender_id = item['key'].split('#')[1]
+
+    jst_timestamp = float(
+        item.get('dateTime', item['key'].rsplit('#', 1)[-1]),
+    )
+
+    return {
+        **item,
+        'key': make_point_key(sender_id, jst_timestamp),
+    }
+
+
+def get_projection(projection_list: list) -> dict:
+    """取得属性リストからProjectionExpressionの引数を作成
+
+    Args:
+        projection_list (list): 取得属性リスト
+
+    Returns:
+        dict: ProjectionExpression、ExpressionAttributeNames
+    """
+    return {
+        'ProjectionExpression': ','.join(
+            f'#{item}' for item in projection_list
+        ),
+        'ExpressionAttributeNames': {
+            f'#{item}': item for item in projection_list
+        },
+    }
+
+
+def compact_users(
+        start_key: dict=None,
+        context=None,
+        age_days: int=None) -> dict:
+    """移行済みユーザの古い履歴を月ごと、送信理由ごとの集計へまとめる
+
+    Lambdaの残り時間が少なくなった場合は中断し、続きのキーを返す
+
+    Args:
+        start_key (dict, optional): 前回の続きのキー Defaults to None.
+        context (dict, optional): コンテキスト Defaults to None.
+        age_days (int, optional): 集計対象にする履歴の経過日数
+            Defaults to None(COMPACTION_AGE_DAYS).
+
+    Returns:
+        dict: {
+            'users': 処理したユーザ数,
+            'compacted': 集計した履歴数,
+            'lastEvaluatedKey': 続きのキー、完了した場合None,
+        }
+    """
+    from boto3.dynamodb.conditions import Attr
+
+    now = get_jst_timestamp()
+    cutoff = now - (age_days or COMPACTION_AGE_DAYS) * 86400
+    expires_at = int(now) + COMPACTED_EXPIRE_DAYS * 86400
+
+    result = {
+        'users': 0,
+        'compacted': 0,
+        'lastEvaluatedKey': start_key,
+    }
+    scan_kwargs = {
+        'FilterExpression': Attr('key').eq('userId') &
+            Attr('pointKeyVersion').gte(POINT_KEY_VERSION),
+        'ProjectionExpression': 'userId',
+        'Limit': MIGRATION_SCAN_LIMIT,
+    }
+
+    while has_time(context, TIME_MARGIN_MS):
+        if not is_empty(result['lastEvaluatedKey']):
+            scan_kwargs['ExclusiveStartKey'] = result['lastEvaluatedKey']
+
+        response = table_user.scan(**scan_kwargs)
+
+        for user in response.get('Items', []):
+            result['compacted'] += compact_user(
+                user['userId'], cutoff, expires_at,
+            )
+            result['users'] += 1
+
+        result['lastEvaluatedKey'] = response.get('LastEvaluatedKey')
+        if result['lastEvaluatedKey'] is None:
+            break
+
+    return result
+
+
+def compact_user(user_id: str, cutoff: float, expires_at: int) -> int:
+    """ユーザの古い履歴を月ごと、送信理由ごとの集計へまとめる
+
+    集計への加算と履歴への集計済みの印付けを同じトランザクションで行う。
+    集計済みの履歴は読み取りから除外し、TTL(expiresAt)で削除させる
+
+    Args:
+        user_id (str): ユーザID
+        cutoff (float): この日時以前の履歴を集計する
+        expires_at (int): 集計済みの履歴を削除する日時(UNIX時間)
+
+    Returns:
+        int: 集計した履歴数
+    """
+    from boto3.dynamodb.conditions import Attr, Key
+
+    items = query_all(
+        table_user.query,
+        KeyConditionExpression=Key('userId').eq(user_id) &
+            Key('key').between(
+                POINT_KEY_PREFIX,
+                POINT_KEY_PREFIX + format_point_time(cutoff) + '#\uffff',
+            ),
+        FilterExpression=Attr('compacted').not_exists(),
+        ProjectionExpression='#key,#reason,#point,#dateTime',
+        ExpressionAttributeNames={
+            '#key': 'key',
+            '#reason': 'reason',
+            '#point': 'point',
+            '#dateTime': 'dateTime',
+        },
+    )
+
+    groups = defaultdict(list)
+    for item in items:
+        month = get_month(float(item['dateTime']))
+        groups[(month, int(item['reason']))].append(item)
+
+    compacted = 0
+    for (month, reason), group in groups.items():
+        # 集計の更新1件と履歴の更新でトランザクションの上限に収める
+        per_transaction = TRANSACT_WRITE_MAX - 1
+        for i in range(0, len(group), per_transaction):
+            compacted += compact_rows(
+                user_id,
+                month,
+                reason,
+                group[i:i + per_transaction],
+                expires_at,
+            )
+
+    # 集計済みの履歴は履歴一覧に含まれなくなるため
+    if compacted:
+        user_version.bump(user_id)
+
+    return compacted
+
+
+def compact_rows(
+        user_id: str,
+        month: str,
+        reason: int,
+        items: list,
+        expires_at: int) -> int:
+    """同じ月、送信理由の履歴を集計へ加算し、集計済みにする
+
+    他の処理で集計済み、削除済みの履歴が含まれトランザクションが
+    取り消された場合は、1件ずつ処理し直す
+
+    Args:
+        user_id (str): ユーザID
+        month (str): 月(YYYYMM)
+        reason (int): 送信理由
+        items (list): 履歴リスト
+        expires_at (int): 集計済みの履歴を削除する日時(UNIX時間)
+
+    Returns:
+        int: 集計した履歴数
+    """
+    from botocore.exceptions import ClientError
+
+    rollup = {
+        'Update': {
+            'TableName': table_user.name,
+            'Key': {
+                'userId': user_id,
+                'key': get_rollup_key(month, reason),
+            },
+            'UpdateExpression': 'ADD #point :point, #count :count '
+                'SET #month = :month, #reason = :reason',
+            'ExpressionAttributeNames': {
+                '#point': 'point',
+                '#count': 'count',
+                '#month': 'month',
+                '#reason': 'reason',
+            },
+            'ExpressionAttributeValues': {
+                ':point': sum(item['point'] for item in items),
+                ':count': len(items),
+                ':month': month,
+                ':reason': reason,
+            },
+        },
+    }
+    marks = [
+        {
+            'Update': {
+                'TableName': table_user.name,
+                'Key': {
+                    'userId': user_id,
+                    'key': item['key'],
+                },
+                'UpdateExpression':
+                    'SET compacted = :compacted, expiresAt = :expiresAt',
+                'ConditionExpression': 'attribute_exists(userId) '
+                    'AND attribute_not_exists(compacted)',
+                'ExpressionAttributeValues': {
+                    ':compacted': True,
+                    ':expiresAt': expires_at,
+                },
+            },
+        }
+        for item in items
+    ]
+
+    try:
+        table_user.meta.client.transact_write_items(
+            TransactItems=[rollup] + marks,
+        )
+        return len(items)
+
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'TransactionCanceledException':
+            raise e
+
+        # 1件の場合は他の処理で集計済み、または削除済み
+        if len(items) == 1:
+            return 0
+
+    return sum(
+        compact_rows(user_id, month, reason, [item], expires_at)
+        for item in items
+    )
+
+
+def get_point_summary(
+        user_id: str,
+        consistent_read: bool=False,
+        user: dict=None) -> list:
+    """送信理由ごとのポイント合計を取得
+
+    ユーザ本体に保持した合計を返す。
+    未集計のユーザの場合のみ、集計済みの月ごとの合計と未集計の履歴を合算する
+
+    Args:
+        user_id (str): ユーザID
+        consistent_read (bool, optional): 強い整合性で読み込むか否か
+            Defaults to False.
+        user (dict, optional): 取得済みのユーザ本体(合計の属性を含むこと)
+            Defaults to None.
+
+    Returns:
+        list: [{'reason': 送信理由, 'point': 合計, 'count': 件数}]
+    """
+    if user is None:
+        user = table_user.get_item(
+            Key={
+                'userId': user_id,
+                'key': 'userId',
+            },
+            ProjectionExpression=f'{SUMMARY_POINTS},{SUMMARY_COUNTS}',
+            ConsistentRead=consistent_read,
+        ).get('Item', {})
+
+    if SUMMARY_POINTS in user:
+        return to_summary(user)
+
+    return query_point_summary(user_id, consistent_read)
+
+
+def query_point_summary(
+        user_id: str, consistent_read: bool=False) -> list:
+    """履歴から送信理由ごとのポイント合計を計算
+
+    集計済みの月ごとの合計と、未集計の履歴を合算する
+
+    Args:
+        user_id (str): ユーザID
+        consistent_read (bool, optional): 強い整合性で読み込むか否か
+            Defaults to False.
+
+    Returns:
+        list: [{'reason': 送信理由, 'point': 合計, 'count': 件数}]
+    """
+    from boto3.dynamodb.conditions import Attr, Key
+
+    items = query_all(
+        table_user.query,
+        KeyConditionExpression=Key('userId').eq(user_id) &
+            Key('key').begins_with('point#'),
+        FilterExpression=Attr('compacted').not_exists(),
+        ProjectionExpression='#key,#reason,#point,#count',
+        ExpressionAttributeNames={
+            '#key': 'key',
+            '#reason': 'reason',
+            '#point': 'point',
+            '#count': 'count',
+        },
+        ConsistentRead=consistent_read,
+    )
+
+    return summarize_points(items)
+
+
+def to_summary(user: dict) -> list:
+    """ユーザ本体に保持した合計から送信理由ごとのポイント合計を作成
+
+    Args:
+        user (dict): ユーザ本体(合計の属性を含むこと)
+
+    Returns:
+        list: [{'reason': 送信理由, 'point': 合計, 'count': 件数}]
+    """
+    points = user.get(SUMMARY_POINTS, {})
+    counts = user.get(SUMMARY_COUNTS, {})
+
+    return [
+        {
+            'reason': int(reason),
+            'point': int(points.get(reason, 0)),
+            'count': int(counts[reason]),
+        }
+        for reason in sorted(counts, key=int)
+        if int(counts[reason]) > 0
+    ]
+
+
+def make_summary(histories: list) -> dict:
+    """登録するユーザ本体へ付ける合計の属性を作成
+
+    Args:
+        histories (list): 同時に登録するポイント履歴リスト
+
+    Returns:
+        dict: {SUMMARY_POINTS: {送信理由: 合計}, SUMMARY_COUNTS: {送信理由: 件数}}
+    """
+    points = defaultdict(int)
+    counts = defaultdict(int)
+    for history in histories:
+        reason = str(int(history['reason']))
+        points[reason] += int(history['point'])
+        counts[reason] += 1
+
+    return {
+        SUMMARY_POINTS: dict(points),
+        SUMMARY_COUNTS: dict(counts),
+    }
+
+
+def add_to_summaries(histories: list, sign: int=1):
+    """登録、削除したポイント履歴をユーザ本体の合計へ反映
+
+    未集計(合計の属性がない)、削除済みのユーザは更新しない
+
+    Args:
+        histories (list): ポイント履歴リスト(userId、reason、pointを含むこと)
+        sign (int, optional): 削除の場合-1 Defaults to 1.
+    """
+    from botocore.exceptions import ClientError
+
+    totals = defaultdict(lambda: defaultdict(lambda: [0, 0]))
+    for history in histories:
+        total = totals[history['userId']][str(int(history['reason']))]
+        total[0] += sign * int(history['point'])
+        total[1] += sign
+
+    for user_id, reasons in totals.items():
+        expressions = []
+        names = {
+            '#points': SUMMARY_POINTS,
+            '#counts': SUMMARY_COUNTS,
+        }
+        values = {':zero': 0}
+        for i, (reason, (point, count)) in enumerate(reasons.items()):
+            names[f'#r{i}'] = reason
+            values[f':p{i}'] = point
+            values[f':c{i}'] = count
+            expressions += [
+                f'#points.#r{i} = if_not_exists(#points.#r{i}, :zero)'
+                f' + :p{i}',
+                f'#counts.#r{i} = if_not_exists(#counts.#r{i}, :zero)'
+                f' + :c{i}',
+            ]
+
+        try:
+            table_user.update_item(
+                Key={
+                    'userId': user_id,
+                    'key': 'userId',
+                },
+                UpdateExpression='SET ' + ', '.join(expressions),
+                ConditionExpression='attribute_exists(#points)',
+                ExpressionAttributeNames=names,
+                ExpressionAttributeValues=values,
+            )
+
+        except ClientError as e:
+            if not get_condition_failures(e):
+                raise e
+
+
+def summarize_users(start_key: dict=None, context=None) -> dict:
+    """未集計ユーザの送信理由ごとの合計を履歴から作成し、ユーザ本体へ保持する
+
+    作成中の履歴の登録は合計に含まれない場合があるため、
+    書き込みの少ない時間に実行する。
+    Lambdaの残り時間が少なくなった場合は中断し、続きのキーを返す
+
+    Args:
+        start_key (dict, optional): 前回の続きのキー Defaults to None.
+        context (dict, optional): コンテキスト Defaults to None.
+
+    Returns:
+        dict: {
+            'users': 処理したユーザ数,
+            'lastEvaluatedKey': 続きのキー、完了した場合None,
+        }
+    """
+    from boto3.dynamodb.conditions import Attr
+    from botocore.exceptions import ClientError
+
+    result = {
+        'users': 0,
+        'lastEvaluatedKey': start_key,
+    }
+    scan_kwargs = {
+        'FilterExpression': Attr('key').eq('userId') &
+            Attr(SUMMARY_POINTS).not_exists(),
+        'ProjectionExpression': 'userId',
+        'Limit': MIGRATION_SCAN_LIMIT,
+    }
+
+    while has_time(context, TIME_MARGIN_MS):
+        if not is_empty(result['lastEvaluatedKey']):
+            scan_kwargs['ExclusiveStartKey'] = result['lastEvaluatedKey']
+
+        response = table_user.scan(**scan_kwargs)
+
+        for user in response.get('Items', []):
+            summary = query_point_summary(user['userId'], True)
+            try:
+                table_user.update_item(
+                    Key={
+                        'userId': user['userId'],
+                        'key': 'userId',
+                    },
+                    UpdateExpression='SET #points = :points,'
+                        ' #counts = :counts',
+                    ConditionExpression='attribute_exists(userId)'
+                        ' AND attribute_not_exists(#points)',
+                    ExpressionAttributeNames={
+                        '#points': SUMMARY_POINTS,
+                        '#counts': SUMMARY_COUNTS,
+                    },
+                    ExpressionAttributeValues={
+                        ':points': {
+                            str(total['reason']): total['point']
+                            for total in summary
+                        },
+                        ':counts': {
+                            str(total['reason']): total['count']
+                            for total in summary
+                        },
+                    },
+                )
+
+            except ClientError as e:
+                if not get_condition_failures(e):
+                    raise e
+
+            result['users'] += 1
+
+        result['lastEvaluatedKey'] = response.get('LastEvaluatedKey')
+        if result['lastEvaluatedKey'] is None:
+            break
+
+    return result
+
+
+def summarize_points(items: list) -> list:
+    """取得済みの履歴と集計から送信理由ごとのポイント合計を計算
+
+    Args:
+        items (list): 未集計の履歴と集計(key、reason、point、countを含むこと)
+
+    Returns:
+        list: [{'reason': 送信理由, 'point': 合計, 'count': 件数}]
+    """
+    totals = defaultdict(lambda: {'point': 0, 'count': 0})
+    for item in items:
+        total = totals[int(item['reason'])]
+        total['point'] += int(item['point'])
+
+        # 集計済みの場合は件数を持つ
+        if item['key'].startswith(ROLLUP_KEY_PREFIX):
+            total['count'] += int(item['count'])
+        else:
+            total['count'] += 1
+
+    return [
+        {'reason': reason, **total}
+        for reason, total in sorted(totals.items())
+    ]
+
+
+def delete_point(user_id: str, key: str) -> bool:
+    """履歴を削除(集計済みの場合は集計から差し引く)
+
+    存在確認は削除の条件で行い、条件を満たさなかった場合のみ読み直す
+
+    Args:
+        user_id (str): ユーザID
+        key (str): ソートキー
+
+    Returns:
+        bool: 削除したか否か(存在しない場合False)
+    """
+    from botocore.exceptions import ClientError
+
+    item_key = {
+        'userId': user_id,
+        'key': key,
+    }
+
+    try:
+        deleted = table_user.delete_item(
+            Key=item_key,
+            ConditionExpression='attribute_exists(userId) '
+                'AND attribute_not_exists(compacted)',
+            ReturnValues='ALL_OLD',
+        )['Attributes']
+        add_to_summaries([deleted], -1)
+        user_version.bump(user_id)
+        return True
+
+    except ClientError as e:
+        if not get_condition_failures(e):
+            raise e
+
+    item = table_user.get_item(Key=item_key, ConsistentRead=True).get('Item')
+    if is_empty(item) or not item.get('compacted'):
+        return False
+
+    try:
+        table_user.meta.client.transact_write_items(
+            TransactItems=[
+                {
+                    'Delete': {
+                        'TableName': table_user.name,
+                        'Key': item_key,
+                        'ConditionExpression': 'attribute_exists(compacted)',
+                    },
+                },
+                {
+                    'Update': {
+                        'TableName': table_user.name,
+                        'Key': {
+                            'userId': user_id,
+                            'key': get_rollup_key(
+                                get_month(float(item['dateTime'])),
+                                int(item['reason']),
+                            ),
+                        },
+                        'UpdateExpression': 'ADD #point :point, #count :count',
+                        'ExpressionAttributeNames': {
+                            '#point': 'point',
+                            '#count': 'count',
+                        },
+                        'ExpressionAttributeValues': {
+                            ':point': -item['point'],
+                            ':count': -1,
+                        },
+                    },
+                },
+            ],
+        )
+
+    except ClientError as e:
+        # 他の処理で削除済み
+        if get_condition_failures(e):
+            return False
+        raise e
+
+    add_to_summaries([item], -1)
+    user_version.bump(user_id)
+
+    return True
+
+
+def get_scope(user_id: str, since: float, until: float) -> str:
+    """ポイント履歴のカーソルの利用範囲を取得
+
+    Args:
+        user_id (str): ユーザID
+        since (float): 開始日時(以降)
+        until (float): 終了日時(以前)
+
+    Returns:
+        str: カーソルの利用範囲
+    """
+    return '#'.join(['point', user_id, str(since), str(until)])
+
+
+def get_rollup_key(month: str, reason: int) -> str:
+    """集計済み履歴のソートキーを取得
+
+    Args:
+        month (str): 月(YYYYMM)
+        reason (int): 送信理由
+
+    Returns:
+        str: ソートキー
+    """
+    return ROLLUP_KEY_PREFIX + '#'.join([month, str(int(reason))])
+
+
+def get_month(jst_timestamp: float) -> str:
+    """日時から月(YYYYMM)を取得
+
+    Args:
+        jst_timestamp (float): 日時
+
+    Returns:
+        str: 月(YYYYMM)
+    """
+    return datetime.fromtimestamp(jst_timestamp, JST).strftime('%Y%m')
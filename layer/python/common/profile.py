@@ -0,0 +1,179 @@
+from functools import partial
+
+from common import point_history
+from common.concurrency import gather
+from common.exception import ApplicationException
+from common.paginator import query_all
+from common.resource import Table
+from common.util import is_empty
+
+
+table_user = Table.USER
+
+
+def load_profile(
+        user_id: str,
+        projections: dict,
+        limit: int=None,
+        cursor: str=None,
+        since: float=None,
+        until: float=None,
+        consistent_read: bool=False) -> dict:
+    """ユーザ本体、投稿エピソード、ポイント履歴1ページ、送信理由ごとの合計を
+    読み込む
+
+    パーティション内の範囲ごとの読み込みを並列に行い、約1往復で取得する。
+    ポイント履歴はquery_pointsでソートキーの範囲と最大件数を指定し、
+    ページ外の履歴は読まない。送信理由ごとの合計はユーザ本体に保持したものを
+    使い、履歴から合計し直さない(未集計のユーザを除く)
+
+    Args:
+        user_id (str): ユーザID
+        projections (dict): 分類ごとの取得属性リスト({
+            'user': [...],
+            'episodes': [...],
+            'points': [...],
+        })
+        limit (int, optional): ポイント履歴の最大件数 Defaults to None.
+        cursor (str, optional): ポイント履歴の前ページのカーソル
+            Defaults to None.
+        since (float, optional): 開始日時(以降) Defaults to None.
+        until (float, optional): 終了日時(以前) Defaults to None.
+        consistent_read (bool, optional): 強い整合性で読み込むか否か
+            Defaults to False.
+
+    Returns:
+        dict: {
+            'user': ユーザ、存在しない場合は空のdict,
+            'episodes': 投稿エピソードリスト,
+            'points': ポイント履歴リスト(新しい順),
+            'nextCursor': 次ページのカーソル、最後のページの場合None,
+            'summary': 送信理由ごとのポイント合計,
+        }
+    """
+    query_points = partial(
+        point_history.query_points,
+        user_id,
+        projections['points'],
+        limit,
+        cursor,
+        since,
+        until,
+        consistent_read=consistent_read,
+    )
+
+    results = gather(
+        {
+            'user': partial(
+                get_user, user_id, projections['user'], consistent_read,
+            ),
+            'episodes': partial(
+                query_episodes,
+                user_id,
+                projections['episodes'],
+                consistent_read,
+            ),
+            # 移行済みとして読み、未移行の場合は読み直す
+            'points': partial(try_query_points, query_points),
+        },
+    )
+    user = results['user']
+
+    points = results['points']
+    summary = []
+    if is_empty(user):
+        points = ([], None)
+
+    else:
+        if points is None or not point_history.is_migrated(user):
+            points = query_points(migrated=False)
+
+        summary = point_history.get_point_summary(
+            user_id, consistent_read, user,
+        )
+
+    user = {
+        name: value for name, value in user.items()
+        if name in projections['user']
+    }
+
+    return {
+        'user': user,
+        'episodes': results['episodes'],
+        'points': points[0],
+        'nextCursor': points[1],
+        'summary': summary,
+    }
+
+
+def get_user(
+        user_id: str, projection_list: list, consistent_read: bool) -> dict:
+    """ユーザ本体を取得(移行状態の判定、送信理由ごとの合計の属性を含む)
+
+    Args:
+        user_id (str): ユーザID
+        projection_list (list): 取得属性リスト
+        consistent_read (bool): 強い整合性で読み込むか否か
+
+    Returns:
+        dict: ユーザ、存在しない場合は空のdict
+    """
+    names = sorted(
+        set(projection_list) | {
+            'pointKeyVersion',
+            point_history.SUMMARY_POINTS,
+            point_history.SUMMARY_COUNTS,
+        },
+    )
+
+    return table_user.get_item(
+        Key={
+            'userId': user_id,
+            'key': 'userId',
+        },
+        ProjectionExpression=','.join(f'#{name}' for name in names),
+        ExpressionAttributeNames={f'#{name}': name for name in names},
+        ConsistentRead=consistent_read,
+    ).get('Item', {})
+
+
+def query_episodes(
+        user_id: str, projection_list: list, consistent_read: bool) -> list:
+    """投稿エピソードを取得
+
+    Args:
+        user_id (str): ユーザID
+        projection_list (list): 取得属性リスト
+        consistent_read (bool): 強い整合性で読み込むか否か
+
+    Returns:
+        list: 投稿エピソードリスト
+    """
+    from boto3.dynamodb.conditions import Key
+
+    return query_all(
+        table_user.query,
+        KeyConditionExpression=Key('userId').eq(user_id) &
+            Key('key').begins_with('episode#'),
+        ConsistentRead=consistent_read,
+        **point_history.get_projection(projection_list),
+    )
+
+
+def try_query_points(query_points) -> tuple:
+    """移行済みとしてポイント履歴を取得
+
+    未移行のユーザのカーソルは移行済みの範囲では使えないため、
+    その場合は読み直しに任せる
+
+    Args:
+        query_points (function): query_pointsの部分適用
+
+    Returns:
+        tuple: query_pointsの結果、カーソルが使えない場合None
+    """
+    try:
+        return query_points(migrated=True)
+
+    except ApplicationException:
+        return None
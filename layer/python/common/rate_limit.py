@@ -0,0 +1,221 @@
+from decimal import Decimal
+import logging
+import math
+import os
+import time
+
+from common.cache import TTLCache
+from common.exception import RateLimitException
+from common.resource import Table
+
+
+logger = logging.getLogger('share-adage-service')
+
+table_control = Table.CONTROL
+
+# 認証なしの書き込みのレート制限(送信元IP、ルートごとのトークンバケット)
+RATE_LIMIT_ENABLED = \
+    os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+# バケットの容量(連続して受け付ける件数)
+RATE_LIMIT_CAPACITY = int(os.environ.get('RATE_LIMIT_CAPACITY', 10))
+# 1秒あたりに補充する件数
+RATE_LIMIT_REFILL_RATE = float(
+    os.environ.get('RATE_LIMIT_REFILL_RATE', 10 / 60),
+)
+
+# コンテナ内で保持するバケットの有効期限(秒)、件数
+RATE_LIMIT_CACHE_TTL = int(os.environ.get('RATE_LIMIT_CACHE_TTL', 60))
+RATE_LIMIT_CACHE_SIZE = int(os.environ.get('RATE_LIMIT_CACHE_SIZE', 1024))
+
+# 共有バケットの更新が競合した場合の再試行回数
+RATE_LIMIT_RETRY = 3
+
+RATE_LIMIT_PREFIX = 'ratelimit#'
+
+# 最後に確認した共有バケットの状態{キー: (トークン数, 更新時刻)}
+bucket_cache = TTLCache(RATE_LIMIT_CACHE_TTL, RATE_LIMIT_CACHE_SIZE)
+
+
+def check_rate_limit(event: dict, route: str):
+    """送信元IP、ルートごとのリクエスト数を制限する
+
+    業務データの書き込み前に呼び出す。コンテナ内のバケットが空の場合は
+    DynamoDBへアクセスせずに拒否し、それ以外は共有バケット(controlTable)から
+    条件付き書き込みでトークンを1つ取得する。
+    共有バケットの更新に失敗した場合は受け付ける
+
+    Args:
+        event (dict): イベント
+        route (str): ルート
+
+    Raises:
+        RateLimitException: 上限を超えた場合
+    """
+    if not RATE_LIMIT_ENABLED:
+        return
+
+    key = RATE_LIMIT_PREFIX + '#'.join([route, get_source_ip(event)])
+    now = time.time()
+
+    # コンテナ内のバケット(共有バケット以上のトークンを持つ)が空の場合
+    state = bucket_cache.get(key)
+    if state is not None:
+        tokens = refill(state, now)
+        if tokens < 1:
+            raise_limited(key, tokens)
+
+    try:
+        tokens = take_shared(key, state, now)
+
+    except Exception as e:
+        logger.warning(
+            'Rate limit check failed. ' + str(type(e)) + ':' + str(e),
+        )
+        return
+
+    if tokens < 1:
+        raise_limited(key, tokens)
+
+
+def take_shared(key: str, state: tuple, now: float) -> float:
+    """共有バケットからトークンを1つ取得(更新時刻による楽観ロック)
+
+    Args:
+        key (str): バケットのキー
+        state (tuple): 最後に確認した(トークン数, 更新時刻)、不明な場合None
+        now (float): 現在時刻
+
+    Returns:
+        float: 取得前のトークン数(1未満の場合は取得していない)
+    """
+    from botocore.exceptions import ClientError
+
+    for _ in range(RATE_LIMIT_RETRY):
+        if state is None:
+            state = get_shared(key)
+
+        tokens = refill(state, now)
+        if tokens < 1:
+            # 補充されるまでコンテナ内で拒否する
+            bucket_cache.set(key, state)
+            return tokens
+
+        condition = {
+            'ConditionExpression': 'attribute_not_exists(controlId)',
+        }
+        if state[1] is not None:
+            condition = {
+                'ConditionExpression': 'updatedAt = :updatedAt',
+                'ExpressionAttributeValues': {
+                    ':updatedAt': to_decimal(state[1]),
+                },
+            }
+
+        try:
+            table_control.put_item(
+                Item={
+                    'controlId': key,
+                    'tokens': to_decimal(tokens - 1),
+                    'updatedAt': to_decimal(now),
+                    'expiresAt': int(
+                        now + RATE_LIMIT_CAPACITY / RATE_LIMIT_REFILL_RATE,
+                    ) + RATE_LIMIT_CACHE_TTL,
+                },
+                **condition,
+            )
+
+        except ClientError as e:
+            if e.response['Error']['Code'] \
+                    != 'ConditionalCheckFailedException':
+                raise e
+
+            # 他のコンテナが更新した場合は読み直す
+            state = None
+            continue
+
+        bucket_cache.set(key, (tokens - 1, now))
+
+        return tokens
+
+    # 競合が続く場合は、補充を待つよう拒否する
+    return 0
+
+
+def get_shared(key: str) -> tuple:
+    """共有バケットの状態を取得
+
+    Args:
+        key (str): バケットのキー
+
+    Returns:
+        tuple: (トークン数, 更新時刻)、存在しない場合は(容量, None)
+    """
+    item = table_control.get_item(
+        Key={'controlId': key},
+        ConsistentRead=True,
+    ).get('Item')
+
+    if item is None:
+        return RATE_LIMIT_CAPACITY, None
+
+    return float(item['tokens']), float(item['updatedAt'])
+
+
+def refill(state: tuple, now: float) -> float:
+    """経過時間に応じて補充したトークン数
+
+    Args:
+        state (tuple): (トークン数, 更新時刻)
+        now (float): 現在時刻
+
+    Returns:
+        float: トークン数
+    """
+    tokens, updated_at = state
+    if updated_at is None:
+        return tokens
+
+    # コンテナ間の時刻のずれで減らさない
+    elapsed = max(now - updated_at, 0)
+
+    return min(
+        RATE_LIMIT_CAPACITY,
+        tokens + elapsed * RATE_LIMIT_REFILL_RATE,
+    )
+
+
+def raise_limited(key: str, tokens: float):
+    """上限を超えた場合の例外を送出
+
+    Args:
+        key (str): バケットのキー
+        tokens (float): トークン数
+
+    Raises:
+        RateLimitException: 常に送出
+    """
+    retry_after = math.ceil((1 - tokens) / RATE_LIMIT_REFILL_RATE)
+
+    raise RateLimitException(
+        max(retry_after, 1),
+        f'Too many requests. key: {key}',
+    )
+
+
+def get_source_ip(event: dict) -> str:
+    """イベントから送信元IPを取得
+
+    Args:
+        event (dict): イベント
+
+    Returns:
+        str: 送信元IP、取得できない場合は'unknown'
+    """
+    identity = ((event or {}).get('requestContext') or {}) \
+        .get('identity') or {}
+
+    return identity.get('sourceIp') or 'unknown'
+
+
+def to_decimal(value: float) -> Decimal:
+    return Decimal(str(round(value, 6)))
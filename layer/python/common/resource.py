@@ -1,6 +1,15 @@
 from enum import Enum
-import boto3
 import os
+import threading
+
+from common.const import (
+    AWS_CONNECT_TIMEOUT,
+    AWS_MAX_ATTEMPTS,
+    AWS_MAX_POOL_CONNECTIONS,
+    AWS_READ_TIMEOUT,
+    AWS_RETRY_MODE,
+    AWS_TCP_KEEPALIVE,
+)
 
 
 COGNITO_CLIENT_ID = os.environ['COGNITO_CLIENT_ID']
@@ -8,10 +17,134 @@ COGNITO_USER_POOL_ID = os.environ['COGNITO_USER_POOL_ID']
 
 TABLE_NAME_PREFIX = os.environ['TABLE_NAME_PREFIX']
 
+# コンテナ内で共有するセッション、クライアント
+# (クライアントはスレッドセーフのため全スレッドで共有する)
+_session = None
+_clients = {}
+_lock = threading.Lock()
+
+# スレッドごとのリソース(リソースはスレッドセーフではないため共有しない)
+_local = threading.local()
+# clear_clientsで進め、各スレッドのリソースを作り直させる
+_generation = 0
+
+
+def get_session():
+    """共有セッションを取得
+
+    boto3の読み込みはコールドスタートで重いため、初回呼び出し時まで遅らせる
+
+    Returns:
+        boto3.session.Session: セッション
+    """
+    global _session
+
+    if _session is None:
+        with _lock:
+            if _session is None:
+                import boto3
+                _session = boto3.session.Session()
+
+    return _session
+
+
+def get_config():
+    """クライアントの接続設定を取得
+
+    Returns:
+        botocore.config.Config: 接続設定
+    """
+    from botocore.config import Config
+
+    return Config(
+        max_pool_connections=AWS_MAX_POOL_CONNECTIONS,
+        connect_timeout=AWS_CONNECT_TIMEOUT,
+        read_timeout=AWS_READ_TIMEOUT,
+        tcp_keepalive=AWS_TCP_KEEPALIVE,
+        retries={
+            'mode': AWS_RETRY_MODE,
+            'max_attempts': AWS_MAX_ATTEMPTS,
+        },
+    )
+
+
+def get_client(service_name: str):
+    """クライアントを取得(初回呼び出し時に作成し、以降は再利用)
+
+    Args:
+        service_name (str): サービス名
+
+    Returns:
+        BaseClient: クライアント
+    """
+    client = _clients.get(service_name)
+    if client is None:
+        session = get_session()
+        with _lock:
+            client = _clients.get(service_name)
+            if client is None:
+                client = session.client(service_name, config=get_config())
+                _clients[service_name] = client
+
+    return client
+
+
+def get_resource(service_name: str):
+    """リソースを取得(スレッドごとに初回呼び出し時に作成し、以降は再利用)
+
+    boto3のリソースはスレッドセーフではないため、並列実行のスレッド間で
+    共有しない(並列実行のスレッドは使い回すため、作成はスレッドごとに1度)
+
+    Args:
+        service_name (str): サービス名
+
+    Returns:
+        ServiceResource: リソース
+    """
+    resources = get_thread_resources()
+
+    resource = resources.get(service_name)
+    if resource is None:
+        session = get_session()
+        # セッションからの作成はスレッドセーフではないため排他する
+        with _lock:
+            resource = session.resource(
+                service_name,
+                config=get_config(),
+            )
+        resources[service_name] = resource
+
+    return resource
+
+
+def get_thread_resources() -> dict:
+    """実行中のスレッドのリソースを取得
+
+    Returns:
+        dict: {サービス名: リソース}
+    """
+    if getattr(_local, 'generation', None) != _generation:
+        _local.generation = _generation
+        _local.resources = {}
+
+    return _local.resources
+
+
+def clear_clients():
+    """共有セッション、クライアント、全スレッドのリソースを破棄
+    """
+    global _session, _generation
+
+    with _lock:
+        _session = None
+        _clients.clear()
+        _generation += 1
+
+
 class Cognito:
 
     def __init__(self):
-        self._cognito = boto3.client('cognito-idp')
+        self._cognito = get_client('cognito-idp')
 
     def sing_up(self, **kwargs):
         """ユーザ登録: 認証コード送信
@@ -72,11 +205,47 @@ class Cognito:
         )
 
 
+class LazyTable:
+    """DynamoDBのTableを初回利用時に作成する代理オブジェクト
+
+    テーブル名の参照だけではリソースを作成しない。
+    Tableはリソースと同じくスレッドごとに作成する
+    """
+
+    def __init__(self, table_name: str):
+        self.name = table_name
+        self._local = threading.local()
+
+    def get(self):
+        """Tableを取得(スレッドごとに初回呼び出し時に作成)
+
+        Returns:
+            dynamodb.Table: Table
+        """
+        local = self._local
+        if getattr(local, 'generation', None) != _generation:
+            local.table = get_resource('dynamodb').Table(self.name)
+            local.generation = _generation
+
+        return local.table
+
+    def __getattr__(self, name: str):
+        # Enumの内部属性の参照ではTableを作成しない
+        if name.startswith('_'):
+            raise AttributeError(name)
+
+        return getattr(self.get(), name)
+
+    def __repr__(self) -> str:
+        return f'LazyTable(name={self.name!r})'
+
+
 class Table(Enum):
 
     def __new__(cls, table_name):
-        obj = boto3.resource('dynamodb').Table(table_name)
+        obj = LazyTable(table_name)
         return obj
 
     ADAGE = TABLE_NAME_PREFIX + 'adagesTable'
     USER = TABLE_NAME_PREFIX + 'usersTable'
+    CONTROL = TABLE_NAME_PREFIX + 'controlTable'
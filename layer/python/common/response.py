@@ -1,30 +1,98 @@
+from base64 import b64encode
+from decimal import Decimal
+import gzip
+from hashlib import sha1
 from http import HTTPStatus
 import json
+import os
 
 from common.exception import ApplicationException
-from common.util import is_empty
+from common.util import get_header, is_empty
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# JSONのエンコーダ(auto: orjsonがあれば使用, json: 標準ライブラリ)
+JSON_BACKEND = os.environ.get('JSON_BACKEND', 'auto')
+
+# レスポンスの圧縮設定(Accept-Encodingに応じてgzip、brotliで圧縮する)
+# API GatewayのbinaryMediaTypesの設定が必要
+RESPONSE_COMPRESSION = \
+    os.environ.get('RESPONSE_COMPRESSION', 'false').lower() == 'true'
+# 圧縮するボディの最小サイズ(バイト)
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 4096))
+# 圧縮レベル(gzip: 1-9, brotli: 0-11)
+GZIP_LEVEL = int(os.environ.get('GZIP_LEVEL', 6))
+BROTLI_QUALITY = int(os.environ.get('BROTLI_QUALITY', 5))
 
 
 class Response:
 
-    def __init__(self, body: dict, http_status: int=HTTPStatus.OK):
+    def __init__(
+            self,
+            body: dict,
+            http_status: int=HTTPStatus.OK,
+            etag: str=None,
+            cache_control: str=None,
+            next_cursor: str=None):
+        """レスポンス作成
+
+        Args:
+            body (dict): ボディ
+            http_status (int, optional): HTTPステータス Defaults to HTTPStatus.OK.
+            etag (str, optional): ETag Defaults to None.
+            cache_control (str, optional): Cache-Control Defaults to None.
+            next_cursor (str, optional): 次ページのカーソル Defaults to None.
+        """
         self._http_status = http_status
         self._body = body
+        self._etag = etag
+        self._cache_control = cache_control
+        self._next_cursor = next_cursor
 
     def format(self) -> dict:
-        """レスポンス用フォーマット
+        """レスポンス用フォーマット(圧縮はdecorator.handlerで行う)
 
         Returns:
             dict: レスポンス
         """
         return {
             'statusCode': self._http_status,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-            },
-            'body': json.dumps(self._body)
+            'headers': self.headers(),
+            'body': dumps(self._body)
         }
 
+    def headers(self) -> dict:
+        """レスポンスヘッダ
+
+        Returns:
+            dict: レスポンスヘッダ
+        """
+        headers = {
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Allow-Headers': 'Content-Type',
+            'Access-Control-Expose-Headers': 'ETag, X-Next-Cursor',
+        }
+
+        if not is_empty(self._etag):
+            headers['ETag'] = self._etag
+
+        if not is_empty(self._cache_control):
+            headers['Cache-Control'] = self._cache_control
+
+        if not is_empty(self._next_cursor):
+            headers['X-Next-Cursor'] = self._next_cursor
+
+        return headers
+
 
 class PostResponse(Response):
 
@@ -32,19 +100,232 @@ class PostResponse(Response):
         super().__init__(body, http_status)
 
 
+class NotModifiedResponse(Response):
+
+    def __init__(self, etag: str, cache_control: str=None):
+        super().__init__(
+            None,
+            HTTPStatus.NOT_MODIFIED,
+            etag,
+            cache_control,
+        )
+
+    def format(self) -> dict:
+        """レスポンス用フォーマット(ボディなし)
+
+        Returns:
+            dict: レスポンス
+        """
+        return {
+            'statusCode': self._http_status,
+            'headers': self.headers(),
+            'body': '',
+        }
+
+
 class ErrorResponse(Response):
 
     def __init__(self, exception_obj=None):
         http_status = HTTPStatus.INTERNAL_SERVER_ERROR \
             if is_empty(exception_obj) \
             else exception_obj
-        self._http_status = http_status.value
-        self._body = {
+        body = {
             'errorCode': http_status.value,
             'phrase': http_status.phrase,
             'message': '',
         }
         if isinstance(http_status, ApplicationException):
-            self._body['message'] = http_status.message
+            body['message'] = http_status.message
         else:
-            self._body['message'] = str(exception_obj)
+            body['message'] = str(exception_obj)
+
+        # 再試行できるまでの秒数(429)
+        self._retry_after = getattr(exception_obj, 'retry_after', None)
+
+        super().__init__(body, http_status.value)
+
+    def headers(self) -> dict:
+        """レスポンスヘッダ(Retry-Afterを含む)
+
+        Returns:
+            dict: レスポンスヘッダ
+        """
+        headers = super().headers()
+
+        if self._retry_after is not None:
+            headers['Retry-After'] = str(self._retry_after)
+            headers['Access-Control-Expose-Headers'] += ', Retry-After'
+
+        return headers
+
+
+def make_etag(body: any) -> str:
+    """ボディから強いETagを作成
+
+    Args:
+        body (any): ボディ
+
+    Returns:
+        str: ETag
+    """
+    digest = sha1(
+        dumps(body, sort_keys=True).encode('utf-8'),
+    ).hexdigest()
+
+    return f'"{digest}"'
+
+
+def dumps(body: any, sort_keys: bool=False) -> str:
+    """DynamoDBのアイテム(Decimal、set)を含むボディをJSONへ変換
+
+    orjsonがインストールされている場合はorjsonを使用する
+
+    Args:
+        body (any): ボディ
+        sort_keys (bool, optional): キーでソートするか否か Defaults to False.
+
+    Returns:
+        str: JSON
+    """
+    if orjson is not None and JSON_BACKEND != 'json':
+        option = orjson.OPT_SORT_KEYS if sort_keys else 0
+        return orjson.dumps(
+            body,
+            default=to_json_value,
+            option=option,
+        ).decode('utf-8')
+
+    return json.dumps(body, default=to_json_value, sort_keys=sort_keys)
+
+
+def compress(response: dict, event: dict) -> dict:
+    """Accept-Encodingに応じてボディを圧縮し、base64で返す
+
+    圧縮が無効な場合、ボディが小さい場合、圧縮しても小さくならない場合は
+    そのまま返す
+
+    Args:
+        response (dict): レスポンス
+        event (dict): イベント
+
+    Returns:
+        dict: レスポンス
+    """
+    if not RESPONSE_COMPRESSION or is_empty(event):
+        return response
+
+    body = response['body'].encode('utf-8')
+    if len(body) < COMPRESSION_MIN_SIZE:
+        return response
+
+    encoding = select_encoding(get_header(event, 'Accept-Encoding'))
+    if encoding is None:
+        return response
+
+    if encoding == 'br':
+        compressed = brotli.compress(body, quality=BROTLI_QUALITY)
+    else:
+        compressed = gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+    if len(compressed) >= len(body):
+        return response
+
+    response['headers']['Content-Encoding'] = encoding
+    response['headers']['Vary'] = 'Accept-Encoding'
+    response['body'] = b64encode(compressed).decode('ascii')
+    response['isBase64Encoded'] = True
+
+    return response
+
+
+def select_encoding(accept_encoding: str) -> str:
+    """Accept-Encodingから使用する圧縮方式を選択
+
+    qの値が大きいものを優先し、同じ場合はbrotli、gzipの順に選択する
+
+    Args:
+        accept_encoding (str): Accept-Encoding
+
+    Returns:
+        str: 圧縮方式(br, gzip)、圧縮しない場合None
+    """
+    if is_empty(accept_encoding):
+        return None
+
+    weights = {}
+    for value in accept_encoding.split(','):
+        name, _, params = value.strip().partition(';')
+        weight = 1.0
+        for param in params.split(';'):
+            key, _, number = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    weight = float(number)
+                except ValueError:
+                    weight = 0.0
+
+        weights[name.strip().lower()] = weight
+
+    candidates = ['br', 'gzip'] if brotli is not None else ['gzip']
+    ranked = [
+        (weights.get(name, weights.get('*', 0.0)), -i, name)
+        for i, name in enumerate(candidates)
+    ]
+    weight, _, name = max(ranked)
+
+    return name if weight > 0 else None
+
+
+def to_json_value(value: any) -> any:
+    """JSONで扱えない値を変換(json.dumpsのdefault)
+
+    Args:
+        value (any): 値
+
+    Raises:
+        TypeError: 変換できない値の場合
+
+    Returns:
+        any: 変換後の値(Decimalは整数または小数、setはリスト)
+    """
+    if isinstance(value, Decimal):
+        integral = value.to_integral_value()
+        return int(integral) if value == integral else float(value)
+
+    if isinstance(value, (set, frozenset)):
+        return sorted(value)
+
+    raise TypeError(
+        f'Object of type {type(value).__name__} is not JSON serializable',
+    )
+
+
+def is_not_modified(event: dict, etag: str) -> bool:
+    """If-None-MatchがETagと一致するか判定
+
+    Args:
+        event (dict): イベント
+        etag (str): ETag
+
+    Returns:
+        bool: 一致する場合True
+    """
+    if_none_match = get_header(event, 'If-None-Match')
+    if is_empty(if_none_match) or is_empty(etag):
+        return False
+
+    for tag in if_none_match.split(','):
+        tag = tag.strip()
+
+        if tag == '*':
+            return True
+
+        # 弱い比較
+        if tag.startswith('W/'):
+            tag = tag[2:]
+
+        if tag == etag:
+            return True
+
+    return False
+
@@ -0,0 +1,1237 @@
+from collections import Counter, defaultdict
+from decimal import Decimal
+from itertools import accumulate
+import logging
+import math
+import os
+import unicodedata
+
+from common.concurrency import batch_write, run_parallel
+from common.paginator import paginate_list, query_all
+from common.resource import Table, get_resource
+from common.util import get_jst_timestamp
+
+
+logger = logging.getLogger('share-adage-service')
+
+table_adage = Table.ADAGE
+
+# 格言タイトル、エピソードの全文検索(文字n-gramの転置インデックス)
+# 格言テーブルの以下のパーティションに保持する
+#   search#meta: 世代、文書数等(key: meta)、
+#       削除済み文書ID(key: deleted#<世代>、語を保持していない旧形式の文書のみ)
+#   search#pending: マージ前の登録、削除(key: <格言ID>#<ソートキー>)
+#   search#<世代>#t#<語>: 語ごとの転置リスト(key: b#<先頭の文書ID>)
+#   search#<世代>#ids: 文書IDから格言IDとソートキーへの対応(key: b#<番号>)
+#   search#<世代>#s#<格言ID>: 格言IDとソートキーから文書ID、語への対応
+#   search#<世代>#terms: 転置リストを作成した語(key: t#<語>)、
+#       一括作成した世代の印(key: meta)。古い世代の削除に使う
+# ゲストの格言、エピソードは月間ランキングと同様に検索対象にしない
+SEARCH_PREFIX = 'search#'
+META_ID = 'search#meta'
+META_KEY = 'meta'
+PENDING_ID = 'search#pending'
+TERMS_META_KEY = 'meta'
+
+# n-gramの文字数
+SEARCH_NGRAM = int(os.environ.get('SEARCH_NGRAM', 2))
+
+# 転置リストの1ブロックあたりの最大件数
+POSTING_BLOCK_SIZE = int(os.environ.get('SEARCH_POSTING_BLOCK_SIZE', 2048))
+
+# 文書IDの対応の1ブロックあたりの件数
+ID_BLOCK_SIZE = 1024
+
+# スコア順に並べて返す最大件数
+SEARCH_MAX_HITS = int(os.environ.get('SEARCH_MAX_HITS', 1000))
+
+# 一括作成時の並列スキャンの分割数
+SEARCH_SCAN_SEGMENTS = int(os.environ.get('SEARCH_SCAN_SEGMENTS', 8))
+
+# BM25のパラメータ
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# BatchGetItemで1度に取得できる最大件数
+BATCH_GET_MAX = 100
+
+
+def search(query: str, limit: int=None, cursor: str=None) -> tuple:
+    """格言タイトル、エピソードを全文検索
+
+    クエリの全てのn-gramを含む文書を、BM25のスコア順に返す。
+    マージ前の登録、削除も反映する
+
+    Args:
+        query (str): 検索文字列
+        limit (int, optional): 最大件数 Defaults to None.
+        cursor (str, optional): 前ページのカーソル Defaults to None.
+
+    Returns:
+        tuple: (
+            list: [{'adageId', 'key', 'title', 'episode', 'score', ...}],
+            str: 次ページのカーソル、最後のページの場合None,
+        )
+    """
+    terms = list(get_terms(query))
+    if not terms:
+        return [], None
+
+    meta = get_meta()
+    generation = meta['generation']
+
+    # マージ前の文書と、それにより置き換わる(削除される)マージ済みの文書
+    pending = get_pending()
+    excluded = get_deleted(generation) | set(
+        get_doc_ids(generation, [source for source, _ in pending]).values(),
+    )
+
+    results = run_parallel(
+        lambda term: read_postings(generation, term),
+        terms,
+    )
+    postings = {}
+    for term, result in zip(terms, results):
+        if isinstance(result, Exception):
+            raise result
+        postings[term] = result
+
+    # マージ前の文書は負の仮IDで区別する
+    pending_docs = {}
+    for i, (source, item) in enumerate(pending):
+        if item['op'] != 'put':
+            continue
+
+        doc_terms = get_terms(item['text'])
+        length = sum(doc_terms.values())
+        pending_docs[-(i + 1)] = source
+        for term in terms:
+            if term in doc_terms:
+                postings[term].append((-(i + 1), doc_terms[term], length))
+
+    doc_count = int(meta['docCount']) + len(pending_docs)
+    total_length = int(meta['totalLength'])
+    hits = rank_documents(
+        postings,
+        doc_count,
+        total_length / max(int(meta['docCount']), 1),
+        excluded,
+    )[:SEARCH_MAX_HITS]
+
+    page, next_cursor = paginate_list(
+        hits,
+        '#'.join([SEARCH_PREFIX.rstrip('#'), str(generation), *terms]),
+        limit,
+        cursor,
+    )
+
+    sources = get_sources(
+        generation,
+        [doc_id for doc_id, _ in page if doc_id >= 0],
+    )
+    sources.update(pending_docs)
+
+    return to_results(page, sources), next_cursor
+
+
+def rank_documents(
+        postings: dict,
+        doc_count: int,
+        average_length: float,
+        excluded: set=frozenset()) -> list:
+    """全ての語を含む文書をBM25でスコア付けし、スコア順に並べる
+
+    Args:
+        postings (dict): {語: [(文書ID, 出現回数, 文書長)]}
+        doc_count (int): 文書数
+        average_length (float): 平均文書長
+        excluded (set, optional): 除外する文書ID Defaults to frozenset().
+
+    Returns:
+        list: [(文書ID, スコア)](スコアの降順、同点は文書IDの降順)
+    """
+    if not postings:
+        return []
+
+    # 出現文書の少ない語から絞り込む
+    ordered = sorted(postings.items(), key=lambda x: len(x[1]))
+    candidates = {doc_id for doc_id, _, _ in ordered[0][1]} - excluded
+    for _, term_postings in ordered[1:]:
+        if not candidates:
+            return []
+        candidates &= {doc_id for doc_id, _, _ in term_postings}
+
+    scores = defaultdict(float)
+    for _, term_postings in ordered:
+        df = len(term_postings)
+        idf = math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+
+        for doc_id, tf, length in term_postings:
+            if doc_id not in candidates:
+                continue
+
+            norm = BM25_K1 * (
+                1 - BM25_B + BM25_B * length / max(average_length, 1)
+            )
+            scores[doc_id] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+    return sorted(scores.items(), key=lambda x: (-x[1], -x[0]))
+
+
+def add_documents(items: list):
+    """格言、エピソードを検索対象に登録(マージ前の登録として保存)
+
+    検索インデックスの更新に失敗しても、格言、エピソードの登録は取り消さない
+    (インデックスは一括作成で修復する)
+
+    Args:
+        items (list): 格言、エピソードのアイテムリスト(ゲストのものは除く)
+    """
+    try:
+        put_pending(
+            [
+                (
+                    (item['adageId'], item['key']),
+                    {'op': 'put', 'text': get_text(item)},
+                )
+                for item in items
+                if not item.get('byGuest')
+            ],
+        )
+
+    except Exception as e:
+        log_failure(e)
+
+
+def remove_document(adage_id: str, key: str):
+    """格言、エピソードを検索対象から削除(マージ前の削除として保存)
+
+    Args:
+        adage_id (str): 格言ID
+        key (str): ソートキー
+    """
+    try:
+        put_pending([((adage_id, key), {'op': 'delete'})])
+
+    except Exception as e:
+        log_failure(e)
+
+
+def log_failure(error: Exception):
+    """検索インデックスの更新失敗をログに出力
+
+    Args:
+        error (Exception): 例外
+    """
+    logger.warning(
+        'Search index update failed. ' + str(type(error)) + ':' + str(error),
+    )
+
+
+def put_pending(changes: list):
+    """マージ前の登録、削除を保存(同じ文書は最後の変更で上書き)
+
+    Args:
+        changes (list): [((格言ID, ソートキー), 変更)]
+    """
+    updated_at = Decimal(str(get_jst_timestamp()))
+
+    batch_write(
+        table_adage,
+        [
+            {
+                'PutRequest': {
+                    'Item': {
+                        'adageId': PENDING_ID,
+                        'key': get_source_key(source),
+                        'sourceAdageId': source[0],
+                        'sourceKey': source[1],
+                        'updatedAt': updated_at,
+                        **change,
+                    },
+                },
+            }
+            for source, change in changes
+        ],
+    )
+
+
+def merge_pending() -> dict:
+    """マージ前の登録、削除を転置リストへ反映
+
+    登録は新しい文書IDを割り当てて転置リストの末尾へ追加し、
+    置き換え、削除された文書は転置リストから取り除く
+    (語を保持していない旧形式の文書のみ削除済み文書IDへ加える)。
+    転置リストの更新は同時に1つだけ実行すること
+
+    Returns:
+        dict: {'added': 登録数, 'removed': 削除数}
+    """
+    meta = get_meta(consistent_read=True)
+    generation = meta['generation']
+    pending = get_pending(consistent_read=True)
+    if not pending:
+        return {'added': 0, 'removed': 0}
+
+    sources = [source for source, _ in pending]
+    old_docs = get_source_docs(generation, sources)
+    puts = [(source, item) for source, item in pending if item['op'] == 'put']
+
+    # 文書IDを予約(途中で失敗しても同じIDを再利用しない)
+    first_id = reserve_doc_ids(len(puts))
+
+    postings = defaultdict(list)
+    entries = []
+    new_docs = {}
+    for i, (source, item) in enumerate(puts):
+        doc_id = first_id + i
+        terms = get_terms(item['text'])
+        length = sum(terms.values())
+
+        for term, tf in terms.items():
+            postings[term].append((doc_id, tf, length))
+        entries.append((doc_id, source))
+        new_docs[source] = {
+            'docId': doc_id,
+            'length': length,
+            'terms': sorted(terms),
+        }
+
+    # 置き換え、削除された文書を語ごとに集める
+    removed = defaultdict(set)
+    legacy_ids = set()
+    for doc in old_docs.values():
+        if doc['terms'] is None:
+            legacy_ids.add(doc['docId'])
+            continue
+
+        for term in doc['terms']:
+            removed[term].add(doc['docId'])
+
+    for result in run_parallel(
+            lambda term: update_postings(
+                generation, term, postings[term], removed[term],
+            ),
+            list(set(postings) | set(removed))):
+        if isinstance(result, Exception):
+            raise result
+
+    append_sources(generation, entries)
+    write_source_docs(generation, sources, new_docs)
+
+    table_adage.update_item(
+        Key={
+            'adageId': META_ID,
+            'key': META_KEY,
+        },
+        UpdateExpression='ADD docCount :count, totalLength :length',
+        ExpressionAttributeValues={
+            ':count': len(new_docs) - len(old_docs),
+            ':length': sum(doc['length'] for doc in new_docs.values())
+                - sum(doc['length'] for doc in old_docs.values()),
+        },
+    )
+    if legacy_ids:
+        table_adage.update_item(
+            Key={
+                'adageId': META_ID,
+                'key': get_deleted_key(generation),
+            },
+            UpdateExpression='ADD docIds :docIds',
+            ExpressionAttributeValues={
+                ':docIds': legacy_ids,
+            },
+        )
+
+    delete_pending(pending)
+
+    return {
+        'added': len(new_docs),
+        'removed': len(old_docs),
+    }
+
+
+def build_index(segments: int=None) -> dict:
+    """格言テーブルを並列スキャンして検索インデックスを一括作成
+
+    新しい世代へ作成してから切り替え、古い世代を削除する。
+    作成中はマージを止めること
+
+    Args:
+        segments (int, optional): 並列スキャンの分割数
+            Defaults to None(SEARCH_SCAN_SEGMENTS).
+
+    Returns:
+        dict: {'documents': 文書数, 'terms': 語数, 'generation': 世代}
+    """
+    started_at = Decimal(str(get_jst_timestamp()))
+    segments = segments or SEARCH_SCAN_SEGMENTS
+    old_generation = get_meta(consistent_read=True)['generation']
+    generation = old_generation + 1
+
+    items = []
+    for result in run_parallel(
+            lambda segment: scan_documents(segment, segments),
+            range(segments)):
+        if isinstance(result, Exception):
+            raise result
+        items += result
+
+    items.sort(key=lambda x: (x['adageId'], x['key']))
+
+    postings = defaultdict(list)
+    entries = []
+    docs = {}
+    total_length = 0
+    for doc_id, item in enumerate(items):
+        source = (item['adageId'], item['key'])
+        terms = get_terms(get_text(item))
+        length = sum(terms.values())
+        total_length += length
+
+        for term, tf in terms.items():
+            postings[term].append((doc_id, tf, length))
+        entries.append((doc_id, source))
+        docs[source] = {
+            'docId': doc_id,
+            'length': length,
+            'terms': sorted(terms),
+        }
+
+    requests = []
+    for term, term_postings in postings.items():
+        for i in range(0, len(term_postings), POSTING_BLOCK_SIZE):
+            requests.append(
+                {
+                    'PutRequest': {
+                        'Item': make_posting_block(
+                            generation,
+                            term,
+                            term_postings[i:i + POSTING_BLOCK_SIZE],
+                        ),
+                    },
+                },
+            )
+    batch_write(table_adage, requests)
+    put_terms(generation, list(postings), complete=True)
+    append_sources(generation, entries)
+    write_source_docs(generation, list(docs), docs)
+
+    # 新しい世代へ切り替え
+    table_adage.put_item(
+        Item={
+            'adageId': META_ID,
+            'key': META_KEY,
+            'generation': generation,
+            'nextDocId': len(items),
+            'docCount': len(items),
+            'totalLength': total_length,
+        },
+    )
+
+    # 作成前のマージ前の変更はインデックスに含まれる
+    delete_pending(
+        [
+            (source, item) for source, item in get_pending(True)
+            if item['updatedAt'] < started_at
+        ],
+    )
+    delete_generation(old_generation)
+
+    return {
+        'documents': len(items),
+        'terms': len(postings),
+        'generation': generation,
+    }
+
+
+def scan_documents(segment: int, total_segments: int) -> list:
+    """格言テーブルの1区分から格言タイトル、エピソードを取得(ゲストを除く)
+
+    Args:
+        segment (int): 区分
+        total_segments (int): 分割数
+
+    Returns:
+        list: 格言、エピソードのアイテムリスト
+    """
+    from boto3.dynamodb.conditions import Attr
+
+    return query_all(
+        table_adage.scan,
+        Segment=segment,
+        TotalSegments=total_segments,
+        FilterExpression=(
+            Attr('key').eq('title') | Attr('key').begins_with('episode#')
+        ) & Attr('title').exists() & Attr('byGuest').not_exists(),
+        ProjectionExpression='adageId,#key,title,episode',
+        ExpressionAttributeNames={
+            '#key': 'key',
+        },
+    )
+
+
+def delete_generation(generation: int):
+    """古い世代の検索インデックスを削除
+
+    記録した語の転置リストと、文書IDの対応から辿れる文書への対応を
+    キーで削除する(語を記録していない旧形式の世代のみスキャンする)
+
+    Args:
+        generation (int): 世代
+    """
+    from boto3.dynamodb.conditions import Key
+
+    if generation <= 0:
+        return
+
+    terms_id = get_terms_id(generation)
+    term_items = query_all(
+        table_adage.query,
+        KeyConditionExpression=Key('adageId').eq(terms_id),
+        ProjectionExpression='#key',
+        ExpressionAttributeNames={
+            '#key': 'key',
+        },
+    )
+    if not any(item['key'] == TERMS_META_KEY for item in term_items):
+        delete_generation_by_scan(generation)
+        return
+
+    # 語ごとの転置リストのブロック
+    keys = []
+    for result in run_parallel(
+            lambda item: get_partition_keys(
+                get_term_id(generation, item['key'][len('t#'):]),
+            ),
+            [item for item in term_items if item['key'] != TERMS_META_KEY]):
+        if isinstance(result, Exception):
+            raise result
+        keys += result
+
+    # 文書IDの対応と、置き換え前の文書も含めた格言ID、ソートキーからの対応
+    sources = set()
+    for item in query_all(
+            table_adage.query,
+            KeyConditionExpression=Key('adageId').eq(get_ids_id(generation))):
+        keys.append({'adageId': item['adageId'], 'key': item['key']})
+        sources.update(item.get('sources', {}).values())
+
+    keys += [
+        {
+            'adageId': get_source_id(generation, adage_id),
+            'key': key,
+        }
+        for adage_id, key in map(parse_source_key, sorted(sources))
+    ]
+    keys += [{'adageId': terms_id, 'key': item['key']} for item in term_items]
+    keys.append({'adageId': META_ID, 'key': get_deleted_key(generation)})
+
+    batch_write(
+        table_adage,
+        [{'DeleteRequest': {'Key': key}} for key in keys],
+    )
+
+
+def delete_generation_by_scan(generation: int):
+    """語を記録していない旧形式の世代の検索インデックスをスキャンして削除
+
+    Args:
+        generation (int): 世代
+    """
+    from boto3.dynamodb.conditions import Attr
+
+    items = query_all(
+        table_adage.scan,
+        FilterExpression=Attr('adageId').begins_with(
+            f'{SEARCH_PREFIX}{generation}#',
+        ),
+        ProjectionExpression='adageId,#key',
+        ExpressionAttributeNames={
+            '#key': 'key',
+        },
+    )
+    items.append({'adageId': META_ID, 'key': get_deleted_key(generation)})
+
+    batch_write(
+        table_adage,
+        [{'DeleteRequest': {'Key': item}} for item in items],
+    )
+
+
+def get_partition_keys(partition: str) -> list:
+    """パーティションの全アイテムのキーを取得
+
+    Args:
+        partition (str): パーティションキー(adageId)
+
+    Returns:
+        list: キーリスト
+    """
+    from boto3.dynamodb.conditions import Key
+
+    return query_all(
+        table_adage.query,
+        KeyConditionExpression=Key('adageId').eq(partition),
+        ProjectionExpression='adageId,#key',
+        ExpressionAttributeNames={
+            '#key': 'key',
+        },
+    )
+
+
+def put_terms(generation: int, terms: list, complete: bool=False):
+    """転置リストを作成した語を記録
+
+    Args:
+        generation (int): 世代
+        terms (list): 語リスト
+        complete (bool, optional): 一括作成で全ての語を記録した場合True
+            Defaults to False.
+    """
+    terms_id = get_terms_id(generation)
+    keys = [f't#{term}' for term in terms]
+    if complete:
+        keys.append(TERMS_META_KEY)
+
+    batch_write(
+        table_adage,
+        [
+            {'PutRequest': {'Item': {'adageId': terms_id, 'key': key}}}
+            for key in keys
+        ],
+    )
+
+
+def reserve_doc_ids(count: int) -> int:
+    """文書IDを予約
+
+    Args:
+        count (int): 件数
+
+    Returns:
+        int: 予約した先頭の文書ID
+    """
+    if count <= 0:
+        return 0
+
+    attributes = table_adage.update_item(
+        Key={
+            'adageId': META_ID,
+            'key': META_KEY,
+        },
+        UpdateExpression='ADD nextDocId :count',
+        ExpressionAttributeValues={
+            ':count': count,
+        },
+        ReturnValues='UPDATED_NEW',
+    )['Attributes']
+
+    return int(attributes['nextDocId']) - count
+
+
+def update_postings(
+        generation: int,
+        term: str,
+        postings: list,
+        removed: set):
+    """語の転置リストから削除された文書を取り除き、登録された文書を追加
+
+    Args:
+        generation (int): 世代
+        term (str): 語
+        postings (list): 追加する[(文書ID, 出現回数, 文書長)](文書IDの昇順)
+        removed (set): 取り除く文書ID
+    """
+    if removed:
+        remove_postings(generation, term, removed)
+
+    if postings:
+        append_postings(generation, term, postings)
+
+
+def remove_postings(generation: int, term: str, doc_ids: set):
+    """転置リストから文書を取り除く
+
+    文書を含むブロックのみ書き換え、空になったブロックは削除する
+    (先頭の文書IDが変わる場合はソートキーを付け替える)
+
+    Args:
+        generation (int): 世代
+        term (str): 語
+        doc_ids (set): 取り除く文書ID
+    """
+    from boto3.dynamodb.conditions import Key
+
+    term_id = get_term_id(generation, term)
+
+    # 文書IDを含むブロック(先頭の文書IDが文書ID以下の最後のブロック)
+    blocks = {}
+    for doc_id in sorted(doc_ids):
+        items = table_adage.query(
+            KeyConditionExpression=Key('adageId').eq(term_id)
+                & Key('key').lte(get_block_key(doc_id)),
+            ScanIndexForward=False,
+            Limit=1,
+            ConsistentRead=True,
+        ).get('Items', [])
+        if items:
+            blocks.setdefault(items[0]['key'], items[0])
+
+    for key, item in blocks.items():
+        postings = decode_postings(item['postings'].value)
+        remaining = [
+            posting for posting in postings
+            if posting[0] not in doc_ids
+        ]
+        if len(remaining) == len(postings):
+            continue
+
+        if remaining:
+            block = make_posting_block(generation, term, remaining)
+            table_adage.put_item(Item=block)
+            if block['key'] == key:
+                continue
+
+        table_adage.delete_item(
+            Key={
+                'adageId': term_id,
+                'key': key,
+            },
+        )
+
+
+def append_postings(generation: int, term: str, postings: list):
+    """転置リストの末尾のブロックへ追加(超えた分は新しいブロックにする)
+
+    再実行時に追加済みの文書IDは追加しない
+
+    Args:
+        generation (int): 世代
+        term (str): 語
+        postings (list): [(文書ID, 出現回数, 文書長)](文書IDの昇順)
+    """
+    from boto3.dynamodb.conditions import Key
+
+    last = table_adage.query(
+        KeyConditionExpression=Key('adageId').eq(
+            get_term_id(generation, term),
+        ),
+        ScanIndexForward=False,
+        Limit=1,
+        ConsistentRead=True,
+    ).get('Items', [])
+
+    # 新しい語は古い世代の削除で辿れるよう、ブロックより先に記録する
+    if not last:
+        put_terms(generation, [term])
+
+    merged = []
+    if last:
+        merged = decode_postings(last[0]['postings'].value)
+        postings = [
+            posting for posting in postings
+            if posting[0] > merged[-1][0]
+        ]
+        if not postings:
+            return
+
+        # 末尾のブロックに空きがない場合は新しいブロックから始める
+        if len(merged) >= POSTING_BLOCK_SIZE:
+            merged = []
+
+    merged += postings
+    for i in range(0, len(merged), POSTING_BLOCK_SIZE):
+        table_adage.put_item(
+            Item=make_posting_block(
+                generation,
+                term,
+                merged[i:i + POSTING_BLOCK_SIZE],
+            ),
+        )
+
+
+def make_posting_block(generation: int, term: str, postings: list) -> dict:
+    """転置リストのブロックのアイテムを作成
+
+    Args:
+        generation (int): 世代
+        term (str): 語
+        postings (list): [(文書ID, 出現回数, 文書長)](文書IDの昇順)
+
+    Returns:
+        dict: アイテム
+    """
+    return {
+        'adageId': get_term_id(generation, term),
+        'key': get_block_key(postings[0][0]),
+        'count': len(postings),
+        'postings': encode_postings(postings),
+    }
+
+
+def read_postings(generation: int, term: str) -> list:
+    """語の転置リストを全ブロック読み込む
+
+    Args:
+        generation (int): 世代
+        term (str): 語
+
+    Returns:
+        list: [(文書ID, 出現回数, 文書長)]
+    """
+    from boto3.dynamodb.conditions import Key
+
+    postings = []
+    for item in query_all(
+            table_adage.query,
+            KeyConditionExpression=Key('adageId').eq(
+                get_term_id(generation, term),
+            ),
+            ProjectionExpression='postings'):
+        postings += decode_postings(item['postings'].value)
+
+    return postings
+
+
+def encode_postings(postings: list) -> bytes:
+    """転置リストを圧縮(文書IDの差分、出現回数、文書長の可変長整数)
+
+    Args:
+        postings (list): [(文書ID, 出現回数, 文書長)](文書IDの昇順)
+
+    Returns:
+        bytes: 圧縮した転置リスト
+    """
+    data = bytearray()
+    previous = 0
+    for doc_id, tf, length in postings:
+        for value in (doc_id - previous, tf, length):
+            while value >= 0x80:
+                data.append(value & 0x7f | 0x80)
+                value >>= 7
+            data.append(value)
+        previous = doc_id
+
+    return bytes(data)
+
+
+def decode_postings(data: bytes) -> list:
+    """圧縮した転置リストを展開
+
+    Args:
+        data (bytes): 圧縮した転置リスト
+
+    Returns:
+        list: [(文書ID, 出現回数, 文書長)]
+    """
+    values = []
+    append = values.append
+    value = 0
+    shift = 0
+    for byte in bytes(data):
+        if byte < 0x80:
+            append(value | byte << shift)
+            value = 0
+            shift = 0
+        else:
+            value |= (byte & 0x7f) << shift
+            shift += 7
+
+    return list(
+        zip(accumulate(values[0::3]), values[1::3], values[2::3]),
+    )
+
+
+def append_sources(generation: int, entries: list):
+    """文書IDから格言ID、ソートキーへの対応を追加
+
+    Args:
+        generation (int): 世代
+        entries (list): [(文書ID, (格言ID, ソートキー))](文書IDの昇順)
+    """
+    blocks = defaultdict(dict)
+    for doc_id, source in entries:
+        blocks[doc_id // ID_BLOCK_SIZE][doc_id % ID_BLOCK_SIZE] = source
+
+    for block, sources in blocks.items():
+        key = {
+            'adageId': get_ids_id(generation),
+            'key': get_block_key(block),
+        }
+        item = table_adage.get_item(Key=key, ConsistentRead=True) \
+            .get('Item', {})
+
+        table_adage.put_item(
+            Item={
+                **key,
+                'sources': {
+                    **item.get('sources', {}),
+                    **{
+                        str(offset): get_source_key(source)
+                        for offset, source in sources.items()
+                    },
+                },
+            },
+        )
+
+
+def get_sources(generation: int, doc_ids: list) -> dict:
+    """文書IDから格言ID、ソートキーを取得
+
+    Args:
+        generation (int): 世代
+        doc_ids (list): 文書IDリスト
+
+    Returns:
+        dict: {文書ID: (格言ID, ソートキー)}
+    """
+    blocks = sorted({doc_id // ID_BLOCK_SIZE for doc_id in doc_ids})
+    items = batch_get(
+        [
+            {
+                'adageId': get_ids_id(generation),
+                'key': get_block_key(block),
+            }
+            for block in blocks
+        ],
+    )
+
+    by_block = {
+        int(item['key'][len('b#'):]): item['sources']
+        for item in items
+    }
+    sources = {}
+    for doc_id in doc_ids:
+        block = by_block.get(doc_id // ID_BLOCK_SIZE, {})
+        source = block.get(str(doc_id % ID_BLOCK_SIZE))
+        if source is not None:
+            sources[doc_id] = parse_source_key(source)
+
+    return sources
+
+
+def get_source_docs(generation: int, sources: list) -> dict:
+    """格言ID、ソートキーから登録済みの文書を取得
+
+    Args:
+        generation (int): 世代
+        sources (list): [(格言ID, ソートキー)]
+
+    Returns:
+        dict: {(格言ID, ソートキー): {
+            'docId': 文書ID,
+            'length': 文書長,
+            'terms': 語リスト(旧形式の文書の場合None),
+        }}
+    """
+    items = batch_get(
+        [
+            {
+                'adageId': get_source_id(generation, adage_id),
+                'key': key,
+            }
+            for adage_id, key in dict.fromkeys(sources)
+        ],
+    )
+
+    return {
+        (item['adageId'].split('#s#', 1)[1], item['key']): {
+            'docId': int(item['docId']),
+            'length': int(item['length']),
+            'terms': item.get('terms'),
+        }
+        for item in items
+    }
+
+
+def get_doc_ids(generation: int, sources: list) -> dict:
+    """格言ID、ソートキーから文書IDを取得
+
+    Args:
+        generation (int): 世代
+        sources (list): [(格言ID, ソートキー)]
+
+    Returns:
+        dict: {(格言ID, ソートキー): 文書ID}
+    """
+    return {
+        source: doc['docId']
+        for source, doc in get_source_docs(generation, sources).items()
+    }
+
+
+def write_source_docs(generation: int, sources: list, docs: dict):
+    """格言ID、ソートキーから文書への対応を登録、削除
+
+    Args:
+        generation (int): 世代
+        sources (list): 変更した[(格言ID, ソートキー)]
+        docs (dict): 登録する{(格言ID, ソートキー): 文書}、含まれない場合は削除
+    """
+    requests = []
+    for adage_id, key in dict.fromkeys(sources):
+        item_key = {
+            'adageId': get_source_id(generation, adage_id),
+            'key': key,
+        }
+        doc = docs.get((adage_id, key))
+
+        if doc is None:
+            requests.append({'DeleteRequest': {'Key': item_key}})
+        else:
+            requests.append({'PutRequest': {'Item': {**item_key, **doc}}})
+
+    batch_write(table_adage, requests)
+
+
+def get_meta(consistent_read: bool=False) -> dict:
+    """検索インデックスの世代、文書数を取得
+
+    Args:
+        consistent_read (bool, optional): 強い整合性で読み込むか否か
+            Defaults to False.
+
+    Returns:
+        dict: {'generation', 'docCount', 'totalLength'}(未作成の場合は0)
+    """
+    item = table_adage.get_item(
+        Key={
+            'adageId': META_ID,
+            'key': META_KEY,
+        },
+        ConsistentRead=consistent_read,
+    ).get('Item', {})
+
+    return {
+        'generation': int(item.get('generation', 0)),
+        'docCount': int(item.get('docCount', 0)),
+        'totalLength': int(item.get('totalLength', 0)),
+    }
+
+
+def get_deleted(generation: int) -> set:
+    """削除済みの文書IDを取得
+
+    Args:
+        generation (int): 世代
+
+    Returns:
+        set: 文書IDの集合
+    """
+    item = table_adage.get_item(
+        Key={
+            'adageId': META_ID,
+            'key': get_deleted_key(generation),
+        },
+    ).get('Item', {})
+
+    return {int(doc_id) for doc_id in item.get('docIds', set())}
+
+
+def get_pending(consistent_read: bool=False) -> list:
+    """マージ前の登録、削除を取得
+
+    Args:
+        consistent_read (bool, optional): 強い整合性で読み込むか否か
+            Defaults to False.
+
+    Returns:
+        list: [((格言ID, ソートキー), 変更)]
+    """
+    from boto3.dynamodb.conditions import Key
+
+    items = query_all(
+        table_adage.query,
+        KeyConditionExpression=Key('adageId').eq(PENDING_ID),
+        ConsistentRead=consistent_read,
+    )
+
+    return [
+        ((item['sourceAdageId'], item['sourceKey']), item)
+        for item in items
+    ]
+
+
+def delete_pending(pending: list):
+    """反映したマージ前の変更を削除(反映中に更新された場合は残す)
+
+    Args:
+        pending (list): [((格言ID, ソートキー), 変更)]
+    """
+    from botocore.exceptions import ClientError
+
+    for source, item in pending:
+        try:
+            table_adage.delete_item(
+                Key={
+                    'adageId': PENDING_ID,
+                    'key': get_source_key(source),
+                },
+                ConditionExpression='updatedAt = :updatedAt',
+                ExpressionAttributeValues={
+                    ':updatedAt': item['updatedAt'],
+                },
+            )
+
+        except ClientError as e:
+            if e.response['Error']['Code'] \
+                    != 'ConditionalCheckFailedException':
+                raise e
+
+
+def batch_get(keys: list) -> list:
+    """BatchGetItemで格言テーブルのアイテムをまとめて取得
+
+    Args:
+        keys (list): キーリスト
+
+    Returns:
+        list: アイテムリスト(存在しないものは含まない)
+    """
+    items = []
+    for i in range(0, len(keys), BATCH_GET_MAX):
+        request_items = {
+            table_adage.name: {'Keys': keys[i:i + BATCH_GET_MAX]},
+        }
+        while request_items:
+            response = get_resource('dynamodb').batch_get_item(
+                RequestItems=request_items,
+            )
+            items += response.get('Responses', {}).get(table_adage.name, [])
+            request_items = response.get('UnprocessedKeys')
+
+    return items
+
+
+def to_results(hits: list, sources: dict) -> list:
+    """スコア順の文書IDから格言、エピソードを取得して検索結果を作成
+
+    Args:
+        hits (list): [(文書ID, スコア)]
+        sources (dict): {文書ID: (格言ID, ソートキー)}
+
+    Returns:
+        list: 検索結果(削除済みの格言、エピソードは含まない)
+    """
+    keys = dict.fromkeys(
+        sources[doc_id] for doc_id, _ in hits if doc_id in sources
+    )
+    items = {
+        (item['adageId'], item['key']): item
+        for item in batch_get(
+            [{'adageId': adage_id, 'key': key} for adage_id, key in keys],
+        )
+    }
+
+    results = []
+    for doc_id, score in hits:
+        item = items.get(sources.get(doc_id))
+        if item is None:
+            continue
+
+        results.append(
+            {
+                'adageId': item['adageId'],
+                'key': item['key'],
+                'title': item.get('title'),
+                'episode': item.get('episode'),
+                'userName': item.get('userName'),
+                'score': round(score, 4),
+            },
+        )
+
+    return results
+
+
+def get_terms(text: str) -> Counter:
+    """文字列を正規化し、文字n-gramの出現回数を取得
+
+    NFKCで全角英数、半角カナを揃え、英字を小文字、カタカナをひらがなにする。
+    空白、記号、句読点で区切り、区切りをまたぐn-gramは作らない
+
+    Args:
+        text (str): 文字列
+
+    Returns:
+        Counter: {語: 出現回数}
+    """
+    terms = Counter()
+    for segment in normalize(text).split():
+        if len(segment) < SEARCH_NGRAM:
+            terms[segment] += 1
+            continue
+
+        for i in range(len(segment) - SEARCH_NGRAM + 1):
+            terms[segment[i:i + SEARCH_NGRAM]] += 1
+
+    return terms
+
+
+def normalize(text: str) -> str:
+    """検索用に文字列を正規化(空白、記号は空白にする)
+
+    Args:
+        text (str): 文字列
+
+    Returns:
+        str: 正規化した文字列
+    """
+    chars = []
+    for char in unicodedata.normalize('NFKC', text or '').lower():
+        if unicodedata.category(char)[0] in 'CPSZ':
+            chars.append(' ')
+        elif 'ァ' <= char <= 'ヶ':
+            chars.append(chr(ord(char) - 0x60))
+        else:
+            chars.append(char)
+
+    return ''.join(chars)
+
+
+def get_text(item: dict) -> str:
+    """格言、エピソードのアイテムから検索対象の文字列を取得
+
+    Args:
+        item (dict): 格言(key: title)、エピソードのアイテム
+
+    Returns:
+        str: 検索対象の文字列
+    """
+    if item['key'] == 'title':
+        return item.get('title', '')
+
+    return item.get('episode', '')
+
+
+def get_term_id(generation: int, term: str) -> str:
+    return f'{SEARCH_PREFIX}{generation}#t#{term}'
+
+
+def get_terms_id(generation: int) -> str:
+    return f'{SEARCH_PREFIX}{generation}#terms'
+
+
+def get_ids_id(generation: int) -> str:
+    return f'{SEARCH_PREFIX}{generation}#ids'
+
+
+def get_source_id(generation: int, adage_id: str) -> str:
+    return f'{SEARCH_PREFIX}{generation}#s#{adage_id}'
+
+
+def get_deleted_key(generation: int) -> str:
+    return f'deleted#{generation}'
+
+
+def get_block_key(number: int) -> str:
+    return f'b#{number:010d}'
+
+
+def get_source_key(source: tuple) -> str:
+    return '#'.join(source)
+
+
+def parse_source_key(source_key: str) -> tuple:
+    adage_id, key = source_key.split('#', 1)
+    return adage_id, key
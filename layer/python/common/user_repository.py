@@ -0,0 +1,139 @@
+from common.cache import TTLCache
+from common.const import (
+    USER_CACHE_MAX_SIZE,
+    USER_CACHE_TTL,
+    USER_NEGATIVE_CACHE_TTL,
+)
+from common.resource import Table
+from common.util import is_empty
+
+
+table_user = Table.USER
+
+# ユーザ((取得済みの属性名, ユーザ))のキャッシュ
+user_cache = TTLCache(USER_CACHE_TTL, USER_CACHE_MAX_SIZE)
+
+# 存在しないユーザIDのキャッシュ
+missing_user_cache = TTLCache(USER_NEGATIVE_CACHE_TTL, USER_CACHE_MAX_SIZE)
+
+
+class UserRepository:
+    """ユーザの取得をまとめるリポジトリ
+
+    リクエストごとに作成し、同じユーザの取得結果を再利用する。
+    取得属性は同じリポジトリで要求されたものを合わせて取得するため、
+    異なる属性での再取得も1回の読み込みで済む
+    """
+
+    def __init__(self):
+        self._users = {}
+        self._login_ids = {}
+        self._projection = set()
+
+    def get(self, user_id: str, projection_list: list) -> dict:
+        """ユーザ取得
+
+        Args:
+            user_id (str): ユーザID
+            projection_list (list): 取得属性リスト
+
+        Returns:
+            dict: ユーザ、存在しない場合は空のdict
+        """
+        if is_empty(user_id):
+            return {}
+
+        self._projection.update(projection_list)
+
+        entry = self._users.get(user_id) or user_cache.get(user_id)
+
+        # 存在しないことが分かっている場合は読み込まない
+        if entry is None and missing_user_cache.get(user_id):
+            entry = (None, {})
+
+        # 未取得の属性がある場合のみ読み込む
+        if entry is None or (
+                entry[0] is not None
+                and not entry[0].issuperset(projection_list)):
+            entry = self._load(user_id, entry[0] if entry else set())
+
+        self._users[user_id] = entry
+        _, user = entry
+
+        return {
+            name: user[name]
+            for name in projection_list
+            if name in user
+        }
+
+    def get_by_login_id(self, login_id: str, projection_list: list) -> dict:
+        """ログインIDからユーザ取得
+
+        Args:
+            login_id (str): ログインID
+            projection_list (list): 取得属性リスト
+
+        Returns:
+            dict: ユーザ、存在しない場合は空のdict
+        """
+        from boto3.dynamodb.conditions import Key
+
+        key = (login_id, tuple(sorted(projection_list)))
+        if key not in self._login_ids:
+            items = table_user.query(
+                IndexName='loginId-Index',
+                KeyConditionExpression=Key('loginId').eq(login_id),
+                ProjectionExpression=','.join(projection_list),
+            ).get('Items')
+
+            self._login_ids[key] = {} if is_empty(items) else items[0]
+
+        return dict(self._login_ids[key])
+
+    def invalidate(self, user_id: str):
+        """ユーザの取得結果を破棄(更新、登録、削除時)
+
+        Args:
+            user_id (str): ユーザID
+        """
+        self._users.pop(user_id, None)
+        self._login_ids.clear()
+        invalidate(user_id)
+
+    def _load(self, user_id: str, loaded: set) -> tuple:
+        names = sorted(self._projection.union(loaded))
+        item = table_user.get_item(
+            Key={
+                'userId': user_id,
+                'key': 'userId',
+            },
+            ProjectionExpression=','.join(f'#{name}' for name in names),
+            ExpressionAttributeNames={f'#{name}': name for name in names},
+        ).get('Item')
+
+        if is_empty(item):
+            missing_user_cache.set(user_id, True)
+            user_cache.delete(user_id)
+            return None, {}
+
+        entry = (frozenset(names), item)
+        user_cache.set(user_id, entry)
+
+        return entry
+
+
+def invalidate(user_id: str):
+    """コンテナ内のキャッシュからユーザを破棄
+
+    Args:
+        user_id (str): ユーザID
+    """
+    user_cache.delete(user_id)
+    missing_user_cache.delete(user_id)
+
+
+def clear_cache():
+    """コンテナ内のユーザのキャッシュを全て破棄
+    """
+    user_cache.clear()
+    missing_user_cache.clear()
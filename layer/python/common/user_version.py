@@ -0,0 +1,105 @@
+from decimal import Decimal
+
+from common.concurrency import call_with_retry, run_parallel
+from common.resource import Table
+
+
+table_user = Table.USER
+
+# ユーザのパーティションの更新バージョンのソートキー
+# (ユーザ本体とは別のアイテムにし、ユーザ本体の読み込みへ影響させない)
+VERSION_KEY = 'version'
+
+
+def bump(user_id: str):
+    """ユーザの更新バージョンを1つ進める
+
+    ユーザのパーティションへの書き込みの後に呼び出す
+
+    Args:
+        user_id (str): ユーザID
+    """
+    if not is_versioned(user_id):
+        return
+
+    call_with_retry(
+        table_user.meta.client.update_item,
+        **get_version_update(user_id),
+    )
+
+
+def bump_all(user_ids: list):
+    """複数ユーザの更新バージョンを並列で進める
+
+    Args:
+        user_ids (list): ユーザIDリスト(重複は1回にまとめる)
+
+    Raises:
+        Exception: いずれかの更新が失敗した場合
+    """
+    for result in run_parallel(bump, list(dict.fromkeys(user_ids))):
+        if isinstance(result, Exception):
+            raise result
+
+
+def get_version_update(user_id: str) -> dict:
+    """更新バージョンを進める更新(TransactWriteItemsのUpdate)を取得
+
+    Args:
+        user_id (str): ユーザID
+
+    Returns:
+        dict: 更新
+    """
+    return {
+        'TableName': table_user.name,
+        'Key': {
+            'userId': user_id,
+            'key': VERSION_KEY,
+        },
+        'UpdateExpression': 'ADD #version :one',
+        'ExpressionAttributeNames': {
+            '#version': 'version',
+        },
+        'ExpressionAttributeValues': {
+            ':one': Decimal(1),
+        },
+    }
+
+
+def get_version(user_id: str) -> int:
+    """ユーザの更新バージョンを取得
+
+    直前の書き込みを反映した値を返すため、強い整合性で読み込む
+
+    Args:
+        user_id (str): ユーザID
+
+    Returns:
+        int: 更新バージョン、更新がない場合0
+    """
+    item = table_user.get_item(
+        Key={
+            'userId': user_id,
+            'key': VERSION_KEY,
+        },
+        ProjectionExpression='#version',
+        ExpressionAttributeNames={
+            '#version': 'version',
+        },
+        ConsistentRead=True,
+    ).get('Item', {})
+
+    return int(item.get('version', 0))
+
+
+def is_versioned(user_id: str) -> bool:
+    """更新バージョンを持つユーザか否か(ゲストは持たない)
+
+    Args:
+        user_id (str): ユーザID
+
+    Returns:
+        bool: 更新バージョンを持つか否か
+    """
+    return bool(user_id) and not user_id.startswith('guest')
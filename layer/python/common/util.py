@@ -1,12 +1,16 @@
 from datetime import datetime, timedelta, timezone
 from decimal import Decimal
 
+from common import user_version
 from common.const import JST, SendReason
 from common.resource import Table
 
 
 table_user = Table.USER
 
+# 日時順のポイント履歴のソートキーの接頭辞
+POINT_KEY_PREFIX = 'point#t#'
+
 
 def is_empty(item: any) -> bool:
     """空の判定
@@ -32,6 +36,26 @@ def is_empty(item: any) -> bool:
     return False
 
 
+def get_header(event: dict, name: str) -> str:
+    """イベントからリクエストヘッダを取得(大文字小文字を区別しない)
+
+    Args:
+        event (dict): イベント
+        name (str): ヘッダ名
+
+    Returns:
+        str: ヘッダの値、存在しない場合None
+    """
+    headers = (event or {}).get('headers') or {}
+    name = name.lower()
+
+    for key, value in headers.items():
+        if key.lower() == name:
+            return value
+
+    return None
+
+
 def add_point_history(
         user_id: str,
         reason: SendReason,
@@ -45,21 +69,79 @@ def add_point_history(
         sender_id (str): 送信者ID
         sender_name (str): 送信者名
     """
-    jst_timestamp: float = get_jst_timestamp()
-
     table_user.put_item(
-        Item={
-            'userId': user_id,
-            'key': '#'.join(['point', sender_id, str(jst_timestamp)]),
-            'senderId': sender_id,
-            'senderName': sender_name,
-            'reason': reason.value,
-            'point': reason.point,
-            'dateTime': Decimal(jst_timestamp),
-        },
+        Item=make_point_history(user_id, reason, sender_id, sender_name),
+    )
+    user_version.bump(user_id)
+
+
+def make_point_history(
+        user_id: str,
+        reason: SendReason,
+        sender_id: str='admin',
+        sender_name: str='管理人',
+        jst_timestamp: float=None) -> dict:
+    """ポイント履歴アイテム作成
+
+    Args:
+        user_id (str): ユーザID
+        reason (SendReason): 送信理由
+        sender_id (str): 送信者ID
+        sender_name (str): 送信者名
+        jst_timestamp (float, optional): 日時、省略時は現在時間
+            Defaults to None.
+
+    Returns:
+        dict: ポイント履歴アイテム
+    """
+    if jst_timestamp is None:
+        jst_timestamp = get_jst_timestamp()
+
+    return {
+        'userId': user_id,
+        'key': make_point_key(sender_id, jst_timestamp),
+        'senderId': sender_id,
+        'senderName': sender_name,
+        'reason': reason.value,
+        'point': reason.point,
+        'dateTime': Decimal(jst_timestamp),
+    }
+
+
+def make_point_key(sender_id: str, jst_timestamp: float) -> str:
+    """ポイント履歴のソートキー作成
+
+    日時を固定桁のマイクロ秒にして送信者IDより前に置き、
+    ソートキー順が日時順になるようにする(point#t#<日時>#<送信者ID>)
+
+    Args:
+        sender_id (str): 送信者ID
+        jst_timestamp (float): 日時
+
+    Returns:
+        str: ソートキー
+    """
+    return '#'.join(
+        [
+            POINT_KEY_PREFIX.rstrip('#'),
+            format_point_time(jst_timestamp),
+            sender_id,
+        ],
     )
 
 
+def format_point_time(jst_timestamp: float) -> str:
+    """日時をソートキー用の固定桁(16桁)のマイクロ秒へ変換
+
+    Args:
+        jst_timestamp (float): 日時
+
+    Returns:
+        str: 固定桁のマイクロ秒
+    """
+    return str(int(round(jst_timestamp * 1000000))).zfill(16)
+
+
 def get_jst_timestamp() -> float:
     """JST現在時間のtimestampを取得
 
@@ -67,3 +149,19 @@ def get_jst_timestamp() -> float:
         float: JST_timestamp
     """
     return datetime.now(JST).timestamp()
+
+
+def has_time(context, margin_ms: int) -> bool:
+    """Lambdaの残り時間に処理を続ける余裕があるか
+
+    Args:
+        context (dict): コンテキスト(Noneの場合は時間制限なし)
+        margin_ms (int): 残しておく時間(ミリ秒)
+
+    Returns:
+        bool: 残り時間があるか
+    """
+    if context is None or not hasattr(context, 'get_remaining_time_in_millis'):
+        return True
+
+    return context.get_remaining_time_in_millis() > margin_ms
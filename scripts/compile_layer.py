@@ -0,0 +1,66 @@
+"""Lambdaレイヤーのバイトコードを事前コンパイル
+
+Lambdaの/optは読み取り専用のため、実行時に__pycache__を書き込めず、
+コールドスタートのたびにレイヤーのモジュールがコンパイルされる。
+デプロイ前に実行し、レイヤーへコンパイル済みのバイトコードを含める
+
+使い方(serverless.ymlのruntimeと同じバージョンのPythonで実行):
+    python scripts/compile_layer.py && sls deploy
+"""
+import compileall
+import os
+import py_compile
+import re
+import sys
+
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# コンパイル対象(レイヤー、関数)
+TARGET_DIRS = [
+    os.path.join(ROOT_DIR, 'layer', 'python'),
+    os.path.join(ROOT_DIR, 'functions'),
+]
+
+
+def get_runtime_version() -> str:
+    """serverless.ymlのruntimeのPythonバージョンを取得
+
+    Returns:
+        str: バージョン(3.8)、取得できない場合None
+    """
+    with open(os.path.join(ROOT_DIR, 'serverless.yml')) as f:
+        match = re.search(r'runtime:\s*python(\d+\.\d+)', f.read())
+
+    return match.group(1) if match else None
+
+
+def main() -> int:
+    runtime_version = get_runtime_version()
+    current_version = '{0}.{1}'.format(*sys.version_info[:2])
+
+    # バージョンが異なるバイトコードは実行時に使われない
+    if runtime_version is not None and runtime_version != current_version:
+        print(
+            f'Python {current_version} does not match the Lambda runtime '
+            f'python{runtime_version}.',
+            file=sys.stderr,
+        )
+        return 1
+
+    # zip展開で更新日時が変わっても使われるよう、ハッシュで検証する
+    success = all(
+        compileall.compile_dir(
+            target_dir,
+            quiet=1,
+            workers=0,
+            invalidation_mode=py_compile.PycInvalidationMode.CHECKED_HASH,
+        )
+        for target_dir in TARGET_DIRS
+    )
+
+    return 0 if success else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
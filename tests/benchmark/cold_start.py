@@ -0,0 +1,202 @@
+"""コールドスタートのベンチマーク
+
+serverless.ymlの関数ごとに新しいプロセスを起動し、
+ハンドラのモジュール読み込み時間と初回呼び出しの処理時間を計測する。
+AWSはmotoでモックするため、計測値は通信時間を含まない
+
+使い方:
+    python tests/benchmark/cold_start.py [--repeat 5] [--handler adage.get]
+        [--json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+import yaml
+
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+# 計測用プロセスの環境変数(未設定の場合のみ)
+DEFAULT_ENVIRONMENT = {
+    'AWS_DEFAULT_REGION': 'ap-northeast-1',
+    'AWS_ACCESS_KEY_ID': 'testing',
+    'AWS_SECRET_ACCESS_KEY': 'testing',
+    'COGNITO_CLIENT_ID': 'benchmark',
+    'COGNITO_USER_POOL_ID': 'benchmark',
+    'TABLE_NAME_PREFIX': 'benchmark-',
+    'LAMBDA_STAGE': 'benchmark',
+    'CURSOR_SECRET': 'benchmark',
+    'PASSWORD': 'benchmark',
+    'LOGIN_ID': 'benchmark@example.com',
+}
+
+# モジュール読み込み時間の計測(AWSへの接続なし)
+IMPORT_SCRIPT = '''
+import importlib, json, sys, time
+start = time.perf_counter()
+importlib.import_module(sys.argv[1])
+print(json.dumps({'import': time.perf_counter() - start}))
+'''
+
+# 初回呼び出しの計測(motoのモック、テーブル作成後に読み込み、呼び出し)
+INVOKE_SCRIPT = '''
+import importlib, json, sys, time
+from moto import mock_cognitoidp, mock_dynamodb2
+for mock in [mock_dynamodb2(), mock_cognitoidp()]:
+    mock.start()
+from set_up import create_tables
+create_tables()
+
+module_name, function_name, event = sys.argv[1], sys.argv[2], sys.argv[3]
+start = time.perf_counter()
+function = getattr(importlib.import_module(module_name), function_name)
+imported = time.perf_counter()
+try:
+    function(json.loads(event), None)
+except Exception:
+    pass
+print(json.dumps({'first_call': time.perf_counter() - imported}))
+'''
+
+# 全ハンドラ共通の最小イベント
+EVENT = {
+    'requestContext': {
+        'authorizer': {
+            'claims': {
+                'sub': 'benchmark-user',
+            },
+        },
+    },
+    'pathParameters': {
+        'adageId': 'benchmark-adage',
+        'userId': 'benchmark-user',
+        'senderUserId': 'benchmark-sender',
+        'jobId': 'benchmark-job',
+    },
+    'queryStringParameters': None,
+    'headers': {},
+    'body': '{}',
+    'userId': 'benchmark-user',
+    'jobId': 'benchmark-job',
+    'month': 1,
+}
+
+
+def get_handlers() -> dict:
+    """serverless.ymlから関数名とハンドラを取得
+
+    Returns:
+        dict: {関数名: ハンドラ(functions/adage.get)}
+    """
+    with open(os.path.join(ROOT_DIR, 'serverless.yml')) as f:
+        text = f.read()
+
+    # Serverlessの変数(${...})はyamlとして読めないため、関数定義のみ抽出
+    functions = yaml.safe_load(
+        text[text.index('\nfunctions:'):].replace('${', '_{'),
+    )['functions']
+
+    return {
+        name: definition['handler']
+        for name, definition in functions.items()
+    }
+
+
+def run(script: str, *args) -> dict:
+    """新しいPythonプロセスでスクリプトを実行
+
+    Args:
+        script (str): スクリプト
+
+    Returns:
+        dict: 計測結果
+    """
+    environment = {**DEFAULT_ENVIRONMENT, **os.environ}
+    environment['PYTHONPATH'] = os.pathsep.join(
+        [
+            os.path.join(ROOT_DIR, 'functions'),
+            os.path.join(ROOT_DIR, 'layer', 'python'),
+            os.path.join(ROOT_DIR, 'tests', 'ut'),
+        ],
+    )
+    environment['PYTHONDONTWRITEBYTECODE'] = '1'
+
+    result = subprocess.run(
+        [sys.executable, '-c', script, *args],
+        cwd=ROOT_DIR,
+        env=environment,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def measure(handler: str, repeat: int) -> dict:
+    """ハンドラのコールドスタートを計測
+
+    Args:
+        handler (str): ハンドラ(functions/adage.get)
+        repeat (int): 計測回数
+
+    Returns:
+        dict: 中央値(ミリ秒)
+    """
+    module_name, function_name = handler.split('/')[-1].rsplit('.', 1)
+    imports = []
+    first_calls = []
+
+    for _ in range(repeat):
+        imports.append(run(IMPORT_SCRIPT, module_name)['import'])
+        first_calls.append(
+            run(
+                INVOKE_SCRIPT,
+                module_name,
+                function_name,
+                json.dumps(EVENT),
+            )['first_call'],
+        )
+
+    return {
+        'import_ms': round(statistics.median(imports) * 1000, 1),
+        'first_call_ms': round(statistics.median(first_calls) * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cold start benchmark')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument(
+        '--handler',
+        action='append',
+        help='module.function (e.g. adage.get)',
+    )
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    results = {}
+    for name, handler in get_handlers().items():
+        if args.handler and handler.split('/')[-1] not in args.handler:
+            continue
+
+        results[name] = {'handler': handler, **measure(handler, args.repeat)}
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f'{"function":<28}{"import(ms)":>12}{"first call(ms)":>16}')
+    for name, result in results.items():
+        print(
+            f'{name:<28}{result["import_ms"]:>12.1f}'
+            f'{result["first_call_ms"]:>16.1f}',
+        )
+
+
+if __name__ == '__main__':
+    main()
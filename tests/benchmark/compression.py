@@ -0,0 +1,110 @@
+"""レスポンス圧縮のベンチマーク
+
+json_encoder.pyと同じ格言フィードをJSONへ変換し、圧縮方式とレベルごとに
+圧縮後のサイズ(base64後)と圧縮時間を計測する
+
+使い方:
+    python tests/benchmark/compression.py [--adages 1000] [--episodes 10]
+        [--repeat 20] [--json]
+"""
+import argparse
+from base64 import b64encode
+import gzip
+import json
+import os
+import statistics
+import sys
+import time
+
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from json_encoder import make_feed, response  # noqa: E402
+
+
+def get_compressors() -> dict:
+    """計測する圧縮方式とレベルの組み合わせを作成
+
+    Returns:
+        dict: {名前: 圧縮関数}
+    """
+    compressors = {'identity': lambda body: body}
+    for level in [1, 6, 9]:
+        compressors[f'gzip-{level}'] = \
+            lambda body, level=level: gzip.compress(
+                body, compresslevel=level, mtime=0,
+            )
+
+    if response.brotli is not None:
+        for quality in [1, 5, 11]:
+            compressors[f'br-{quality}'] = \
+                lambda body, quality=quality: response.brotli.compress(
+                    body, quality=quality,
+                )
+
+    return compressors
+
+
+def measure(compress, body: bytes, repeat: int) -> dict:
+    """圧縮時間とサイズを計測
+
+    Args:
+        compress (function): 圧縮関数
+        body (bytes): ボディ
+        repeat (int): 計測回数
+
+    Returns:
+        dict: 圧縮時間の中央値(ミリ秒)、圧縮後のサイズ、
+            送信サイズ(圧縮した場合はbase64後)と元のサイズとの比
+    """
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        compressed = compress(body)
+        durations.append(time.perf_counter() - start)
+
+    sent = len(body) if compressed is body else len(b64encode(compressed))
+
+    return {
+        'compress_ms': round(statistics.median(durations) * 1000, 2),
+        'bytes': len(compressed),
+        'sent_bytes': sent,
+        'ratio': round(sent / len(body), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compression benchmark')
+    parser.add_argument('--adages', type=int, default=1000)
+    parser.add_argument('--episodes', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    body = response.dumps(
+        make_feed(args.adages, args.episodes),
+    ).encode('utf-8')
+
+    results = {
+        name: measure(compress, body, args.repeat)
+        for name, compress in get_compressors().items()
+    }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(
+        f'{"encoding":<10}{"compress(ms)":>14}{"bytes":>12}'
+        f'{"sent":>12}{"ratio":>8}',
+    )
+    for name, result in results.items():
+        print(
+            f'{name:<10}{result["compress_ms"]:>14.2f}'
+            f'{result["bytes"]:>12}{result["sent_bytes"]:>12}'
+            f'{result["ratio"]:>8.3f}',
+        )
+
+
+if __name__ == '__main__':
+    main()
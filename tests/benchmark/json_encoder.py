@@ -0,0 +1,176 @@
+"""レスポンスのJSON変換のベンチマーク
+
+DynamoDBから読んだ形(Decimalを含む)の格言フィードを作成し、
+以下の変換方法ごとに変換時間とメモリ割り当てを計測する
+
+    manual: ハンドラでDecimalを手作業でintへ変換してからjson.dumps
+    json: common.response.dumps(標準ライブラリ)
+    orjson: common.response.dumps(orjson、インストールされている場合)
+
+使い方:
+    python tests/benchmark/json_encoder.py [--adages 1000] [--episodes 10]
+        [--repeat 20] [--json]
+"""
+import argparse
+from decimal import Decimal
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from unittest import mock
+
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, os.path.join(ROOT_DIR, 'layer', 'python'))
+
+# 共通レイヤーの読み込みに必要な環境変数(未設定の場合のみ、AWSへの接続なし)
+for name, value in {
+    'AWS_DEFAULT_REGION': 'ap-northeast-1',
+    'COGNITO_CLIENT_ID': 'benchmark',
+    'COGNITO_USER_POOL_ID': 'benchmark',
+    'TABLE_NAME_PREFIX': 'benchmark-',
+    'LAMBDA_STAGE': 'benchmark',
+    'CURSOR_SECRET': 'benchmark',
+}.items():
+    os.environ.setdefault(name, value)
+
+from common import response  # noqa: E402
+
+
+def make_feed(adages: int, episodes: int) -> list:
+    """DynamoDBから読んだ形の格言フィードを作成
+
+    Args:
+        adages (int): 格言数
+        episodes (int): 格言ごとのエピソード数
+
+    Returns:
+        list: 格言フィード
+    """
+    return [
+        {
+            'adageId': f'adage-{i:06d}',
+            'title': f'格言タイトル{i}',
+            'registrationMonth': Decimal(1),
+            'likePoints': Decimal(adages - i),
+            'episode': [
+                {
+                    'adageId': f'adage-{i:06d}',
+                    'key': f'episode#user-{j:04d}',
+                    'userId': f'user-{j:04d}',
+                    'userName': f'ユーザ{j}',
+                    'episode': 'エピソード本文' * 8,
+                    'likePoints': Decimal(j),
+                }
+                for j in range(episodes)
+            ],
+        }
+        for i in range(adages)
+    ]
+
+
+def manual(feed: list) -> str:
+    """従来の方法(Decimalを手作業で変換してからjson.dumps)
+
+    Args:
+        feed (list): 格言フィード
+
+    Returns:
+        str: JSON
+    """
+    converted = []
+    for adage in feed:
+        adage = dict(adage)
+        adage['registrationMonth'] = int(adage['registrationMonth'])
+        adage['likePoints'] = int(adage['likePoints'])
+        adage['episode'] = [
+            {**episode, 'likePoints': int(episode['likePoints'])}
+            for episode in adage['episode']
+        ]
+        converted.append(adage)
+
+    return json.dumps(converted)
+
+
+def with_backend(backend: str):
+    """指定したエンコーダでcommon.response.dumpsを呼び出す関数を作成
+
+    Args:
+        backend (str): JSON_BACKEND
+
+    Returns:
+        function: 変換関数
+    """
+    def encode(feed: list) -> str:
+        with mock.patch.object(response, 'JSON_BACKEND', backend):
+            return response.dumps(feed)
+
+    return encode
+
+
+def measure(encode, feed: list, repeat: int) -> dict:
+    """変換時間とメモリ割り当てを計測
+
+    Args:
+        encode (function): 変換関数
+        feed (list): 格言フィード
+        repeat (int): 計測回数
+
+    Returns:
+        dict: 変換時間の中央値(ミリ秒)、割り当てのピーク(KiB)、出力サイズ
+    """
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = encode(feed)
+        durations.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    encode(feed)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'encode_ms': round(statistics.median(durations) * 1000, 2),
+        'peak_kib': round(peak / 1024, 1),
+        'bytes': len(body.encode('utf-8')),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='JSON encoder benchmark')
+    parser.add_argument('--adages', type=int, default=1000)
+    parser.add_argument('--episodes', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    feed = make_feed(args.adages, args.episodes)
+    encoders = {
+        'manual': manual,
+        'json': with_backend('json'),
+    }
+    if response.orjson is not None:
+        encoders['orjson'] = with_backend('auto')
+
+    results = {
+        name: measure(encode, feed, args.repeat)
+        for name, encode in encoders.items()
+    }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f'{"encoder":<10}{"encode(ms)":>12}{"peak(KiB)":>12}{"bytes":>12}')
+    for name, result in results.items():
+        print(
+            f'{name:<10}{result["encode_ms"]:>12.2f}'
+            f'{result["peak_kib"]:>12.1f}{result["bytes"]:>12}',
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,225 @@
+"""ユーザランキングのベンチマーク
+
+合成したユーザのいいねポイント(べき分布)に対して、以下を計測する
+
+    sort: 全ユーザをソートして順位を求める(スキャンによる方法)
+    histogram: ヒストグラムの作成と、ヒストグラムからの順位の推定
+        (推定誤差、正確な順位の割合を含む)
+    update: いいねポイントの加算を順に反映した場合の処理時間と、
+        ヒストグラム、上位ランキングへの書き込みが必要になった割合
+
+DynamoDBへは接続せず、common.leaderboardの計算部分のみを計測する
+
+使い方:
+    python tests/benchmark/leaderboard.py [--users 1000000]
+        [--queries 10000] [--updates 100000] [--seed 1] [--json]
+"""
+import argparse
+import bisect
+from collections import Counter
+import heapq
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, os.path.join(ROOT_DIR, 'layer', 'python'))
+
+# 共通レイヤーの読み込みに必要な環境変数(未設定の場合のみ、AWSへの接続なし)
+for name, value in {
+    'AWS_DEFAULT_REGION': 'ap-northeast-1',
+    'COGNITO_CLIENT_ID': 'benchmark',
+    'COGNITO_USER_POOL_ID': 'benchmark',
+    'TABLE_NAME_PREFIX': 'benchmark-',
+    'LAMBDA_STAGE': 'benchmark',
+    'CURSOR_SECRET': 'benchmark',
+}.items():
+    os.environ.setdefault(name, value)
+
+from common import leaderboard  # noqa: E402
+
+
+def make_scores(users: int, rng: random.Random) -> list:
+    """ユーザのいいねポイントを作成(多くが登録時のポイント付近のべき分布)
+
+    Args:
+        users (int): ユーザ数
+        rng (Random): 乱数
+
+    Returns:
+        list: いいねポイントリスト
+    """
+    return [
+        100 + int(rng.paretovariate(1.2)) - 1
+        if rng.random() < 0.9
+        else int(rng.paretovariate(0.8) * 100)
+        for _ in range(users)
+    ]
+
+
+def measure_sort(scores: list, queries: list) -> dict:
+    """全ユーザのソートによる順位の計測
+
+    Args:
+        scores (list): いいねポイントリスト
+        queries (list): 順位を求めるいいねポイントリスト
+
+    Returns:
+        dict: ソート時間(ミリ秒)、1件あたりの順位の取得時間(マイクロ秒)
+    """
+    start = time.perf_counter()
+    ordered = sorted(scores)
+    sort_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    for score in queries:
+        len(ordered) - bisect.bisect_right(ordered, score) + 1
+    rank_us = (time.perf_counter() - start) * 1000000 / len(queries)
+
+    return {
+        'build_ms': round(sort_ms, 1),
+        'rank_us': round(rank_us, 2),
+        'items': len(ordered),
+    }
+
+
+def measure_histogram(scores: list, queries: list) -> dict:
+    """ヒストグラムによる順位の推定の計測
+
+    Args:
+        scores (list): いいねポイントリスト
+        queries (list): 順位を求めるいいねポイントリスト
+
+    Returns:
+        dict: 作成時間(ミリ秒)、1件あたりの推定時間(マイクロ秒)、
+            範囲の数、推定誤差(相対誤差の平均、最大)、正確な順位の割合
+    """
+    start = time.perf_counter()
+    buckets = dict(Counter(leaderboard.get_bucket(score) for score in scores))
+    build_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    estimates = [
+        leaderboard.estimate_rank(buckets, score) for score in queries
+    ]
+    rank_us = (time.perf_counter() - start) * 1000000 / len(queries)
+
+    ordered = sorted(scores)
+    errors = []
+    exact = 0
+    for score, (rank, _) in zip(queries, estimates):
+        actual = len(ordered) - bisect.bisect_right(ordered, score) + 1
+        errors.append(abs(rank - actual) / actual)
+        exact += rank == actual
+
+    return {
+        'build_ms': round(build_ms, 1),
+        'rank_us': round(rank_us, 2),
+        'items': len(buckets),
+        'mean_error': round(statistics.mean(errors), 5),
+        'max_error': round(max(errors), 5),
+        'exact_ratio': round(exact / len(queries), 3),
+    }
+
+
+def measure_updates(scores: list, updates: int, rng: random.Random) -> dict:
+    """いいねポイントの加算の反映の計測
+
+    Args:
+        scores (list): いいねポイントリスト(変更する)
+        updates (int): 加算回数
+        rng (Random): 乱数
+
+    Returns:
+        dict: 1件あたりの処理時間(マイクロ秒)、範囲の移動、
+            上位ランキングの更新が必要になった割合
+    """
+    capacity = leaderboard.LEADERBOARD_TOP_SIZE \
+        + leaderboard.LEADERBOARD_TOP_MARGIN
+    top = [
+        {'userId': str(i), 'userName': '', 'likePoints': score}
+        for i, score in heapq.nlargest(
+            capacity, enumerate(scores), key=lambda x: x[1],
+        )
+    ]
+    leaderboard.sort_users(top)
+
+    # 人気のユーザほどハートを受け取りやすい
+    weights = [score + 1 for score in scores]
+    targets = rng.choices(range(len(scores)), weights=weights, k=updates)
+
+    moved = 0
+    top_writes = 0
+    start = time.perf_counter()
+    for user in targets:
+        old = scores[user]
+        scores[user] = new = old + 1
+
+        if leaderboard.get_bucket(old) != leaderboard.get_bucket(new):
+            moved += 1
+
+        entry = {'userId': str(user), 'userName': '', 'likePoints': new}
+        if leaderboard.merge_top(top, entry, capacity):
+            top_writes += 1
+    update_us = (time.perf_counter() - start) * 1000000 / updates
+
+    return {
+        'update_us': round(update_us, 2),
+        'bucket_write_ratio': round(moved / updates, 3),
+        'top_write_ratio': round(top_writes / updates, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Leaderboard benchmark')
+    parser.add_argument('--users', type=int, default=1000000)
+    parser.add_argument('--queries', type=int, default=10000)
+    parser.add_argument('--updates', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    scores = make_scores(args.users, rng)
+    queries = rng.sample(scores, min(args.queries, len(scores)))
+
+    results = {
+        'sort': measure_sort(scores, queries),
+        'histogram': measure_histogram(scores, queries),
+        'update': measure_updates(scores, args.updates, rng),
+    }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f'users: {args.users}')
+    print(f'{"method":<12}{"build(ms)":>12}{"rank(us)":>12}{"items":>10}')
+    for name in ['sort', 'histogram']:
+        result = results[name]
+        print(
+            f'{name:<12}{result["build_ms"]:>12.1f}'
+            f'{result["rank_us"]:>12.2f}{result["items"]:>10}',
+        )
+
+    histogram = results['histogram']
+    print(
+        f'histogram error: mean {histogram["mean_error"]:.5f}, '
+        f'max {histogram["max_error"]:.5f}, '
+        f'exact {histogram["exact_ratio"]:.1%}',
+    )
+
+    update = results['update']
+    print(
+        f'update: {update["update_us"]:.2f}us/op, '
+        f'bucket writes {update["bucket_write_ratio"]:.1%}, '
+        f'top writes {update["top_write_ratio"]:.1%}',
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,264 @@
+"""全文検索のベンチマーク
+
+合成した格言、エピソードに対して、以下を計測する
+
+    index: 転置リストの作成時間、語数、圧縮前後のサイズ
+    scan: 全文書の部分一致による検索(インデックスなし)
+    index query: 転置リストの展開とBM25によるスコア付け
+        (出現文書の多いクエリ、少ないクエリそれぞれの平均、p95)
+
+DynamoDBへは接続せず、common.searchの計算部分のみを計測する
+
+使い方:
+    python tests/benchmark/search.py [--docs 100000] [--queries 200]
+        [--seed 1] [--json]
+"""
+import argparse
+from collections import defaultdict
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, os.path.join(ROOT_DIR, 'layer', 'python'))
+
+# 共通レイヤーの読み込みに必要な環境変数(未設定の場合のみ、AWSへの接続なし)
+for name, value in {
+    'AWS_DEFAULT_REGION': 'ap-northeast-1',
+    'COGNITO_CLIENT_ID': 'benchmark',
+    'COGNITO_USER_POOL_ID': 'benchmark',
+    'TABLE_NAME_PREFIX': 'benchmark-',
+    'LAMBDA_STAGE': 'benchmark',
+    'CURSOR_SECRET': 'benchmark',
+}.items():
+    os.environ.setdefault(name, value)
+
+from common import search  # noqa: E402
+
+
+# 語を作る文字(ひらがな、カタカナ、常用漢字の一部)
+CHARS = [chr(code) for code in range(ord('ぁ'), ord('ゖ'))] \
+    + [chr(code) for code in range(ord('ァ'), ord('ヶ'))] \
+    + list('日月火水木金土山川田人口目耳手足力心年時分上下左右大小中石')
+WORDS = 20000
+
+
+def make_words(rng: random.Random) -> list:
+    """2〜4文字の語を作成
+
+    Args:
+        rng (Random): 乱数
+
+    Returns:
+        list: 語リスト(出現頻度の高い順)
+    """
+    return [
+        ''.join(rng.choices(CHARS, k=rng.randint(2, 4)))
+        for _ in range(WORDS)
+    ]
+
+
+def make_corpus(docs: int, words: list, rng: random.Random) -> list:
+    """格言タイトル、エピソードの文字列を作成(語の出現頻度はZipf分布)
+
+    Args:
+        docs (int): 文書数
+        words (list): 語リスト
+        rng (Random): 乱数
+
+    Returns:
+        list: 文字列リスト
+    """
+    weights = [1 / (i + 1) for i in range(len(words))]
+
+    corpus = []
+    for i in range(docs):
+        # 3件に1件は格言タイトル(短い)、それ以外はエピソード(長い)
+        length = rng.randint(3, 8) if i % 3 == 0 else rng.randint(20, 80)
+        chosen = rng.choices(words, weights=weights, k=length)
+        corpus.append('。'.join(
+            ''.join(chosen[j:j + 4]) for j in range(0, length, 4)
+        ))
+
+    return corpus
+
+
+def measure_index(corpus: list) -> tuple:
+    """転置リストの作成と圧縮の計測
+
+    Args:
+        corpus (list): 文字列リスト
+
+    Returns:
+        tuple: (
+            dict: 作成時間(ミリ秒)、語数、ブロック数、
+                圧縮前(JSON)、圧縮後のサイズ(バイト),
+            dict: {語: 圧縮した転置リストのブロックリスト},
+        )
+    """
+    start = time.perf_counter()
+    postings = defaultdict(list)
+    for doc_id, text in enumerate(corpus):
+        terms = search.get_terms(text)
+        length = sum(terms.values())
+        for term, tf in terms.items():
+            postings[term].append((doc_id, tf, length))
+
+    size = search.POSTING_BLOCK_SIZE
+    blocks = {
+        term: [
+            search.encode_postings(term_postings[i:i + size])
+            for i in range(0, len(term_postings), size)
+        ]
+        for term, term_postings in postings.items()
+    }
+    build_ms = (time.perf_counter() - start) * 1000
+
+    raw_bytes = sum(
+        len(json.dumps(term_postings)) for term_postings in postings.values()
+    )
+    encoded_bytes = sum(
+        len(block) for term_blocks in blocks.values() for block in term_blocks
+    )
+
+    return {
+        'build_ms': round(build_ms, 1),
+        'terms': len(blocks),
+        'blocks': sum(len(term_blocks) for term_blocks in blocks.values()),
+        'raw_bytes': raw_bytes,
+        'encoded_bytes': encoded_bytes,
+        'bytes_per_posting': round(
+            encoded_bytes / sum(len(x) for x in postings.values()), 2,
+        ),
+    }, blocks
+
+
+def measure_scan(corpus: list, queries: list) -> dict:
+    """全文書の部分一致による検索の計測
+
+    Args:
+        corpus (list): 文字列リスト
+        queries (list): クエリリスト
+
+    Returns:
+        dict: 1件あたりの平均、p95(ミリ秒)
+    """
+    normalized = [search.normalize(text) for text in corpus]
+
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        needle = search.normalize(query)
+        [i for i, text in enumerate(normalized) if needle in text]
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    return summarize(latencies)
+
+
+def measure_query(blocks: dict, corpus_size: int, queries: list) -> dict:
+    """転置リストによる検索の計測
+
+    Args:
+        blocks (dict): {語: 圧縮した転置リストのブロックリスト}
+        corpus_size (int): 文書数
+        queries (list): クエリリスト
+
+    Returns:
+        dict: 1件あたりの平均、p95(ミリ秒)、平均ヒット数
+    """
+    latencies = []
+    hits = []
+    for query in queries:
+        start = time.perf_counter()
+        postings = {}
+        for term in search.get_terms(query):
+            postings[term] = []
+            for block in blocks.get(term, []):
+                postings[term] += search.decode_postings(block)
+
+        ranked = search.rank_documents(postings, corpus_size, 40)
+        ranked[:search.SEARCH_MAX_HITS]
+        latencies.append((time.perf_counter() - start) * 1000)
+        hits.append(len(ranked))
+
+    return {
+        **summarize(latencies),
+        'hits': round(statistics.mean(hits), 1),
+    }
+
+
+def summarize(latencies: list) -> dict:
+    """処理時間の平均、p95
+
+    Args:
+        latencies (list): 処理時間リスト(ミリ秒)
+
+    Returns:
+        dict: 平均、p95(ミリ秒)
+    """
+    latencies = sorted(latencies)
+
+    return {
+        'mean_ms': round(statistics.mean(latencies), 3),
+        'p95_ms': round(latencies[int(len(latencies) * 0.95)], 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Search benchmark')
+    parser.add_argument('--docs', type=int, default=100000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    words = make_words(rng)
+    corpus = make_corpus(args.docs, words, rng)
+
+    # 出現頻度の高い語、低い語のクエリ
+    common = [rng.choice(words[:20]) for _ in range(args.queries)]
+    rare = [rng.choice(words[1000:]) for _ in range(args.queries)]
+
+    index, blocks = measure_index(corpus)
+    results = {
+        'index': index,
+        'scan': {
+            'common': measure_scan(corpus, common),
+            'rare': measure_scan(corpus, rare),
+        },
+        'index_query': {
+            'common': measure_query(blocks, len(corpus), common),
+            'rare': measure_query(blocks, len(corpus), rare),
+        },
+    }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(
+        f'docs: {args.docs}, terms: {index["terms"]}, '
+        f'blocks: {index["blocks"]}, build: {index["build_ms"]:.1f}ms',
+    )
+    print(
+        f'postings: {index["raw_bytes"]} bytes (json) -> '
+        f'{index["encoded_bytes"]} bytes '
+        f'({index["bytes_per_posting"]:.2f} bytes/posting)',
+    )
+    print(f'{"method":<14}{"query":<8}{"mean(ms)":>10}{"p95(ms)":>10}')
+    for method in ['scan', 'index_query']:
+        for kind in ['common', 'rare']:
+            result = results[method][kind]
+            print(
+                f'{method:<14}{kind:<8}'
+                f'{result["mean_ms"]:>10.3f}{result["p95_ms"]:>10.3f}',
+            )
+
+
+if __name__ == '__main__':
+    main()
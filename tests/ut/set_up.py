@@ -15,9 +15,18 @@ def set_up(func):
     @mock_dynamodb2
     @mock_cognitoidp
     def wrapper(*args, **kwargs):
+        from common import feed, leaderboard, rate_limit, user_repository
+
         create_tables()
         user_pool_id, client_id = create_cognito()
 
+        # テーブルを作り直すため、コンテナ内のキャッシュを破棄
+        user_repository.clear_cache()
+        leaderboard.leaderboard_cache.clear()
+        rate_limit.bucket_cache.clear()
+        feed.feed_cache.clear()
+        feed.built_cache.clear()
+
         # 設定変更
         with ExitStack() as stack:
             stack.enter_context(mock.patch(
@@ -53,6 +62,9 @@ def create_tables():
                 my_stage_prefix,
             )
 
+        # TTLはテーブル作成後に設定するため除外
+        definition['Properties'].pop('TimeToLiveSpecification', None)
+
         test = dynamo_db.create_table(**definition['Properties'])
 
 
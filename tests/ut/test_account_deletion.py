@@ -0,0 +1,210 @@
+from decimal import Decimal
+from http import HTTPStatus
+import json
+from unittest import mock
+
+from common import account_deletion, concurrency, feed
+from common.resource import Table
+from set_up import set_up
+import user
+
+
+table_adage = Table.ADAGE
+table_user = Table.USER
+
+USER_ID = 'deletion-test-user'
+
+
+class Context:
+
+    def __init__(self, remaining: list):
+        self._remaining = remaining
+
+    def get_remaining_time_in_millis(self) -> int:
+        return self._remaining.pop(0) if self._remaining else 0
+
+
+class TestAccountDeletion:
+
+    @set_up
+    def test_run_job(self):
+        """正常: ユーザのアイテムとエピソードを全て削除できること
+        """
+        create_user_items(points=60, episodes=3)
+        feed.rebuild_monthly_ranking(1)
+
+        job = account_deletion.start_job(USER_ID)
+        job_id = account_deletion.get_job_id(job)
+
+        with mock.patch.object(account_deletion, 'DELETION_PAGE_SIZE', 7):
+            job = account_deletion.run_job(job_id)
+
+        assert job['status'] == account_deletion.STATUS_COMPLETED
+        assert count_user_items() == 0
+        assert count_episodes() == 0
+        assert feed.get_monthly_ranking(1)[0]['episode'] == []
+        assert account_deletion.to_status(job) == {
+            'jobId': job_id,
+            'status': account_deletion.STATUS_COMPLETED,
+            'phase': account_deletion.PHASE_USER,
+            'deleted': 3 + 63 + 1,
+        }
+
+    @set_up
+    def test_get_deletion_other_user(self):
+        """異常: 他のユーザの削除ジョブは404を返すこと
+        """
+        job = account_deletion.start_job(USER_ID)
+        job_id = account_deletion.get_job_id(job)
+
+        def get_deletion(sub: str) -> dict:
+            return user.get_deletion(
+                {
+                    'pathParameters': {'jobId': job_id},
+                    'requestContext': {
+                        'authorizer': {'claims': {'sub': sub}},
+                    },
+                },
+                None,
+            )
+
+        assert get_deletion('other-user')['statusCode'] \
+            == HTTPStatus.NOT_FOUND.value
+
+        response = get_deletion(USER_ID)
+        assert response['statusCode'] == HTTPStatus.OK.value
+        assert json.loads(response['body'])['jobId'] == job_id
+
+    @set_up
+    def test_run_job_resume(self):
+        """正常: 時間切れで中断した場合、チェックポイントから再開できること
+        """
+        create_user_items(points=60, episodes=3)
+
+        job = account_deletion.start_job(USER_ID)
+        job_id = account_deletion.get_job_id(job)
+
+        with mock.patch.object(account_deletion, 'DELETION_PAGE_SIZE', 10):
+            job = account_deletion.run_job(
+                job_id,
+                Context([60000, 60000, 60000]),
+            )
+            assert job['status'] == account_deletion.STATUS_RUNNING
+            assert job['phase'] == account_deletion.PHASE_PARTITION
+            assert job['checkpoint']
+
+            saved = account_deletion.get_job(job_id)
+            assert saved['checkpoint'] == job['checkpoint']
+            assert 0 < count_user_items() < 64
+
+            job = account_deletion.run_job(job_id)
+
+        assert job['status'] == account_deletion.STATUS_COMPLETED
+        assert count_user_items() == 0
+
+    @set_up
+    def test_batch_delete_unprocessed(self):
+        """正常: 未処理アイテムを再送すること
+        """
+        create_user_items(points=30, episodes=0)
+        keys = [
+            {'userId': USER_ID, 'key': f'point#admin#{i}'}
+            for i in range(30)
+        ]
+        client = table_user.meta.client
+        batch_write_item = client.batch_write_item
+        calls = []
+
+        def flaky_batch_write_item(RequestItems):
+            calls.append(RequestItems)
+            requests = RequestItems[table_user.name]
+
+            # 初回は後半を未処理として返す
+            if len(calls) == 1:
+                batch_write_item(
+                    RequestItems={table_user.name: requests[:10]},
+                )
+                return {
+                    'UnprocessedItems': {table_user.name: requests[10:]},
+                }
+
+            return batch_write_item(RequestItems=RequestItems)
+
+        with mock.patch.object(
+                client, 'batch_write_item', flaky_batch_write_item), \
+                mock.patch.object(concurrency.time, 'sleep'):
+            deleted = account_deletion.batch_delete(table_user, keys)
+
+        assert deleted == 30
+        assert [len(call[table_user.name]) for call in calls] == [25, 15, 5]
+        assert count_user_items() == 1
+
+
+def create_user_items(points: int, episodes: int):
+    with table_user.batch_writer() as batch:
+        batch.put_item(
+            Item={
+                'userId': USER_ID,
+                'key': 'userId',
+                'userName': 'deletion',
+                'likePoints': Decimal(0),
+            },
+        )
+        for i in range(points):
+            batch.put_item(
+                Item={
+                    'userId': USER_ID,
+                    'key': f'point#admin#{i}',
+                    'point': Decimal(1),
+                },
+            )
+        for i in range(episodes):
+            batch.put_item(
+                Item={
+                    'userId': USER_ID,
+                    'key': f'episode#adage-{i}',
+                    'adageId': f'adage-{i}',
+                },
+            )
+
+    with table_adage.batch_writer() as batch:
+        batch.put_item(
+            Item={
+                'adageId': 'adage-0',
+                'key': 'title',
+                'title': 'title',
+                'registrationMonth': 1,
+                'likePoints': Decimal(0),
+            },
+        )
+        for i in range(episodes):
+            batch.put_item(
+                Item={
+                    'adageId': f'adage-{i}',
+                    'key': f'episode#{USER_ID}',
+                    'userId': USER_ID,
+                    'userName': 'deletion',
+                    'title': 'title',
+                    'episode': 'episode',
+                    'registrationMonth': 1,
+                    'likePoints': Decimal(0),
+                },
+            )
+
+
+def count_user_items() -> int:
+    return len(
+        table_user.query(
+            KeyConditionExpression='userId = :userId',
+            ExpressionAttributeValues={':userId': USER_ID},
+        )['Items'],
+    )
+
+
+def count_episodes() -> int:
+    return len(
+        [
+            item for item in table_adage.scan()['Items']
+            if item['key'] == f'episode#{USER_ID}'
+        ],
+    )
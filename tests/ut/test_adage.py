@@ -6,6 +6,7 @@ from datetime import datetime
 from http import HTTPStatus
 import json
 
+from common.const import SendReason
 from common.resource import Table
 from common.util import is_empty
 from util.const import USER_ID
@@ -14,6 +15,7 @@ import adage
 
 
 table_adage = Table.ADAGE
+table_user = Table.USER
 
 
 class TestAdage:
@@ -63,10 +65,51 @@ class TestAdage:
         assert item['registrationMonth'] == res['registrationMonth']
 
 
+    @set_up
     def test_post_with_episode(self):
         """正常: 格言とエピソードを登録できること
         """
-        pass
+        table_user.put_item(
+            Item={
+                'userId': USER_ID,
+                'key': 'userId',
+                'userName': 'テストユーザ',
+                'likePoints': 0,
+            },
+        )
+        body = {
+            'title': 'From unit test',
+            'episode': 'エピソードも同時に登録するテスト',
+        }
+        event = create_event(USER_ID, body)
+        response = adage.post(event, None)
+
+        assert response['statusCode'] == HTTPStatus.CREATED.value
+
+        res = json.loads(response['body'])
+        assert res['episode'] == body['episode']
+
+        item = get_adage(res['adageId'], f'episode#{USER_ID}')
+        assert item['userName'] == 'テストユーザ'
+        assert item['episode'] == body['episode']
+        assert item['registrationMonth'] == datetime.now().month
+
+        item = table_user.get_item(
+            Key={
+                'userId': USER_ID,
+                'key': f'episode#{res["adageId"]}',
+            },
+        )['Item']
+        assert item['episode'] == body['episode']
+
+        item = table_user.get_item(
+            Key={
+                'userId': USER_ID,
+                'key': 'userId',
+            },
+        )['Item']
+        assert item['likePoints'] == SendReason.REGISTRATION_ADAGE.point \
+            + SendReason.REGISTRATION_EPISODE.point
 
 
 def create_event(user_id: str, body: dict) -> dict:
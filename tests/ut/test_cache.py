@@ -0,0 +1,49 @@
+from unittest import mock
+
+from common.cache import TTLCache
+
+
+class TestCache:
+
+    def test_get(self):
+        """正常: 登録した値が取得できること
+        """
+        cache = TTLCache(60, 2)
+        cache.set('key', 'value')
+
+        assert cache.get('key') == 'value'
+        assert cache.get('not_exists') is None
+        assert cache.get('not_exists', 'default') == 'default'
+
+    def test_expired(self):
+        """正常: 有効期限切れの値が取得できないこと
+        """
+        cache = TTLCache(60, 2)
+
+        with mock.patch('common.cache.time.monotonic', return_value=100):
+            cache.set('key', 'value')
+
+        with mock.patch('common.cache.time.monotonic', return_value=160):
+            assert cache.get('key') is None
+            assert len(cache) == 0
+
+    def test_max_size(self):
+        """正常: 最大件数を超えた場合、最も古く参照された値が破棄されること
+        """
+        cache = TTLCache(60, 2)
+        cache.set('first', 1)
+        cache.set('second', 2)
+        cache.get('first')
+        cache.set('third', 3)
+
+        assert cache.get('first') == 1
+        assert cache.get('second') is None
+        assert cache.get('third') == 3
+
+    def test_disabled(self):
+        """正常: 有効期限が0の場合、キャッシュされないこと
+        """
+        cache = TTLCache(0, 2)
+        cache.set('key', 'value')
+
+        assert cache.get('key') is None
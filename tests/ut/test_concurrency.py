@@ -0,0 +1,139 @@
+from botocore.exceptions import ClientError
+from functools import partial
+import pytest
+import threading
+from unittest import mock
+
+from common import concurrency
+
+
+def create_error(code: str) -> ClientError:
+    return ClientError({'Error': {'Code': code, 'Message': code}}, 'Test')
+
+
+class TestConcurrency:
+
+    def test_run_parallel(self):
+        """正常: 結果がアイテム順に返り、失敗は例外として格納されること
+        """
+        def func(item):
+            if item == 3:
+                raise ValueError(item)
+            return item * 2
+
+        results = concurrency.run_parallel(func, range(6), max_workers=3)
+
+        assert results[:3] == [0, 2, 4]
+        assert isinstance(results[3], ValueError)
+        assert results[4:] == [8, 10]
+
+    def test_run_parallel_bounded(self):
+        """正常: 同時実行数が最大スレッド数を超えないこと
+        """
+        lock = threading.Lock()
+        running = []
+        peak = []
+
+        def func(item):
+            with lock:
+                running.append(item)
+                peak.append(len(running))
+            threading.Event().wait(0.01)
+            with lock:
+                running.remove(item)
+
+        concurrency.run_parallel(func, range(20), max_workers=4)
+
+        assert max(peak) <= 4
+
+    def test_gather(self):
+        """正常: 名前ごとの結果と処理時間を返すこと
+        """
+        timings = {}
+        results = concurrency.gather(
+            {
+                'a': lambda: 1,
+                'b': lambda: threading.Event().wait(0.01) or 2,
+            },
+            timings=timings,
+        )
+
+        assert results == {'a': 1, 'b': 2}
+        assert set(timings) == {'a', 'b'}
+        assert timings['b'] >= 10
+
+    def test_gather_error(self):
+        """異常: 全て完了した後、定義順で最初の例外を送出すること
+        """
+        done = []
+
+        def fail(name):
+            threading.Event().wait(0.01 if name == 'first' else 0)
+            raise ValueError(name)
+
+        with pytest.raises(ValueError, match='first'):
+            concurrency.gather(
+                {
+                    'first': lambda: fail('first'),
+                    'second': lambda: fail('second'),
+                    'third': lambda: done.append('third'),
+                },
+            )
+
+        assert done == ['third']
+
+    def test_gather_sequential(self):
+        """正常: 順番に実行する設定の場合、同じスレッドで定義順に実行すること
+        """
+        called = []
+
+        def func(name):
+            called.append((name, threading.get_ident()))
+
+        with mock.patch.object(concurrency, 'PARALLEL_SEQUENTIAL', True):
+            concurrency.gather({name: partial(func, name) for name in 'abc'})
+
+        assert called == [
+            (name, threading.get_ident()) for name in 'abc'
+        ]
+
+    def test_call_with_retry(self):
+        """正常: スロットリングされた場合に再試行すること
+        """
+        func = mock.Mock(
+            side_effect=[
+                create_error('ProvisionedThroughputExceededException'),
+                create_error('ThrottlingException'),
+                'ok',
+            ],
+        )
+
+        with mock.patch.object(concurrency.time, 'sleep') as sleep:
+            assert concurrency.call_with_retry(func, 1, a=2) == 'ok'
+
+        assert func.call_count == 3
+        assert sleep.call_count == 2
+        func.assert_called_with(1, a=2)
+
+    def test_call_with_retry_error(self):
+        """異常: スロットリング以外のエラーは再試行しないこと
+        """
+        func = mock.Mock(
+            side_effect=create_error('ConditionalCheckFailedException'),
+        )
+
+        with pytest.raises(ClientError):
+            concurrency.call_with_retry(func)
+
+        assert func.call_count == 1
+
+    def test_call_with_retry_exceeded(self):
+        """異常: 再試行回数を超えた場合はエラーになること
+        """
+        func = mock.Mock(side_effect=create_error('ThrottlingException'))
+
+        with mock.patch.object(concurrency.time, 'sleep'), \
+                pytest.raises(ClientError):
+            concurrency.call_with_retry(func, retries=2)
+
+        assert func.call_count == 3
@@ -0,0 +1,83 @@
+from unittest import mock
+
+from set_up import set_up
+
+from common import counter
+from common.resource import Table
+
+
+table_adage = Table.ADAGE
+
+
+class TestCounter:
+
+    @set_up
+    def test_increment_like_points(self):
+        """正常: 分割しない場合、本体アイテムへ加算されること
+        """
+        key = {'adageId': 'adage_1', 'key': 'title'}
+        table_adage.put_item(Item={**key, 'likePoints': 1})
+
+        with mock.patch.dict(counter.LIKE_SHARDS, {table_adage.name: 1}):
+            item = counter.increment_like_points(table_adage, key, 2)
+
+        assert item['likePoints'] == 3
+
+    @set_up
+    def test_increment_like_points_sharded(self):
+        """正常: 分割する場合、合計値が正確であり、集約後も変わらないこと
+        """
+        key = {'adageId': 'adage_1', 'key': 'title'}
+        table_adage.put_item(Item={**key, 'likePoints': 1})
+
+        with mock.patch.dict(counter.LIKE_SHARDS, {table_adage.name: 4}):
+            for _ in range(10):
+                # 加算ごとに合計値は読まない
+                assert counter.increment_like_points(table_adage, key) \
+                    is None
+
+            assert table_adage.get_item(Key=key)['Item']['likePoints'] == 1
+            assert counter.get_like_points(table_adage, key) == 11
+
+            assert counter.fold_like_points(table_adage) \
+                == {(('adageId', 'adage_1'), ('key', 'title')): 10}
+            assert table_adage.get_item(Key=key)['Item']['likePoints'] == 11
+            assert counter.get_like_points(table_adage, key) == 11
+
+            items = counter.merge_like_points(
+                table_adage,
+                [{**key, 'likePoints': 0}],
+            )
+            assert items[0]['likePoints'] == 11
+
+    @set_up
+    def test_fold_like_points_deleted(self):
+        """正常: 本体アイテムが削除済みの場合、本体を作り直さず分割アイテムを削除すること
+        """
+        key = {'adageId': 'adage_1', 'key': 'episode#user_1'}
+        table_adage.put_item(Item={**key, 'likePoints': 0})
+
+        with mock.patch.dict(counter.LIKE_SHARDS, {table_adage.name: 4}):
+            for _ in range(3):
+                counter.increment_like_points(table_adage, key)
+
+            table_adage.delete_item(Key=key)
+
+            assert counter.fold_like_points(table_adage) == {}
+
+        assert table_adage.scan()['Items'] == []
+
+    @set_up
+    def test_delete_like_shards(self):
+        """正常: 分割アイテムのみが削除されること
+        """
+        key = {'adageId': 'adage_1', 'key': 'episode#user_1'}
+        table_adage.put_item(Item={**key, 'likePoints': 0})
+
+        with mock.patch.dict(counter.LIKE_SHARDS, {table_adage.name: 4}):
+            for _ in range(10):
+                counter.increment_like_points(table_adage, key)
+
+            counter.delete_like_shards(table_adage, key)
+
+        assert table_adage.scan()['Items'] == [{**key, 'likePoints': 0}]
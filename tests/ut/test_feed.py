@@ -0,0 +1,191 @@
+from decimal import Decimal
+
+from set_up import set_up
+
+from common import feed
+from common.resource import Table
+
+
+table_adage = Table.ADAGE
+
+
+class TestFeed:
+
+    def test_build_feed(self):
+        """正常: 格言とエピソードがいいねポイント順にまとめられること
+        """
+        feed_items = [
+            {
+                'adageId': 'adage_1',
+                'key': 'title',
+                'title': '格言1',
+                'registrationMonth': Decimal(1),
+                'likePoints': Decimal(1),
+            },
+            {
+                'adageId': 'adage_2',
+                'key': 'episode#user_2',
+                'userId': 'user_2',
+                'userName': 'ユーザ2',
+                'title': '格言2',
+                'episode': 'エピソード2',
+                'registrationMonth': Decimal(1),
+                'likePoints': Decimal(3),
+            },
+            {
+                'adageId': 'adage_2',
+                'key': 'title',
+                'title': '格言2',
+                'registrationMonth': Decimal(1),
+                'likePoints': Decimal(5),
+            },
+            {
+                'adageId': 'adage_2',
+                'key': 'episode#user_1',
+                'userId': 'user_1',
+                'userName': 'ユーザ1',
+                'title': '格言2',
+                'episode': 'エピソード1',
+                'registrationMonth': Decimal(1),
+            },
+        ]
+
+        adage_list = feed.build_feed(feed_items)
+
+        assert [adage['adageId'] for adage in adage_list] \
+            == ['adage_2', 'adage_1']
+        assert adage_list[0]['likePoints'] == 5
+        assert adage_list[0]['registrationMonth'] == 1
+        assert adage_list[1]['episode'] == []
+
+        episodes = adage_list[0]['episode']
+        assert [episode['key'] for episode in episodes] \
+            == ['episode#user_1', 'episode#user_2']
+        assert episodes[0]['likePoints'] == 0
+        assert episodes[1]['likePoints'] == 3
+        for episode in episodes:
+            assert 'registrationMonth' not in episode
+
+    @set_up
+    def test_like(self):
+        """正常: いいねポイントの更新は該当エントリのみ、増える場合のみ反映すること
+        """
+        put_items()
+        feed.rebuild_monthly_ranking(1)
+
+        feed.apply_like_points({**ADAGE_ITEMS[1], 'likePoints': Decimal(9)})
+        feed.apply_like_points({**EPISODE_ITEM, 'likePoints': Decimal(4)})
+        # 遅れて届いた古い値では戻さない
+        feed.apply_like_points({**EPISODE_ITEM, 'likePoints': Decimal(2)})
+
+        adage_list = feed.get_monthly_ranking(1)
+
+        assert [adage['adageId'] for adage in adage_list] \
+            == ['adage_2', 'adage_1']
+        assert adage_list[0]['likePoints'] == 9
+        assert adage_list[0]['episode'][0]['likePoints'] == 4
+        assert adage_list[1]['likePoints'] == 5
+
+    @set_up
+    def test_like_without_ranking(self):
+        """正常: 月間ランキングが未作成の場合、格言テーブルから作成すること
+        """
+        put_items()
+        table_adage.update_item(
+            Key={'adageId': 'adage_2', 'key': 'title'},
+            UpdateExpression='SET likePoints = :likePoints',
+            ExpressionAttributeValues={':likePoints': 9},
+        )
+
+        feed.apply_like_points({**ADAGE_ITEMS[1], 'likePoints': Decimal(9)})
+
+        adage_list = feed.get_monthly_ranking(1)
+
+        assert [adage['likePoints'] for adage in adage_list] == [9, 5]
+
+    @set_up
+    def test_remove_episode(self):
+        """正常: エピソードの削除は該当エントリのみ削除すること
+        """
+        put_items()
+        feed.rebuild_monthly_ranking(1)
+
+        feed.remove_episode(1, 'adage_2', 'episode#user_1')
+
+        adage_list = feed.get_monthly_ranking(1)
+
+        assert [adage['adageId'] for adage in adage_list] \
+            == ['adage_1', 'adage_2']
+        assert adage_list[1]['episode'] == []
+
+    @set_up
+    def test_rename(self):
+        """正常: ユーザ名の変更がエピソードのエントリへ反映されること
+        """
+        put_items()
+        feed.rebuild_monthly_ranking(1)
+
+        feed.update_user_episodes(
+            1,
+            ['adage_1', 'adage_2'],
+            'episode#user_1',
+            {'userName': '変更後'},
+        )
+
+        adage_list = feed.get_monthly_ranking(1)
+
+        assert adage_list[1]['episode'][0]['userName'] == '変更後'
+        # エピソードのない格言にはエントリを作らない
+        assert adage_list[0]['episode'] == []
+
+    @set_up
+    def test_rebuild_removes_stale_entries(self):
+        """正常: 再作成で格言テーブルにないエントリを削除すること
+        """
+        put_items()
+        feed.rebuild_monthly_ranking(1)
+        table_adage.delete_item(
+            Key={'adageId': 'adage_1', 'key': 'title'},
+        )
+
+        adage_list = feed.rebuild_monthly_ranking(1)
+
+        assert [adage['adageId'] for adage in adage_list] == ['adage_2']
+        assert [adage['adageId'] for adage in feed.get_monthly_ranking(1)] \
+            == ['adage_2']
+
+
+ADAGE_ITEMS = [
+    {
+        'adageId': 'adage_1',
+        'key': 'title',
+        'title': '格言1',
+        'registrationMonth': 1,
+        'likePoints': 5,
+    },
+    {
+        'adageId': 'adage_2',
+        'key': 'title',
+        'title': '格言2',
+        'registrationMonth': 1,
+        'likePoints': 1,
+    },
+]
+
+EPISODE_ITEM = {
+    'adageId': 'adage_2',
+    'key': 'episode#user_1',
+    'userId': 'user_1',
+    'userName': 'ユーザ1',
+    'title': '格言2',
+    'episode': 'エピソード1',
+    'registrationMonth': 1,
+    'likePoints': 0,
+}
+
+
+def put_items():
+    """格言テーブルへ格言、エピソードを登録
+    """
+    for item in [*ADAGE_ITEMS, EPISODE_ITEM]:
+        table_adage.put_item(Item=item)
@@ -0,0 +1,174 @@
+import gzip
+from http import HTTPStatus
+import json
+import time
+
+from boto3.dynamodb.conditions import Attr
+from set_up import set_up
+
+from common import idempotency
+from common.decorator import handler
+from common.exception import ApplicationException
+from common.resource import Table
+import adage
+
+
+table_adage = Table.ADAGE
+
+
+class TestIdempotency:
+
+    @set_up
+    def test_replay(self):
+        """正常: 同じIdempotency-Keyの再送は実行せずに最初のレスポンスを返すこと
+        """
+        first = post_by_guest('key_1', 'test')
+        second = post_by_guest('key_1', 'test')
+
+        assert first['statusCode'] == HTTPStatus.CREATED.value
+        assert second['statusCode'] == HTTPStatus.CREATED.value
+        assert second['body'] == first['body']
+        assert second['headers']['Idempotent-Replayed'] == 'true'
+        assert 'Idempotent-Replayed' not in first['headers']
+
+        titles = table_adage.scan(
+            FilterExpression=Attr('key').eq('title'),
+        )['Items']
+        assert len(titles) == 1
+
+        # キーが異なる場合は別のリクエストとして実行する
+        post_by_guest('key_2', 'test')
+        titles = table_adage.scan(
+            FilterExpression=Attr('key').eq('title'),
+        )['Items']
+        assert len(titles) == 2
+
+    @set_up
+    def test_guest_scope(self):
+        """正常: 送信元IPが異なるゲストは同じIdempotency-Keyでも別に実行すること
+        """
+        responses = [
+            adage.post_by_guest(
+                {
+                    **make_event('key_1', 'test'),
+                    'requestContext': {'identity': {'sourceIp': source_ip}},
+                },
+                None,
+            )
+            for source_ip in ('10.0.0.1', '10.0.0.2')
+        ]
+
+        assert [x['statusCode'] for x in responses] \
+            == [HTTPStatus.CREATED.value] * 2
+        assert 'Idempotent-Replayed' not in responses[1]['headers']
+        titles = table_adage.scan(
+            FilterExpression=Attr('key').eq('title'),
+        )['Items']
+        assert len(titles) == 2
+
+    @set_up
+    def test_stored_compressed(self):
+        """正常: 保存するレスポンスのボディをgzipで圧縮すること
+        """
+        first = post_by_guest('key_1', 'test')
+
+        item = Table.CONTROL.get_item(
+            Key={
+                'controlId': idempotency.get_control_id(
+                    make_event('key_1', 'test'),
+                ),
+            },
+        )['Item']
+        assert gzip.decompress(item['response']['body'].value) \
+            .decode('utf-8') == first['body']
+
+    @set_up
+    def test_in_progress(self):
+        """異常: 同じIdempotency-Keyのリクエストが処理中の場合、409を返すこと
+        """
+        event = make_event('key_1', 'test')
+        idempotency.lock(
+            idempotency.get_control_id(event),
+            idempotency.get_request_hash(event),
+            int(time.time()),
+        )
+
+        response = adage.post_by_guest(event, None)
+
+        assert response['statusCode'] == HTTPStatus.CONFLICT.value
+        assert table_adage.scan()['Items'] == []
+
+    @set_up
+    def test_expired_lock(self):
+        """正常: 処理中のまま期限が過ぎた記録は引き継いで実行すること
+        """
+        event = make_event('key_1', 'test')
+        idempotency.lock(
+            idempotency.get_control_id(event),
+            idempotency.get_request_hash(event),
+            int(time.time()) - idempotency.IDEMPOTENCY_LOCK_TTL - 1,
+        )
+
+        response = adage.post_by_guest(event, None)
+
+        assert response['statusCode'] == HTTPStatus.CREATED.value
+
+    @set_up
+    def test_different_request(self):
+        """異常: 同じIdempotency-Keyで異なるボディの場合、422を返すこと
+        """
+        post_by_guest('key_1', 'test')
+        response = post_by_guest('key_1', 'other')
+
+        assert response['statusCode'] \
+            == HTTPStatus.UNPROCESSABLE_ENTITY.value
+
+    @set_up
+    def test_error_not_stored(self):
+        """正常: エラーの場合は記録を残さず、再試行で再実行すること
+        """
+        calls = []
+
+        @handler
+        def fail(event, context):
+            calls.append(event)
+            raise ApplicationException(HTTPStatus.SERVICE_UNAVAILABLE)
+
+        event = make_event('key_1', 'test')
+        assert fail(event, None)['statusCode'] \
+            == HTTPStatus.SERVICE_UNAVAILABLE.value
+        assert fail(event, None)['statusCode'] \
+            == HTTPStatus.SERVICE_UNAVAILABLE.value
+
+        assert len(calls) == 2
+
+
+def make_event(key: str, title: str) -> dict:
+    """Idempotency-Key付きのゲストの格言登録イベントを作成
+
+    Args:
+        key (str): Idempotency-Key
+        title (str): 格言
+
+    Returns:
+        dict: イベント
+    """
+    return {
+        'httpMethod': 'POST',
+        'resource': '/adage/guest',
+        'headers': {'idempotency-key': key},
+        'body': json.dumps({'title': title}),
+    }
+
+
+def post_by_guest(key: str, title: str) -> dict:
+    """Idempotency-Key付きでゲストの格言登録
+
+    Args:
+        key (str): Idempotency-Key
+        title (str): 格言
+
+    Returns:
+        dict: レスポンス
+    """
+    return adage.post_by_guest(make_event(key, title), None)
@@ -0,0 +1,243 @@
+from http import HTTPStatus
+import json
+from unittest import mock
+
+from boto3.dynamodb.conditions import Key
+from set_up import set_up
+
+from common import counter, leaderboard, likes
+from common.resource import Table
+import leaderboard as leaderboard_function
+
+
+table_user = Table.USER
+
+
+class TestLeaderboard:
+
+    def test_bucket(self):
+        """正常: いいねポイントが範囲に含まれ、範囲の番号が昇順に並ぶこと
+        """
+        previous = -1
+        for like_points in list(range(0, 200)) + [10 ** 6, 2 ** 40]:
+            bucket = leaderboard.get_bucket(like_points)
+            low, high = leaderboard.get_bucket_range(bucket)
+
+            assert low <= like_points < high
+            assert bucket >= previous
+            assert high - low <= max(1, low // leaderboard.SUB_BUCKETS)
+            previous = bucket
+
+    def test_estimate_rank(self):
+        """正常: ヒストグラムから順位を推定できること
+        """
+        scores = [5, 5, 20, 40, 41, 1000]
+        buckets = {}
+        for score in scores:
+            bucket = leaderboard.get_bucket(score)
+            buckets[bucket] = buckets.get(bucket, 0) + 1
+
+        # 幅が1の範囲は正確な順位
+        assert leaderboard.estimate_rank(buckets, 5) == (5, True)
+        assert leaderboard.estimate_rank(buckets, 20) == (4, True)
+        assert leaderboard.estimate_rank(buckets, 1000) == (1, False)
+
+    @set_up
+    def test_apply_like_points(self):
+        """正常: いいねポイントの加算がランキングへ反映されること
+        """
+        for user_id, like_points in [('user_1', 10), ('user_2', 30)]:
+            create_user(user_id, like_points)
+
+        likes.apply_events(
+            [
+                likes.like_event(
+                    'user', {'userId': 'user_1', 'key': 'userId'}, 25,
+                ),
+            ],
+        )
+
+        assert [
+            (user['rank'], user['userId'], user['likePoints'])
+            for user in leaderboard.get_ranking()
+        ] == [(1, 'user_1', 35), (2, 'user_2', 30)]
+        assert leaderboard.get_rank('user_2', 30) \
+            == {'rank': 2, 'total': 2, 'exact': True}
+
+        # 上位ランキングに含まれない場合はヒストグラムから推定する
+        with mock.patch.object(leaderboard, 'LEADERBOARD_TOP_SIZE', 1), \
+                mock.patch.object(leaderboard, 'LEADERBOARD_TOP_MARGIN', 0):
+            create_user('user_3', 3)
+
+        assert leaderboard.get_rank('user_3', 3) \
+            == {'rank': 3, 'total': 3, 'exact': True}
+
+    @set_up
+    def test_apply_like_points_new_user(self):
+        """正常: 加算で作成されたユーザはヒストグラムへ追加されること
+        """
+        create_user('user_1', 10)
+
+        # 存在確認なしの加算
+        likes.apply_events(
+            [
+                likes.like_event(
+                    'user', {'userId': 'user_2', 'key': 'userId'}, 5,
+                ),
+            ],
+        )
+        assert get_bucket_counts() == {
+            leaderboard.get_bucket(5): 1,
+            leaderboard.get_bucket(10): 1,
+        }
+
+        # 存在確認付きのトランザクションでの加算
+        likes.apply_events(
+            [
+                likes.like_event(
+                    'user',
+                    {'userId': 'user_1', 'key': 'userId'},
+                    1,
+                    must_exist=True,
+                ),
+                likes.like_event(
+                    'user', {'userId': 'user_3', 'key': 'userId'}, 7,
+                ),
+            ],
+        )
+        assert get_bucket_counts() == {
+            leaderboard.get_bucket(5): 1,
+            leaderboard.get_bucket(7): 1,
+            leaderboard.get_bucket(11): 1,
+        }
+
+    @set_up
+    def test_top_items(self):
+        """正常: 上位ユーザを1件ずつ保持し、保持件数を超えた最下位を削除すること
+        """
+        with mock.patch.object(leaderboard, 'LEADERBOARD_TOP_SIZE', 1), \
+                mock.patch.object(leaderboard, 'LEADERBOARD_TOP_MARGIN', 1):
+            create_user('user_1', 10)
+            create_user('user_2', 20)
+            create_user('user_3', 30)
+
+            # 順位、ユーザ名が変わらない場合は書き込まない
+            with mock.patch.object(table_user, 'put_item') as put_item:
+                leaderboard.put_top_user(
+                    {
+                        'userId': 'user_3',
+                        'userName': 'name_user_3',
+                        'likePoints': 30,
+                    },
+                )
+                put_item.assert_not_called()
+
+            leaderboard.rename_user('user_2', 'renamed')
+            leaderboard.leaderboard_cache.clear()
+
+            assert [
+                (user['userId'], user['userName'], user['likePoints'])
+                for user in leaderboard.get_top()
+            ] == [('user_3', 'name_user_3', 30), ('user_2', 'renamed', 20)]
+
+        items = table_user.query(
+            KeyConditionExpression=Key('userId').eq(
+                leaderboard.LEADERBOARD_ID,
+            ) & Key('key').begins_with(leaderboard.TOP_KEY_PREFIX),
+        )['Items']
+        assert sorted(item['key'] for item in items) \
+            == ['top#user_2', 'top#user_3']
+
+    @set_up
+    def test_rebuild(self):
+        """正常: 並列スキャンで分割されたいいねポイントを含めて再作成できること
+        """
+        for i in range(5):
+            table_user.put_item(
+                Item={
+                    'userId': f'user_{i}',
+                    'key': 'userId',
+                    'userName': f'name_{i}',
+                    'likePoints': i * 10,
+                },
+            )
+
+        with mock.patch.dict(counter.LIKE_SHARDS, {table_user.name: 2}):
+            counter.increment_like_points(
+                table_user, {'userId': 'user_0', 'key': 'userId'}, 100,
+            )
+
+        # motoのスキャンは分割(Segment)に対応していないため1分割で実行
+        result = leaderboard.rebuild(segments=1)
+
+        assert result['users'] == 5
+        ranking = leaderboard.get_ranking(2)
+        assert [(user['userId'], user['likePoints']) for user in ranking] \
+            == [('user_0', 100), ('user_4', 40)]
+        assert ranking[0]['userName'] == 'name_0'
+        assert sum(leaderboard.get_buckets().values()) == 5
+
+    @set_up
+    def test_get_me(self):
+        """正常: 自分の順位を参照できること
+        """
+        create_user('user_1', 10)
+        create_user('user_2', 20)
+
+        response = leaderboard_function.get_me(
+            {
+                'requestContext': {
+                    'authorizer': {
+                        'claims': {
+                            'sub': 'user_1',
+                        },
+                    },
+                },
+            },
+            None,
+        )
+
+        assert response['statusCode'] == HTTPStatus.OK.value
+        assert json.loads(response['body']) == {
+            'userId': 'user_1',
+            'likePoints': 10,
+            'rank': 2,
+            'total': 2,
+            'exact': True,
+        }
+
+
+def create_user(user_id: str, like_points: int):
+    """ユーザを作成し、ランキングへ追加
+
+    Args:
+        user_id (str): ユーザID
+        like_points (int): いいねポイント
+    """
+    item = {
+        'userId': user_id,
+        'key': 'userId',
+        'userName': f'name_{user_id}',
+        'likePoints': like_points,
+    }
+    table_user.put_item(Item=item)
+    leaderboard.add_user(item)
+
+
+def get_bucket_counts() -> dict:
+    """ヒストグラムのアイテムを直接読み、ユーザ数が0でない範囲を取得
+
+    Returns:
+        dict: {範囲の番号: ユーザ数}
+    """
+    items = table_user.query(
+        KeyConditionExpression=Key('userId').eq(leaderboard.LEADERBOARD_ID)
+        & Key('key').begins_with(leaderboard.BUCKET_KEY_PREFIX),
+    )['Items']
+
+    return {
+        int(item['key'][len(leaderboard.BUCKET_KEY_PREFIX):]):
+            int(item['count'])
+        for item in items
+        if int(item['count']) != 0
+    }
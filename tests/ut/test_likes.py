@@ -0,0 +1,256 @@
+from http import HTTPStatus
+import json
+from unittest import mock
+
+from boto3.dynamodb.conditions import Attr, Key
+import pytest
+from set_up import set_up
+
+from common import counter, leaderboard, likes, user_version
+from common.const import SendReason
+from common.event_queue import FileQueue, MemoryQueue
+from common.exception import ConditionalCheckException
+from common.resource import Table
+import counter as counter_function
+import episode
+
+
+table_user = Table.USER
+
+
+class TestLikes:
+
+    @set_up
+    def test_write_async(self):
+        """正常: asyncモードの場合、キューへ登録し集約時にまとめて書き込まれること
+        """
+        user_key = {'userId': 'user_1', 'key': 'userId'}
+        table_user.put_item(Item={**user_key, 'likePoints': 0})
+        queue = MemoryQueue()
+
+        with mock.patch('common.likes.LIKE_WRITE_MODE', 'async'), \
+                mock.patch('common.likes.get_queue', return_value=queue):
+            for _ in range(3):
+                likes.write(
+                    [
+                        likes.like_event('user', user_key),
+                        likes.history_event('user_1', SendReason.THANK_YOU),
+                    ],
+                )
+
+        # 集約前は書き込まれないこと
+        assert len(queue) == 6
+        assert table_user.get_item(Key=user_key)['Item']['likePoints'] == 0
+
+        result = likes.apply_events(queue.drain())
+
+        assert result == {'events': 6, 'updates': 1, 'histories': 3}
+        assert table_user.get_item(Key=user_key)['Item']['likePoints'] == 3
+
+    @set_up
+    def test_write_must_exist(self):
+        """異常: 存在しないアイテムへの加算の場合、加算も履歴も書き込まれないこと
+        """
+        user_key = {'userId': 'user_1', 'key': 'userId'}
+
+        with pytest.raises(ConditionalCheckException) as e:
+            likes.write(
+                [
+                    likes.like_event('user', user_key, must_exist=True),
+                    likes.history_event('user_1', SendReason.THANK_YOU),
+                ],
+            )
+
+        assert (e.value.table, e.value.key) == ('user', user_key)
+        assert table_user.query(
+            KeyConditionExpression=Key('userId').eq('user_1'),
+        )['Items'] == []
+
+        # 存在する場合は書き込まれること
+        table_user.put_item(Item={**user_key, 'likePoints': 0})
+        likes.write(
+            [
+                likes.like_event('user', user_key, must_exist=True),
+                likes.history_event('user_1', SendReason.THANK_YOU),
+            ],
+        )
+        assert len(
+            table_user.query(
+                KeyConditionExpression=Key('userId').eq('user_1'),
+                FilterExpression=Attr('key').ne(user_version.VERSION_KEY),
+            )['Items'],
+        ) == 2
+
+    @set_up
+    def test_write_must_exist_sharded(self):
+        """異常: 分割した場合も、存在しないアイテムへ加算されないこと
+        """
+        user_key = {'userId': 'user_1', 'key': 'userId'}
+
+        with mock.patch.dict(
+                counter.LIKE_SHARDS, {table_user.name: 4}), \
+                pytest.raises(ConditionalCheckException):
+            likes.apply_events(
+                [likes.like_event('user', user_key, must_exist=True)],
+            )
+
+        assert table_user.scan()['Items'] == []
+
+    @set_up
+    def test_patch_from_user_not_found(self):
+        """異常: エピソードが存在しない場合、404を返しユーザのポイントも履歴も変わらないこと
+        """
+        for user_id in ('user_1', 'user_2'):
+            table_user.put_item(
+                Item={
+                    'userId': user_id,
+                    'key': 'userId',
+                    'userName': user_id,
+                    'likePoints': 0,
+                },
+            )
+
+        response = episode.patch_from_user(
+            {
+                'pathParameters': {
+                    'adageId': 'not_exists_adage_id',
+                    'userId': 'user_1',
+                    'senderUserId': 'user_2',
+                },
+            },
+            None,
+        )
+
+        assert response['statusCode'] == HTTPStatus.NOT_FOUND.value
+        assert json.loads(response['body'])['message'] \
+            == 'Episode does not exists. ' \
+            'adageId: not_exists_adage_id, userId: user_1'
+        assert table_user.get_item(
+            Key={'userId': 'user_1', 'key': 'userId'},
+        )['Item']['likePoints'] == 0
+        assert table_user.query(
+            KeyConditionExpression=Key('userId').eq('user_1'),
+        )['Items'] == [
+            {
+                'userId': 'user_1',
+                'key': 'userId',
+                'userName': 'user_1',
+                'likePoints': 0,
+            },
+        ]
+        assert leaderboard.get_ranking(1) == []
+
+    @set_up
+    def test_apply_folded(self):
+        """正常: 分割した場合、集約時にユーザランキングへ反映されること
+        """
+        user_key = {'userId': 'user_1', 'key': 'userId'}
+        table_user.put_item(
+            Item={**user_key, 'userName': 'name_1', 'likePoints': 0},
+        )
+
+        with mock.patch.dict(counter.LIKE_SHARDS, {table_user.name: 4}):
+            likes.apply_events(
+                [likes.like_event('user', user_key) for _ in range(3)],
+            )
+            assert leaderboard.get_ranking(1) == []
+
+            likes.apply_folded('user', counter.fold_like_points(table_user))
+
+        ranking = leaderboard.get_ranking(1)
+        assert [(user['userId'], user['likePoints']) for user in ranking] \
+            == [('user_1', 3)]
+
+    @set_up
+    def test_aggregate_redelivery(self):
+        """正常: SQSから再配信された処理済みのメッセージは加算しないこと
+        """
+        user_key = {'userId': 'user_1', 'key': 'userId'}
+        table_user.put_item(Item={**user_key, 'likePoints': 0})
+        records = [
+            {
+                'messageId': f'message_{i}',
+                'body': json.dumps(likes.like_event('user', user_key)),
+            }
+            for i in range(2)
+        ]
+
+        assert aggregate(records[:1]) == {'batchItemFailures': []}
+        assert aggregate(records) == {'batchItemFailures': []}
+
+        assert table_user.get_item(Key=user_key)['Item']['likePoints'] == 2
+
+    @set_up
+    def test_aggregate_failure(self):
+        """異常: 書き込みに失敗した場合、失敗を返し再配信で再処理すること
+        """
+        user_key = {'userId': 'user_1', 'key': 'userId'}
+        table_user.put_item(Item={**user_key, 'likePoints': 0})
+        records = [
+            {
+                'messageId': 'message_1',
+                'body': json.dumps(likes.like_event('user', user_key)),
+            },
+        ]
+
+        with mock.patch(
+                'common.likes.increment_like_points',
+                side_effect=RuntimeError('failed')):
+            assert aggregate(records) == {
+                'batchItemFailures': [{'itemIdentifier': 'message_1'}],
+            }
+
+        assert aggregate(records) == {'batchItemFailures': []}
+        assert table_user.get_item(Key=user_key)['Item']['likePoints'] == 1
+
+    @set_up
+    def test_write_async_must_exist(self):
+        """異常: asyncモードの場合、登録前に存在を確認すること
+        """
+        user_key = {'userId': 'user_1', 'key': 'userId'}
+        queue = MemoryQueue()
+
+        with mock.patch('common.likes.LIKE_WRITE_MODE', 'async'), \
+                mock.patch('common.likes.get_queue', return_value=queue):
+            with pytest.raises(ConditionalCheckException):
+                likes.write(
+                    [likes.like_event('user', user_key, must_exist=True)],
+                )
+            assert len(queue) == 0
+
+            table_user.put_item(Item={**user_key, 'likePoints': 0})
+            likes.write(
+                [likes.like_event('user', user_key, must_exist=True)],
+            )
+            assert len(queue) == 1
+
+    def test_file_queue(self, tmp_path):
+        """正常: ファイルキューで登録、取り出し、処理完了ができること
+        """
+        queue = FileQueue(str(tmp_path / 'events.jsonl'))
+        queue.put([{'type': 'like', 'point': 1}])
+        queue.put([{'type': 'like', 'point': 2}])
+
+        assert len(queue) == 2
+        assert [event['point'] for event in queue.drain()] == [1, 2]
+
+        # 処理完了前は再度取り出せること
+        queue.put([{'type': 'like', 'point': 3}])
+        assert [event['point'] for event in queue.drain()] == [1, 2]
+
+        queue.ack()
+        assert [event['point'] for event in queue.drain()] == [3]
+        queue.ack()
+        assert queue.drain() == []
+
+
+def aggregate(records: list) -> dict:
+    """SQSトリガーとして集約関数を実行
+
+    Args:
+        records (list): Records
+
+    Returns:
+        dict: 結果
+    """
+    return counter_function.aggregate({'Records': records}, None)
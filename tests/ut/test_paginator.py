@@ -0,0 +1,122 @@
+from decimal import Decimal
+from http import HTTPStatus
+from unittest import mock
+
+import pytest
+
+from common import paginator
+from common.exception import ApplicationException
+from common.paginator import (
+    decode_cursor,
+    encode_cursor,
+    get_page_params,
+    paginate_list,
+    query_page,
+)
+
+
+class FakeTable:
+    """1ページ2件まで返すクエリのスタブ
+    """
+
+    def __init__(self, items: list):
+        self._items = items
+        self.calls = 0
+
+    def query(self, **kwargs):
+        self.calls += 1
+        start = 0
+        if 'ExclusiveStartKey' in kwargs:
+            start = int(kwargs['ExclusiveStartKey']['index']) + 1
+
+        end = min(start + min(kwargs.get('Limit', 2), 2), len(self._items))
+        response = {'Items': self._items[start:end]}
+        if end < len(self._items):
+            response['LastEvaluatedKey'] = {'index': Decimal(end - 1)}
+
+        return response
+
+
+class TestPaginator:
+
+    def test_cursor(self):
+        """正常: カーソルから元のページ位置が復元できること
+        """
+        key = {'userId': 'user_1', 'key': 'point#1', 'month': Decimal(10)}
+        cursor = encode_cursor(key, 'scope')
+
+        assert decode_cursor(cursor, 'scope') == key
+
+    def test_cursor_tampered(self):
+        """異常: 改ざん、別用途のカーソルは400となること
+        """
+        cursor = encode_cursor({'offset': 10}, 'scope')
+        payload, signature = cursor.split('.')
+        tampered = encode_cursor({'offset': 20}, 'scope').split('.')[0]
+
+        for invalid in [
+                '.'.join([tampered, signature]),
+                'invalid',
+                '']:
+            with pytest.raises(ApplicationException) as e:
+                decode_cursor(invalid, 'scope')
+            assert e.value.value == HTTPStatus.BAD_REQUEST.value
+
+        with pytest.raises(ApplicationException):
+            decode_cursor(cursor, 'other_scope')
+
+    def test_cursor_secret_not_set(self):
+        """異常: 署名キーが未設定の場合、カーソルの作成、検証時に500となること
+        """
+        cursor = encode_cursor({'offset': 10}, 'scope')
+
+        with mock.patch.object(paginator, 'CURSOR_SECRET', None), \
+                mock.patch.object(paginator, 'LAMBDA_STAGE', 'prod'):
+            for call in [
+                    lambda: encode_cursor({'offset': 10}, 'scope'),
+                    lambda: decode_cursor(cursor, 'scope')]:
+                with pytest.raises(ApplicationException) as e:
+                    call()
+                assert e.value.value \
+                    == HTTPStatus.INTERNAL_SERVER_ERROR.value
+
+    def test_query_page(self):
+        """正常: LastEvaluatedKeyをたどってlimit件ずつ取得できること
+        """
+        table = FakeTable(list(range(5)))
+
+        items, cursor = query_page(table.query, 'scope', 3)
+        assert items == [0, 1, 2]
+        assert cursor
+
+        items, cursor = query_page(table.query, 'scope', 3, cursor)
+        assert items == [3, 4]
+        assert cursor is None
+
+        items, cursor = query_page(table.query, 'scope')
+        assert items == [0, 1, 2, 3, 4]
+        assert cursor is None
+
+    def test_paginate_list(self):
+        """正常: 取得済みのリストをページ単位に切り出せること
+        """
+        items, cursor = paginate_list(list(range(5)), 'scope', 2)
+        assert items == [0, 1]
+
+        items, cursor = paginate_list(list(range(5)), 'scope', 2, cursor)
+        assert items == [2, 3]
+
+        items, cursor = paginate_list(list(range(5)), 'scope', 2, cursor)
+        assert items == [4]
+        assert cursor is None
+
+    def test_get_page_params(self):
+        """正常: クエリ文字列からページング条件が取得できること
+        """
+        assert get_page_params(None) == (None, None)
+        assert get_page_params(
+            {'queryStringParameters': {'limit': '10', 'cursor': 'abc'}},
+        ) == (10, 'abc')
+
+        with pytest.raises(ApplicationException):
+            get_page_params({'queryStringParameters': {'limit': '0'}})
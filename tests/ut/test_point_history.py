@@ -0,0 +1,357 @@
+from decimal import Decimal
+from unittest import mock
+
+from boto3.dynamodb.conditions import Key
+
+from common import concurrency, likes, point_history
+from common.const import SendReason
+from common.profile import load_profile
+from common.resource import Table
+from common.util import get_jst_timestamp, make_point_history, make_point_key
+from set_up import set_up
+
+
+table_user = Table.USER
+
+USER_ID = 'point-history-test-user'
+
+# 2023-01-01 00:00:00
+BASE_TIME = 1672498800.0
+
+
+class TestPointHistory:
+
+    def test_make_point_key(self):
+        """正常: ソートキーの順序が日時順になること
+        """
+        keys = [
+            make_point_history(USER_ID, SendReason.SEND_HEART, sender, '', t)
+            ['key']
+            for sender, t in [
+                ('zzz', BASE_TIME),
+                ('aaa', BASE_TIME + 0.5),
+                ('admin', BASE_TIME + 10),
+                ('aaa', BASE_TIME + 100000),
+            ]
+        ]
+
+        assert keys == sorted(keys)
+        assert keys[0] == 'point#t#1672498800000000#zzz'
+
+    @set_up
+    def test_query_points_latest(self):
+        """正常: 新しい順に最大件数ずつ取得できること
+        """
+        create_user(migrated=True)
+        create_histories(20)
+
+        points, cursor = point_history.query_points(
+            USER_ID, ['key', 'dateTime'], limit=5,
+        )
+        assert [float(p['dateTime']) for p in points] \
+            == [BASE_TIME + i for i in range(19, 14, -1)]
+
+        points, cursor = point_history.query_points(
+            USER_ID, ['key', 'dateTime'], limit=20, cursor=cursor,
+        )
+        assert len(points) == 15
+        assert float(points[-1]['dateTime']) == BASE_TIME
+        assert cursor is None
+
+    @set_up
+    def test_query_points_between(self):
+        """正常: 日時の範囲で取得できること
+        """
+        create_user(migrated=True)
+        create_histories(20)
+
+        points, _ = point_history.query_points(
+            USER_ID,
+            ['dateTime'],
+            since=BASE_TIME + 3,
+            until=BASE_TIME + 6,
+        )
+
+        assert [float(p['dateTime']) for p in points] \
+            == [BASE_TIME + i for i in [6, 5, 4, 3]]
+
+    @set_up
+    def test_migrate_users(self):
+        """正常: 旧形式のキーを日時順の形式へ書き換えられること
+        """
+        create_user(migrated=False)
+        create_histories(30, legacy=True)
+        create_histories(2, offset=100)
+
+        # 未移行の場合も新しい順に取得できること
+        user = table_user.get_item(
+            Key={'userId': USER_ID, 'key': 'userId'},
+        )['Item']
+        assert not point_history.is_migrated(user)
+
+        legacy_points, _ = point_history.query_points(
+            USER_ID, ['key', 'dateTime'], limit=3, migrated=False,
+        )
+        assert [float(p['dateTime']) for p in legacy_points] \
+            == [BASE_TIME + 101, BASE_TIME + 100, BASE_TIME + 29]
+
+        with mock.patch.object(concurrency.time, 'sleep'):
+            result = point_history.migrate_users(writes_per_second=10)
+
+        assert result == {
+            'users': 1,
+            'rewritten': 30,
+            'lastEvaluatedKey': None,
+        }
+
+        user = table_user.get_item(
+            Key={'userId': USER_ID, 'key': 'userId'},
+        )['Item']
+        assert point_history.is_migrated(user)
+
+        points, _ = point_history.query_points(
+            USER_ID, ['key', 'dateTime', 'senderId', 'point'],
+        )
+        assert len(points) == 32
+        assert all(
+            p['key'].startswith(point_history.POINT_KEY_PREFIX)
+            for p in points
+        )
+        assert [float(p['dateTime']) for p in points[:3]] \
+            == [BASE_TIME + 101, BASE_TIME + 100, BASE_TIME + 29]
+
+        # 再実行しても対象がないこと
+        assert point_history.migrate_users()['users'] == 0
+
+    @set_up
+    def test_compact_users(self):
+        """正常: 古い履歴を月ごと、送信理由ごとに集計しても合計が変わらないこと
+        """
+        create_user(migrated=True)
+        create_histories(20)
+        create_histories(3, offset=40 * 86400)
+        table_user.put_item(
+            Item=make_point_history(
+                USER_ID, SendReason.REGISTRATION_USER, jst_timestamp=BASE_TIME,
+            ),
+        )
+        now = get_jst_timestamp()
+        create_histories(2, offset=now - BASE_TIME)
+
+        summary = point_history.get_point_summary(USER_ID)
+        assert summary == [
+            {'reason': SendReason.REGISTRATION_USER, 'point': 100, 'count': 1},
+            {'reason': SendReason.SEND_HEART, 'point': 25, 'count': 25},
+        ]
+
+        result = point_history.compact_users()
+        assert result == {
+            'users': 1,
+            'compacted': 24,
+            'lastEvaluatedKey': None,
+        }
+        assert point_history.get_point_summary(USER_ID) == summary
+
+        # 集計は月ごと、送信理由ごと
+        rollups = table_user.query(
+            KeyConditionExpression=Key('userId').eq(USER_ID) &
+                Key('key').begins_with(point_history.ROLLUP_KEY_PREFIX),
+        )['Items']
+        assert sorted(
+            (r['key'], int(r['point']), int(r['count'])) for r in rollups
+        ) == [
+            ('point#r#202301#100', 100, 1),
+            ('point#r#202301#101', 20, 20),
+            ('point#r#202302#101', 3, 3),
+        ]
+
+        # 集計済みの履歴は一覧に含まれず、TTLで削除されること
+        points, _ = point_history.query_points(USER_ID, ['key', 'dateTime'])
+        assert len(points) == 2
+        compacted = table_user.get_item(
+            Key={
+                'userId': USER_ID,
+                'key': make_point_key('sender0', BASE_TIME),
+            },
+        )['Item']
+        assert compacted['compacted']
+        assert compacted['expiresAt'] > now
+
+        # 再実行しても二重に集計されないこと
+        assert point_history.compact_users()['compacted'] == 0
+        assert point_history.get_point_summary(USER_ID) == summary
+
+        # 集計済みの履歴を削除すると集計から差し引かれること
+        assert point_history.delete_point(USER_ID, compacted['key'])
+        assert point_history.get_point_summary(USER_ID)[1] \
+            == {'reason': SendReason.SEND_HEART, 'point': 24, 'count': 24}
+
+    @set_up
+    def test_load_profile(self):
+        """正常: ポイント履歴は最大件数までのみ読み、query_pointsと同じ結果になること
+        """
+        create_user(migrated=True)
+        create_histories(20)
+        table_user.put_item(
+            Item={
+                'userId': USER_ID,
+                'key': 'episode#adage-1',
+                'adageId': 'adage-1',
+                'title': 'title',
+                'episode': 'episode',
+            },
+        )
+
+        projection_list = ['key', 'dateTime', 'reason', 'point']
+        projections = {
+            'user': ['userId', 'userName'],
+            'episodes': ['adageId', 'title'],
+            'points': projection_list,
+        }
+
+        with mock.patch.object(
+                point_history, 'query_page',
+                wraps=point_history.query_page) as query_page:
+            profile = load_profile(
+                USER_ID, projections, limit=5, since=BASE_TIME + 2,
+            )
+
+        assert query_page.call_args.args[2] == 5
+        assert profile['user'] == {
+            'userId': USER_ID,
+            'userName': 'point history',
+        }
+        assert profile['episodes'] \
+            == [{'adageId': 'adage-1', 'title': 'title'}]
+
+        expected, expected_cursor = point_history.query_points(
+            USER_ID, projection_list, limit=5, since=BASE_TIME + 2,
+        )
+        assert profile['points'] == expected
+        assert profile['nextCursor'] == expected_cursor
+        assert profile['summary'] == point_history.get_point_summary(USER_ID)
+
+        # 次ページ
+        profile = load_profile(
+            USER_ID, projections, cursor=expected_cursor,
+            since=BASE_TIME + 2,
+        )
+        assert [float(p['dateTime']) for p in profile['points']] \
+            == [BASE_TIME + i for i in range(14, 1, -1)]
+        assert profile['nextCursor'] is None
+
+    @set_up
+    def test_point_summary(self):
+        """正常: 送信理由ごとの合計をユーザ本体に保持し、履歴を読まずに返すこと
+        """
+        create_user(migrated=True)
+        create_histories(3)
+
+        # 未集計のユーザは履歴から合計を作成する
+        assert point_history.summarize_users()['users'] == 1
+        assert point_history.get_point_summary(USER_ID) \
+            == [{'reason': SendReason.SEND_HEART, 'point': 3, 'count': 3}]
+
+        likes.apply_events(
+            [
+                likes.history_event(USER_ID, SendReason.THANK_YOU),
+                likes.history_event(USER_ID, SendReason.SEND_HEART),
+            ],
+        )
+        summary = [
+            {'reason': SendReason.SEND_HEART, 'point': 4, 'count': 4},
+            {
+                'reason': SendReason.THANK_YOU,
+                'point': SendReason.THANK_YOU.point,
+                'count': 1,
+            },
+        ]
+
+        with mock.patch.object(point_history, 'query_all') as query_all:
+            assert point_history.get_point_summary(USER_ID) == summary
+            query_all.assert_not_called()
+
+        assert point_history.query_point_summary(USER_ID) == summary
+
+        # 削除した履歴は合計から差し引かれること
+        assert point_history.delete_point(
+            USER_ID, make_point_key('sender0', BASE_TIME),
+        )
+        assert point_history.get_point_summary(USER_ID)[0] \
+            == {'reason': SendReason.SEND_HEART, 'point': 3, 'count': 3}
+
+        # 作成済みのユーザは対象外
+        assert point_history.summarize_users()['users'] == 0
+
+    @set_up
+    def test_load_profile_legacy(self):
+        """正常: 未移行のユーザは日時順に並べ替えて取得すること
+        """
+        create_user(migrated=False)
+        for i in range(3):
+            table_user.put_item(
+                Item={
+                    'userId': USER_ID,
+                    'key': f'point#sender-{i}#{BASE_TIME + i}',
+                    'senderId': f'sender-{i}',
+                    'reason': SendReason.SEND_HEART.value,
+                    'point': 1,
+                    'dateTime': Decimal(str(BASE_TIME + i)),
+                },
+            )
+
+        profile = load_profile(
+            USER_ID,
+            {
+                'user': ['userId'],
+                'episodes': ['adageId'],
+                'points': ['senderId'],
+            },
+            limit=2,
+        )
+
+        assert profile['points'] \
+            == [{'senderId': 'sender-2'}, {'senderId': 'sender-1'}]
+        profile = load_profile(
+            USER_ID,
+            {
+                'user': ['userId'],
+                'episodes': ['adageId'],
+                'points': ['senderId'],
+            },
+            limit=2,
+            cursor=profile['nextCursor'],
+        )
+        assert profile['points'] == [{'senderId': 'sender-0'}]
+
+
+def create_user(migrated: bool):
+    item = {
+        'userId': USER_ID,
+        'key': 'userId',
+        'userName': 'point history',
+        'likePoints': Decimal(0),
+    }
+    if migrated:
+        item['pointKeyVersion'] = point_history.POINT_KEY_VERSION
+
+    table_user.put_item(Item=item)
+
+
+def create_histories(count: int, offset: int=0, legacy: bool=False):
+    with table_user.batch_writer() as batch:
+        for i in range(count):
+            jst_timestamp = BASE_TIME + offset + i
+            item = make_point_history(
+                USER_ID,
+                SendReason.SEND_HEART,
+                f'sender{i % 3}',
+                'sender',
+                jst_timestamp,
+            )
+            if legacy:
+                item['key'] = '#'.join(
+                    ['point', item['senderId'], str(jst_timestamp)],
+                )
+
+            batch.put_item(Item=item)
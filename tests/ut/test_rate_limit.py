@@ -0,0 +1,132 @@
+from http import HTTPStatus
+import json
+from unittest import mock
+
+from boto3.dynamodb.conditions import Attr
+from set_up import set_up
+
+from common import rate_limit
+from common.resource import Table
+import adage
+import episode
+
+
+table_adage = Table.ADAGE
+
+
+class TestRateLimit:
+
+    @set_up
+    def test_post_by_guest(self):
+        """異常: 上限を超えた場合、書き込み前に429とRetry-Afterを返すこと
+        """
+        with mock.patch.object(rate_limit, 'RATE_LIMIT_CAPACITY', 2):
+            responses = [post_by_guest('10.0.0.1') for _ in range(3)]
+
+        assert [x['statusCode'] for x in responses] == [
+            HTTPStatus.CREATED.value,
+            HTTPStatus.CREATED.value,
+            HTTPStatus.TOO_MANY_REQUESTS.value,
+        ]
+        assert responses[2]['headers']['Retry-After'] == '6'
+        titles = table_adage.scan(
+            FilterExpression=Attr('key').eq('title'),
+        )['Items']
+        assert len(titles) == 2
+
+        # 送信元IPが異なる場合は制限しない
+        with mock.patch.object(rate_limit, 'RATE_LIMIT_CAPACITY', 2):
+            response = post_by_guest('10.0.0.2')
+
+        assert response['statusCode'] == HTTPStatus.CREATED.value
+
+    @set_up
+    def test_shared_bucket(self):
+        """異常: 別のコンテナ(キャッシュなし)でも共有バケットで制限されること
+        """
+        event = {'requestContext': {'identity': {'sourceIp': '10.0.0.1'}}}
+
+        with mock.patch.object(rate_limit, 'RATE_LIMIT_CAPACITY', 1):
+            rate_limit.check_rate_limit(event, 'route')
+            rate_limit.bucket_cache.clear()
+
+            try:
+                rate_limit.check_rate_limit(event, 'route')
+                assert False
+
+            except rate_limit.RateLimitException as e:
+                assert e.value == HTTPStatus.TOO_MANY_REQUESTS.value
+
+            # 拒否後はコンテナ内のバケットのみで拒否する
+            with mock.patch.object(rate_limit, 'table_control') as table:
+                try:
+                    rate_limit.check_rate_limit(event, 'route')
+                    assert False
+
+                except rate_limit.RateLimitException:
+                    pass
+
+                table.get_item.assert_not_called()
+                table.put_item.assert_not_called()
+
+    @set_up
+    def test_episode_routes(self):
+        """異常: ボディのuserIdによらず、認証なしのエピソードの書き込みを制限すること
+        """
+        request_context = {'identity': {'sourceIp': '10.0.0.1'}}
+        post_event = {
+            'body': json.dumps(
+                {
+                    'adageId': 'adage_1',
+                    'episode': 'test',
+                    'userId': 'user_1',
+                },
+            ),
+            'requestContext': request_context,
+        }
+        patch_event = {
+            'pathParameters': {
+                'adageId': 'adage_1',
+                'userId': 'user_1',
+                'senderUserId': 'user_2',
+            },
+            'requestContext': request_context,
+        }
+
+        for function, event in [
+                (episode.post, post_event),
+                (episode.patch_from_user, patch_event)]:
+            with mock.patch.object(rate_limit, 'RATE_LIMIT_CAPACITY', 1):
+                responses = [function(event, None) for _ in range(2)]
+
+            assert responses[0]['statusCode'] \
+                != HTTPStatus.TOO_MANY_REQUESTS.value
+            assert responses[1]['statusCode'] \
+                == HTTPStatus.TOO_MANY_REQUESTS.value
+
+    def test_refill(self):
+        """正常: 経過時間に応じて容量まで補充されること
+        """
+        with mock.patch.object(rate_limit, 'RATE_LIMIT_REFILL_RATE', 0.5):
+            assert rate_limit.refill((0, 100), 104) == 2
+            assert rate_limit.refill((0, 100), 1000) \
+                == rate_limit.RATE_LIMIT_CAPACITY
+            assert rate_limit.refill((1, 100), 90) == 1
+
+
+def post_by_guest(source_ip: str) -> dict:
+    """ゲストユーザで格言登録
+
+    Args:
+        source_ip (str): 送信元IP
+
+    Returns:
+        dict: レスポンス
+    """
+    return adage.post_by_guest(
+        {
+            'body': json.dumps({'title': 'test'}),
+            'requestContext': {'identity': {'sourceIp': source_ip}},
+        },
+        None,
+    )
@@ -0,0 +1,110 @@
+import threading
+from unittest import mock
+
+from common import concurrency, const, resource
+
+
+class TestResource:
+
+    def test_get_client(self):
+        """正常: クライアントはサービスごとに1度だけ作成されること
+        """
+        resource.clear_clients()
+        session = resource.get_session()
+
+        with mock.patch.object(
+                session, 'client', wraps=session.client) as create:
+            lambda_client = resource.get_client('lambda')
+            assert resource.get_client('lambda') is lambda_client
+
+            sqs_client = resource.get_client('sqs')
+            assert resource.get_client('sqs') is sqs_client
+            assert sqs_client is not lambda_client
+
+        assert create.call_count == 2
+        assert resource.get_session() is session
+
+    def test_cognito(self):
+        """正常: Cognitoはリクエストごとにクライアントを作成しないこと
+        """
+        resource.clear_clients()
+        session = resource.get_session()
+
+        with mock.patch.object(
+                session, 'client', wraps=session.client) as create:
+            first = resource.Cognito()
+            second = resource.Cognito()
+
+        assert first._cognito is second._cognito
+        assert create.call_count == 1
+
+    def test_get_config(self):
+        """正常: 接続設定が反映されること
+        """
+        config = resource.get_config()
+
+        assert config.max_pool_connections \
+            == const.AWS_MAX_POOL_CONNECTIONS
+        assert config.connect_timeout == const.AWS_CONNECT_TIMEOUT
+        assert config.read_timeout == const.AWS_READ_TIMEOUT
+        assert config.retries['mode'] == const.AWS_RETRY_MODE
+        assert config.retries['max_attempts'] == const.AWS_MAX_ATTEMPTS
+
+    def test_lazy_table(self):
+        """正常: テーブル名の参照ではTableを作成せず、初回利用時に1度だけ作成すること
+        """
+        table = resource.LazyTable('lazyTable')
+
+        with mock.patch.object(resource, 'get_resource') as get_resource:
+            assert table.name == 'lazyTable'
+            get_resource.assert_not_called()
+
+            table.put_item
+            table.get_item
+            get_resource.assert_called_once_with('dynamodb')
+            get_resource.return_value.Table.assert_called_once_with(
+                'lazyTable',
+            )
+
+    def test_resource_per_thread(self):
+        """正常: リソースはスレッドごとに作成し、同じスレッドでは再利用すること
+        """
+        resource.clear_clients()
+
+        def get_resources(_):
+            return (
+                threading.get_ident(),
+                resource.get_resource('dynamodb'),
+                resource.get_resource('dynamodb'),
+            )
+
+        results = concurrency.run_parallel(
+            get_resources, range(8), max_workers=4,
+        ) + [get_resources(None)]
+
+        resources = {}
+        for thread_id, first, second in results:
+            assert first is second
+            assert resources.setdefault(thread_id, first) is first
+
+        # スレッド間で共有しない
+        assert len({id(x) for x in resources.values()}) == len(resources)
+        assert len(resources) > 1
+
+    def test_run_parallel_reuses_threads(self):
+        """正常: 並列実行のスレッドは使い回し、リソースを作り直さないこと
+        """
+        resource.clear_clients()
+        table = resource.LazyTable('lazyTable')
+
+        results = []
+        for _ in range(5):
+            results += concurrency.run_parallel(
+                lambda _: (threading.get_ident(), table.get()),
+                range(4),
+            )
+
+        threads = {thread_id for thread_id, _ in results}
+        tables = {id(x) for _, x in results}
+        assert len(threads) <= concurrency.PARALLEL_MAX_WORKERS
+        assert len(tables) == len(threads)
@@ -1,7 +1,22 @@
+from base64 import b64decode
+from decimal import Decimal
+import gzip
 from http import HTTPStatus
 import json
+from unittest import mock
 
-from common.response import Response
+import pytest
+
+from common import response as response_module
+from common.response import (
+    compress,
+    dumps,
+    is_not_modified,
+    select_encoding,
+    make_etag,
+    NotModifiedResponse,
+    Response,
+)
 
 
 class TestResponse:
@@ -17,8 +32,173 @@ class TestResponse:
         response = Response(body).format()
 
         assert response['statusCode'] == HTTPStatus.OK.value
-        assert response['body'] == json.dumps(body)
+        assert json.loads(response['body']) == body
         assert response['headers']['Access-Control-Allow-Origin'] \
             == '*'
         assert response['headers']['Access-Control-Allow-Headers'] \
             == 'Content-Type'
+
+    def test_response_etag(self):
+        """正常
+
+        ETag、Cache-Controlが返却されること
+        """
+        body = {
+            'test': 'test is OK',
+        }
+        etag = make_etag(body)
+        response = Response(
+            body,
+            etag=etag,
+            cache_control='public, max-age=60',
+        ).format()
+
+        assert response['statusCode'] == HTTPStatus.OK.value
+        assert response['headers']['ETag'] == etag
+        assert response['headers']['Cache-Control'] == 'public, max-age=60'
+
+    def test_not_modified(self):
+        """正常
+
+        If-None-Matchが一致する場合、304が返却されること
+        """
+        etag = make_etag({'test': 'test is OK'})
+        event = {
+            'headers': {
+                'if-none-match': f'"other", W/{etag}',
+            },
+        }
+
+        assert is_not_modified(event, etag)
+        assert not is_not_modified({'headers': None}, etag)
+
+        response = NotModifiedResponse(etag).format()
+
+        assert response['statusCode'] == HTTPStatus.NOT_MODIFIED.value
+        assert response['headers']['ETag'] == etag
+        assert response['body'] == ''
+
+    @pytest.mark.parametrize('backend', ['auto', 'json'])
+    def test_dumps_decimal(self, backend):
+        """正常: DynamoDBのアイテムをそのまま変換できること
+        """
+        body = {
+            'likePoints': Decimal('12'),
+            'dateTime': Decimal('1672498800.5'),
+            'tags': {'b', 'a'},
+            'episode': [{'likePoints': Decimal('0'), 'title': '格言'}],
+        }
+
+        with mock.patch.object(response_module, 'JSON_BACKEND', backend):
+            result = json.loads(dumps(body))
+            response = Response(body).format()
+
+        assert result == {
+            'likePoints': 12,
+            'dateTime': 1672498800.5,
+            'tags': ['a', 'b'],
+            'episode': [{'likePoints': 0, 'title': '格言'}],
+        }
+        assert isinstance(result['likePoints'], int)
+        assert json.loads(response['body']) == result
+
+    def test_dumps_error(self):
+        """異常: 変換できない値の場合、TypeErrorとなること
+        """
+        with pytest.raises(TypeError):
+            dumps({'value': object()})
+
+    def test_make_etag_sort_keys(self):
+        """正常: キーの順序によらず同じETagとなること
+        """
+        assert make_etag({'a': Decimal(1), 'b': 2}) \
+            == make_etag({'b': 2, 'a': 1})
+
+
+class TestCompression:
+
+    body = {
+        'adages': [
+            {'adageId': f'adage-{i}', 'title': '格言タイトル' * 4}
+            for i in range(200)
+        ],
+    }
+
+    @staticmethod
+    def make_event(accept_encoding: str) -> dict:
+        return {'headers': {'accept-encoding': accept_encoding}}
+
+    @pytest.fixture(autouse=True)
+    def enable_compression(self):
+        with mock.patch.multiple(
+                response_module,
+                RESPONSE_COMPRESSION=True,
+                COMPRESSION_MIN_SIZE=1024,
+                brotli=None):
+            yield
+
+    def test_gzip(self):
+        """正常: gzipを受け付ける場合、圧縮してbase64で返却されること
+        """
+        response = compress(
+            Response(self.body).format(),
+            self.make_event('gzip, br'),
+        )
+
+        assert response['isBase64Encoded']
+        assert response['headers']['Content-Encoding'] == 'gzip'
+        assert response['headers']['Vary'] == 'Accept-Encoding'
+        assert json.loads(gzip.decompress(b64decode(response['body']))) \
+            == self.body
+
+    def test_below_threshold(self):
+        """正常: ボディが閾値未満の場合、圧縮されないこと
+        """
+        response = compress(
+            Response({'test': 'test is OK'}).format(),
+            self.make_event('gzip'),
+        )
+
+        assert 'isBase64Encoded' not in response
+        assert 'Content-Encoding' not in response['headers']
+        assert json.loads(response['body']) == {'test': 'test is OK'}
+
+    @pytest.mark.parametrize('accept_encoding', [
+        None,
+        'identity',
+        'gzip;q=0',
+        'br',
+    ])
+    def test_not_accepted(self, accept_encoding):
+        """正常: 対応する圧縮方式を受け付けない場合、圧縮されないこと
+        """
+        response = compress(
+            Response(self.body).format(),
+            self.make_event(accept_encoding),
+        )
+
+        assert 'isBase64Encoded' not in response
+        assert json.loads(response['body']) == self.body
+
+    def test_disabled(self):
+        """正常: 圧縮が無効の場合、圧縮されないこと
+        """
+        with mock.patch.object(response_module, 'RESPONSE_COMPRESSION', False):
+            response = compress(
+                Response(self.body).format(),
+                self.make_event('gzip'),
+            )
+
+        assert 'isBase64Encoded' not in response
+
+    def test_select_encoding(self):
+        """正常: qの値とbrotliの有無に応じて圧縮方式が選択されること
+        """
+        assert select_encoding('*') == 'gzip'
+        assert select_encoding('deflate, gzip;q=0.5') == 'gzip'
+        assert select_encoding('*;q=0') is None
+
+        with mock.patch.object(response_module, 'brotli', object()):
+            assert select_encoding('gzip, br') == 'br'
+            assert select_encoding('gzip, br;q=0.5') == 'gzip'
+            assert select_encoding('*') == 'br'
@@ -0,0 +1,132 @@
+from http import HTTPStatus
+import json
+from unittest import mock
+
+import yaml
+
+import router
+
+
+def load_http_routes(text: str) -> set:
+    """Serverlessの関数定義からhttpイベントのルートを取得
+    """
+    functions = yaml.safe_load(text.replace('${', '_{'))
+    routes = set()
+
+    for definition in functions.values():
+        handler = definition['handler'].split('/')[-1]
+        for event in definition.get('events') or []:
+            if 'http' in event:
+                routes.add(
+                    (
+                        event['http']['method'].upper(),
+                        event['http']['path'],
+                        handler,
+                    ),
+                )
+
+    return routes
+
+
+class TestRouter:
+
+    def test_routes(self):
+        """正常: ルート定義がserverless.ymlのhttpイベントと一致すること
+        """
+        with open('./serverless.yml') as f:
+            text = f.read()
+        text = text[text.index('\nfunctions:') + len('\nfunctions:'):]
+        routes = load_http_routes(text)
+
+        assert set(router.ROUTES) == routes
+
+    def test_router_yml(self):
+        """正常: 1関数用の定義がルート定義と一致すること
+        """
+        with open('./serverless/router.yml') as f:
+            routes = load_http_routes(f.read())
+
+        assert routes == {
+            (method, path, 'router.handle')
+            for method, path, _ in router.ROUTES
+        }
+
+    def test_resolve(self):
+        """正常: リソースパス、実際のパスからルートを検索できること
+        """
+        assert router.resolve(
+            'PATCH',
+            '/adage/{adageId}/episode/{userId}',
+            '/adage/a1/episode/u1',
+        ) == (
+            '/adage/{adageId}/episode/{userId}',
+            'episode.patch_from_guest',
+            {},
+        )
+
+        assert router.resolve(
+            'PATCH',
+            None,
+            '/adage/a1/episode/u1/u2',
+        ) == (
+            '/adage/{adageId}/episode/{userId}/{senderUserId}',
+            'episode.patch_from_user',
+            {'adageId': 'a1', 'userId': 'u1', 'senderUserId': 'u2'},
+        )
+
+        assert router.resolve('GET', None, '/user/') == (
+            '/user',
+            'user.get',
+            {},
+        )
+        assert router.resolve('PUT', None, '/adage') is None
+
+    def test_handle(self):
+        """正常: ハンドラへ振り分け、処理時間をヘッダに付与すること
+        """
+        events = []
+
+        def fake_handler(event, context):
+            events.append(event)
+            return {
+                'statusCode': HTTPStatus.OK.value,
+                'headers': {},
+                'body': '{}',
+            }
+
+        event = {
+            'httpMethod': 'DELETE',
+            'path': '/episode/a1',
+            'body': '{}',
+        }
+
+        with mock.patch.dict(
+                router._handlers, {'episode.delete': fake_handler}), \
+                mock.patch.dict(router.route_stats, clear=True):
+            response = router.handle(event, None)
+            response = router.handle(event, None)
+
+            stats = router.route_stats['DELETE /episode/{adageId}']
+            assert stats['count'] == 2
+
+        assert response['statusCode'] == HTTPStatus.OK.value
+        assert response['headers']['Server-Timing'].startswith(
+            'route;desc="episode.delete";dur=',
+        )
+        assert events[0]['pathParameters'] == {'adageId': 'a1'}
+        assert events[0]['body'] == '{}'
+
+    def test_handle_not_found(self):
+        """異常: ルートが存在しない場合
+        """
+        response = router.handle(
+            {
+                'httpMethod': 'GET',
+                'path': '/unknown',
+            },
+            None,
+        )
+        assert response['statusCode'] == HTTPStatus.NOT_FOUND.value
+
+        res = json.loads(response['body'])
+        assert res['errorCode'] == HTTPStatus.NOT_FOUND.value
@@ -0,0 +1,243 @@
+from http import HTTPStatus
+import json
+from unittest import mock
+
+from boto3.dynamodb.conditions import Attr
+from set_up import set_up
+
+from common import search
+from common.resource import Table
+import search as search_function
+
+
+table_adage = Table.ADAGE
+
+
+class TestSearch:
+
+    def test_get_terms(self):
+        """正常: 全角、半角、カタカナを揃え、記号をまたがないn-gramになること
+        """
+        assert search.get_terms('ＡＢ、ｶﾞｯコウ') == {
+            'ab': 1,
+            'がっ': 1,
+            'っこ': 1,
+            'こう': 1,
+        }
+        assert search.get_terms('ああああ') == {'ああ': 3}
+        assert search.get_terms('木 と') == {'木': 1, 'と': 1}
+        assert search.get_terms('!? ') == {}
+
+    def test_encode_postings(self):
+        """正常: 圧縮した転置リストを展開できること
+        """
+        postings = [(0, 1, 5), (3, 2, 130), (200000, 1, 7)]
+        data = search.encode_postings(postings)
+
+        assert search.decode_postings(data) == postings
+        assert len(data) == 12
+
+    @set_up
+    def test_merge(self):
+        """正常: マージ前、マージ後のどちらも検索でき、削除が反映されること
+        """
+        items = create_adages()
+        search.add_documents(items)
+
+        before = search.search('木から')[0]
+        assert search.merge_pending() == {'added': 3, 'removed': 0}
+        after = search.search('木から')[0]
+
+        assert [(x['adageId'], x['key']) for x in before] \
+            == [(x['adageId'], x['key']) for x in after]
+        assert {(x['adageId'], x['key']) for x in after} \
+            == {('adage_1', 'title'), ('adage_1', 'episode#user_1')}
+
+        # マージ前の削除は検索結果から除外する
+        search.remove_document('adage_1', 'episode#user_1')
+        assert [x['key'] for x in search.search('木から')[0]] == ['title']
+
+        assert search.merge_pending() == {'added': 0, 'removed': 1}
+        assert [x['key'] for x in search.search('木から')[0]] == ['title']
+        assert search.get_meta()['docCount'] == 2
+
+        # 削除した文書は削除済み文書IDに溜めず、転置リストから取り除く
+        assert 'Item' not in table_adage.get_item(
+            Key={
+                'adageId': search.META_ID,
+                'key': search.get_deleted_key(0),
+            },
+        )
+        assert len(search.read_postings(0, '木か')) == 1
+
+    @set_up
+    def test_build_index(self):
+        """正常: 格言テーブルから検索インデックスを一括作成できること
+        """
+        create_adages()
+        search.add_documents([{'adageId': 'x', 'key': 'title', 'title': '木'}])
+
+        # motoのスキャンは分割(Segment)に対応していないため1分割で実行
+        result = search.build_index(segments=1)
+
+        assert result['documents'] == 3
+        assert result['generation'] == 1
+        assert search.get_pending() == []
+        assert [x['title'] for x in search.search('三年')[0]] \
+            == ['石の上にも三年']
+
+        # 再作成すると古い世代を削除する
+        assert search.build_index(segments=1)['generation'] == 2
+        assert table_adage.get_item(
+            Key={
+                'adageId': search.get_term_id(1, 'さん'),
+                'key': search.get_block_key(0),
+            },
+        ).get('Item') is None
+
+    @set_up
+    def test_delete_generation(self):
+        """正常: 記録した語、文書IDの対応から古い世代を全て削除できること
+        """
+        create_adages()
+        search.build_index(segments=1)
+
+        # マージで追加した語、置き換えた文書も削除する
+        search.add_documents(
+            [
+                {'adageId': 'adage_3', 'key': 'title', 'title': '急がば回れ'},
+                {'adageId': 'adage_2', 'key': 'title', 'title': '石の上'},
+            ],
+        )
+        search.merge_pending()
+        assert get_generation_items(1)
+
+        with mock.patch.object(
+                table_adage, 'scan', side_effect=AssertionError):
+            search.delete_generation(1)
+
+        assert get_generation_items(1) == []
+
+    @set_up
+    def test_delete_legacy_generation(self):
+        """正常: 語を記録していない旧形式の世代はスキャンして削除すること
+        """
+        create_adages()
+        search.build_index(segments=1)
+        table_adage.delete_item(
+            Key={
+                'adageId': search.get_terms_id(1),
+                'key': search.TERMS_META_KEY,
+            },
+        )
+
+        search.delete_generation(1)
+
+        assert get_generation_items(1) == []
+
+    @set_up
+    def test_guest_documents(self):
+        """正常: ゲストの格言、エピソードは検索対象にしないこと
+        """
+        guest = {
+            'adageId': 'adage_9',
+            'key': 'title',
+            'title': '木登り',
+            'byGuest': True,
+        }
+        table_adage.put_item(Item=guest)
+        search.add_documents([guest])
+
+        assert search.get_pending() == []
+
+        create_adages()
+        assert search.build_index(segments=1)['documents'] == 3
+        assert 'adage_9' not in {
+            x['adageId'] for x in search.search('木')[0]
+        }
+
+    @set_up
+    def test_get(self):
+        """正常: スコア順に検索結果をページングして返すこと
+        """
+        search.add_documents(create_adages())
+
+        response = search_function.get(
+            {'queryStringParameters': {'q': '木から', 'limit': '1'}},
+            None,
+        )
+
+        assert response['statusCode'] == HTTPStatus.OK.value
+        body = json.loads(response['body'])
+        assert len(body) == 1
+        assert body[0]['key'] == 'title'
+
+        response = search_function.get(
+            {
+                'queryStringParameters': {
+                    'q': '木から',
+                    'limit': '1',
+                    'cursor': response['headers']['X-Next-Cursor'],
+                },
+            },
+            None,
+        )
+        assert [x['key'] for x in json.loads(response['body'])] \
+            == ['episode#user_1']
+
+    @set_up
+    def test_get_without_query(self):
+        """異常: 検索文字列が空の場合、400を返すこと
+        """
+        response = search_function.get(
+            {'queryStringParameters': {'q': '、'}},
+            None,
+        )
+
+        assert response['statusCode'] == HTTPStatus.BAD_REQUEST.value
+
+
+def create_adages() -> list:
+    """格言、エピソードを登録
+
+    Returns:
+        list: 登録したアイテムリスト
+    """
+    items = [
+        {
+            'adageId': 'adage_1',
+            'key': 'title',
+            'title': 'サルも木から落ちる',
+        },
+        {
+            'adageId': 'adage_1',
+            'key': 'episode#user_1',
+            'title': 'サルも木から落ちる',
+            'episode': '木から落ちた日のこと。木の上は高い',
+        },
+        {
+            'adageId': 'adage_2',
+            'key': 'title',
+            'title': '石の上にも三年',
+        },
+    ]
+    for item in items:
+        table_adage.put_item(Item=item)
+
+    return items
+
+
+def get_generation_items(generation: int) -> list:
+    """世代の検索インデックスのアイテムを取得
+
+    Args:
+        generation (int): 世代
+
+    Returns:
+        list: アイテムリスト
+    """
+    return table_adage.scan(
+        FilterExpression=Attr('adageId').begins_with(
+            f'{search.SEARCH_PREFIX}{generation}#',
+        ),
+    )['Items']
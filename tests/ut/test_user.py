@@ -1,11 +1,15 @@
 from http import HTTPStatus
 import json
+from unittest import mock
+
+from set_up import set_up
 
 from common.resource import Table
 from util.const import LOGIN_ID, PASSWORD
 import user
 
 
+table_adage = Table.ADAGE
 table_user = Table.USER
 
 
@@ -63,7 +67,110 @@ class TestUser:
         assert res['phrase'] == HTTPStatus.BAD_REQUEST.phrase
         assert res['message'] == 'Incorrect username or password.'
 
+    @set_up
+    def test_put_pending(self):
+        """正常: ユーザ名変更は反映を待たずに返り、反映状態が処理中になること
+        """
+        create_user_with_episode()
+
+        with mock.patch.object(user, 'get_client') as get_client:
+            response = user.put(
+                create_event({'userName': '変更後'}, USER_ID),
+                None,
+            )
+
+        assert response['statusCode'] == HTTPStatus.OK.value
+        assert json.loads(response['body'])['propagation'] \
+            == {'status': user.SYNC_PENDING}
+        get_client.return_value.invoke.assert_called_once()
+
+        res = get_user()
+        assert res['userName'] == '変更後'
+        assert res['userNameSync'] == {'status': user.SYNC_PENDING}
+        # 反映前の投稿エピソードは変更前のまま
+        assert get_episode()['userName'] == '変更前'
+
+    @set_up
+    def test_propagate_name(self):
+        """正常: ユーザ名の反映後、投稿エピソードと反映状態が更新されること
+        """
+        create_user_with_episode()
+        with mock.patch.object(user, 'get_client'):
+            user.put(create_event({'userName': '変更後'}, USER_ID), None)
+
+        etag = user.get(create_event({}, USER_ID), None)['headers']['ETag']
+
+        assert user.propagate_name({'userId': USER_ID}, None) == {
+            'status': user.SYNC_COMPLETED,
+            'total': 1,
+            'updated': 1,
+            'failed': 0,
+        }
+
+        assert get_episode()['userName'] == '変更後'
+        response = user.get(create_event({}, USER_ID), None)
+        # 反映状態の保存でETagが変わること
+        assert response['headers']['ETag'] != etag
+        assert json.loads(response['body'])['userNameSync'] == {
+            'status': user.SYNC_COMPLETED,
+            'total': 1,
+            'updated': 1,
+            'failed': 0,
+        }
+
+
+USER_ID = 'user_1'
+
+
+def create_user_with_episode():
+    """ユーザと投稿エピソードを登録
+    """
+    table_user.put_item(
+        Item={
+            'userId': USER_ID,
+            'key': 'userId',
+            'userName': '変更前',
+            'loginId': LOGIN_ID,
+            'likePoints': 0,
+        },
+    )
+    table_adage.put_item(
+        Item={
+            'adageId': 'adage_1',
+            'key': f'episode#{USER_ID}',
+            'userId': USER_ID,
+            'userName': '変更前',
+            'title': '格言1',
+            'episode': 'エピソード1',
+            'likePoints': 0,
+        },
+    )
+
+
+def get_user() -> dict:
+    """ユーザ参照のレスポンスボディを取得
+
+    Returns:
+        dict: レスポンスボディ
+    """
+    response = user.get(create_event({}, USER_ID), None)
+    assert response['statusCode'] == HTTPStatus.OK.value
+
+    return json.loads(response['body'])
+
+
+def get_episode() -> dict:
+    """投稿エピソードを取得
 
+    Returns:
+        dict: エピソード
+    """
+    return table_adage.get_item(
+        Key={
+            'adageId': 'adage_1',
+            'key': f'episode#{USER_ID}',
+        },
+    )['Item']
 
 
 def create_event(body: dict, user_id: str=None) -> dict:
@@ -0,0 +1,89 @@
+from unittest import mock
+
+from set_up import set_up
+
+from common import user_repository
+from common.cache import TTLCache
+from common.resource import Table
+from common.user_repository import UserRepository
+
+
+table_user = Table.USER
+
+USER_ID = 'repository-test-user'
+
+
+class TestUserRepository:
+
+    @set_up
+    def test_get_memoized(self):
+        """正常: 異なる属性での再取得も、同じリクエスト内では1回の読み込みで済むこと
+        """
+        create_user()
+        users = UserRepository()
+
+        with count_reads() as get_item:
+            assert users.get(USER_ID, ['userId']) == {'userId': USER_ID}
+            assert users.get(USER_ID, ['userName']) == {'userName': 'name'}
+            assert users.get(USER_ID, ['userId', 'userName']) \
+                == {'userId': USER_ID, 'userName': 'name'}
+
+            # 存在しない属性は再読み込みしないこと
+            assert users.get(USER_ID, ['userId']) == {'userId': USER_ID}
+
+        # 2回目は1回目の属性を合わせて取得する
+        assert get_item.call_count == 2
+
+    @set_up
+    def test_get_not_found(self):
+        """正常: 存在しないユーザは、リクエストをまたいで再読み込みしないこと
+        """
+        with count_reads() as get_item:
+            assert UserRepository().get(USER_ID, ['userId']) == {}
+            assert UserRepository().get(USER_ID, ['userName']) == {}
+
+        assert get_item.call_count == 1
+
+        # 登録後に破棄すれば読み込めること
+        create_user()
+        user_repository.invalidate(USER_ID)
+        assert UserRepository().get(USER_ID, ['userName']) \
+            == {'userName': 'name'}
+
+    @set_up
+    def test_get_cached(self):
+        """正常: キャッシュが有効な場合、リクエストをまたいで再利用すること
+        """
+        create_user()
+
+        with mock.patch.object(
+                user_repository, 'user_cache', TTLCache(60, 10)), \
+                count_reads() as get_item:
+            for _ in range(3):
+                assert UserRepository().get(USER_ID, ['userName']) \
+                    == {'userName': 'name'}
+
+            # 更新時に破棄すること
+            users = UserRepository()
+            users.invalidate(USER_ID)
+            users.get(USER_ID, ['userName'])
+
+        assert get_item.call_count == 2
+
+
+def create_user():
+    table_user.put_item(
+        Item={
+            'userId': USER_ID,
+            'key': 'userId',
+            'userName': 'name',
+        },
+    )
+
+
+def count_reads():
+    return mock.patch.object(
+        table_user,
+        'get_item',
+        wraps=table_user.get_item,
+    )
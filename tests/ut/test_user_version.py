@@ -0,0 +1,136 @@
+from http import HTTPStatus
+import json
+from unittest import mock
+
+from set_up import set_up
+
+from common import likes, user_version
+from common.const import SendReason
+from common.resource import Table
+from common.util import add_point_history
+import user
+
+
+table_user = Table.USER
+
+USER_ID = 'version-test-user'
+
+
+class TestUserVersion:
+
+    @set_up
+    def test_bump(self):
+        """正常: 書き込みごとに更新バージョンが進むこと
+        """
+        create_user()
+        assert user_version.get_version(USER_ID) == 0
+
+        add_point_history(USER_ID, SendReason.SEND_HEART)
+        assert user_version.get_version(USER_ID) == 1
+
+        # 同じユーザへの複数のイベントは1回にまとめる
+        likes.apply_events(
+            [
+                likes.like_event('user', {'userId': USER_ID, 'key': 'userId'}),
+                likes.history_event(USER_ID, SendReason.THANK_YOU),
+            ],
+        )
+        assert user_version.get_version(USER_ID) == 2
+
+        # ゲストは更新バージョンを持たない
+        user_version.bump('guest#test')
+        assert 'Item' not in table_user.get_item(
+            Key={'userId': 'guest#test', 'key': user_version.VERSION_KEY},
+        )
+
+    @set_up
+    def test_get_not_modified(self):
+        """正常: 変更がない場合、更新バージョンの読み込みのみで304となること
+        """
+        create_user()
+
+        response = user.get(create_event(), None)
+        assert response['statusCode'] == HTTPStatus.OK.value
+        assert response['headers']['Cache-Control'] == 'private, no-cache'
+        etag = response['headers']['ETag']
+
+        with count_calls() as calls:
+            response = user.get(create_event(etag), None)
+
+        assert response['statusCode'] == HTTPStatus.NOT_MODIFIED.value
+        assert response['headers']['ETag'] == etag
+        assert calls == ['GetItem']
+
+        # 書き込み後は新しい内容が返ること
+        add_point_history(USER_ID, SendReason.SEND_HEART)
+        response = user.get(create_event(etag), None)
+
+        assert response['statusCode'] == HTTPStatus.OK.value
+        assert response['headers']['ETag'] != etag
+        assert json.loads(response['body'])['likePoints'] == 100
+        assert len(json.loads(response['body'])['pointList']) == 1
+
+
+def create_user():
+    """ユーザ作成
+    """
+    table_user.put_item(
+        Item={
+            'userId': USER_ID,
+            'key': 'userId',
+            'loginId': 'version@example.com',
+            'userName': 'name',
+            'likePoints': 100,
+        },
+    )
+
+
+def create_event(etag: str=None) -> dict:
+    """ユーザ参照のイベント作成
+
+    Args:
+        etag (str, optional): If-None-Match Defaults to None.
+
+    Returns:
+        dict: イベント
+    """
+    return {
+        'headers': {} if etag is None else {'If-None-Match': etag},
+        'requestContext': {
+            'authorizer': {
+                'claims': {
+                    'sub': USER_ID,
+                },
+            },
+        },
+    }
+
+
+def count_calls():
+    """DynamoDBへのリクエストを記録する
+
+    Returns:
+        mock: 呼び出したオペレーション名のリスト
+    """
+    from botocore.client import BaseClient
+
+    calls = []
+    original = BaseClient._make_api_call
+
+    def make_api_call(self, operation_name, api_params):
+        calls.append(operation_name)
+        return original(self, operation_name, api_params)
+
+    class Recorder:
+
+        def __enter__(self):
+            self._patch = mock.patch.object(
+                BaseClient, '_make_api_call', make_api_call,
+            )
+            self._patch.start()
+            return calls
+
+        def __exit__(self, *args):
+            self._patch.stop()
+
+    return Recorder()